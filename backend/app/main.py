@@ -1,10 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth, rentals, invoices, customers, returns, support, reports, equipment, admin, events, uom, rates, currencies, vat, contracts, warehouse, finance, sales, crm, hr
-from .utils.database import connect_to_mongo, close_mongo_connection
+from .utils.database import connect_to_mongo, close_mongo_connection, get_max_pool_size
 from .utils.seed_data import seed_demo_data
+from .utils.dashboard_stats import reconcile_periodically
+from .utils.password_pool import password_pool
+from .utils.indexes import ensure_indexes_in_background, flush_query_shapes_periodically
+from .utils.lead_sync import sync_leads_periodically
+from .utils.command_accounting import CommandAccountingMiddleware
+from .utils.loop_monitor import monitor_loop_lag
+from .utils.profiling import ProfilingMiddleware
+from .utils.logging_setup import configure_logging, shutdown_logging, RequestIdMiddleware
+from .utils.metrics import MetricsMiddleware, METRICS_TOKEN, CONTENT_TYPE, render_metrics
+from .utils.pagination import NEXT_CURSOR_HEADER
+import asyncio
 import os
 
+# Queue-based structured logging for the app.* loggers (see utils/logging_setup.py)
+configure_logging()
+
 app = FastAPI(
     title="Rigit Control Hub API",
     description="Backend API for the Rigit Control Hub application",
@@ -34,41 +48,71 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # A "*" wildcard is not honoured for credentialed requests, so list the headers clients read
+    expose_headers=[
+        NEXT_CURSOR_HEADER, "ETag", "X-Request-ID", "X-Profile-Id",
+        "X-DB-Commands", "X-DB-Command-Types", "X-DB-Time-Ms", "X-DB-Max-Batch", "X-DB-Warnings",
+    ],
 )
 
-# Include routers
-app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
-app.include_router(equipment.router, prefix="/api/equipment", tags=["Equipment"])
-app.include_router(rentals.router, prefix="/api/rentals", tags=["Rentals"])
-app.include_router(invoices.router, prefix="/api/invoices", tags=["Invoices"])
-app.include_router(customers.router, prefix="/api/customers", tags=["Customers"])
-app.include_router(returns.router, prefix="/api/returns", tags=["Return Requests"])
-app.include_router(support.router, prefix="/api/support", tags=["Support"])
-app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
-app.include_router(events.router, prefix="/api/events", tags=["Events"])
-app.include_router(uom.router, prefix="/api/master-data/uom", tags=["Master Data - UOM"])
-app.include_router(rates.router, prefix="/api/master-data/rates", tags=["Master Data - Rates"])
-app.include_router(currencies.router, prefix="/api/master-data/currencies", tags=["Master Data - Currencies"])
-app.include_router(vat.router, prefix="/api/master-data/vat", tags=["Master Data - VAT"])
-app.include_router(contracts.router, prefix="/api/contracts", tags=["Contracts"])
-app.include_router(warehouse.router, prefix="/api/warehouse", tags=["Warehouse"])
-app.include_router(finance.router, prefix="/api/finance", tags=["Finance"])
-app.include_router(sales.router, prefix="/api/sales", tags=["Sales"])
-app.include_router(crm.router, prefix="/api/crm", tags=["CRM"])
-app.include_router(hr.router, prefix="/api/hr", tags=["HR"])
+# Routers with their URL prefixes (also the `router` label of the request metrics)
+ROUTERS = [
+    (auth.router, "/api/auth", "Authentication"),
+    (admin.router, "/api/admin", "Admin"),
+    (equipment.router, "/api/equipment", "Equipment"),
+    (rentals.router, "/api/rentals", "Rentals"),
+    (invoices.router, "/api/invoices", "Invoices"),
+    (customers.router, "/api/customers", "Customers"),
+    (returns.router, "/api/returns", "Return Requests"),
+    (support.router, "/api/support", "Support"),
+    (reports.router, "/api/reports", "Reports"),
+    (events.router, "/api/events", "Events"),
+    (uom.router, "/api/master-data/uom", "Master Data - UOM"),
+    (rates.router, "/api/master-data/rates", "Master Data - Rates"),
+    (currencies.router, "/api/master-data/currencies", "Master Data - Currencies"),
+    (vat.router, "/api/master-data/vat", "Master Data - VAT"),
+    (contracts.router, "/api/contracts", "Contracts"),
+    (warehouse.router, "/api/warehouse", "Warehouse"),
+    (finance.router, "/api/finance", "Finance"),
+    (sales.router, "/api/sales", "Sales"),
+    (crm.router, "/api/crm", "CRM"),
+    (hr.router, "/api/hr", "HR"),
+]
+
+for router, prefix, tag in ROUTERS:
+    app.include_router(router, prefix=prefix, tags=[tag])
+
+# Samples requests sent by admins with X-Profile: 1 (listed on /api/admin/profiles)
+app.add_middleware(ProfilingMiddleware)
+# MongoDB commands per request: X-DB-* headers outside production, N+1 warnings everywhere
+app.add_middleware(CommandAccountingMiddleware)
+# Request metrics; added after the middleware above, so their time is included
+app.add_middleware(MetricsMiddleware, router_prefixes=[prefix for _, prefix, _ in ROUTERS])
+# Binds X-Request-ID to every log line of the request, including the middleware above
+app.add_middleware(RequestIdMiddleware)
+
+background_tasks = []
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection and seed demo data"""
+    """Initialize database connection, seed demo data and start background jobs"""
     await connect_to_mongo()
     await seed_demo_data()
+    background_tasks.append(asyncio.create_task(ensure_indexes_in_background()))
+    background_tasks.append(asyncio.create_task(reconcile_periodically()))
+    background_tasks.append(asyncio.create_task(flush_query_shapes_periodically()))
+    background_tasks.append(asyncio.create_task(sync_leads_periodically()))
+    background_tasks.append(asyncio.create_task(monitor_loop_lag()))
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connection"""
+    """Stop background jobs and close database connection"""
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    password_pool.shutdown()
     await close_mongo_connection()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -77,3 +121,10 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint (see utils/metrics.py)"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(get_max_pool_size()), media_type=CONTENT_TYPE)
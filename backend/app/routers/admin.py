@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
-import traceback
+import logging
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.counters import next_id, LEAD_ID, ENQUIRY_ID, RENTAL_CONTRACT_NUMBER, SALES_ORDER_ID, INVOICE_ID, CUSTOMER_ID
+from ..utils.dashboard_stats import (
+    get_dashboard_stats, status_total, map_total,
+    record_customer_change, record_rental_created, record_quotation_status_change, record_invoice_created
+)
+from ..utils.lead_activity import record_lead_activity
+from ..utils.pagination import PageParams, NEXT_CURSOR_HEADER
+from ..utils.enquiry_feed import EnquiryFeedParams, fetch_enquiry_page
+from ..utils.command_accounting import route_command_stats, QUERY_BUDGET, REPEATED_QUERY_LIMIT
+from ..utils.profiling import profile_store, render_folded, render_tree
 from pydantic import BaseModel
 from bson import ObjectId
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/dashboard")
 async def get_admin_dashboard(current_user: dict = Depends(get_current_user)):
@@ -19,40 +30,19 @@ async def get_admin_dashboard(current_user: dict = Depends(get_current_user)):
         
         db = get_database()
         
-        # Get total customers
-        total_customers = await db.customers.count_documents({})
-        
-        # Get total enquiries
-        total_enquiries = await db.rentals.count_documents({})
-        total_enquiries += await db.enquiries.count_documents({})
-        
-        # Get pending quotations
-        pending_quotations = await db.quotations.count_documents({"status": "sent"})
-        
-        # Get active contracts
-        active_contracts = await db.rentals.count_documents({"status": "active"})
-        
-        # Get total revenue
-        total_revenue = 0
-        try:
-            invoices_cursor = db.invoices.find({})
-            invoices = await invoices_cursor.to_list(length=None)
-            total_revenue = sum(invoice.get("total", 0) or invoice.get("amount", 0) or 0 for invoice in invoices)
-        except Exception:
-            total_revenue = 0
-        
-        # Get equipment stats
-        equipment_rented = await db.equipment.count_documents({"quantity_rented": {"$gt": 0}})
-        equipment_available = await db.equipment.count_documents({"quantity_available": {"$gt": 0}})
+        # Counters are maintained by the write paths (see utils/dashboard_stats.py)
+        stats = await get_dashboard_stats(db)
+        pending_quotations = status_total(stats, "quotations_by_status", ["sent"])
+        total_revenue = map_total(stats, "invoice_amount_by_status")
         
         return {
-            "totalCustomers": total_customers,
-            "totalEnquiries": total_enquiries,
+            "totalCustomers": stats["customers"],
+            "totalEnquiries": stats["enquiries"],
             "pendingQuotations": pending_quotations,
-            "activeContracts": active_contracts,
+            "activeContracts": status_total(stats, "rentals_by_status", ["active"]),
             "totalRevenue": total_revenue,
-            "equipmentRented": equipment_rented,
-            "equipmentAvailable": equipment_available,
+            "equipmentRented": stats["equipment_rented"],
+            "equipmentAvailable": stats["equipment_available"],
             "monthlyRevenue": total_revenue,  # Simplified
             "pendingApprovals": pending_quotations
         }
@@ -66,6 +56,45 @@ async def get_admin_stats(current_user: dict = Depends(get_current_user)):
     """Get admin statistics (alias for dashboard)"""
     return await get_admin_dashboard(current_user)
 
+@router.get("/db-command-stats")
+async def get_db_command_stats(current_user: dict = Depends(get_current_user)):
+    """MongoDB commands per route since startup, busiest first (see utils/command_accounting.py)"""
+    from ..utils.auth import require_admin_or_super_admin
+    require_admin_or_super_admin(current_user)
+    return {
+        "query_budget": QUERY_BUDGET,
+        "repeated_query_limit": REPEATED_QUERY_LIMIT,
+        "routes": route_command_stats.snapshot()
+    }
+
+@router.get("/profiles")
+async def list_profiles(current_user: dict = Depends(get_current_user)):
+    """Recent request profiles, newest first (profile a request by sending it with X-Profile: 1)"""
+    from ..utils.auth import require_admin_or_super_admin
+    require_admin_or_super_admin(current_user)
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "tree", current_user: dict = Depends(get_current_user)):
+    """A stored profile as a call tree (format=tree) or folded stacks for flame graphs (format=folded)"""
+    from ..utils.auth import require_admin_or_super_admin
+    require_admin_or_super_admin(current_user)
+    if format not in ("tree", "folded"):
+        raise HTTPException(status_code=400, detail="format must be 'tree' or 'folded'")
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(
+            content=render_folded(profile["samples"]),
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+        )
+    summary = (f"{profile['method']} {profile['path']} {profile['duration_ms']}ms, "
+               f"{profile['sample_count']} samples every {profile['sample_interval_ms']:g}ms "
+               f"({profile['on_loop_samples']} on the loop)\n\n")
+    return Response(content=summary + render_tree(profile["samples"]), media_type="text/plain")
+
 class CustomerCreate(BaseModel):
     name: str
     email: str
@@ -111,7 +140,12 @@ async def get_pending_quotations(current_user: dict = Depends(get_current_user))
         raise HTTPException(status_code=500, detail=f"Error fetching quotations: {str(e)}")
 
 @router.get("/enquiries")
-async def get_all_enquiries(current_user: dict = Depends(get_current_user)):
+async def get_all_enquiries(
+    response: Response,
+    page: PageParams = Depends(),
+    filters: EnquiryFeedParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
     """Get all customer enquiries for admin view"""
     try:
         if current_user.get("role") != "admin":
@@ -119,55 +153,12 @@ async def get_all_enquiries(current_user: dict = Depends(get_current_user)):
 
         db = get_database()
 
-        # Get all rentals (enquiries) from database
-        rentals_cursor = db.rentals.find({})
-        rentals_raw = await rentals_cursor.to_list(length=None)
-
-        enquiries = []
-        # Sync leads for existing enquiries (create leads for enquiries that don't have one)
-        await sync_leads_for_enquiries(db, current_user)
-
-        for rental in rentals_raw:
-            rental_copy = rental.copy()
-            rental_copy["id"] = str(rental_copy.pop("_id"))
-
-            # Convert rental to enquiry format
-            enquiry_format = {
-                "id": rental_copy["id"],
-                "enquiry_id": rental_copy.get("contract_number", f"ENQ-{rental_copy['id'][:8]}"),
-                "customer_id": rental_copy.get("customer_id", ""),
-                "customer_name": rental_copy.get("customer_name", "Unknown Customer"),
-                "customer_email": rental_copy.get("contact_email", rental_copy.get("customer_email", "")),
-                "equipment_name": f"{rental_copy.get('equipment_category', '')} - {rental_copy.get('equipment_type', '')}".strip(' - '),
-                "quantity": rental_copy.get("quantity", 1),
-                "rental_duration_days": rental_copy.get("rental_duration_days", 0),
-                "delivery_location": rental_copy.get("delivery_address", ""),
-                "expected_delivery_date": rental_copy.get("start_date", ""),
-                "special_instructions": rental_copy.get("special_requirements", ""),
-                "assigned_salesperson_id": rental_copy.get("assigned_salesperson_id", None),
-                "assigned_salesperson_name": rental_copy.get("assigned_salesperson_name", None),
-                "status": rental_copy.get("status", "submitted_by_customer"),
-                "enquiry_date": rental_copy.get("created_at", ""),
-                "created_at": rental_copy.get("created_at", ""),
-                "updated_at": rental_copy.get("updated_at", rental_copy.get("created_at", "")),
-                "is_rental_order": True,
-                "contract_number": rental_copy.get("contract_number", ""),
-                "project_name": rental_copy.get("project_name", ""),
-                "equipment_type": rental_copy.get("equipment_type", ""),
-                "start_date": rental_copy.get("start_date", ""),
-                "end_date": rental_copy.get("end_date", ""),
-            }
-            enquiries.append(enquiry_format)
-
-        # Also get dedicated enquiries if they exist
-        enquiries_cursor = db.enquiries.find({})
-        enquiries_raw = await enquiries_cursor.to_list(length=None)
-
-        for enquiry in enquiries_raw:
-            enquiry_copy = enquiry.copy()
-            enquiry_copy["id"] = str(enquiry_copy.pop("_id"))
-            enquiries.append(enquiry_copy)
-
+        # Rentals and dedicated enquiries, merged by the database (see utils/enquiry_feed.py)
+        enquiries, next_cursor = await fetch_enquiry_page(
+            db, filters.query(), page.cursor, page.limit, filters.direction
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return enquiries
 
     except HTTPException:
@@ -175,139 +166,6 @@ async def get_all_enquiries(current_user: dict = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching enquiries: {str(e)}")
 
-async def sync_leads_for_enquiries(db, current_user):
-    """Sync leads for existing enquiries that don't have a corresponding lead"""
-    try:
-        # Get all rentals (enquiries)
-        rentals = await db.rentals.find({}).to_list(length=None)
-        
-        # Get all existing leads
-        existing_leads = await db.leads.find({}).to_list(length=None)
-        existing_enquiry_ids = {lead.get("enquiry_id") for lead in existing_leads if lead.get("enquiry_id")}
-        
-        created_count = 0
-        for rental in rentals:
-            # Get enquiry_id - first check if it's stored in rental, otherwise use contract_number
-            enquiry_id = rental.get("enquiry_id") or rental.get("contract_number", "")
-            
-            # If no enquiry_id in ENQ- format, try to generate one from contract_number
-            if not enquiry_id or (not enquiry_id.startswith("ENQ-") and not enquiry_id.startswith("RC-")):
-                # Generate enquiry_id similar to create_enquiry
-                created_at = rental.get("created_at", datetime.now().isoformat())
-                try:
-                    if isinstance(created_at, str):
-                        year = int(created_at[:4])
-                    else:
-                        year = created_at.year if hasattr(created_at, 'year') else datetime.now().year
-                except:
-                    year = datetime.now().year
-                # This is a fallback - ideally all rentals should have enquiry_id
-                rental_mongo_id = str(rental.get("_id", ""))
-                enquiry_id = f"ENQ-{year}-{rental_mongo_id[:4]}"
-            elif enquiry_id.startswith("RC-"):
-                # If we have RC- format, convert to ENQ- format for consistency
-                # Extract year and sequence from RC-YYYY-### format
-                parts = enquiry_id.split("-")
-                if len(parts) == 3 and parts[1].isdigit():
-                    enquiry_id = f"ENQ-{parts[1]}-{parts[2].zfill(4)}"
-                else:
-                    # Fallback: use contract_number as-is or generate new
-                    created_at = rental.get("created_at", datetime.now().isoformat())
-                    try:
-                        if isinstance(created_at, str):
-                            year = int(created_at[:4])
-                        else:
-                            year = created_at.year if hasattr(created_at, 'year') else datetime.now().year
-                    except:
-                        year = datetime.now().year
-                    rental_mongo_id = str(rental.get("_id", ""))
-                    enquiry_id = f"ENQ-{year}-{rental_mongo_id[:4]}"
-            
-            # Check if lead exists for this enquiry_id
-            if enquiry_id and enquiry_id not in existing_enquiry_ids:
-                # Create lead for this enquiry
-                customer_name = rental.get("customer_name", "Unknown")
-                customer_email = rental.get("contact_email") or rental.get("customer_email", "")
-                
-                if not customer_email:
-                    continue  # Skip if no email
-                
-                # Parse customer name
-                customer_name_parts = customer_name.strip().split(maxsplit=1)
-                first_name = customer_name_parts[0] if customer_name_parts else customer_name
-                last_name = customer_name_parts[1] if len(customer_name_parts) > 1 else ""
-                
-                # Generate lead ID
-                current_year = datetime.now().year
-                all_leads = await db.leads.find({}).to_list(length=None)
-                
-                max_seq = 0
-                for lead in all_leads:
-                    lead_id_val = lead.get("lead_id", "")
-                    if lead_id_val.startswith(f"LEAD-{current_year}-"):
-                        try:
-                            parts = lead_id_val.split("-")
-                            if len(parts) == 3 and parts[1] == str(current_year) and parts[2].isdigit():
-                                max_seq = max(max_seq, int(parts[2]))
-                        except:
-                            pass
-                
-                max_seq += 1
-                lead_id = f"LEAD-{current_year}-{str(max_seq).zfill(4)}"
-                
-                # Verify lead_id doesn't exist
-                existing_lead = await db.leads.find_one({"lead_id": lead_id})
-                while existing_lead:
-                    max_seq += 1
-                    lead_id = f"LEAD-{current_year}-{str(max_seq).zfill(4)}"
-                    existing_lead = await db.leads.find_one({"lead_id": lead_id})
-                
-                # Create lead document
-                now = rental.get("created_at", datetime.now(timezone.utc).isoformat())
-                lead_doc = {
-                    "lead_id": lead_id,
-                    "salutation": "Mr",
-                    "firstName": first_name,
-                    "lastName": last_name or "",
-                    "email": customer_email,
-                    "mobile": "",
-                    "organization": customer_name if len(customer_name_parts) == 1 else "",
-                    "website": "",
-                    "jobTitle": "",
-                    "industry": "",
-                    "source": "Enquiry Form",
-                    "status": "New",
-                    "gender": "Male",
-                    "noOfEmployees": "",
-                    "annualRevenue": 0,
-                    "territory": "",
-                    "leadOwner": rental.get("assigned_salesperson_name", "Shariq Ansari"),
-                    "createdAt": now,
-                    "createdBy": current_user.get("id", ""),
-                    "updatedAt": now,
-                    "activities": [
-                        {
-                            "type": "created",
-                            "description": f"Lead created from enquiry: {enquiry_id} (synced)",
-                            "by": current_user.get("name", "System"),
-                            "timestamp": now
-                        }
-                    ],
-                    "enquiry_id": enquiry_id,
-                    "enquiry_reference": str(rental.get("_id", ""))
-                }
-                
-                # Insert lead
-                await db.leads.insert_one(lead_doc)
-                created_count += 1
-                print(f"Created missing lead {lead_id} for enquiry {enquiry_id}")
-        
-        if created_count > 0:
-            print(f"Synced {created_count} missing leads for enquiries")
-    except Exception as e:
-        print(f"Error syncing leads for enquiries: {str(e)}")
-        print(traceback.format_exc())
-
 class EnquiryCreate(BaseModel):
     customer_name: str
     customer_email: str
@@ -330,11 +188,9 @@ async def create_enquiry(enquiry_data: EnquiryCreate, current_user: dict = Depen
         
         db = get_database()
         
-        # Generate enquiry ID
-        current_year = datetime.now().year
-        enquiry_count = await db.rentals.count_documents({})
-        enquiry_id = f"ENQ-{current_year}-{str(enquiry_count + 1).zfill(4)}"
-        contract_number = f"RC-{current_year}-{str(enquiry_count + 1).zfill(3)}"
+        # Generate enquiry ID and contract number
+        enquiry_id = await next_id(db, ENQUIRY_ID)
+        contract_number = await next_id(db, RENTAL_CONTRACT_NUMBER)
         
         # Calculate end date from start date and rental duration
         try:
@@ -377,6 +233,7 @@ async def create_enquiry(enquiry_data: EnquiryCreate, current_user: dict = Depen
         
         # Insert into database
         result = await db.rentals.insert_one(rental_doc)
+        await record_rental_created(db, rental_doc)
         
         # Automatically create a lead from the enquiry
         # Each enquiry should create a separate lead, even if the email is the same
@@ -384,7 +241,7 @@ async def create_enquiry(enquiry_data: EnquiryCreate, current_user: dict = Depen
             # Check if a lead already exists for this enquiry_id to avoid duplicates
             existing_lead_by_enquiry = await db.leads.find_one({"enquiry_id": enquiry_id})
             if existing_lead_by_enquiry:
-                print(f"Lead already exists for enquiry {enquiry_id}, skipping lead creation")
+                logger.debug("Lead already exists for enquiry %s, skipping lead creation", enquiry_id)
             else:
                 # Parse customer name to extract first name and last name
                 customer_name_parts = enquiry_data.customer_name.strip().split(maxsplit=1)
@@ -392,32 +249,7 @@ async def create_enquiry(enquiry_data: EnquiryCreate, current_user: dict = Depen
                 last_name = customer_name_parts[1] if len(customer_name_parts) > 1 else ""
                 
                 # Generate lead ID with year-based format
-                # Count ALL leads (including those without proper IDs) to ensure unique sequence
-                current_year = datetime.now().year
-                all_leads = await db.leads.find({}).to_list(length=None)
-                
-                max_seq = 0
-                for lead in all_leads:
-                    lead_id_val = lead.get("lead_id", "")
-                    if lead_id_val.startswith(f"LEAD-{current_year}-"):
-                        try:
-                            parts = lead_id_val.split("-")
-                            if len(parts) == 3 and parts[1] == str(current_year) and parts[2].isdigit():
-                                max_seq = max(max_seq, int(parts[2]))
-                        except:
-                            pass
-                
-                # Increment to get the next sequence number
-                max_seq += 1
-                lead_id = f"LEAD-{current_year}-{str(max_seq).zfill(4)}"
-                
-                # Verify the lead_id doesn't already exist (safety check)
-                existing_lead = await db.leads.find_one({"lead_id": lead_id})
-                while existing_lead:
-                    # If somehow the ID exists, increment and try again
-                    max_seq += 1
-                    lead_id = f"LEAD-{current_year}-{str(max_seq).zfill(4)}"
-                    existing_lead = await db.leads.find_one({"lead_id": lead_id})
+                lead_id = await next_id(db, LEAD_ID)
                 
                 # Create lead document
                 lead_doc = {
@@ -441,25 +273,23 @@ async def create_enquiry(enquiry_data: EnquiryCreate, current_user: dict = Depen
                     "createdAt": now,
                     "createdBy": current_user.get("id", ""),
                     "updatedAt": now,
-                    "activities": [
-                        {
-                            "type": "created",
-                            "description": f"Lead created from enquiry: {enquiry_id}",
-                            "by": current_user.get("name", enquiry_data.assigned_salesperson_name or "System"),
-                            "timestamp": now
-                        }
-                    ],
+                    "activityCount": 0,
                     "enquiry_id": enquiry_id,  # Link to the enquiry
                     "enquiry_reference": str(result.inserted_id)  # Link to the rental/enquiry
                 }
                 
                 # Insert lead into database
                 lead_result = await db.leads.insert_one(lead_doc)
-                print(f"Successfully created lead {lead_id} from enquiry {enquiry_id}")
+                await record_lead_activity(db, lead_id, {
+                    "type": "created",
+                    "description": f"Lead created from enquiry: {enquiry_id}",
+                    "by": current_user.get("name", enquiry_data.assigned_salesperson_name or "System"),
+                    "timestamp": now
+                })
+                logger.info("Created lead %s from enquiry %s", lead_id, enquiry_id)
         except Exception as lead_error:
             # Log error but don't fail the enquiry creation
-            print(f"Warning: Failed to create lead from enquiry {enquiry_id}: {str(lead_error)}")
-            print(traceback.format_exc())
+            logger.warning("Failed to create lead from enquiry %s: %s", enquiry_id, lead_error, exc_info=True)
         
         # Return the created enquiry
         rental_doc["id"] = str(result.inserted_id)
@@ -503,10 +333,10 @@ async def approve_quotation(quotation_id: str, current_user: dict = Depends(get_
                 "updated_at": datetime.now().isoformat()
             }}
         )
+        await record_quotation_status_change(db, quotation.get("status"), "approved")
         
         # Create sales order from quotation
-        sales_order_count = await db.sales_orders.count_documents({})
-        sales_order_id = f"SO-2025-{str(sales_order_count + 1).zfill(3)}"
+        sales_order_id = await next_id(db, SALES_ORDER_ID)
         
         sales_order = {
             "sales_order_id": sales_order_id,
@@ -544,31 +374,34 @@ async def reject_quotation(quotation_id: str, current_user: dict = Depends(get_c
         
         db = get_database()
         
-        # Update quotation status to 'rejected'
-        result = await db.quotations.update_one(
+        # Update quotation status to 'rejected' (returns the previous document)
+        quotation = await db.quotations.find_one_and_update(
             {"quotation_id": quotation_id},
             {"$set": {
                 "status": "rejected",
                 "rejected_at": datetime.now().isoformat(),
                 "rejected_by": current_user["id"],
                 "updated_at": datetime.now().isoformat()
-            }}
+            }},
+            projection={"status": 1}
         )
         
-        if result.modified_count == 0:
+        if not quotation:
             # Try with id field
-            result = await db.quotations.update_one(
+            quotation = await db.quotations.find_one_and_update(
                 {"id": quotation_id},
                 {"$set": {
                     "status": "rejected",
                     "rejected_at": datetime.now().isoformat(),
                     "rejected_by": current_user["id"],
                     "updated_at": datetime.now().isoformat()
-                }}
+                }},
+                projection={"status": 1}
             )
         
-        if result.modified_count == 0:
+        if not quotation:
             raise HTTPException(status_code=404, detail="Quotation not found")
+        await record_quotation_status_change(db, quotation.get("status"), "rejected")
         
         return {"message": "Quotation rejected"}
     
@@ -667,8 +500,7 @@ async def approve_contract(contract_id: str, current_user: dict = Depends(get_cu
         )
         
         # Create invoice for finance
-        invoice_count = await db.invoices.count_documents({})
-        invoice_id = f"INV-2025-{str(invoice_count + 1).zfill(3)}"
+        invoice_id = await next_id(db, INVOICE_ID)
         
         # Calculate VAT (5% for AED)
         amount = contract.get("total_amount", 0)
@@ -695,6 +527,7 @@ async def approve_contract(contract_id: str, current_user: dict = Depends(get_cu
         }
 
         await db.invoices.insert_one(invoice)
+        await record_invoice_created(db, invoice)
 
         return {
             "message": "Contract approved, sent to warehouse, and invoice created",
@@ -825,29 +658,7 @@ async def create_customer(customer_data: CustomerCreate, current_user: dict = De
             raise HTTPException(status_code=400, detail="Customer with this email already exists")
 
         # Create customer document with simple sequential ID
-        # Get the maximum existing customer number
-        all_customers = await db.customers.find({
-            "customer_id": {"$regex": "^CUST-"}
-        }).to_list(length=None)
-        
-        max_num = 0
-        for cust in all_customers:
-            cust_id = cust.get("customer_id", "")
-            if cust_id.startswith("CUST-"):
-                try:
-                    parts = cust_id.split("-")
-                    if len(parts) == 2:
-                        # Simple format CUST-001
-                        num = int(parts[1])
-                        max_num = max(max_num, num)
-                    elif len(parts) == 3 and parts[2].isdigit():
-                        # Year format CUST-2025-0001, use sequence number
-                        num = int(parts[2])
-                        max_num = max(max_num, num)
-                except:
-                    pass
-        
-        customer_id = f"CUST-{str(max_num + 1).zfill(4)}"
+        customer_id = await next_id(db, CUSTOMER_ID)
 
         customer = {
             "customer_id": customer_id,
@@ -865,6 +676,7 @@ async def create_customer(customer_data: CustomerCreate, current_user: dict = De
         }
 
         result = await db.customers.insert_one(customer)
+        await record_customer_change(db, 1)
 
         return {
             "message": "Customer created successfully",
@@ -945,6 +757,7 @@ async def delete_customer(customer_id: str, current_user: dict = Depends(get_cur
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Customer not found")
+        await record_customer_change(db, -1)
 
         return {"message": "Customer deleted successfully"}
 
@@ -1007,6 +820,7 @@ async def reject_customer(customer_id: str, current_user: dict = Depends(get_cur
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Customer not found")
+        await record_customer_change(db, -1)
 
         return {"message": "Customer rejected and removed"}
 
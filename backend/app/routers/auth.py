@@ -7,9 +7,13 @@ from bson import ObjectId
 
 from ..models.user import UserCreate, UserResponse, Token, TokenData, UserUpdate, UserLogin
 from ..utils.database import get_database
+from ..utils.dashboard_stats import record_user_created, record_user_role_change
+from ..utils.principal_cache import principal_cache
+from ..utils.password_pool import PasswordPoolBusy
 from ..utils.auth import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
+    password_pool_busy_exception,
     create_access_token,
     get_current_user,
     is_admin_or_super_admin
@@ -42,7 +46,12 @@ async def login(credentials: UserLogin):
     db = get_database()
     user = await db.users.find_one({"email": email})
 
-    if not user or not verify_password(password, user["hashed_password"]):
+    try:
+        password_ok = bool(user) and await verify_password_async(password, user["hashed_password"])
+    except PasswordPoolBusy:
+        raise password_pool_busy_exception()
+
+    if not password_ok:
         # Log failed login attempt
         await db.audit_log.insert_one({
             "action": "failed_login",
@@ -83,13 +92,17 @@ async def register(user_data: UserCreate, current_user: dict = Depends(get_curre
 
     # Create new user
     user_dict = user_data.dict()
-    user_dict["hashed_password"] = get_password_hash(user_data.password)
+    try:
+        user_dict["hashed_password"] = await get_password_hash_async(user_data.password)
+    except PasswordPoolBusy:
+        raise password_pool_busy_exception()
     del user_dict["password"]
     user_dict["created_at"] = datetime.utcnow()
     user_dict["updated_at"] = datetime.utcnow()
 
     result = await db.users.insert_one(user_dict)
     user_dict["id"] = str(result.inserted_id)
+    await record_user_created(db, user_dict)
 
     # Log user creation
     await db.audit_log.insert_one({
@@ -146,7 +159,12 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
     update_dict = user_data.dict(exclude_unset=True)
     if update_dict:
         update_dict["updated_at"] = datetime.utcnow()
-        await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_dict})
+        previous = await db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)}, {"$set": update_dict}, projection={"role": 1}
+        )
+        principal_cache.invalidate(user["email"])
+        if previous and "role" in update_dict:
+            await record_user_role_change(db, previous.get("role"), update_dict["role"])
 
         # Log role change if role was updated
         if "role" in update_dict:
@@ -175,7 +193,10 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    await db.users.delete_one({"_id": ObjectId(user_id)})
+    deleted = await db.users.find_one_and_delete({"_id": ObjectId(user_id)}, projection={"role": 1})
+    principal_cache.invalidate(user["email"])
+    if deleted:
+        await record_user_role_change(db, deleted.get("role"), None)
 
     # Log user deletion
     await db.audit_log.insert_one({
@@ -187,6 +208,17 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
 
     return {"message": "User deleted successfully"}
 
+@router.get("/cache-stats")
+async def get_user_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Admin/Super Admin only: Hit/miss metrics of the authenticated-user cache"""
+    if not is_admin_or_super_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view cache statistics"
+        )
+
+    return principal_cache.stats()
+
 @router.get("/audit-log")
 async def get_audit_log(current_user: dict = Depends(get_current_user)):
     """Admin-only: Get audit log"""
@@ -1,25 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional
 import os
 from bson import ObjectId
+from pymongo import DESCENDING
 
 from ..models.contract import ContractCreate, ContractResponse, ContractUpdate
 from ..utils.database import get_database
+from ..utils.counters import next_id, RENTAL_CONTRACT_NUMBER
 from ..utils.auth import get_current_user
+from ..utils.pagination import PageParams, fetch_page
 
 router = APIRouter()
 security = HTTPBearer()
 
 @router.get("/", response_model=List[ContractResponse])
 async def get_contracts(
+    response: Response,
     current_user: dict = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100,
+    page: PageParams = Depends(),
     status_filter: Optional[str] = None
 ):
-    """Get all contracts with optional filtering"""
+    """Get contracts with optional filtering, newest first (paginated)"""
     if current_user["role"] not in ["admin", "sales", "finance"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -31,9 +34,8 @@ async def get_contracts(
     if status_filter:
         query["status"] = status_filter
 
-    contracts_cursor = db.contracts.find(query).skip(skip).limit(limit).sort("created_at", -1)
     contracts = []
-    async for contract in contracts_cursor:
+    for contract in await fetch_page(db.contracts, query, page, response, sort_key="created_at", direction=DESCENDING):
         contract["id"] = str(contract["_id"])
         del contract["_id"]
         contracts.append(contract)
@@ -54,9 +56,7 @@ async def create_contract(
     db = get_database()
 
     # Generate contract ID
-    year = datetime.utcnow().year
-    count = await db.contracts.count_documents({"created_at": {"$gte": datetime(year, 1, 1)}})
-    contract_id = f"RC-{year}-{str(count + 1).zfill(3)}"
+    contract_id = await next_id(db, RENTAL_CONTRACT_NUMBER, datetime.utcnow().year)
 
     contract_dict = contract_data.dict()
     contract_dict["contract_id"] = contract_id
@@ -1,13 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
 from bson import ObjectId
+from pymongo import DESCENDING
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.customer_metrics import CustomerPageParams, fetch_crm_customers, format_customer_document
+from ..utils.counters import next_id, LEAD_ID, ENQUIRY_ID
+from ..utils.sales_pipeline import fetch_sales_pipeline, PIPELINE_STAGES
+from ..utils.sales_performance import fetch_sales_performance, PERIOD_LENGTHS
+from ..utils.dashboard_stats import record_enquiry_created
+from ..utils.pagination import NEXT_CURSOR_HEADER, PageParams, decode_cursor, encode_cursor
+from ..utils.lead_timeline import TIMELINE_TYPES, fetch_lead_timeline_page
+from ..utils.lead_activity import (
+    delete_lead_activities, fetch_lead_timeline, find_lead, record_lead_activity
+)
+from ..utils.repository import View, array_size, find_page_view, model_fields
+import asyncio
+import logging
 import os
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Upper bound for the performance window (two years of weekly buckets)
+MAX_PERFORMANCE_PERIODS = 104
+
+def write_file(path: str, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
 
 # Pydantic models for request/response
 class CustomerDocument(BaseModel):
@@ -64,6 +86,13 @@ class CustomerCRM(BaseModel):
     creditLimit: Optional[float] = 0
     outstandingAmount: Optional[float] = 0
 
+# Customer fields the CRM list returns (including legacy names the UI falls back to)
+CUSTOMER_LIST_VIEW = View(model_fields(
+    CustomerCRM, "customer_id", "companyName", "company_type", "contact_name", "contact_phone",
+    "deliveryLocation", "registrationDate", "credit_limit", "special_instructions",
+    "created_at", "updated_at"
+))
+
 class DocumentUpload(BaseModel):
     customerId: str
     documentName: str
@@ -110,6 +139,18 @@ class Lead(BaseModel):
     leadOwner: str = "Shariq Ansari"
 
 
+# Fields the lead lists return; activity history is reduced to its count
+LEAD_LIST_VIEW = View(
+    model_fields(Lead, "lead_id", "createdAt", "created_at", "updatedAt", "updated_at", "createdBy",
+                 "assigned_salesperson_id", "assigned_salesperson_name", "assignedTo", "enquiry_id",
+                 "notes", "nextFollowUp", "lastActivityAt"),
+    # Leads not yet moved to activity buckets still carry the embedded array
+    {"activitiesCount": {"$ifNull": ["$activityCount", array_size("activities")]}}
+)
+
+# Activities returned with a single lead; older ones are paged via /leads/{lead_id}/activities
+LEAD_RECENT_ACTIVITIES = 20
+
 class LeadStatusUpdate(BaseModel):
     status: str
     nextFollowUp: Optional[str] = None
@@ -150,207 +191,23 @@ class ConvertToDeal(BaseModel):
     contactId: Optional[str] = None
 
 @router.get("/customers")
-async def get_crm_customers(current_user: dict = Depends(get_current_user)):
-    """Get all customers with CRM data including documents and pipeline info"""
+async def get_crm_customers(
+    response: Response,
+    page: CustomerPageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get customers (oldest first) with CRM data including documents and pipeline info.
+
+    Paginated: the cursor for the next page is returned in the X-Next-Cursor header.
+    """
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access CRM data")
         
         db = get_database()
         
-        # Fetch all customers with their details
-        customers_cursor = db.customers.find({})
-        customers_raw = await customers_cursor.to_list(length=None)
-        
-        customers = []
-        
-        # First pass: find maximum existing customer number
-        max_customer_num = 0
-        for customer in customers_raw:
-            customer_id = customer.get("customer_id", "")
-            # Check if customer has a properly formatted ID (CUST-#### format)
-            if customer_id and customer_id.startswith("CUST-"):
-                # Extract number part from CUST-#### or CUST-YYYY-####
-                parts = customer_id.split("-")
-                if len(parts) >= 2:
-                    try:
-                        # Handle both CUST-001 and CUST-2025-0001 formats
-                        if len(parts) == 2:
-                            # Simple format CUST-001
-                            num = int(parts[1])
-                            max_customer_num = max(max_customer_num, num)
-                        elif len(parts) == 3 and parts[2].isdigit():
-                            # Year format CUST-2025-0001, use just the sequence number
-                            num = int(parts[2])
-                            max_customer_num = max(max_customer_num, num)
-                    except:
-                        pass
-        
-        # Second pass: generate and normalize IDs for all customers
-        customer_id_map = {}  # Map of mongo_id -> display_id
-        customers_to_update = []  # List of customers that need database updates
-        
-        for customer in customers_raw:
-            mongo_id = customer.get("_id")
-            mongo_id_str = str(mongo_id) if mongo_id else ""
-            display_customer_id = customer.get("customer_id", "")
-            
-            # Check if customer ID needs to be generated or normalized
-            needs_update = False
-            normalized_id = None
-            
-            if not display_customer_id or not display_customer_id.startswith("CUST-") or len(display_customer_id) > 15:
-                # Generate new ID
-                max_customer_num += 1
-                normalized_id = f"CUST-{str(max_customer_num).zfill(4)}"
-                needs_update = True
-            else:
-                # Normalize existing ID to simple format if it's in year format
-                parts = display_customer_id.split("-")
-                if len(parts) == 3 and parts[2].isdigit():
-                    # Convert CUST-2025-0001 to CUST-0001
-                    normalized_id = f"CUST-{parts[2]}"
-                    if normalized_id != display_customer_id:
-                        needs_update = True
-                else:
-                    normalized_id = display_customer_id
-            
-            customer_id_map[mongo_id_str] = normalized_id
-            
-            # Track customers that need database update
-            if needs_update and mongo_id:
-                # Convert to ObjectId if it's a string, otherwise use as-is
-                update_id = ObjectId(mongo_id_str) if isinstance(mongo_id_str, str) and mongo_id_str else mongo_id
-                customers_to_update.append({
-                    "id": update_id,
-                    "customer_id": normalized_id
-                })
-        
-        # Update customers in database that need ID fixes
-        if customers_to_update:
-            for customer_update in customers_to_update:
-                try:
-                    await db.customers.update_one(
-                        {"_id": customer_update["id"]},
-                        {"$set": {"customer_id": customer_update["customer_id"]}}
-                    )
-                except:
-                    pass  # Continue even if update fails
-        
-        # Third pass: build final customer list with proper IDs
-        for customer in customers_raw:
-            customer_copy = customer.copy()
-            mongo_id = customer_copy.get("_id")
-            mongo_id_str = str(mongo_id) if mongo_id else ""
-            display_customer_id = customer_id_map.get(mongo_id_str, customer_copy.get("customer_id", ""))
-            
-            # Ensure we have a valid ID
-            if not display_customer_id or not display_customer_id.startswith("CUST-"):
-                max_customer_num += 1
-                display_customer_id = f"CUST-{str(max_customer_num).zfill(4)}"
-            
-            customer_copy.pop("_id", None)
-            customer_copy["id"] = display_customer_id
-            customer_copy["_id"] = mongo_id_str  # Keep MongoDB ID for internal reference
-            
-            # Get contract statistics - try both MongoDB _id and formatted customer_id
-            active_contracts = await db.contracts.count_documents({
-                "$or": [
-                    {"customer_id": mongo_id},
-                    {"customer_id": display_customer_id}
-                ],
-                "status": "active"
-            })
-            
-            completed_projects = await db.contracts.count_documents({
-                "$or": [
-                    {"customer_id": mongo_id},
-                    {"customer_id": display_customer_id}
-                ],
-                "status": "completed"
-            })
-            
-            # Calculate total value from all contracts
-            contracts_cursor = db.contracts.find({
-                "$or": [
-                    {"customer_id": mongo_id},
-                    {"customer_id": display_customer_id}
-                ]
-            })
-            contracts = await contracts_cursor.to_list(length=None)
-            total_value = sum(c.get("totalAmount", 0) or c.get("total_amount", 0) or c.get("amount", 0) for c in contracts)
-            
-            # Get average satisfaction score from feedback
-            feedback_cursor = db.feedback.find({
-                "$or": [
-                    {"customer_id": mongo_id},
-                    {"customer_id": display_customer_id}
-                ]
-            })
-            feedback_list = await feedback_cursor.to_list(length=None)
-            avg_satisfaction = 0
-            if feedback_list:
-                avg_satisfaction = sum(f.get("score", 0) for f in feedback_list) / len(feedback_list)
-            
-            # Calculate outstanding amount
-            invoices_cursor = db.invoices.find({
-                "$or": [
-                    {"customer_id": mongo_id},
-                    {"customer_id": display_customer_id}
-                ],
-                "status": {"$in": ["pending", "overdue"]}
-            })
-            invoices = await invoices_cursor.to_list(length=None)
-            outstanding_amount = sum(inv.get("totalAmount", 0) or inv.get("total_amount", 0) or inv.get("amount", 0) for inv in invoices)
-            
-            # Get documents - try both MongoDB _id and formatted customer_id
-            documents_cursor = db.customer_documents.find({
-                "$or": [
-                    {"customer_id": mongo_id_str},
-                    {"customer_id": display_customer_id},
-                    {"customer_id_formatted": display_customer_id},
-                    {"customer_id": str(mongo_id)}
-                ]
-            })
-            documents = await documents_cursor.to_list(length=None)
-            
-            # Add computed fields and documents
-            customer_copy.update({
-                "activeContracts": active_contracts,
-                "completedProjects": completed_projects,
-                "totalValue": total_value,
-                "satisfactionScore": round(avg_satisfaction, 1) if avg_satisfaction else 5.0,
-                "outstandingAmount": outstanding_amount,
-                "status": "active" if active_contracts > 0 else "inactive",
-                "documents": [
-                    {
-                        "name": doc.get("name") or doc.get("document_name") or "Unnamed Document",
-                        "type": doc.get("type") or doc.get("document_type") or "N/A",
-                        "status": doc.get("status") or "pending",
-                        "uploadDate": doc.get("uploadDate") or doc.get("upload_date") or doc.get("created_at") or "N/A",
-                        "expiryDate": doc.get("expiryDate") or doc.get("expiry_date") or None
-                    }
-                    for doc in documents
-                ]
-            })
-            
-            customers.append(customer_copy)
-        
-        # Sort customers by ID in ascending order (CUST-0001, CUST-0002, etc.)
-        def extract_customer_number(cust):
-            cust_id = cust.get("id", "")
-            if cust_id.startswith("CUST-"):
-                try:
-                    parts = cust_id.split("-")
-                    if len(parts) >= 2:
-                        # Extract number part
-                        num_str = parts[1] if len(parts) == 2 else parts[-1]
-                        return int(num_str)
-                except:
-                    pass
-            return float('inf')  # Put invalid IDs at the end
-        
-        customers.sort(key=extract_customer_number)
+        # Aggregate contract, feedback, invoice and document data for the page
+        customers = await fetch_crm_customers(db, page, response, view=CUSTOMER_LIST_VIEW)
         
         return customers
     
@@ -425,16 +282,7 @@ async def get_customer_details(customer_id: str, current_user: dict = Depends(ge
             ]
         })
         documents = await documents_cursor.to_list(length=None)
-        customer_copy["documents"] = [
-            {
-                "name": doc.get("name") or doc.get("document_name") or "Unnamed Document",
-                "type": doc.get("type") or doc.get("document_type") or "N/A",
-                "status": doc.get("status") or "pending",
-                "uploadDate": doc.get("uploadDate") or doc.get("upload_date") or doc.get("created_at") or "N/A",
-                "expiryDate": doc.get("expiryDate") or doc.get("expiry_date") or None
-            }
-            for doc in documents
-        ]
+        customer_copy["documents"] = [format_customer_document(doc) for doc in documents]
         
         return customer_copy
     
@@ -444,73 +292,37 @@ async def get_customer_details(customer_id: str, current_user: dict = Depends(ge
         raise HTTPException(status_code=500, detail=f"Error fetching customer details: {str(e)}")
 
 @router.get("/pipeline")
-async def get_sales_pipeline(current_user: dict = Depends(get_current_user)):
-    """Get complete sales pipeline data (enquiry → quotation → contract → feedback)"""
+async def get_sales_pipeline(
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    stage: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """Get complete sales pipeline data (enquiry → quotation → contract → feedback)
+
+    `stage` accepts a comma-separated list of stages, `date_from`/`date_to` filter on the
+    enquiry creation date. When `limit` is set and more items remain, the cursor for the
+    next page is returned in the X-Next-Cursor header.
+    """
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access pipeline data")
         
-        db = get_database()
+        stages = [value.strip() for value in stage.split(",") if value.strip()] if stage else None
+        if stages and any(value not in PIPELINE_STAGES for value in stages):
+            raise HTTPException(status_code=400, detail=f"Invalid stage. Use one of: {', '.join(PIPELINE_STAGES)}")
         
-        # Get all enquiries and build pipeline
-        enquiries_cursor = db.enquiries.find({})
-        enquiries = await enquiries_cursor.to_list(length=None)
+        db = get_database()
         
-        pipeline = []
-        for enquiry in enquiries:
-            enquiry_id = enquiry.get("enquiry_id") or enquiry.get("id")
-            customer_id = enquiry.get("customer_id")
-            
-            # Get customer name
-            customer = await db.customers.find_one({"_id": customer_id})
-            customer_name = customer.get("name", "Unknown") if customer else "Unknown"
-            
-            # Find related quotation
-            quotation = await db.quotations.find_one({"enquiry_id": enquiry_id})
-            
-            # Find related contract
-            contract = None
-            if quotation:
-                quotation_id = quotation.get("quotation_id") or quotation.get("id")
-                contract = await db.contracts.find_one({"quotation_id": quotation_id})
-            
-            # Find feedback
-            feedback = None
-            if contract:
-                contract_id = contract.get("contract_id") or contract.get("id")
-                feedback = await db.feedback.find_one({"contract_id": contract_id})
-            
-            # Determine stage
-            stage = "enquiry"
-            if feedback:
-                stage = "feedback"
-            elif contract:
-                stage = "contract"
-            elif quotation:
-                stage = "quotation"
-            
-            pipeline_item = {
-                "id": f"PIPE-{str(enquiry.get('_id'))[-6:]}",
-                "customerId": customer_id,
-                "customerName": customer_name,
-                "enquiryId": enquiry_id,
-                "enquiryDate": enquiry.get("created_at"),
-                "enquiryStatus": enquiry.get("status"),
-                "quotationId": quotation.get("quotation_id") if quotation else None,
-                "quotationDate": quotation.get("created_at") if quotation else None,
-                "quotationValue": quotation.get("totalAmount") if quotation else None,
-                "quotationStatus": quotation.get("status") if quotation else None,
-                "contractId": contract.get("contract_id") if contract else None,
-                "contractDate": contract.get("created_at") if contract else None,
-                "contractValue": contract.get("totalAmount") if contract else None,
-                "contractStatus": contract.get("status") if contract else None,
-                "feedbackScore": feedback.get("score") if feedback else None,
-                "feedbackDate": feedback.get("created_at") if feedback else None,
-                "stage": stage,
-                "notes": enquiry.get("notes", "")
-            }
-            
-            pipeline.append(pipeline_item)
+        # Join enquiry -> quotation -> contract -> feedback in a single aggregation
+        pipeline, next_cursor = await fetch_sales_pipeline(
+            db, stages=stages, date_from=date_from, date_to=date_to, cursor=cursor, limit=limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         return pipeline
     
@@ -615,9 +427,8 @@ async def upload_customer_document(
         unique_filename = f"{customer_id}_{document_type}_{timestamp}{file_extension}"
         file_path = os.path.join(uploads_dir, unique_filename)
         
-        # Save file to disk
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Save file to disk, off the event loop
+        await asyncio.to_thread(write_file, file_path, file_content)
         
         # Create document record
         document = {
@@ -684,68 +495,25 @@ async def verify_document(document_id: str, current_user: dict = Depends(get_cur
         raise HTTPException(status_code=500, detail=f"Error verifying document: {str(e)}")
 
 @router.get("/performance/metrics")
-async def get_sales_performance(current_user: dict = Depends(get_current_user)):
-    """Get sales performance metrics for the last 6 months"""
+async def get_sales_performance(
+    current_user: dict = Depends(get_current_user),
+    periods: int = 6,
+    granularity: str = "monthly"
+):
+    """Get sales performance metrics for the last `periods` months (or weeks)"""
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access performance data")
         
-        db = get_database()
-        
-        performance_data = []
+        if granularity not in PERIOD_LENGTHS:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity. Use one of: {', '.join(PERIOD_LENGTHS)}")
+        if periods < 1 or periods > MAX_PERFORMANCE_PERIODS:
+            raise HTTPException(status_code=400, detail=f"periods must be between 1 and {MAX_PERFORMANCE_PERIODS}")
         
-        # Calculate metrics for last 6 months
-        for i in range(6):
-            month_start = datetime.now() - timedelta(days=30 * (i + 1))
-            month_end = datetime.now() - timedelta(days=30 * i)
-            
-            # Count enquiries
-            enquiries_count = await db.enquiries.count_documents({
-                "created_at": {
-                    "$gte": month_start.isoformat(),
-                    "$lte": month_end.isoformat()
-                }
-            })
-            
-            # Count quotations
-            quotations_count = await db.quotations.count_documents({
-                "created_at": {
-                    "$gte": month_start.isoformat(),
-                    "$lte": month_end.isoformat()
-                }
-            })
-            
-            # Count contracts
-            contracts_count = await db.contracts.count_documents({
-                "created_at": {
-                    "$gte": month_start.isoformat(),
-                    "$lte": month_end.isoformat()
-                }
-            })
-            
-            # Calculate revenue
-            contracts_cursor = db.contracts.find({
-                "created_at": {
-                    "$gte": month_start.isoformat(),
-                    "$lte": month_end.isoformat()
-                }
-            })
-            contracts = await contracts_cursor.to_list(length=None)
-            revenue = sum(c.get("totalAmount", 0) for c in contracts)
-            
-            # Calculate conversion rate
-            conversion_rate = (contracts_count / enquiries_count * 100) if enquiries_count > 0 else 0
-            
-            performance_data.append({
-                "month": month_end.strftime("%b %Y"),
-                "enquiries": enquiries_count,
-                "quotations": quotations_count,
-                "contracts": contracts_count,
-                "revenue": revenue,
-                "conversionRate": round(conversion_rate, 1)
-            })
+        db = get_database()
         
-        return list(reversed(performance_data))
+        # Counts and revenue for every period come from a single bucketed aggregation
+        return await fetch_sales_performance(db, periods=periods, granularity=granularity)
     
     except HTTPException:
         raise
@@ -870,8 +638,7 @@ async def update_customer_crm(
                 customer = await db.customers.find_one({"_id": mongo_id})
             except Exception as e:
                 # If ObjectId conversion fails, try other methods
-                print(f"ObjectId conversion failed: {e}")
-                pass
+                logger.debug("ObjectId conversion failed: %s", e)
         
         # If not found by _id, try to find by customer_id field (formatted ID like CUST-0001)
         if not customer:
@@ -949,115 +716,40 @@ async def update_customer_crm(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating customer %s", customer_id)
         raise HTTPException(status_code=500, detail=f"Error updating customer: {str(e)}")
 
 # ============= LEADS MANAGEMENT =============
 
 @router.get("/leads")
-async def get_leads(current_user: dict = Depends(get_current_user)):
-    """Get all leads"""
+async def get_leads(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all leads, one page at a time (next page cursor in the X-Next-Cursor header).
+
+    List items carry `activitiesCount` instead of the activity log; GET /leads/{lead_id} has it.
+    """
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access leads")
         
         db = get_database()
         
-        leads_cursor = db.leads.find({})
-        leads_raw = await leads_cursor.to_list(length=None)
+        # Newest first, on the createdAt_id index
+        leads_raw = await find_page_view(
+            db.leads, {}, LEAD_LIST_VIEW, page, response, sort_key="createdAt", direction=DESCENDING
+        )
         
         leads = []
-        current_year = datetime.now().year
-        
-        # First pass: determine year sequences from existing leads
-        year_sequences = {}
-        for lead in leads_raw:
-            lead_id = lead.get("lead_id", "")
-            # Check if lead has a properly formatted ID (LEAD-YYYY-#### format)
-            if lead_id and lead_id.startswith("LEAD-") and len(lead_id) <= 15:
-                # Extract year if in format LEAD-YYYY-####
-                parts = lead_id.split("-")
-                if len(parts) == 3 and parts[1].isdigit():
-                    year = int(parts[1])
-                    if year not in year_sequences:
-                        year_sequences[year] = 0
-                    try:
-                        seq_num = int(parts[2])
-                        year_sequences[year] = max(year_sequences[year], seq_num)
-                    except:
-                        pass
-        
-        # Second pass: generate IDs for leads without proper IDs
-        lead_id_map = {}
-        
-        for lead in leads_raw:
-            mongo_id = str(lead.get("_id", ""))
-            display_lead_id = lead.get("lead_id", "")
-            
-            # Check if lead ID needs to be generated
-            needs_id = (not display_lead_id or 
-                       len(display_lead_id) > 15 or 
-                       not display_lead_id.startswith("LEAD-"))
-            
-            if needs_id:
-                # Get creation year
-                created_at = lead.get("createdAt") or lead.get("created_at") or ""
-                year = current_year
-                try:
-                    if created_at:
-                        if isinstance(created_at, str) and len(created_at) >= 4:
-                            year = int(created_at[:4])
-                        elif hasattr(created_at, 'year'):
-                            year = created_at.year
-                except:
-                    pass
-                
-                # Initialize sequence for year if needed
-                if year not in year_sequences:
-                    year_sequences[year] = 0
-                
-                # Get next sequence number for this year
-                year_sequences[year] += 1
-                display_lead_id = f"LEAD-{year}-{str(year_sequences[year]).zfill(4)}"
-                lead_id_map[mongo_id] = display_lead_id
-        
-        # Third pass: build final lead list with proper IDs
         for lead in leads_raw:
             lead_copy = lead.copy()
             mongo_id = str(lead_copy.pop("_id"))
-            display_lead_id = lead_copy.get("lead_id", "")
-            
-            # Use generated ID if lead didn't have one
-            if mongo_id in lead_id_map:
-                display_lead_id = lead_id_map[mongo_id]
-            # Or ensure existing ID is properly formatted
-            elif not display_lead_id or len(display_lead_id) > 15 or not display_lead_id.startswith("LEAD-"):
-                # Fallback: generate ID based on current year
-                year = current_year
-                created_at = lead_copy.get("createdAt") or lead_copy.get("created_at") or ""
-                try:
-                    if created_at:
-                        if isinstance(created_at, str) and len(created_at) >= 4:
-                            year = int(created_at[:4])
-                        elif hasattr(created_at, 'year'):
-                            year = created_at.year
-                except:
-                    pass
-                
-                if year not in year_sequences:
-                    year_sequences[year] = 0
-                year_sequences[year] += 1
-                display_lead_id = f"LEAD-{year}-{str(year_sequences[year]).zfill(4)}"
             
             # Use lead_id as the display ID, keep MongoDB _id for internal reference
-            lead_copy["id"] = display_lead_id
+            lead_copy["id"] = lead_copy.get("lead_id") or mongo_id
             lead_copy["_id"] = mongo_id
-            lead_copy["lead_id"] = display_lead_id
-            
-            # Get activities count
-            activities_count = len(lead_copy.get("activities", []))
-            lead_copy["activitiesCount"] = activities_count
             
             leads.append(lead_copy)
         
@@ -1070,17 +762,19 @@ async def get_leads(current_user: dict = Depends(get_current_user)):
 
 @router.get("/leads/{lead_id}")
 async def get_lead(lead_id: str, current_user: dict = Depends(get_current_user)):
-    """Get a specific lead with all details"""
+    """Get a specific lead with all details and its most recent activities"""
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access leads")
         
         db = get_database()
         
-        lead = await db.leads.find_one({"lead_id": lead_id})
+        lead = await find_lead(db, {"lead_id": lead_id})
         if not lead:
             raise HTTPException(status_code=404, detail="Lead not found")
         
+        activities, _ = await fetch_lead_timeline(db, lead, limit=LEAD_RECENT_ACTIVITIES)
+        
         lead_copy = lead.copy()
         mongo_id = str(lead_copy.pop("_id"))
         display_lead_id = lead_copy.get("lead_id", lead_id)
@@ -1104,6 +798,8 @@ async def get_lead(lead_id: str, current_user: dict = Depends(get_current_user))
         lead_copy["id"] = display_lead_id
         lead_copy["_id"] = mongo_id
         lead_copy["lead_id"] = display_lead_id
+        lead_copy["activities"] = activities
+        lead_copy["activitiesCount"] = lead_copy.get("activityCount", 0)
         
         return lead_copy
     
@@ -1122,24 +818,7 @@ async def create_lead(lead_data: Lead, current_user: dict = Depends(get_current_
         db = get_database()
         
         # Generate lead ID with year-based format
-        current_year = datetime.now().year
-        # Get the maximum sequence number for this year
-        year_leads = await db.leads.find({
-            "lead_id": {"$regex": f"^LEAD-{current_year}-"}
-        }).to_list(length=None)
-        
-        max_seq = 0
-        for lead in year_leads:
-            lead_id_val = lead.get("lead_id", "")
-            if lead_id_val.startswith(f"LEAD-{current_year}-"):
-                try:
-                    parts = lead_id_val.split("-")
-                    if len(parts) == 3 and parts[2].isdigit():
-                        max_seq = max(max_seq, int(parts[2]))
-                except:
-                    pass
-        
-        lead_id = f"LEAD-{current_year}-{str(max_seq + 1).zfill(4)}"
+        lead_id = await next_id(db, LEAD_ID)
         
         lead = {
             "lead_id": lead_id,
@@ -1147,17 +826,16 @@ async def create_lead(lead_data: Lead, current_user: dict = Depends(get_current_
             "createdAt": datetime.now().isoformat(),
             "createdBy": current_user["id"],
             "updatedAt": datetime.now().isoformat(),
-            "activities": [
-                {
-                    "type": "created",
-                    "description": "Lead created",
-                    "by": current_user.get("name", lead_data.leadOwner),
-                    "timestamp": datetime.now().isoformat()
-                }
-            ]
+            "activityCount": 0
         }
         
         result = await db.leads.insert_one(lead)
+        await record_lead_activity(db, lead_id, {
+            "type": "created",
+            "description": "Lead created",
+            "by": current_user.get("name", lead_data.leadOwner),
+            "timestamp": datetime.now().isoformat()
+        })
         
         return {
             "message": "Lead created successfully",
@@ -1184,30 +862,13 @@ async def create_public_lead(lead_data: PublicLeadSubmission):
         assigned_salesperson_id = str(assigned_salesperson["_id"]) if assigned_salesperson else None
         assigned_salesperson_name = assigned_salesperson.get("full_name") if assigned_salesperson else None
 
-        # Create or reuse lead entry for CRM follow-up with year-based format
-        current_year = now.year
-        year_leads = await db.leads.find({
-            "lead_id": {"$regex": f"^LEAD-{current_year}-"}
-        }).to_list(length=None)
-        
-        max_seq = 0
-        for lead in year_leads:
-            lead_id_val = lead.get("lead_id", "")
-            if lead_id_val.startswith(f"LEAD-{current_year}-"):
-                try:
-                    parts = lead_id_val.split("-")
-                    if len(parts) == 3 and parts[2].isdigit():
-                        max_seq = max(max_seq, int(parts[2]))
-                except:
-                    pass
-        
-        lead_id = f"LEAD-{current_year}-{str(max_seq + 1).zfill(4)}"
+        # Create lead entry for CRM follow-up with year-based format
+        lead_id = await next_id(db, LEAD_ID, now.year)
 
         full_name = f"{lead_data.firstName} {lead_data.lastName}".strip()
 
         # Generate enquiry_id first so we can link it to the lead
-        enquiry_count = await db.enquiries.count_documents({}) if hasattr(db, "enquiries") else 0
-        enquiry_id = f"ENQ-{now.year}-{str(enquiry_count + 1).zfill(4)}"
+        enquiry_id = await next_id(db, ENQUIRY_ID, now.year)
 
         lead_doc = {
             "lead_id": lead_id,
@@ -1227,19 +888,18 @@ async def create_public_lead(lead_data: PublicLeadSubmission):
             "createdBy": "public",
             "updatedAt": now.isoformat(),
             "enquiry_id": enquiry_id,  # Link to the enquiry
-            "activities": [
-                {
-                    "type": "created",
-                    "description": f"Lead captured via website enquiry form (Enquiry: {enquiry_id})",
-                    "by": "Website",
-                    "timestamp": now.isoformat()
-                }
-            ],
+            "activityCount": 0,
             "notes": lead_data.message,
         }
 
         await db.leads.insert_one(lead_doc)
-        print(f"Created lead {lead_id} from public enquiry form")
+        await record_lead_activity(db, lead_id, {
+            "type": "created",
+            "description": f"Lead captured via website enquiry form (Enquiry: {enquiry_id})",
+            "by": "Website",
+            "timestamp": now.isoformat()
+        })
+        logger.info("Created lead %s from public enquiry form", lead_id)
 
         expected_start = lead_data.desiredStartDate or now.date().isoformat()
         quantity = max(1, int(lead_data.quantity or 1))
@@ -1269,7 +929,8 @@ async def create_public_lead(lead_data: PublicLeadSubmission):
 
         # Always insert enquiry - the collection exists as it's part of the database schema
         await db.enquiries.insert_one(enquiry_doc)
-        print(f"Created enquiry {enquiry_id} from public form (linked to lead {lead_id})")
+        await record_enquiry_created(db)
+        logger.info("Created enquiry %s from public form (linked to lead %s)", enquiry_id, lead_id)
 
         return {
             "message": "Thank you! Your enquiry has been received.",
@@ -1283,8 +944,12 @@ async def create_public_lead(lead_data: PublicLeadSubmission):
 
 
 @router.get("/leads/assigned")
-async def get_assigned_leads(current_user: dict = Depends(get_current_user)):
-    """Return leads assigned to the current salesperson (or all leads for admin)"""
+async def get_assigned_leads(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Return leads assigned to the current salesperson (or all leads for admin), newest first"""
     try:
         if current_user.get("role") not in ["sales", "admin"]:
             raise HTTPException(status_code=403, detail="Only sales or admin users can access assigned leads")
@@ -1301,93 +966,19 @@ async def get_assigned_leads(current_user: dict = Depends(get_current_user)):
                 ]
             }
 
-        # Sort by createdAt (descending) or created_at, with fallback
-        try:
-            leads_cursor = db.leads.find(query).sort("createdAt", -1)
-        except:
-            # Fallback if createdAt field doesn't exist
-            leads_cursor = db.leads.find(query).sort("created_at", -1)
-        
-        leads_raw = await leads_cursor.to_list(length=None)
+        leads_raw = await find_page_view(
+            db.leads, query, LEAD_LIST_VIEW, page, response, sort_key="createdAt", direction=DESCENDING
+        )
         
-        print(f"Found {len(leads_raw)} raw leads from database")
+        logger.debug("Found %d raw leads from database", len(leads_raw))
         
         leads = []
-        current_year = datetime.now().year
-        
-        # First pass: determine year sequences from existing leads
-        year_sequences = {}
-        for lead in leads_raw:
-            lead_id = lead.get("lead_id", "")
-            if lead_id and lead_id.startswith("LEAD-") and len(lead_id) <= 15:
-                parts = lead_id.split("-")
-                if len(parts) == 3 and parts[1].isdigit():
-                    year = int(parts[1])
-                    if year not in year_sequences:
-                        year_sequences[year] = 0
-                    try:
-                        seq_num = int(parts[2])
-                        year_sequences[year] = max(year_sequences[year], seq_num)
-                    except:
-                        pass
-        
-        # Second pass: generate IDs for leads without proper IDs
-        lead_id_map = {}
-        for lead in leads_raw:
-            mongo_id = str(lead.get("_id", ""))
-            display_lead_id = lead.get("lead_id", "")
-            
-            needs_id = (not display_lead_id or 
-                       len(display_lead_id) > 15 or 
-                       not display_lead_id.startswith("LEAD-"))
-            
-            if needs_id:
-                created_at = lead.get("createdAt") or lead.get("created_at") or ""
-                year = current_year
-                try:
-                    if created_at:
-                        if isinstance(created_at, str) and len(created_at) >= 4:
-                            year = int(created_at[:4])
-                        elif hasattr(created_at, 'year'):
-                            year = created_at.year
-                except:
-                    pass
-                
-                if year not in year_sequences:
-                    year_sequences[year] = 0
-                
-                year_sequences[year] += 1
-                display_lead_id = f"LEAD-{year}-{str(year_sequences[year]).zfill(4)}"
-                lead_id_map[mongo_id] = display_lead_id
-        
-        # Third pass: build final lead list with proper IDs
         for lead in leads_raw:
             lead_copy = lead.copy()
             mongo_id = str(lead_copy.pop("_id"))
-            display_lead_id = lead_copy.get("lead_id", "")
             
-            if mongo_id in lead_id_map:
-                display_lead_id = lead_id_map[mongo_id]
-            elif not display_lead_id or len(display_lead_id) > 15 or not display_lead_id.startswith("LEAD-"):
-                year = current_year
-                created_at = lead_copy.get("createdAt") or lead_copy.get("created_at") or ""
-                try:
-                    if created_at:
-                        if isinstance(created_at, str) and len(created_at) >= 4:
-                            year = int(created_at[:4])
-                        elif hasattr(created_at, 'year'):
-                            year = created_at.year
-                except:
-                    pass
-                
-                if year not in year_sequences:
-                    year_sequences[year] = 0
-                year_sequences[year] += 1
-                display_lead_id = f"LEAD-{year}-{str(year_sequences[year]).zfill(4)}"
-            
-            lead_copy["id"] = display_lead_id
+            lead_copy["id"] = lead_copy.get("lead_id") or mongo_id
             lead_copy["_id"] = mongo_id
-            lead_copy["lead_id"] = display_lead_id
             
             # Ensure all required fields have default values
             if "createdAt" not in lead_copy:
@@ -1400,14 +991,12 @@ async def get_assigned_leads(current_user: dict = Depends(get_current_user)):
             leads.append(lead_copy)
 
         # Always return an array, even if empty
-        return leads if leads else []
+        return leads
 
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        print(f"Error in get_assigned_leads: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in get_assigned_leads")
         raise HTTPException(status_code=500, detail=f"Error fetching assigned leads: {str(e)}")
 
 
@@ -1461,14 +1050,7 @@ async def update_lead_status(lead_id: str, status_update: LeadStatusUpdate, curr
         if status_update.notes:
             activity_entry["notes"] = status_update.notes
 
-        update_operations = {
-            "$set": updates,
-            "$push": {"activities": activity_entry},
-        }
-
-        result = await db.leads.update_one({"lead_id": lead_id}, update_operations)
-
-        if result.modified_count == 0:
+        if not await record_lead_activity(db, lead["lead_id"], activity_entry, set_fields=updates):
             raise HTTPException(status_code=500, detail="Lead status update failed")
 
         return {"message": "Lead status updated successfully"}
@@ -1522,18 +1104,12 @@ async def update_lead_status(lead_id: str, status: str, current_user: dict = Dep
             "timestamp": datetime.now().isoformat()
         }
         
-        result = await db.leads.update_one(
-            {"lead_id": lead_id},
-            {
-                "$set": {
-                    "status": status,
-                    "updatedAt": datetime.now().isoformat()
-                },
-                "$push": {"activities": activity}
-            }
-        )
+        updated = await record_lead_activity(db, lead_id, activity, set_fields={
+            "status": status,
+            "updatedAt": datetime.now().isoformat()
+        })
         
-        if result.modified_count == 0:
+        if not updated:
             raise HTTPException(status_code=404, detail="Lead not found")
         
         return {"message": f"Lead status updated to {status}"}
@@ -1562,6 +1138,7 @@ async def delete_lead(lead_id: str, current_user: dict = Depends(get_current_use
         await db.lead_calls.delete_many({"lead_id": lead_id})
         await db.lead_tasks.delete_many({"lead_id": lead_id})
         await db.lead_notes.delete_many({"lead_id": lead_id})
+        await delete_lead_activities(db, lead_id)
         
         return {"message": "Lead and related data deleted successfully"}
     
@@ -1570,6 +1147,75 @@ async def delete_lead(lead_id: str, current_user: dict = Depends(get_current_use
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting lead: {str(e)}")
 
+@router.get("/leads/{lead_id}/activities")
+async def get_lead_activities(
+    lead_id: str,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Activity timeline of a lead, newest first (next page cursor in the X-Next-Cursor header)"""
+    try:
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Only admin can access leads")
+        
+        db = get_database()
+        
+        lead = await find_lead(db, {"lead_id": lead_id})
+        if not lead:
+            raise HTTPException(status_code=404, detail="Lead not found")
+        
+        before = decode_cursor(page.cursor, "seq")[0] if page.cursor else None
+        # Activity numbers start at 1; anything else did not come from this endpoint
+        if before is not None and (type(before) is not int or before < 1):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+        activities, next_before = await fetch_lead_timeline(db, lead, before=before, limit=page.limit)
+        if next_before:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor("seq", next_before, None)
+        
+        return activities
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching lead activities: {str(e)}")
+
+@router.get("/leads/{lead_id}/timeline")
+async def get_lead_timeline(
+    lead_id: str,
+    response: Response,
+    type: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Emails, calls, tasks and notes of a lead in one newest-first list.
+
+    `type` accepts a comma-separated list of entry types (email, call, task, note). When more
+    entries remain, the cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    try:
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Only admin can access leads")
+        
+        types = [value.strip() for value in type.split(",") if value.strip()] if type else None
+        if types and any(value not in TIMELINE_TYPES for value in types):
+            raise HTTPException(status_code=400, detail=f"Invalid type. Use one of: {', '.join(TIMELINE_TYPES)}")
+        
+        db = get_database()
+        
+        entries, next_cursor = await fetch_lead_timeline_page(
+            db, lead_id, types=types, cursor=page.cursor, limit=page.limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return entries
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching lead timeline: {str(e)}")
+
 # ============= EMAILS =============
 
 @router.get("/leads/{lead_id}/emails")
@@ -1626,13 +1272,7 @@ async def send_email(email_data: Email, current_user: dict = Depends(get_current
             "timestamp": datetime.now().isoformat()
         }
         
-        await db.leads.update_one(
-            {"lead_id": email_data.leadId},
-            {
-                "$push": {"activities": activity},
-                "$set": {"updatedAt": datetime.now().isoformat()}
-            }
-        )
+        await record_lead_activity(db, email_data.leadId, activity, set_fields={"updatedAt": datetime.now().isoformat()})
         
         return {
             "message": "Email sent successfully",
@@ -1706,13 +1346,7 @@ async def log_call(call_data: Call, current_user: dict = Depends(get_current_use
             "timestamp": datetime.now().isoformat()
         }
         
-        await db.leads.update_one(
-            {"lead_id": call_data.leadId},
-            {
-                "$push": {"activities": activity},
-                "$set": {"updatedAt": datetime.now().isoformat()}
-            }
-        )
+        await record_lead_activity(db, call_data.leadId, activity, set_fields={"updatedAt": datetime.now().isoformat()})
         
         return {
             "message": "Call logged successfully",
@@ -1779,13 +1413,7 @@ async def create_task(task_data: Task, current_user: dict = Depends(get_current_
             "timestamp": datetime.now().isoformat()
         }
         
-        await db.leads.update_one(
-            {"lead_id": task_data.leadId},
-            {
-                "$push": {"activities": activity},
-                "$set": {"updatedAt": datetime.now().isoformat()}
-            }
-        )
+        await record_lead_activity(db, task_data.leadId, activity, set_fields={"updatedAt": datetime.now().isoformat()})
         
         return {
             "message": "Task created successfully",
@@ -1875,13 +1503,7 @@ async def create_note(note_data: Note, current_user: dict = Depends(get_current_
             "timestamp": datetime.now().isoformat()
         }
         
-        await db.leads.update_one(
-            {"lead_id": note_data.leadId},
-            {
-                "$push": {"activities": activity},
-                "$set": {"updatedAt": datetime.now().isoformat()}
-            }
-        )
+        await record_lead_activity(db, note_data.leadId, activity, set_fields={"updatedAt": datetime.now().isoformat()})
         
         return {
             "message": "Note created successfully",
@@ -1910,23 +1532,20 @@ async def convert_to_deal(convert_data: ConvertToDeal, current_user: dict = Depe
             raise HTTPException(status_code=404, detail="Lead not found")
         
         # Update lead status to Qualified
-        await db.leads.update_one(
-            {"lead_id": convert_data.leadId},
+        await record_lead_activity(
+            db,
+            convert_data.leadId,
             {
-                "$set": {
-                    "status": "Qualified",
-                    "convertedToDeal": True,
-                    "convertedAt": datetime.now().isoformat(),
-                    "updatedAt": datetime.now().isoformat()
-                },
-                "$push": {
-                    "activities": {
-                        "type": "conversion",
-                        "description": "Converted to deal",
-                        "by": current_user.get("name", "Admin"),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                }
+                "type": "conversion",
+                "description": "Converted to deal",
+                "by": current_user.get("name", "Admin"),
+                "timestamp": datetime.now().isoformat()
+            },
+            set_fields={
+                "status": "Qualified",
+                "convertedToDeal": True,
+                "convertedAt": datetime.now().isoformat(),
+                "updatedAt": datetime.now().isoformat()
             }
         )
         
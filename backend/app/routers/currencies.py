@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
@@ -11,10 +11,14 @@ from ..models.currency import (
 )
 from ..utils.database import get_database
 from ..utils.auth import get_current_user
+from ..utils.response_cache import cached_response, invalidate_cache
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Response cache namespace, cleared on every create/update/delete
+CURRENCIES_CACHE = "currencies"
+
 @router.post("/", response_model=CurrencyResponse)
 async def create_currency(
     currency_data: CurrencyCreate,
@@ -44,48 +48,57 @@ async def create_currency(
     })
 
     result = await db.currencies.insert_one(currency_dict)
+    await invalidate_cache(CURRENCIES_CACHE)
     currency_dict["id"] = str(result.inserted_id)
 
     return CurrencyResponse(**currency_dict)
 
 @router.get("/", response_model=List[CurrencyResponse])
 async def get_currencies(
+    request: Request,
     status: Optional[CurrencyStatus] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Get all currencies"""
-    db = get_database()
+    async def load():
+        db = get_database()
 
-    # Build query
-    query = {}
-    if status:
-        query["status"] = status
+        # Build query
+        query = {}
+        if status:
+            query["status"] = status
 
-    currencies_cursor = db.currencies.find(query).sort("created_at", -1)
-    currencies_list = []
-    async for item in currencies_cursor:
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        currencies_list.append(item)
+        currencies_cursor = db.currencies.find(query).sort("created_at", -1)
+        currencies_list = []
+        async for item in currencies_cursor:
+            item["id"] = str(item["_id"])
+            del item["_id"]
+            currencies_list.append(CurrencyResponse(**item))
 
-    return currencies_list
+        return currencies_list
+
+    return await cached_response(request, CURRENCIES_CACHE, load)
 
 @router.get("/{currency_id}", response_model=CurrencyResponse)
 async def get_currency_by_id(
+    request: Request,
     currency_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get currency by ID"""
-    db = get_database()
-    currency = await db.currencies.find_one({"_id": ObjectId(currency_id)})
+    async def load():
+        db = get_database()
+        currency = await db.currencies.find_one({"_id": ObjectId(currency_id)})
 
-    if not currency:
-        raise HTTPException(status_code=404, detail="Currency not found")
+        if not currency:
+            raise HTTPException(status_code=404, detail="Currency not found")
+
+        currency["id"] = str(currency["_id"])
+        del currency["_id"]
 
-    currency["id"] = str(currency["_id"])
-    del currency["_id"]
+        return CurrencyResponse(**currency)
 
-    return CurrencyResponse(**currency)
+    return await cached_response(request, CURRENCIES_CACHE, load)
 
 @router.put("/{currency_id}", response_model=CurrencyResponse)
 async def update_currency(
@@ -111,6 +124,7 @@ async def update_currency(
         update_dict["updated_at"] = datetime.utcnow()
 
         await db.currencies.update_one({"_id": ObjectId(currency_id)}, {"$set": update_dict})
+        await invalidate_cache(CURRENCIES_CACHE)
 
     # Return updated currency
     updated_currency = await db.currencies.find_one({"_id": ObjectId(currency_id)})
@@ -138,5 +152,6 @@ async def delete_currency(
         raise HTTPException(status_code=404, detail="Currency not found")
 
     await db.currencies.delete_one({"_id": ObjectId(currency_id)})
+    await invalidate_cache(CURRENCIES_CACHE)
 
     return {"message": "Currency deleted successfully"}
\ No newline at end of file
@@ -10,12 +10,24 @@ from ..models.equipment import (
     EquipmentCategory, EquipmentUnit
 )
 from ..models.user import UserResponse
-from ..utils.database import get_database
+from ..utils.database import get_database, run_in_transaction
 from ..utils.auth import get_current_user
+from ..utils.dashboard_stats import record_equipment_change
+from ..utils.inventory import (
+    ADJUSTMENTS, DISPATCH, RETURNS, QuantityChange,
+    apply_quantity_change, revert_quantity_change, take_from_dispatch, restore_dispatch
+)
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Reported when an adjustment's guard fails (see utils/inventory.py)
+ADJUSTMENT_SHORTFALL_MESSAGES = {
+    "remove": "Not enough available quantity to remove",
+    "damage": "Not enough available quantity to mark as damaged",
+    "repair": "Not enough damaged quantity to repair",
+}
+
 @router.post("/", response_model=EquipmentResponse)
 async def create_equipment(
     equipment_data: EquipmentCreate,
@@ -55,6 +67,7 @@ async def create_equipment(
 
     result = await db.equipment.insert_one(equipment_dict)
     equipment_dict["id"] = str(result.inserted_id)
+    await record_equipment_change(db, None, equipment_dict)
 
     # Log equipment creation
     await db.equipment_history.insert_one({
@@ -169,7 +182,10 @@ async def update_equipment(
                 detail="Only administrators can change approval status"
             )
 
-        await db.equipment.update_one({"_id": equipment_id}, {"$set": update_dict})
+        # The document as it was just before this write, so the counters move from the right state
+        previous = await db.equipment.find_one_and_update({"_id": equipment_id}, {"$set": update_dict})
+        if previous:
+            await record_equipment_change(db, previous, {**previous, **update_dict})
 
         # Log the update
         await db.equipment_history.insert_one({
@@ -221,6 +237,7 @@ async def delete_equipment(
         )
 
     await db.equipment.delete_one({"_id": equipment_id})
+    await record_equipment_change(db, equipment, None)
 
     # Log deletion
     await db.equipment_history.insert_one({
@@ -249,55 +266,32 @@ async def adjust_equipment_quantity(
             detail="Only warehouse staff and administrators can adjust equipment quantities"
         )
 
-    db = get_database()
-    equipment = await db.equipment.find_one({"_id": equipment_id})
-
-    if not equipment:
-        raise HTTPException(status_code=404, detail="Equipment not found")
-
-    # Calculate new quantities based on adjustment type
-    updates = {}
     quantity_change = adjustment.quantity
+    if quantity_change <= 0:
+        raise HTTPException(status_code=400, detail="Invalid quantity")
 
-    if adjustment.adjustment_type == "add":
-        updates["quantity_total"] = equipment["quantity_total"] + quantity_change
-        updates["quantity_available"] = equipment["quantity_available"] + quantity_change
-    elif adjustment.adjustment_type == "remove":
-        if equipment["quantity_available"] < quantity_change:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Not enough available quantity to remove"
-            )
-        updates["quantity_total"] = equipment["quantity_total"] - quantity_change
-        updates["quantity_available"] = equipment["quantity_available"] - quantity_change
-    elif adjustment.adjustment_type == "damage":
-        if equipment["quantity_available"] < quantity_change:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Not enough available quantity to mark as damaged"
-            )
-        updates["quantity_available"] = equipment["quantity_available"] - quantity_change
-        updates["quantity_damaged"] = equipment["quantity_damaged"] + quantity_change
-    elif adjustment.adjustment_type == "repair":
-        if equipment["quantity_damaged"] < quantity_change:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Not enough damaged quantity to repair"
-            )
-        updates["quantity_damaged"] = equipment["quantity_damaged"] - quantity_change
-        updates["quantity_available"] = equipment["quantity_available"] + quantity_change
-
-    updates["updated_at"] = datetime.utcnow()
+    db = get_database()
+    # Unknown types only touch updated_at, as before
+    change = ADJUSTMENTS.get(adjustment.adjustment_type, QuantityChange({}, None))
+    result = await apply_quantity_change(db, equipment_id, change, quantity_change)
 
-    await db.equipment.update_one({"_id": equipment_id}, {"$set": updates})
+    if result is None:
+        if not await db.equipment.find_one({"_id": equipment_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Equipment not found")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ADJUSTMENT_SHORTFALL_MESSAGES[adjustment.adjustment_type]
+        )
+    equipment, updated = result
+    await record_equipment_change(db, equipment, updated)
 
     # Log the adjustment
     await db.equipment_history.insert_one({
         "equipment_id": equipment_id,
         "action": adjustment.adjustment_type,
         "quantity_change": quantity_change,
-        "previous_quantity": equipment["quantity_total"],
-        "new_quantity": updates.get("quantity_total", equipment["quantity_total"]),
+        "previous_quantity": equipment.get("quantity_total", 0),
+        "new_quantity": updated.get("quantity_total", 0),
         "performed_by": current_user["email"],
         "approved_by": adjustment.approved_by,
         "reason": adjustment.reason,
@@ -489,46 +483,51 @@ async def dispatch_equipment(
         raise HTTPException(status_code=400, detail="Invalid quantity")
 
     db = get_database()
-    equipment = await db.equipment.find_one({"_id": equipment_id})
-
-    if not equipment:
-        raise HTTPException(status_code=404, detail="Equipment not found")
-
-    if equipment["quantity_available"] < quantity:
-        raise HTTPException(status_code=400, detail="Insufficient available quantity")
 
-    # Update equipment quantities
-    await db.equipment.update_one(
-        {"_id": equipment_id},
-        {
-            "$inc": {"quantity_available": -quantity, "quantity_rented": quantity},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
-
-    # Create dispatch record
-    dispatch_record = {
-        "equipment_id": equipment_id,
-        "contract_id": contract_id,
-        "customer_id": customer_id,
-        "quantity": quantity,
-        "dispatched_by": current_user["email"],
-        "dispatch_date": datetime.utcnow(),
-        "status": "active"
-    }
-    await db.equipment_dispatch.insert_one(dispatch_record)
-
-    # Log the dispatch
-    await db.equipment_history.insert_one({
-        "equipment_id": equipment_id,
-        "action": "dispatched",
-        "quantity_change": -quantity,
-        "previous_quantity": equipment["quantity_available"],
-        "new_quantity": equipment["quantity_available"] - quantity,
-        "performed_by": current_user["email"],
-        "reason": f"Dispatched for contract {contract_id}",
-        "timestamp": datetime.utcnow()
-    })
+    async def dispatch(session):
+        result = await apply_quantity_change(db, equipment_id, DISPATCH, quantity, session=session)
+        if result is None:
+            if not await db.equipment.find_one({"_id": equipment_id}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Equipment not found")
+            raise HTTPException(status_code=400, detail="Insufficient available quantity")
+        equipment, updated = result
+
+        dispatch_id = None
+        try:
+            # Create dispatch record
+            inserted = await db.equipment_dispatch.insert_one({
+                "equipment_id": equipment_id,
+                "contract_id": contract_id,
+                "customer_id": customer_id,
+                "quantity": quantity,
+                "dispatched_by": current_user["email"],
+                "dispatch_date": datetime.utcnow(),
+                "status": "active"
+            }, session=session)
+            dispatch_id = inserted.inserted_id
+
+            # Log the dispatch
+            await db.equipment_history.insert_one({
+                "equipment_id": equipment_id,
+                "action": "dispatched",
+                "quantity_change": -quantity,
+                "previous_quantity": equipment.get("quantity_available", 0),
+                "new_quantity": updated["quantity_available"],
+                "performed_by": current_user["email"],
+                "reason": f"Dispatched for contract {contract_id}",
+                "timestamp": datetime.utcnow()
+            }, session=session)
+        except Exception:
+            if session is None:
+                # No transaction to roll back: put the stock back and drop the dispatch record
+                await revert_quantity_change(db, equipment_id, DISPATCH, quantity)
+                if dispatch_id is not None:
+                    await db.equipment_dispatch.delete_one({"_id": dispatch_id})
+            raise
+        return equipment, updated
+
+    equipment, updated = await run_in_transaction(dispatch)
+    await record_equipment_change(db, equipment, updated, dispatch_delta=1)
 
     return {"message": f"Equipment dispatched successfully. {quantity} units sent."}
 
@@ -553,77 +552,70 @@ async def return_equipment(
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Invalid quantity")
 
-    db = get_database()
-    equipment = await db.equipment.find_one({"_id": equipment_id})
+    if condition not in RETURNS:
+        raise HTTPException(status_code=400, detail="Invalid condition")
 
-    if not equipment:
-        raise HTTPException(status_code=404, detail="Equipment not found")
-
-    # Find active dispatch record
-    dispatch_record = await db.equipment_dispatch.find_one({
-        "equipment_id": equipment_id,
-        "contract_id": contract_id,
-        "status": "active"
-    })
-
-    if not dispatch_record:
-        raise HTTPException(status_code=404, detail="No active dispatch found for this equipment and contract")
-
-    if dispatch_record["quantity"] < quantity:
-        raise HTTPException(status_code=400, detail="Return quantity exceeds dispatched quantity")
-
-    # Update equipment quantities based on condition
-    updates = {"updated_at": datetime.utcnow()}
-
-    if condition == "good":
-        updates["quantity_available"] = equipment["quantity_available"] + quantity
-        updates["quantity_rented"] = equipment["quantity_rented"] - quantity
-    elif condition == "damaged":
-        updates["quantity_damaged"] = equipment["quantity_damaged"] + quantity
-        updates["quantity_rented"] = equipment["quantity_rented"] - quantity
-    elif condition == "lost":
-        # Lost equipment is permanently removed
-        updates["quantity_total"] = equipment["quantity_total"] - quantity
-        updates["quantity_rented"] = equipment["quantity_rented"] - quantity
-
-    await db.equipment.update_one({"_id": equipment_id}, {"$set": updates})
-
-    # Update dispatch record
-    remaining_quantity = dispatch_record["quantity"] - quantity
-    if remaining_quantity <= 0:
-        await db.equipment_dispatch.update_one(
-            {"_id": dispatch_record["_id"]},
-            {"$set": {"status": "completed", "return_date": datetime.utcnow()}}
-        )
-    else:
-        await db.equipment_dispatch.update_one(
-            {"_id": dispatch_record["_id"]},
-            {"$set": {"quantity": remaining_quantity}}
-        )
+    db = get_database()
 
-    # Create return record
-    return_record = {
-        "equipment_id": equipment_id,
-        "contract_id": contract_id,
-        "quantity": quantity,
-        "condition": condition,
-        "notes": notes,
-        "processed_by": current_user["email"],
-        "return_date": datetime.utcnow()
-    }
-    await db.equipment_returns.insert_one(return_record)
-
-    # Log the return
-    await db.equipment_history.insert_one({
-        "equipment_id": equipment_id,
-        "action": f"returned_{condition}",
-        "quantity_change": quantity if condition == "good" else -quantity,
-        "previous_quantity": equipment["quantity_available"],
-        "new_quantity": updates.get("quantity_available", equipment["quantity_available"]),
-        "performed_by": current_user["email"],
-        "reason": f"Returned from contract {contract_id} - {condition}",
-        "notes": notes,
-        "timestamp": datetime.utcnow()
-    })
+    async def process_return(session):
+        dispatch_record = await take_from_dispatch(db, equipment_id, contract_id, quantity, session=session)
+        if dispatch_record is None:
+            if not await db.equipment.find_one({"_id": equipment_id}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Equipment not found")
+            if await db.equipment_dispatch.find_one(
+                {"equipment_id": equipment_id, "contract_id": contract_id, "status": "active"}, {"_id": 1},
+                session=session
+            ):
+                raise HTTPException(status_code=400, detail="Return quantity exceeds dispatched quantity")
+            raise HTTPException(status_code=404, detail="No active dispatch found for this equipment and contract")
+
+        result = None
+        return_id = None
+        try:
+            # Update equipment quantities based on condition
+            result = await apply_quantity_change(db, equipment_id, RETURNS[condition], quantity, session=session)
+            if result is None:
+                if not await db.equipment.find_one({"_id": equipment_id}, {"_id": 1}, session=session):
+                    raise HTTPException(status_code=404, detail="Equipment not found")
+                raise HTTPException(status_code=400, detail="Return quantity exceeds rented quantity")
+            equipment, updated = result
+
+            # Create return record
+            inserted = await db.equipment_returns.insert_one({
+                "equipment_id": equipment_id,
+                "contract_id": contract_id,
+                "quantity": quantity,
+                "condition": condition,
+                "notes": notes,
+                "processed_by": current_user["email"],
+                "return_date": datetime.utcnow()
+            }, session=session)
+            return_id = inserted.inserted_id
+
+            # Log the return
+            await db.equipment_history.insert_one({
+                "equipment_id": equipment_id,
+                "action": f"returned_{condition}",
+                "quantity_change": quantity if condition == "good" else -quantity,
+                "previous_quantity": equipment.get("quantity_available", 0),
+                "new_quantity": updated.get("quantity_available", 0),
+                "performed_by": current_user["email"],
+                "reason": f"Returned from contract {contract_id} - {condition}",
+                "notes": notes,
+                "timestamp": datetime.utcnow()
+            }, session=session)
+        except Exception:
+            if session is None:
+                # No transaction to roll back: undo whatever this return already wrote
+                if result is not None:
+                    await revert_quantity_change(db, equipment_id, RETURNS[condition], quantity)
+                if return_id is not None:
+                    await db.equipment_returns.delete_one({"_id": return_id})
+                await restore_dispatch(db, dispatch_record, quantity)
+            raise
+        return equipment, updated, dispatch_record["status"] == "completed"
+
+    equipment, updated, completed = await run_in_transaction(process_return)
+    await record_equipment_change(db, equipment, updated, dispatch_delta=-1 if completed else 0)
 
     return {"message": f"Equipment return processed successfully. {quantity} units returned in {condition} condition."}
\ No newline at end of file
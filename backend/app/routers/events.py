@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import os
 from bson import ObjectId
+from pymongo import DESCENDING
 
 from ..models.event import (
     EventCreate, EventResponse, EventUpdate,
@@ -11,6 +12,7 @@ from ..models.event import (
 )
 from ..utils.database import get_database
 from ..utils.auth import get_current_user
+from ..utils.pagination import PageParams, fetch_page
 
 router = APIRouter()
 security = HTTPBearer()
@@ -38,13 +40,15 @@ async def create_event(
 
 @router.get("/", response_model=List[EventResponse])
 async def get_events(
+    response: Response,
     type: Optional[EventType] = None,
     status: Optional[EventStatus] = None,
     priority: Optional[EventPriority] = None,
     assigned_to: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all events with optional filters"""
+    """Get events with optional filters, newest first (paginated)"""
     db = get_database()
 
     # Build query
@@ -58,9 +62,8 @@ async def get_events(
     if assigned_to:
         query["assigned_to"] = assigned_to
 
-    events_cursor = db.events.find(query).sort("created_at", -1)
     events = []
-    async for event in events_cursor:
+    for event in await fetch_page(db.events, query, page, response, sort_key="created_at", direction=DESCENDING):
         event["id"] = str(event["_id"])
         del event["_id"]
         events.append(event)
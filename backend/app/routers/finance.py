@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import timedelta
 from ..utils.auth import get_current_user, is_admin_or_super_admin
 from ..utils.database import get_database
+from ..utils.dashboard_stats import get_dashboard_stats, status_total, map_total
+from ..utils.pagination import PageParams, fetch_page
 
 router = APIRouter()
 
@@ -16,59 +18,13 @@ async def get_finance_dashboard(current_user: dict = Depends(get_current_user)):
 
         db = get_database()
 
-        # Get total revenue from invoices
-        total_revenue = 0
-        try:
-            invoices_cursor = db.invoices.find({})
-            invoices = await invoices_cursor.to_list(length=None)
-            for invoice in invoices:
-                total_revenue += invoice.get("total", 0) or invoice.get("amount", 0) or 0
-        except Exception:
-            total_revenue = 0
-
-        # Get outstanding amount from pending invoices
-        outstanding_amount = 0
-        outstanding_count = 0
-        try:
-            pending_invoices_cursor = db.invoices.find({"status": "pending"})
-            pending_invoices = await pending_invoices_cursor.to_list(length=None)
-            for invoice in pending_invoices:
-                outstanding_amount += invoice.get("total", 0) or invoice.get("amount", 0) or 0
-                outstanding_count += 1
-        except Exception:
-            outstanding_amount = 0
-            outstanding_count = 0
-
-        # Get pending approvals
-        try:
-            pending_approvals = await db.rentals.count_documents({"status": "pending_approval"})
-        except Exception:
-            pending_approvals = 0
-
-        # Get recent invoices
-        recent_invoices = []
-        try:
-            recent_invoices_cursor = db.invoices.find({}).sort("created_at", -1).limit(5)
-            recent_invoices_raw = await recent_invoices_cursor.to_list(length=5)
-            for invoice in recent_invoices_raw:
-                created_at = invoice.get("created_at")
-                if isinstance(created_at, datetime):
-                    date_str = created_at.strftime("%Y-%m-%d")
-                elif isinstance(created_at, str):
-                    date_str = created_at[:10] if len(created_at) >= 10 else ""
-                else:
-                    date_str = ""
-                
-                recent_invoices.append({
-                    "id": invoice.get("invoice_id", str(invoice["_id"])),
-                    "customer": invoice.get("customer_name", ""),
-                    "date": date_str,
-                    "amount": invoice.get("amount", invoice.get("total", 0)),
-                    "vat": invoice.get("vat", 0),
-                    "status": invoice.get("status", "pending")
-                })
-        except Exception:
-            recent_invoices = []
+        # Counters are maintained by the write paths (see utils/dashboard_stats.py)
+        stats = await get_dashboard_stats(db)
+        total_revenue = map_total(stats, "invoice_amount_by_status")
+        outstanding_amount = status_total(stats, "invoice_amount_by_status", ["pending"])
+        outstanding_count = status_total(stats, "invoices_by_status", ["pending"])
+        pending_approvals = status_total(stats, "rentals_by_status", ["pending_approval"])
+        recent_invoices = stats["recent_invoices"]
 
         # Get contract profitability (simplified)
         contract_profitability = []  # TODO: Calculate from contracts and costs
@@ -92,8 +48,12 @@ async def get_finance_dashboard(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error fetching finance dashboard: {str(e)}")
 
 @router.get("/invoices")
-async def get_finance_invoices(current_user: dict = Depends(get_current_user)):
-    """Get invoices for finance"""
+async def get_finance_invoices(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get invoices for finance (paginated)"""
     try:
         # Check if user is admin or super_admin
         if not is_admin_or_super_admin(current_user):
@@ -101,8 +61,7 @@ async def get_finance_invoices(current_user: dict = Depends(get_current_user)):
         db = get_database()
 
         # Query from invoices collection
-        invoices_cursor = db.invoices.find({})
-        invoices_raw = await invoices_cursor.to_list(length=None)
+        invoices_raw = await fetch_page(db.invoices, {}, page, response)
         invoices = []
         for invoice in invoices_raw:
             invoice_copy = invoice.copy()
@@ -111,12 +70,18 @@ async def get_finance_invoices(current_user: dict = Depends(get_current_user)):
 
         return invoices
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching invoices: {str(e)}")
 
 @router.get("/payments")
-async def get_finance_payments(current_user: dict = Depends(get_current_user)):
-    """Get payments for finance"""
+async def get_finance_payments(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get payments for finance (paginated)"""
     try:
         # Check if user is admin or super_admin
         if not is_admin_or_super_admin(current_user):
@@ -124,8 +89,7 @@ async def get_finance_payments(current_user: dict = Depends(get_current_user)):
         db = get_database()
 
         # Query from payments collection
-        payments_cursor = db.payments.find({})
-        payments_raw = await payments_cursor.to_list(length=None)
+        payments_raw = await fetch_page(db.payments, {}, page, response)
         payments = []
         for payment in payments_raw:
             payment_copy = payment.copy()
@@ -134,12 +98,18 @@ async def get_finance_payments(current_user: dict = Depends(get_current_user)):
 
         return payments
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching payments: {str(e)}")
 
 @router.get("/deposits")
-async def get_finance_deposits(current_user: dict = Depends(get_current_user)):
-    """Get deposits for finance"""
+async def get_finance_deposits(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get deposits for finance (paginated)"""
     try:
         # Check if user is admin or super_admin
         if not is_admin_or_super_admin(current_user):
@@ -147,8 +117,7 @@ async def get_finance_deposits(current_user: dict = Depends(get_current_user)):
         db = get_database()
 
         # Query from deposits collection
-        deposits_cursor = db.deposits.find({})
-        deposits_raw = await deposits_cursor.to_list(length=None)
+        deposits_raw = await fetch_page(db.deposits, {}, page, response)
         deposits = []
         for deposit in deposits_raw:
             deposit_copy = deposit.copy()
@@ -157,6 +126,8 @@ async def get_finance_deposits(current_user: dict = Depends(get_current_user)):
 
         return deposits
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching deposits: {str(e)}")
 
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
 from datetime import datetime, timezone
 import traceback
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.counters import next_id, EMPLOYEE_ID
+from ..utils.pagination import PageParams, fetch_page
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -26,17 +28,19 @@ class EmployeeUpdate(BaseModel):
     status: Optional[str] = None
 
 @router.get("/employees")
-async def get_employees(current_user: dict = Depends(get_current_user)):
-    """Get all employees for admin management"""
+async def get_employees(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all employees for admin management (paginated)"""
     try:
         if current_user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Only admin can access this endpoint")
 
         db = get_database()
 
-        # Fetch all employees
-        employees_cursor = db.employees.find({})
-        employees_raw = await employees_cursor.to_list(length=None)
+        employees_raw = await fetch_page(db.employees, {}, page, response)
 
         employees = []
         for employee in employees_raw:
@@ -65,24 +69,7 @@ async def create_employee(employee_data: EmployeeCreate, current_user: dict = De
         if existing:
             raise HTTPException(status_code=400, detail="Employee with this email already exists")
 
-        # Get the maximum existing employee number
-        all_employees = await db.employees.find({
-            "employee_id": {"$regex": "^EMP-"}
-        }).to_list(length=None)
-
-        max_num = 0
-        for emp in all_employees:
-            emp_id = emp.get("employee_id", "")
-            if emp_id.startswith("EMP-"):
-                try:
-                    parts = emp_id.split("-")
-                    if len(parts) == 2:
-                        num = int(parts[1])
-                        max_num = max(max_num, num)
-                except:
-                    pass
-
-        employee_id = f"EMP-{str(max_num + 1).zfill(4)}"
+        employee_id = await next_id(db, EMPLOYEE_ID)
 
         employee = {
             "employee_id": employee_id,
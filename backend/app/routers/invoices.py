@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
+from pymongo import DESCENDING
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.pagination import PageParams, fetch_page
 
 router = APIRouter()
 
 @router.get("/")
-async def get_invoices(current_user: dict = Depends(get_current_user)):
-    """Get invoices for the current user or all invoices for finance/admin"""
+async def get_invoices(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get invoices for the current user or all invoices for finance/admin, newest first (paginated)"""
     try:
         db = get_database()
 
@@ -49,11 +55,11 @@ async def get_invoices(current_user: dict = Depends(get_current_user)):
 
         # Finance/Admin can see all invoices, customers see only their own
         if current_user.get("role") in ["finance", "admin"]:
-            invoices_cursor = db.invoices.find({}).sort("created_at", -1)
+            query = {}
         else:
-            invoices_cursor = db.invoices.find({"customer_id": current_user["id"]}).sort("created_at", -1)
+            query = {"customer_id": current_user["id"]}
         
-        invoices_raw = await invoices_cursor.to_list(length=None)
+        invoices_raw = await fetch_page(db.invoices, query, page, response, sort_key="created_at", direction=DESCENDING)
         
         # Convert _id to id for frontend
         invoices = []
@@ -64,6 +70,8 @@ async def get_invoices(current_user: dict = Depends(get_current_user)):
         
         return invoices
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching invoices: {str(e)}")
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
@@ -11,10 +11,14 @@ from ..models.rate import (
 )
 from ..utils.database import get_database
 from ..utils.auth import get_current_user
+from ..utils.response_cache import cached_response, invalidate_cache
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Response cache namespace, cleared on every create/update/delete
+RATES_CACHE = "rates"
+
 @router.post("/", response_model=RateResponse)
 async def create_rate(
     rate_data: RateCreate,
@@ -44,51 +48,60 @@ async def create_rate(
     })
 
     result = await db.rates.insert_one(rate_dict)
+    await invalidate_cache(RATES_CACHE)
     rate_dict["id"] = str(result.inserted_id)
 
     return RateResponse(**rate_dict)
 
 @router.get("/", response_model=List[RateResponse])
 async def get_rates(
+    request: Request,
     status: Optional[RateStatus] = None,
     currency: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Get all rate configurations"""
-    db = get_database()
+    async def load():
+        db = get_database()
 
-    # Build query
-    query = {}
-    if status:
-        query["status"] = status
-    if currency:
-        query["currency"] = currency
+        # Build query
+        query = {}
+        if status:
+            query["status"] = status
+        if currency:
+            query["currency"] = currency
 
-    rates_cursor = db.rates.find(query).sort("created_at", -1)
-    rates_list = []
-    async for item in rates_cursor:
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        rates_list.append(item)
+        rates_cursor = db.rates.find(query).sort("created_at", -1)
+        rates_list = []
+        async for item in rates_cursor:
+            item["id"] = str(item["_id"])
+            del item["_id"]
+            rates_list.append(RateResponse(**item))
 
-    return rates_list
+        return rates_list
+
+    return await cached_response(request, RATES_CACHE, load)
 
 @router.get("/{rate_id}", response_model=RateResponse)
 async def get_rate_by_id(
+    request: Request,
     rate_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get rate configuration by ID"""
-    db = get_database()
-    rate = await db.rates.find_one({"_id": ObjectId(rate_id)})
+    async def load():
+        db = get_database()
+        rate = await db.rates.find_one({"_id": ObjectId(rate_id)})
 
-    if not rate:
-        raise HTTPException(status_code=404, detail="Rate configuration not found")
+        if not rate:
+            raise HTTPException(status_code=404, detail="Rate configuration not found")
+
+        rate["id"] = str(rate["_id"])
+        del rate["_id"]
 
-    rate["id"] = str(rate["_id"])
-    del rate["_id"]
+        return RateResponse(**rate)
 
-    return RateResponse(**rate)
+    return await cached_response(request, RATES_CACHE, load)
 
 @router.put("/{rate_id}", response_model=RateResponse)
 async def update_rate(
@@ -114,6 +127,7 @@ async def update_rate(
         update_dict["updated_at"] = datetime.utcnow()
 
         await db.rates.update_one({"_id": ObjectId(rate_id)}, {"$set": update_dict})
+        await invalidate_cache(RATES_CACHE)
 
     # Return updated rate
     updated_rate = await db.rates.find_one({"_id": ObjectId(rate_id)})
@@ -141,5 +155,6 @@ async def delete_rate(
         raise HTTPException(status_code=404, detail="Rate configuration not found")
 
     await db.rates.delete_one({"_id": ObjectId(rate_id)})
+    await invalidate_cache(RATES_CACHE)
 
     return {"message": "Rate configuration deleted successfully"}
\ No newline at end of file
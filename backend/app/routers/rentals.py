@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
 from pydantic import BaseModel
 import datetime
+import logging
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.counters import next_id, RENTAL_CONTRACT_NUMBER
+from ..utils.dashboard_stats import record_rental_created, record_rental_status_change
+from ..utils.pagination import PageParams, fetch_page
 from ..models.enquiry import EnquiryCreate, EnquiryStatus
 
 class RentalCreate(BaseModel):
@@ -50,34 +54,39 @@ class RentalResponse(BaseModel):
     assigned_salesperson_id: Optional[str] = None
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/")
-async def get_rentals(current_user: dict = Depends(get_current_user)):
-    """Get rentals for the current user or all for sales"""
+async def get_rentals(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get rentals for the current user or all for sales (paginated)"""
     try:
         db = get_database()
 
         # Fetch rentals from database
         if current_user.get("role") == "sales":
-            print(f"Fetching all rentals for sales user: {current_user['id']}")
-            rentals_cursor = db.rentals.find({})
+            logger.debug("Fetching all rentals for sales user %s", current_user["id"])
+            query = {}
         else:
-            print(f"Fetching rentals for customer user: {current_user['id']}")
-            rentals_cursor = db.rentals.find({"customer_id": current_user["id"]})
+            logger.debug("Fetching rentals for customer user %s", current_user["id"])
+            query = {"customer_id": current_user["id"]}
         rentals = []
 
-        async for rental in rentals_cursor:
+        for rental in await fetch_page(db.rentals, query, page, response):
             # Convert MongoDB _id to id for frontend compatibility
             rental["id"] = str(rental.pop("_id"))
             rentals.append(rental)
 
-        print(f"Found {len(rentals)} rentals")
+        logger.debug("Found %d rentals", len(rentals))
         return rentals
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error fetching rentals: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching rentals")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching rentals: {str(e)}"
@@ -117,9 +126,7 @@ async def create_rental(rental_data: RentalCreate, current_user: dict = Depends(
             )
 
         # Generate a unique contract number
-        current_year = datetime.datetime.now().year
-        rental_count = await db.rentals.count_documents({})
-        contract_number = f"RC-{current_year}-{str(rental_count + 1).zfill(3)}"
+        contract_number = await next_id(db, RENTAL_CONTRACT_NUMBER)
 
         # Create rental document
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
@@ -149,6 +156,7 @@ async def create_rental(rental_data: RentalCreate, current_user: dict = Depends(
 
         # Insert into database
         result = await db.rentals.insert_one(rental_doc)
+        await record_rental_created(db, rental_doc)
 
         # Return the created rental in the expected format
         rental_doc["id"] = str(result.inserted_id)
@@ -157,8 +165,7 @@ async def create_rental(rental_data: RentalCreate, current_user: dict = Depends(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating rental")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating rental: {str(e)}"
@@ -183,6 +190,7 @@ async def extend_rental(rental_id: str, extend_data: RentalExtend, current_user:
             "updated_at": now
         }
         await db.rentals.update_one({"_id": rental_id}, {"$set": update_data})
+        await record_rental_status_change(db, rental.get("status"), "extended", rental.get("total_amount"))
 
         # Return updated rental
         updated_rental = await db.rentals.find_one({"_id": rental_id})
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import logging
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.counters import next_id, CONTRACT_REQUEST_ID
+from ..utils.dashboard_stats import (
+    get_dashboard_stats, status_total, CONVERTED_RENTAL_STATUSES,
+    record_rental_status_change, record_quotation_created, record_quotation_status_change
+)
+from ..utils.pagination import PageParams, fetch_page, NEXT_CURSOR_HEADER
+from ..utils.enquiry_feed import EnquiryFeedParams, fetch_enquiry_page
 from ..models.enquiry import EnquiryResponse, EnquiryStatus
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class QuotationCreate(BaseModel):
     id: str
@@ -27,54 +36,19 @@ async def get_sales_dashboard(current_user: dict = Depends(get_current_user)):
     try:
         db = get_database()
 
-        # Get all rentals (since assigned_salesperson_id is not set in rental creation)
-        rentals_cursor = db.rentals.find({})
-        rentals_raw = await rentals_cursor.to_list(length=None)
-        rentals = []
-        for rental in rentals_raw:
-            rental_copy = rental.copy()
-            rental_copy["id"] = str(rental_copy.pop("_id"))
-            rentals.append({
-                "id": rental_copy["contract_number"],
-                "customer": rental_copy["customer_name"],
-                "project": rental_copy.get("project_name", "N/A"),
-                "date": rental_copy["created_at"][:10] if rental_copy.get("created_at") else "",
-                "status": rental_copy.get("status", "unknown"),
-                "amount": rental_copy.get("total_amount", 0)  # Add amount field
-            })
-
-        # Get active rentals (approved)
-        active_count = await db.rentals.count_documents({"status": {"$in": ["active", "approved"]}})
-
-        # Calculate monthly revenue (sum of total_amount for active rentals)
-        pipeline = [
-            {"$match": {"status": {"$in": ["active", "approved"]}}},
-            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
-        ]
-        revenue_cursor = db.rentals.aggregate(pipeline)
-        revenue_result = await revenue_cursor.to_list(length=1)
-        monthly_revenue = revenue_result[0]["total"] if revenue_result else 0
-
-        # Get quotations count
-        quotations_count = await db.quotations.count_documents({"status": "sent"})
-
-        # Get recent quotations
-        quotations_cursor = db.quotations.find({}).sort("created_at", -1).limit(5)
-        quotations_raw = await quotations_cursor.to_list(length=5)
-        recent_quotations = []
-        for quot in quotations_raw:
-            recent_quotations.append({
-                "id": quot.get("quotation_id", str(quot["_id"])),
-                "customer": quot.get("customerName", ""),
-                "project": quot.get("project", ""),
-                "amount": quot.get("totalAmount", 0),
-                "status": quot.get("status", "")
-            })
-
-        total_customers = await db.users.count_documents({"role": "customer"})
+        # Counters are maintained by the write paths (see utils/dashboard_stats.py)
+        stats = await get_dashboard_stats(db)
+
+        # Active rentals (approved) and their total_amount
+        active_count = status_total(stats, "rentals_by_status", CONVERTED_RENTAL_STATUSES)
+        monthly_revenue = status_total(stats, "rental_amount_by_status", CONVERTED_RENTAL_STATUSES)
+        quotations_count = status_total(stats, "quotations_by_status", ["sent"])
+        rentals = stats["recent_rentals"]
+        recent_quotations = stats["recent_quotations"]
+        total_customers = stats["customer_users"]
 
         return {
-            "totalEnquiries": len(rentals),
+            "totalEnquiries": stats["rentals"],
             "activeQuotations": quotations_count,
             "convertedContracts": active_count,
             "monthlyRevenue": monthly_revenue,
@@ -95,89 +69,28 @@ async def get_sales_dashboard(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error fetching sales dashboard: {str(e)}")
 
 @router.get("/enquiries")
-async def get_sales_enquiries(current_user: dict = Depends(get_current_user)):
-    """Get sales enquiries"""
+async def get_sales_enquiries(
+    response: Response,
+    page: PageParams = Depends(),
+    filters: EnquiryFeedParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get sales enquiries (stored enquiries and rental orders, newest first)"""
     try:
         db = get_database()
-        
-        print(f"\n=== SALES ENQUIRIES REQUEST ===")
-        print(f"User: {current_user.get('email')} (Role: {current_user.get('role')})")
-
-        # Query enquiries collection - for admin, show all; for sales, show assigned/unassigned
-        query = {}
-        if current_user.get("role") == "sales":
-            query = {
-                "$or": [
-                    {"assigned_salesperson_id": current_user["id"]},
-                    {"assigned_salesperson_id": None},
-                    {"assigned_salesperson_id": {"$exists": False}},
-                ]
-            }
-        
-        enquiries_cursor = db.enquiries.find(query)
-        enquiries_raw = await enquiries_cursor.to_list(length=None)
-        enquiries = []
-        for enquiry in enquiries_raw:
-            enquiry_copy = enquiry.copy()
-            enquiry_copy["id"] = str(enquiry_copy.pop("_id"))
-            # Ensure enquiry_id is set
-            if "enquiry_id" not in enquiry_copy:
-                enquiry_copy["enquiry_id"] = enquiry_copy.get("id", f"ENQ-{enquiry_copy['id'][:8]}")
-            enquiries.append(enquiry_copy)
-        
-        print(f"Found {len(enquiries)} regular enquiries from enquiries collection")
-
-        # Also include rentals - for admin, show all; for sales, show assigned/unassigned
-        rental_query = {}
-        if current_user.get("role") == "sales":
-            rental_query = {
-                "$or": [
-                    {"assigned_salesperson_id": current_user["id"]},
-                    {"assigned_salesperson_id": None},
-                    {"assigned_salesperson_id": {"$exists": False}},
-                ]
-            }
-        
-        rentals_cursor = db.rentals.find(rental_query)
-        rentals_raw = await rentals_cursor.to_list(length=None)
-        
-        print(f"Found {len(rentals_raw)} rental orders in database")
-
-        for rental in rentals_raw:
-            rental_copy = rental.copy()
-            rental_copy["id"] = str(rental_copy.pop("_id"))
-            # Convert rental to enquiry format
-            enquiry_format = {
-                "id": rental_copy["id"],
-                "enquiry_id": rental_copy.get("contract_number", f"RENTAL-{rental_copy['id'][:8]}"),
-                "customer_id": rental_copy.get("customer_id", ""),
-                "customer_name": rental_copy.get("customer_name", "Unknown Customer"),
-                "customer_email": rental_copy.get("contact_email", ""),
-                "equipment_name": f"{rental_copy.get('equipment_category', '')} - {rental_copy.get('equipment_type', '')}".strip(' - '),
-                "quantity": rental_copy.get("quantity", 1),
-                "rental_duration_days": 30,  # Default duration
-                "delivery_location": rental_copy.get("delivery_address", ""),
-                "expected_delivery_date": rental_copy.get("start_date", ""),
-                "special_instructions": rental_copy.get("special_requirements", ""),
-                "assigned_salesperson_id": rental_copy.get("assigned_salesperson_id", None),
-                "assigned_salesperson_name": rental_copy.get("assigned_salesperson_name", None),
-                "status": rental_copy.get("status", "submitted_by_customer"),  # Use actual status
-                "enquiry_date": rental_copy.get("created_at", ""),
-                "created_at": rental_copy.get("created_at", ""),
-                "updated_at": rental_copy.get("updated_at", rental_copy.get("created_at", "")),
-                "is_rental_order": True  # Flag to identify rental-based enquiries
-            }
-            enquiries.append(enquiry_format)
 
-        print(f"Total enquiries to return: {len(enquiries)}")
-        print(f"=== END SALES ENQUIRIES REQUEST ===\n")
-        
+        # For admin, show all; for sales, show assigned/unassigned
+        visible_to = current_user["id"] if current_user.get("role") == "sales" else None
+        enquiries, next_cursor = await fetch_enquiry_page(
+            db, filters.query(visible_to), page.cursor, page.limit, filters.direction
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return enquiries
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"ERROR in get_sales_enquiries: {str(e)}")
-        import traceback
-        traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error fetching enquiries: {str(e)}")
 
 @router.put("/enquiries/{enquiry_id}/status")
@@ -198,13 +111,15 @@ async def update_enquiry_status(enquiry_id: str, status_data: dict, current_user
                 update_data["assigned_salesperson_id"] = status_data["assigned_salesperson_id"]
                 update_data["assigned_salesperson_name"] = status_data.get("assigned_salesperson_name")
 
-            result = await db.rentals.update_one(
+            rental = await db.rentals.find_one_and_update(
                 {"contract_number": enquiry_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"status": 1, "total_amount": 1}
             )
 
-            if result.modified_count == 0:
+            if not rental:
                 raise HTTPException(status_code=404, detail="Rental order not found")
+            await record_rental_status_change(db, rental.get("status"), update_data["status"], rental.get("total_amount"))
 
             return {"message": "Rental order status updated successfully"}
         else:
@@ -234,14 +149,17 @@ async def update_enquiry_status(enquiry_id: str, status_data: dict, current_user
         raise HTTPException(status_code=500, detail=f"Error updating enquiry status: {str(e)}")
 
 @router.get("/quotations")
-async def get_sales_quotations(current_user: dict = Depends(get_current_user)):
-    """Get sales quotations"""
+async def get_sales_quotations(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get sales quotations (paginated)"""
     try:
         db = get_database()
 
         # Query from quotations collection
-        quotations_cursor = db.quotations.find({})
-        quotations_raw = await quotations_cursor.to_list(length=None)
+        quotations_raw = await fetch_page(db.quotations, {}, page, response)
         quotations = []
         for quotation in quotations_raw:
             quotation_copy = quotation.copy()
@@ -250,6 +168,8 @@ async def get_sales_quotations(current_user: dict = Depends(get_current_user)):
 
         return quotations
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching quotations: {str(e)}")
 
@@ -272,10 +192,11 @@ async def create_quotation(quotation_data: QuotationCreate, current_user: dict =
         quotation_dict["updated_at"] = now.isoformat()
         quotation_dict["created_by"] = current_user["id"]
         
-        print(f"Creating quotation with ID: {quotation_dict['quotation_id']}, Status: {quotation_dict['status']}")
+        logger.info("Creating quotation %s with status %s", quotation_dict["quotation_id"], quotation_dict["status"])
 
         # Insert into database
         result = await db.quotations.insert_one(quotation_dict)
+        await record_quotation_created(db, quotation_dict)
 
         return {
             "id": str(result.inserted_id),
@@ -284,7 +205,7 @@ async def create_quotation(quotation_data: QuotationCreate, current_user: dict =
         }
 
     except Exception as e:
-        print(f"Error creating quotation: {str(e)}")
+        logger.exception("Error creating quotation")
         raise HTTPException(status_code=500, detail=f"Error creating quotation: {str(e)}")
 
 @router.put("/quotations/{quotation_id}/send")
@@ -301,43 +222,49 @@ async def send_quotation(quotation_id: str, current_user: dict = Depends(get_cur
             "updated_at": datetime.now().isoformat()
         }
         
-        print(f"Sending quotation {quotation_id} for approval")
+        logger.debug("Sending quotation %s for approval", quotation_id)
 
-        # Try to find by id first, then by quotation_id
-        result = await db.quotations.update_one(
+        # Try to find by id first, then by quotation_id (returns the previous document)
+        quotation = await db.quotations.find_one_and_update(
             {"id": quotation_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"status": 1}
         )
 
-        if result.modified_count == 0:
+        if not quotation:
             # Try with quotation_id field
-            result = await db.quotations.update_one(
+            quotation = await db.quotations.find_one_and_update(
                 {"quotation_id": quotation_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"status": 1}
             )
 
-        if result.modified_count == 0:
+        if not quotation:
             raise HTTPException(status_code=404, detail="Quotation not found")
+        await record_quotation_status_change(db, quotation.get("status"), "sent")
         
-        print(f"Quotation {quotation_id} sent successfully, status updated to 'sent'")
+        logger.info("Quotation %s sent for approval", quotation_id)
 
         return {"message": "Quotation sent for approval successfully"}
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error sending quotation: {str(e)}")
+        logger.exception("Error sending quotation %s", quotation_id)
         raise HTTPException(status_code=500, detail=f"Error sending quotation: {str(e)}")
 
 @router.get("/orders")
-async def get_sales_orders(current_user: dict = Depends(get_current_user)):
-    """Get sales orders"""
+async def get_sales_orders(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get sales orders (paginated)"""
     try:
         db = get_database()
 
         # Query from sales_orders collection
-        orders_cursor = db.sales_orders.find({})
-        orders_raw = await orders_cursor.to_list(length=None)
+        orders_raw = await fetch_page(db.sales_orders, {}, page, response)
         orders = []
         for order in orders_raw:
             order_copy = order.copy()
@@ -346,6 +273,8 @@ async def get_sales_orders(current_user: dict = Depends(get_current_user)):
 
         return orders
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching sales orders: {str(e)}")
 
@@ -398,8 +327,7 @@ async def create_contract_request(order_id: str, current_user: dict = Depends(ge
             raise HTTPException(status_code=400, detail="Contract request already exists for this sales order")
 
         # Create contract request
-        contract_count = await db.contracts.count_documents({})
-        contract_id = f"CNT-2025-{str(contract_count + 1).zfill(3)}"
+        contract_id = await next_id(db, CONTRACT_REQUEST_ID)
         
         contract_request = {
             "contract_id": contract_id,
@@ -447,14 +375,17 @@ async def create_contract_request(order_id: str, current_user: dict = Depends(ge
         raise HTTPException(status_code=500, detail=f"Error creating contract request: {str(e)}")
 
 @router.get("/contracts")
-async def get_sales_contracts(current_user: dict = Depends(get_current_user)):
-    """Get sales contracts"""
+async def get_sales_contracts(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get sales contracts (paginated)"""
     try:
         db = get_database()
 
         # Query from contracts collection
-        contracts_cursor = db.contracts.find({})
-        contracts_raw = await contracts_cursor.to_list(length=None)
+        contracts_raw = await fetch_page(db.contracts, {}, page, response)
         contracts = []
         for contract in contracts_raw:
             contract_copy = contract.copy()
@@ -463,6 +394,8 @@ async def get_sales_contracts(current_user: dict = Depends(get_current_user)):
 
         return contracts
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching contracts: {str(e)}")
 
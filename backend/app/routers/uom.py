@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
@@ -11,10 +11,14 @@ from ..models.uom import (
 )
 from ..utils.database import get_database
 from ..utils.auth import get_current_user
+from ..utils.response_cache import cached_response, invalidate_cache
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Response cache namespace, cleared on every create/update/delete
+UOM_CACHE = "uom"
+
 @router.post("/", response_model=UOMResponse)
 async def create_uom(
     uom_data: UOMCreate,
@@ -44,48 +48,57 @@ async def create_uom(
     })
 
     result = await db.uom.insert_one(uom_dict)
+    await invalidate_cache(UOM_CACHE)
     uom_dict["id"] = str(result.inserted_id)
 
     return UOMResponse(**uom_dict)
 
 @router.get("/", response_model=List[UOMResponse])
 async def get_uom(
+    request: Request,
     status: Optional[UOMStatus] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Get all units of measurement"""
-    db = get_database()
+    async def load():
+        db = get_database()
 
-    # Build query
-    query = {}
-    if status:
-        query["status"] = status
+        # Build query
+        query = {}
+        if status:
+            query["status"] = status
 
-    uom_cursor = db.uom.find(query).sort("created_at", -1)
-    uom_list = []
-    async for item in uom_cursor:
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        uom_list.append(item)
+        uom_cursor = db.uom.find(query).sort("created_at", -1)
+        uom_list = []
+        async for item in uom_cursor:
+            item["id"] = str(item["_id"])
+            del item["_id"]
+            uom_list.append(UOMResponse(**item))
 
-    return uom_list
+        return uom_list
+
+    return await cached_response(request, UOM_CACHE, load)
 
 @router.get("/{uom_id}", response_model=UOMResponse)
 async def get_uom_by_id(
+    request: Request,
     uom_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get unit of measurement by ID"""
-    db = get_database()
-    uom = await db.uom.find_one({"_id": ObjectId(uom_id)})
+    async def load():
+        db = get_database()
+        uom = await db.uom.find_one({"_id": ObjectId(uom_id)})
 
-    if not uom:
-        raise HTTPException(status_code=404, detail="Unit of measurement not found")
+        if not uom:
+            raise HTTPException(status_code=404, detail="Unit of measurement not found")
+
+        uom["id"] = str(uom["_id"])
+        del uom["_id"]
 
-    uom["id"] = str(uom["_id"])
-    del uom["_id"]
+        return UOMResponse(**uom)
 
-    return UOMResponse(**uom)
+    return await cached_response(request, UOM_CACHE, load)
 
 @router.put("/{uom_id}", response_model=UOMResponse)
 async def update_uom(
@@ -111,6 +124,7 @@ async def update_uom(
         update_dict["updated_at"] = datetime.utcnow()
 
         await db.uom.update_one({"_id": ObjectId(uom_id)}, {"$set": update_dict})
+        await invalidate_cache(UOM_CACHE)
 
     # Return updated uom
     updated_uom = await db.uom.find_one({"_id": ObjectId(uom_id)})
@@ -138,5 +152,6 @@ async def delete_uom(
         raise HTTPException(status_code=404, detail="Unit of measurement not found")
 
     await db.uom.delete_one({"_id": ObjectId(uom_id)})
+    await invalidate_cache(UOM_CACHE)
 
     return {"message": "Unit of measurement deleted successfully"}
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
@@ -11,10 +11,14 @@ from ..models.vat import (
 )
 from ..utils.database import get_database
 from ..utils.auth import get_current_user
+from ..utils.response_cache import cached_response, invalidate_cache
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Response cache namespace, cleared on every create/update/delete
+VAT_CACHE = "vat_rates"
+
 @router.post("/", response_model=VATResponse)
 async def create_vat(
     vat_data: VATCreate,
@@ -36,48 +40,57 @@ async def create_vat(
     })
 
     result = await db.vat_rates.insert_one(vat_dict)
+    await invalidate_cache(VAT_CACHE)
     vat_dict["id"] = str(result.inserted_id)
 
     return VATResponse(**vat_dict)
 
 @router.get("/", response_model=List[VATResponse])
 async def get_vat_rates(
+    request: Request,
     status: Optional[VATStatus] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Get all VAT rates"""
-    db = get_database()
+    async def load():
+        db = get_database()
 
-    # Build query
-    query = {}
-    if status:
-        query["status"] = status
+        # Build query
+        query = {}
+        if status:
+            query["status"] = status
 
-    vat_cursor = db.vat_rates.find(query).sort("created_at", -1)
-    vat_list = []
-    async for item in vat_cursor:
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        vat_list.append(item)
+        vat_cursor = db.vat_rates.find(query).sort("created_at", -1)
+        vat_list = []
+        async for item in vat_cursor:
+            item["id"] = str(item["_id"])
+            del item["_id"]
+            vat_list.append(VATResponse(**item))
 
-    return vat_list
+        return vat_list
+
+    return await cached_response(request, VAT_CACHE, load)
 
 @router.get("/{vat_id}", response_model=VATResponse)
 async def get_vat_by_id(
+    request: Request,
     vat_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get VAT rate by ID"""
-    db = get_database()
-    vat = await db.vat_rates.find_one({"_id": ObjectId(vat_id)})
+    async def load():
+        db = get_database()
+        vat = await db.vat_rates.find_one({"_id": ObjectId(vat_id)})
 
-    if not vat:
-        raise HTTPException(status_code=404, detail="VAT rate not found")
+        if not vat:
+            raise HTTPException(status_code=404, detail="VAT rate not found")
+
+        vat["id"] = str(vat["_id"])
+        del vat["_id"]
 
-    vat["id"] = str(vat["_id"])
-    del vat["_id"]
+        return VATResponse(**vat)
 
-    return VATResponse(**vat)
+    return await cached_response(request, VAT_CACHE, load)
 
 @router.put("/{vat_id}", response_model=VATResponse)
 async def update_vat(
@@ -103,6 +116,7 @@ async def update_vat(
         update_dict["updated_at"] = datetime.utcnow()
 
         await db.vat_rates.update_one({"_id": ObjectId(vat_id)}, {"$set": update_dict})
+        await invalidate_cache(VAT_CACHE)
 
     # Return updated vat
     updated_vat = await db.vat_rates.find_one({"_id": ObjectId(vat_id)})
@@ -130,5 +144,6 @@ async def delete_vat(
         raise HTTPException(status_code=404, detail="VAT rate not found")
 
     await db.vat_rates.delete_one({"_id": ObjectId(vat_id)})
+    await invalidate_cache(VAT_CACHE)
 
     return {"message": "VAT rate deleted successfully"}
\ No newline at end of file
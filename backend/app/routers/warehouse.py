@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
 from ..utils.auth import get_current_user
 from ..utils.database import get_database
+from ..utils.dashboard_stats import get_dashboard_stats
+from ..utils.pagination import PageParams, fetch_page
 
 router = APIRouter()
 
@@ -12,37 +14,15 @@ async def get_warehouse_dashboard(current_user: dict = Depends(get_current_user)
     try:
         db = get_database()
 
-        # Get pending dispatches - handle if collection doesn't exist
-        try:
-            pending_dispatch = await db.equipment_dispatch.count_documents({"status": "active"})
-        except Exception:
-            pending_dispatch = 0
-
-        # Get expected returns (rentals ending in next 7 days)
-        try:
-            next_week = datetime.utcnow() + timedelta(days=7)
-            expected_returns = await db.rentals.count_documents({
-                "status": {"$in": ["active", "extended"]},
-                "end_date": {"$lte": next_week.isoformat()}
-            })
-        except Exception:
-            expected_returns = 0
-
-        # Get low stock items (available < 10)
-        try:
-            low_stock_items = await db.equipment.count_documents({"quantity_available": {"$lt": 10}})
-        except Exception:
-            low_stock_items = 0
-
-        # Get equipment utilization
-        try:
-            total_equipment = await db.equipment.count_documents({})
-            available_equipment = await db.equipment.count_documents({"quantity_available": {"$gt": 0}})
-            rented_equipment = await db.equipment.count_documents({"quantity_rented": {"$gt": 0}})
-        except Exception:
-            total_equipment = 0
-            available_equipment = 0
-            rented_equipment = 0
+        # Counters are maintained by the write paths (see utils/dashboard_stats.py);
+        # expected returns are refreshed by the periodic reconciliation
+        stats = await get_dashboard_stats(db)
+        pending_dispatch = stats["active_dispatches"]
+        expected_returns = stats["expected_returns"]
+        low_stock_items = stats["equipment_low_stock"]
+        total_equipment = stats["equipment_total"]
+        available_equipment = stats["equipment_available"]
+        rented_equipment = stats["equipment_rented"]
 
         equipment_utilization = [
             {"status": "Available", "count": available_equipment, "color": "bg-green-500"},
@@ -136,14 +116,17 @@ async def dispatch_sales_order(order_id: str, current_user: dict = Depends(get_c
         raise HTTPException(status_code=500, detail=f"Error dispatching order: {str(e)}")
 
 @router.get("/dispatch")
-async def get_warehouse_dispatch(current_user: dict = Depends(get_current_user)):
-    """Get dispatches from sales orders for delivery management"""
+async def get_warehouse_dispatch(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get dispatches from sales orders for delivery management (paginated)"""
     try:
         db = get_database()
 
         # Get dispatch records created from sales orders
-        dispatches_cursor = db.dispatches.find({})
-        dispatches_raw = await dispatches_cursor.to_list(length=None)
+        dispatches_raw = await fetch_page(db.dispatches, {}, page, response)
         
         dispatches = []
         for dispatch in dispatches_raw:
@@ -153,6 +136,8 @@ async def get_warehouse_dispatch(current_user: dict = Depends(get_current_user))
 
         return dispatches
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching dispatches: {str(e)}")
 
@@ -7,6 +7,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 
 from .database import get_database
+from .principal_cache import principal_cache
+from .password_pool import password_pool
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
@@ -21,6 +23,21 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool; raises PasswordPoolBusy when the queue is full"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool; raises PasswordPoolBusy when the queue is full"""
+    return await password_pool.run(get_password_hash, password)
+
+def password_pool_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests are being processed. Please try again shortly.",
+        headers={"Retry-After": "1"},
+    )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -67,19 +84,27 @@ async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] =
     except JWTError:
         raise credentials_exception
 
+    principal = principal_cache.get(email)
+    if principal is not None:
+        # Copy so request handlers can't modify the cached entry
+        return dict(principal)
+
     # Check database for registered users first
+    generation = principal_cache.generation
     db = get_database()
     user = await db.users.find_one({"email": email})
 
     if user is None:
         raise credentials_exception
 
-    return {
+    principal = {
         "email": user["email"],
         "role": user["role"],
         "name": user["full_name"],
         "id": str(user["_id"])
     }
+    principal_cache.put(email, principal, generation)
+    return dict(principal)
 
 def is_admin_or_super_admin(user: dict) -> bool:
     """Check if user has admin or super_admin role"""
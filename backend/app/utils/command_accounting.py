@@ -0,0 +1,218 @@
+"""
+Per-request MongoDB command accounting and N+1 detection.
+
+CommandAccountingMiddleware opens a RequestCommands record for every HTTP request and keeps it
+in a ContextVar. The CommandAccountant listener, registered on the MongoDB client (and on the
+in-memory engine), adds every command the request issues to that record: the command name,
+the time the server spent on it and the size of the result batch. Motor runs driver calls
+through contextvars.copy_context(), so listener callbacks on the driver threads see the record
+of the request that issued the command. Commands issued outside a request (startup, background
+jobs) have no record and are not counted.
+
+A request is flagged, and logged with its route, when it issues more than QUERY_BUDGET commands
+or the same query shape (collection, filter fields, sort fields; see indexes.command_shape) more
+than REPEATED_QUERY_LIMIT times, the signature of a per-row lookup in a loop (N+1).
+
+Outside production (or with DB_COMMAND_HEADERS=true) every response carries its record:
+    X-DB-Commands: 12
+    X-DB-Command-Types: find=10,aggregate=2
+    X-DB-Time-Ms: 8.4
+    X-DB-Max-Batch: 100
+    X-DB-Warnings: customer_documents(customer_id) repeated 10 times
+Per-route totals are kept in every environment (route_command_stats,
+GET /api/admin/db-command-stats).
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from .indexes import command_shape
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "25"))
+REPEATED_QUERY_LIMIT = int(os.getenv("REPEATED_QUERY_LIMIT", "5"))
+DB_COMMAND_HEADERS = os.getenv(
+    "DB_COMMAND_HEADERS", "false" if os.getenv("ENVIRONMENT", "development") == "production" else "true"
+).lower() in ("1", "true", "yes")
+
+# (collection, filter fields, sort fields), as returned by indexes.command_shape
+Shape = Tuple[str, Tuple[str, ...], Tuple[str, ...]]
+
+
+def describe_shape(shape: Shape) -> str:
+    collection, fields, sort = shape
+    text = f"{collection}({','.join(fields)})"
+    return f"{text} sort({','.join(sort)})" if sort else text
+
+
+def reply_batch_size(reply) -> int:
+    """Documents returned by a command reply (cursor batch, findAndModify value, distinct values)"""
+    if not isinstance(reply, dict):
+        return 0
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if isinstance(batch, list) else 0
+    if isinstance(reply.get("values"), list):
+        return len(reply["values"])
+    return 1 if reply.get("value") is not None else 0
+
+
+class RequestCommands:
+    """Commands issued while serving one request (updated from the driver's worker threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.by_type: Counter = Counter()
+        self.shapes: Counter = Counter()
+        self.db_time_micros = 0
+        self.max_batch = 0
+
+    def started(self, command_name: str, command: dict):
+        shape = command_shape(command_name, command)
+        with self._lock:
+            self.count += 1
+            self.by_type[command_name] += 1
+            if shape is not None:
+                self.shapes[shape] += 1
+
+    def finished(self, duration_micros: int, batch_size: int = 0):
+        with self._lock:
+            self.db_time_micros += duration_micros
+            self.max_batch = max(self.max_batch, batch_size)
+
+    @property
+    def db_time_ms(self) -> float:
+        return self.db_time_micros / 1000
+
+    def repeated_shapes(self, limit: int = REPEATED_QUERY_LIMIT) -> List[Tuple[Shape, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > limit]
+
+    def warnings(self, budget: int = QUERY_BUDGET, limit: int = REPEATED_QUERY_LIMIT) -> List[str]:
+        warnings = []
+        if self.count > budget:
+            warnings.append(f"{self.count} commands exceed the budget of {budget}")
+        for shape, count in self.repeated_shapes(limit):
+            warnings.append(f"{describe_shape(shape)} repeated {count} times")
+        return warnings
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        types = ",".join(f"{name}={count}" for name, count in self.by_type.most_common())
+        headers = [
+            (b"x-db-commands", str(self.count).encode()),
+            (b"x-db-command-types", types.encode()),
+            (b"x-db-time-ms", f"{self.db_time_ms:.1f}".encode()),
+            (b"x-db-max-batch", str(self.max_batch).encode()),
+        ]
+        warnings = self.warnings()
+        if warnings:
+            headers.append((b"x-db-warnings", "; ".join(warnings).encode()))
+        return headers
+
+
+current_commands: ContextVar[Optional[RequestCommands]] = ContextVar("current_commands", default=None)
+
+
+class CommandAccountant(monitoring.CommandListener):
+    """Adds each command to the record of the request that issued it"""
+
+    def started(self, event):
+        commands = current_commands.get()
+        if commands is not None:
+            commands.started(event.command_name, event.command)
+
+    def succeeded(self, event):
+        commands = current_commands.get()
+        if commands is not None:
+            commands.finished(event.duration_micros, reply_batch_size(event.reply))
+
+    def failed(self, event):
+        commands = current_commands.get()
+        if commands is not None:
+            commands.finished(event.duration_micros)
+
+
+command_accountant = CommandAccountant()
+
+
+class RouteCommandStats:
+    """Per-route totals of the request records (touched from the event loop only)"""
+
+    def __init__(self):
+        self._routes: Dict[str, dict] = {}
+
+    def record(self, route: str, commands: RequestCommands, flagged: bool):
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = {
+                "requests": 0, "commands": 0, "db_time_ms": 0.0,
+                "max_commands": 0, "max_batch": 0, "flagged": 0,
+            }
+        stats["requests"] += 1
+        stats["commands"] += commands.count
+        stats["db_time_ms"] += commands.db_time_ms
+        stats["max_commands"] = max(stats["max_commands"], commands.count)
+        stats["max_batch"] = max(stats["max_batch"], commands.max_batch)
+        stats["flagged"] += int(flagged)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Routes by total commands, with per-request averages"""
+        snapshot = {}
+        for route, stats in sorted(self._routes.items(), key=lambda item: -item[1]["commands"]):
+            snapshot[route] = {
+                **stats,
+                "db_time_ms": round(stats["db_time_ms"], 1),
+                "commands_per_request": round(stats["commands"] / stats["requests"], 2),
+            }
+        return snapshot
+
+    def clear(self):
+        self._routes.clear()
+
+
+route_command_stats = RouteCommandStats()
+
+
+def route_label(scope) -> str:
+    """Method and path template of the matched route, so per-id URLs share one entry"""
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else 'unmatched'}"
+
+
+class CommandAccountingMiddleware:
+    """ASGI middleware: opens the request record, adds the headers and logs flagged requests"""
+
+    def __init__(self, app, headers: bool = DB_COMMAND_HEADERS):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        commands = RequestCommands()
+        token = current_commands.set(commands)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + commands.headers()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.headers else send)
+        finally:
+            current_commands.reset(token)
+            route = route_label(scope)
+            warnings = commands.warnings()
+            if warnings:
+                logger.warning("%s issued %d MongoDB commands: %s", route, commands.count, "; ".join(warnings),
+                               extra={"route": route, "db_commands": commands.count})
+            route_command_stats.record(route, commands, bool(warnings))
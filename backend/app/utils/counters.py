@@ -0,0 +1,141 @@
+"""
+Atomic sequence counters for human-readable document IDs (LEAD-2025-0001, EMP-0001, ...).
+
+Each sequence lives in the `counters` collection as {"_id": "<PREFIX>[-<YEAR>]", "seq": <last value>}
+and is advanced with a single find_one_and_update($inc, upsert). The first time a sequence is
+used it is seeded from the highest ID already stored, so existing data never collides.
+
+Set ID_BLOCK_SIZE > 1 to let each worker reserve a block of values at once and hand them out
+without a database round trip (unused values in a block are skipped after a restart).
+"""
+import asyncio
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "1"))
+
+
+class IdSequence(NamedTuple):
+    prefix: str
+    width: int
+    yearly: bool
+    # (collection, field) pairs that already hold IDs of this sequence
+    sources: Tuple[Tuple[str, str], ...]
+
+
+LEAD_ID = IdSequence("LEAD", 4, True, (("leads", "lead_id"),))
+ENQUIRY_ID = IdSequence("ENQ", 4, True, (("enquiries", "enquiry_id"), ("rentals", "enquiry_id")))
+RENTAL_CONTRACT_NUMBER = IdSequence("RC", 3, True, (("rentals", "contract_number"), ("contracts", "contract_id")))
+CONTRACT_REQUEST_ID = IdSequence("CNT", 3, True, (("contracts", "contract_id"),))
+SALES_ORDER_ID = IdSequence("SO", 3, True, (("sales_orders", "sales_order_id"),))
+INVOICE_ID = IdSequence("INV", 3, True, (("invoices", "invoice_id"),))
+EMPLOYEE_ID = IdSequence("EMP", 4, False, (("employees", "employee_id"),))
+CUSTOMER_ID = IdSequence("CUST", 4, False, (("customers", "customer_id"),))
+
+
+def sequence_key(sequence: IdSequence, year: Optional[int] = None) -> str:
+    """Counter document _id (and ID prefix) for a sequence, e.g. LEAD-2025 or EMP"""
+    if sequence.yearly:
+        return f"{sequence.prefix}-{year or datetime.now().year}"
+    return sequence.prefix
+
+
+def format_id(key: str, value: int, width: int) -> str:
+    return f"{key}-{str(value).zfill(width)}"
+
+
+def parse_sequence_number(value, key: str) -> Optional[int]:
+    """Sequence number of an ID under `key` (the last numeric segment), or None"""
+    if not isinstance(value, str) or not value.startswith(f"{key}-"):
+        return None
+    last = value.rsplit("-", 1)[-1]
+    return int(last) if last.isdigit() else None
+
+
+class MongoCounterStore:
+    """Hands out sequence values, reserving them from the `counters` collection in blocks"""
+
+    def __init__(self, db, block_size: int = 1):
+        self.db = db
+        self.block_size = max(1, block_size)
+        self._blocks: Dict[str, List[int]] = {}  # key -> [next value, last reserved value]
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._seeded: set = set()
+
+    async def _increment(self, key: str, count: int) -> int:
+        """Atomically add `count` to the counter and return the new value"""
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"]
+
+    async def _seed(self, key: str, sources: Tuple[Tuple[str, str], ...]):
+        """Raise the counter to at least the highest ID already stored"""
+        if await self.db.counters.find_one({"_id": key}):
+            return
+        # One-time scan per sequence; afterwards the counter document is authoritative
+        highest = 0
+        for collection, field in sources:
+            cursor = getattr(self.db, collection).find(
+                {field: {"$regex": f"^{re.escape(key)}-"}},
+                {field: 1}
+            )
+            async for doc in cursor:
+                num = parse_sequence_number(doc.get(field), key)
+                if num is not None:
+                    highest = max(highest, num)
+        await self.db.counters.update_one({"_id": key}, {"$max": {"seq": highest}}, upsert=True)
+
+    async def reserve(self, key: str, count: int = 1, sources: Tuple[Tuple[str, str], ...] = ()) -> List[int]:
+        """Reserve `count` unused values for `key`, in increasing order"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key not in self._seeded:
+                await self._seed(key, sources)
+                self._seeded.add(key)
+
+            values: List[int] = []
+            block = self._blocks.get(key)
+            while block and block[0] <= block[1] and len(values) < count:
+                values.append(block[0])
+                block[0] += 1
+
+            remaining = count - len(values)
+            if remaining:
+                reserve = max(remaining, self.block_size)
+                last = await self._increment(key, reserve)
+                first = last - reserve + 1
+                values.extend(range(first, first + remaining))
+                self._blocks[key] = [first + remaining, last]
+            return values
+
+
+_stores: Dict[int, MongoCounterStore] = {}
+
+
+def get_counter_store(db) -> MongoCounterStore:
+    """Counter store bound to `db` (one per database object, so reserved blocks are shared)"""
+    store = _stores.get(id(db))
+    if store is None or store.db is not db:
+        store = MongoCounterStore(db, ID_BLOCK_SIZE)
+        _stores[id(db)] = store
+    return store
+
+
+async def next_ids(db, sequence: IdSequence, count: int, year: Optional[int] = None) -> List[str]:
+    """Allocate `count` new IDs from a sequence"""
+    key = sequence_key(sequence, year)
+    values = await get_counter_store(db).reserve(key, count, sequence.sources)
+    return [format_id(key, value, sequence.width) for value in values]
+
+
+async def next_id(db, sequence: IdSequence, year: Optional[int] = None) -> str:
+    """Allocate one new ID from a sequence, e.g. await next_id(db, LEAD_ID) -> LEAD-2025-0042"""
+    return (await next_ids(db, sequence, 1, year))[0]
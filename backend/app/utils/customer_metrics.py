@@ -0,0 +1,176 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import Query, Response
+
+from .pagination import PAGE_SIZE_MAX, PageParams, fetch_page
+from .repository import View, find_page_view
+
+# Pending/overdue invoices count towards a customer's outstanding balance
+OUTSTANDING_INVOICE_STATUSES = ["pending", "overdue"]
+
+CUSTOMER_PAGE_SIZE = int(os.getenv("CUSTOMER_PAGE_SIZE", "100"))
+
+
+def first_truthy_amount(*fields: str) -> dict:
+    """Build an expression equivalent to `doc.get(a) or doc.get(b) or ... or 0`"""
+    expression: Any = {"$ifNull": [f"${fields[-1]}", 0]}
+    for field in reversed(fields[:-1]):
+        expression = {"$cond": [f"${field}", f"${field}", expression]}
+    return expression
+
+
+AMOUNT_EXPRESSION = first_truthy_amount("totalAmount", "total_amount", "amount")
+
+
+class CustomerPageParams(PageParams):
+    """Like PageParams, but pages are always bounded: metrics are computed for every customer on a page"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        limit: int = Query(CUSTOMER_PAGE_SIZE, ge=1, le=PAGE_SIZE_MAX, description="Page size")
+    ):
+        super().__init__(cursor, limit)
+
+
+def format_customer_document(doc: dict) -> dict:
+    """Map a customer_documents record to the shape used by the CRM UI"""
+    return {
+        "name": doc.get("name") or doc.get("document_name") or "Unnamed Document",
+        "type": doc.get("type") or doc.get("document_type") or "N/A",
+        "status": doc.get("status") or "pending",
+        "uploadDate": doc.get("uploadDate") or doc.get("upload_date") or doc.get("created_at") or "N/A",
+        "expiryDate": doc.get("expiryDate") or doc.get("expiry_date") or None
+    }
+
+
+async def _group_by_customer(collection, keys: list, group: dict, extra_match: Optional[dict] = None) -> Dict[str, dict]:
+    """Run one $group pipeline over all requested customer keys, indexed by str(customer_id)"""
+    match = {"customer_id": {"$in": keys}}
+    if extra_match:
+        match.update(extra_match)
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$customer_id", **group}}
+    ]
+    rows = await collection.aggregate(pipeline).to_list(length=None)
+    return {str(row["_id"]): row for row in rows}
+
+
+async def fetch_crm_customers(
+    db,
+    page: PageParams,
+    response: Response,
+    view: Optional[View] = None
+) -> List[dict]:
+    """Load a page of customers with contract, feedback, invoice and document metrics.
+
+    Customers are read in creation (_id) order and keyset-paginated; the next page's cursor is
+    set on `response`. customer_id is only displayed: its CUST-#### strings stop sorting
+    numerically past CUST-9999. `page.limit` is required. When a view is given, only its
+    customer fields are loaded.
+
+    Uses a fixed number of queries regardless of how many customers are returned:
+    one for the customer page, one $group each for contracts, feedback and invoices,
+    and one find for documents.
+    """
+    if page.limit is None:
+        raise ValueError("customer pages need a limit")
+    if view:
+        customers_raw = await find_page_view(db.customers, {}, view, page, response)
+    else:
+        customers_raw = await fetch_page(db.customers, {}, page, response)
+    if not customers_raw:
+        return []
+
+    customers = []
+    owners: Dict[str, int] = {}  # str(key) -> index into customers
+    raw_keys: list = []
+    string_keys: List[str] = []
+    formatted_ids: List[str] = []
+
+    for index, customer in enumerate(customers_raw):
+        customer_copy = customer.copy()
+        mongo_id = customer_copy.pop("_id", None)
+        mongo_id_str = str(mongo_id) if mongo_id else ""
+        # Customer ids are normalized by `python -m app.utils.migrations`
+        display_customer_id = customer_copy.get("customer_id") or mongo_id_str
+
+        customer_copy["id"] = display_customer_id
+        customer_copy["_id"] = mongo_id_str  # Keep MongoDB ID for internal reference
+        customers.append(customer_copy)
+
+        # Related records may reference either the MongoDB _id or the formatted customer_id
+        for key in (mongo_id, display_customer_id):
+            if key:
+                raw_keys.append(key)
+                owners.setdefault(str(key), index)
+        for key in (mongo_id_str, display_customer_id):
+            if key:
+                string_keys.append(key)
+        if display_customer_id:
+            formatted_ids.append(display_customer_id)
+
+    contract_stats = await _group_by_customer(db.contracts, raw_keys, {
+        "active": {"$sum": {"$cond": [{"$eq": ["$status", "active"]}, 1, 0]}},
+        "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+        "total_value": {"$sum": AMOUNT_EXPRESSION}
+    })
+    feedback_stats = await _group_by_customer(db.feedback, raw_keys, {
+        "score_total": {"$sum": {"$ifNull": ["$score", 0]}},
+        "count": {"$sum": 1}
+    })
+    invoice_stats = await _group_by_customer(db.invoices, raw_keys, {
+        "outstanding": {"$sum": AMOUNT_EXPRESSION}
+    }, extra_match={"status": {"$in": OUTSTANDING_INVOICE_STATUSES}})
+
+    documents_cursor = db.customer_documents.find(
+        {"$or": [
+            {"customer_id": {"$in": string_keys}},
+            {"customer_id_formatted": {"$in": formatted_ids}}
+        ]},
+        {
+            "customer_id": 1, "customer_id_formatted": 1,
+            "name": 1, "document_name": 1, "type": 1, "document_type": 1, "status": 1,
+            "uploadDate": 1, "upload_date": 1, "created_at": 1, "expiryDate": 1, "expiry_date": 1
+        }
+    )
+    documents = await documents_cursor.to_list(length=None)
+
+    totals = [
+        {"active": 0, "completed": 0, "total_value": 0, "score_total": 0, "feedback_count": 0,
+         "outstanding": 0, "documents": []}
+        for _ in customers
+    ]
+    for key, index in owners.items():
+        if key in contract_stats:
+            totals[index]["active"] += contract_stats[key]["active"]
+            totals[index]["completed"] += contract_stats[key]["completed"]
+            totals[index]["total_value"] += contract_stats[key]["total_value"]
+        if key in feedback_stats:
+            totals[index]["score_total"] += feedback_stats[key]["score_total"]
+            totals[index]["feedback_count"] += feedback_stats[key]["count"]
+        if key in invoice_stats:
+            totals[index]["outstanding"] += invoice_stats[key]["outstanding"]
+
+    for doc in documents:
+        index = owners.get(str(doc.get("customer_id")))
+        if index is None:
+            index = owners.get(str(doc.get("customer_id_formatted")))
+        if index is not None:
+            totals[index]["documents"].append(format_customer_document(doc))
+
+    for customer_copy, stats in zip(customers, totals):
+        avg_satisfaction = stats["score_total"] / stats["feedback_count"] if stats["feedback_count"] else 0
+        customer_copy.update({
+            "activeContracts": stats["active"],
+            "completedProjects": stats["completed"],
+            "totalValue": stats["total_value"],
+            "satisfactionScore": round(avg_satisfaction, 1) if avg_satisfaction else 5.0,
+            "outstandingAmount": stats["outstanding"],
+            "status": "active" if stats["active"] > 0 else "inactive",
+            "documents": stats["documents"]
+        })
+
+    return customers
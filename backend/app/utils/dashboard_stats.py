@@ -0,0 +1,412 @@
+"""
+Materialized dashboard counters.
+
+The admin, sales, finance and warehouse dashboards read a single `dashboard_stats` document
+instead of counting and scanning collections on every request. Write paths keep it current
+with small $inc/$push updates through the record_* helpers below; a failed update never
+fails the request, it just leaves drift for the reconciliation job to correct.
+
+`reconcile_dashboard_stats` rebuilds the document from the source collections. Every
+incremental update also bumps a `version` field, and the rebuilt document only replaces the
+stored one if the version did not move while the collections were scanned, so updates made
+during a rebuild are never overwritten. It runs on startup and then every
+DASHBOARD_RECONCILE_SECONDS, and can be run by hand from the backend directory:
+    python -m app.utils.dashboard_stats
+
+`expectedReturns` depends on the clock (rentals ending within the next week), so it is only
+refreshed by reconciliation, as are the statuses shown in the recent-item lists.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from .customer_metrics import first_truthy_amount
+from .database import get_database, connect_to_mongo, close_mongo_connection
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_RECONCILE_SECONDS = int(os.getenv("DASHBOARD_RECONCILE_SECONDS", "300"))
+# Rebuilds attempted per reconciliation when write paths keep changing the stats meanwhile
+RECONCILE_ATTEMPTS = 3
+
+STATS_ID = "global"
+RECENT_ITEMS = 5
+LOW_STOCK_THRESHOLD = 10
+
+# Rentals counted as converted/active on the sales and admin dashboards
+CONVERTED_RENTAL_STATUSES = ["active", "approved"]
+RETURNING_RENTAL_STATUSES = ["active", "extended"]
+
+# Invoices store the VAT-inclusive amount in `total`, older ones only have `amount`
+INVOICE_AMOUNT = first_truthy_amount("total", "amount")
+
+
+def _status_key(status) -> str:
+    """Statuses are used as field names inside the per-status maps"""
+    if not status:
+        return "unknown"
+    return str(status).replace(".", "_").replace("$", "_")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _number(value) -> float:
+    return value if _is_number(value) else 0
+
+
+def _date_prefix(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, str):
+        return value[:10]
+    return ""
+
+
+def rental_summary(rental: dict) -> dict:
+    return {
+        "id": rental.get("contract_number", ""),
+        "customer": rental.get("customer_name", ""),
+        "project": rental.get("project_name", "N/A"),
+        "date": _date_prefix(rental.get("created_at")),
+        "status": rental.get("status", "unknown"),
+        "amount": rental.get("total_amount", 0)
+    }
+
+
+def quotation_summary(quotation: dict) -> dict:
+    return {
+        "id": quotation.get("quotation_id", str(quotation.get("_id", ""))),
+        "customer": quotation.get("customerName", ""),
+        "project": quotation.get("project", ""),
+        "amount": quotation.get("totalAmount", 0),
+        "status": quotation.get("status", "")
+    }
+
+
+def invoice_summary(invoice: dict) -> dict:
+    return {
+        "id": invoice.get("invoice_id", str(invoice.get("_id", ""))),
+        "customer": invoice.get("customer_name", ""),
+        "date": _date_prefix(invoice.get("created_at")),
+        "amount": invoice.get("amount", invoice.get("total", 0)),
+        "vat": invoice.get("vat", 0),
+        "status": invoice.get("status", "pending")
+    }
+
+
+def invoice_amount(invoice: dict) -> float:
+    return invoice.get("total", 0) or invoice.get("amount", 0) or 0
+
+
+def equipment_flags(equipment: Optional[dict]) -> Dict[str, int]:
+    """Which equipment counters an item contributes to (mirrors the reconciliation queries)"""
+    if not equipment:
+        return {"equipment_total": 0, "equipment_available": 0, "equipment_rented": 0, "equipment_low_stock": 0}
+    available = equipment.get("quantity_available")
+    rented = equipment.get("quantity_rented")
+    return {
+        "equipment_total": 1,
+        "equipment_available": int(_is_number(available) and available > 0),
+        "equipment_rented": int(_is_number(rented) and rented > 0),
+        "equipment_low_stock": int(_is_number(available) and available < LOW_STOCK_THRESHOLD)
+    }
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        "_id": STATS_ID,
+        "customers": 0,
+        "customer_users": 0,
+        "enquiries": 0,
+        "rentals": 0,
+        "rentals_by_status": {},
+        "rental_amount_by_status": {},
+        "quotations_by_status": {},
+        "invoices_by_status": {},
+        "invoice_amount_by_status": {},
+        "equipment_total": 0,
+        "equipment_available": 0,
+        "equipment_rented": 0,
+        "equipment_low_stock": 0,
+        "active_dispatches": 0,
+        "expected_returns": 0,
+        "recent_rentals": [],
+        "recent_quotations": [],
+        "recent_invoices": []
+    }
+
+
+def status_total(stats: dict, field: str, statuses: List[str]) -> float:
+    """Sum a per-status map over the given statuses"""
+    by_status = stats.get(field) or {}
+    return sum(by_status.get(_status_key(status), 0) for status in statuses)
+
+
+def map_total(stats: dict, field: str) -> float:
+    return sum((stats.get(field) or {}).values())
+
+
+async def _apply(db, update: dict):
+    """Apply an incremental update to the stats document; drift is fixed by reconciliation"""
+    update.setdefault("$set", {})["updated_at"] = datetime.now().isoformat()
+    update.setdefault("$inc", {})["version"] = 1
+    try:
+        await db.dashboard_stats.update_one({"_id": STATS_ID}, update, upsert=True)
+    except Exception as e:
+        logger.warning("Failed to update dashboard stats: %s", e)
+
+
+def _inc(update: dict, field: str, amount):
+    if amount:
+        incs = update.setdefault("$inc", {})
+        incs[field] = incs.get(field, 0) + amount
+
+
+def _push_recent(update: dict, field: str, item: dict, newest_first: bool):
+    if newest_first:
+        spec = {"$each": [item], "$position": 0, "$slice": RECENT_ITEMS}
+    else:
+        spec = {"$each": [item], "$slice": -RECENT_ITEMS}
+    update.setdefault("$push", {})[field] = spec
+
+
+async def record_customer_change(db, delta: int):
+    update: dict = {}
+    _inc(update, "customers", delta)
+    await _apply(db, update)
+
+
+async def record_user_created(db, user: dict):
+    await record_user_role_change(db, None, user.get("role"))
+
+
+async def record_user_role_change(db, old_role: Optional[str], new_role: Optional[str]):
+    """Adjust customer_users for a user going from `old_role` to `new_role` (None = absent)"""
+    delta = int(new_role == "customer") - int(old_role == "customer")
+    if not delta:
+        return
+    update: dict = {}
+    _inc(update, "customer_users", delta)
+    await _apply(db, update)
+
+
+async def record_enquiry_created(db):
+    update: dict = {}
+    _inc(update, "enquiries", 1)
+    await _apply(db, update)
+
+
+async def record_rental_created(db, rental: dict):
+    """Rentals double as enquiries on the admin dashboard"""
+    status = _status_key(rental.get("status"))
+    update: dict = {}
+    _inc(update, "rentals", 1)
+    _inc(update, "enquiries", 1)
+    _inc(update, f"rentals_by_status.{status}", 1)
+    _inc(update, f"rental_amount_by_status.{status}", _number(rental.get("total_amount")))
+    _push_recent(update, "recent_rentals", rental_summary(rental), newest_first=False)
+    await _apply(db, update)
+
+
+async def record_rental_status_change(db, old_status, new_status, total_amount=0):
+    old_key, new_key = _status_key(old_status), _status_key(new_status)
+    if old_key == new_key:
+        return
+    amount = _number(total_amount)
+    update: dict = {}
+    _inc(update, f"rentals_by_status.{old_key}", -1)
+    _inc(update, f"rentals_by_status.{new_key}", 1)
+    _inc(update, f"rental_amount_by_status.{old_key}", -amount)
+    _inc(update, f"rental_amount_by_status.{new_key}", amount)
+    await _apply(db, update)
+
+
+async def record_quotation_created(db, quotation: dict):
+    update: dict = {}
+    _inc(update, f"quotations_by_status.{_status_key(quotation.get('status'))}", 1)
+    _push_recent(update, "recent_quotations", quotation_summary(quotation), newest_first=True)
+    await _apply(db, update)
+
+
+async def record_quotation_status_change(db, old_status, new_status):
+    old_key, new_key = _status_key(old_status), _status_key(new_status)
+    if old_key == new_key:
+        return
+    update: dict = {}
+    _inc(update, f"quotations_by_status.{old_key}", -1)
+    _inc(update, f"quotations_by_status.{new_key}", 1)
+    await _apply(db, update)
+
+
+async def record_invoice_created(db, invoice: dict):
+    status = _status_key(invoice.get("status"))
+    update: dict = {}
+    _inc(update, f"invoices_by_status.{status}", 1)
+    _inc(update, f"invoice_amount_by_status.{status}", invoice_amount(invoice))
+    _push_recent(update, "recent_invoices", invoice_summary(invoice), newest_first=True)
+    await _apply(db, update)
+
+
+async def record_equipment_change(db, before: Optional[dict], after: Optional[dict], dispatch_delta: int = 0):
+    """Adjust equipment counters for an item going from `before` to `after` (None = absent)"""
+    old_flags, new_flags = equipment_flags(before), equipment_flags(after)
+    update: dict = {}
+    for field in new_flags:
+        _inc(update, field, new_flags[field] - old_flags[field])
+    _inc(update, "active_dispatches", dispatch_delta)
+    if update:
+        await _apply(db, update)
+
+
+async def _count_by_status(collection, amount=None) -> Dict[str, Dict[str, float]]:
+    group: Dict[str, Any] = {"_id": "$status", "count": {"$sum": 1}}
+    if amount is not None:
+        group["amount"] = {"$sum": amount}
+    rows = await collection.aggregate([{"$group": group}]).to_list(length=None)
+    counts: Dict[str, float] = {}
+    amounts: Dict[str, float] = {}
+    for row in rows:
+        key = _status_key(row["_id"])
+        counts[key] = counts.get(key, 0) + row["count"]
+        if amount is not None:
+            amounts[key] = amounts.get(key, 0) + (row.get("amount") or 0)
+    return {"counts": counts, "amounts": amounts}
+
+
+async def _equipment_counts(db) -> Dict[str, int]:
+    def flag(condition: dict) -> dict:
+        return {"$sum": {"$cond": [condition, 1, 0]}}
+
+    available_is_number = {"$isNumber": "$quantity_available"}
+    rows = await db.equipment.aggregate([{"$group": {
+        "_id": None,
+        "equipment_total": {"$sum": 1},
+        "equipment_available": flag({"$and": [available_is_number, {"$gt": ["$quantity_available", 0]}]}),
+        "equipment_rented": flag({"$and": [{"$isNumber": "$quantity_rented"}, {"$gt": ["$quantity_rented", 0]}]}),
+        "equipment_low_stock": flag({"$and": [
+            available_is_number, {"$lt": ["$quantity_available", LOW_STOCK_THRESHOLD]}
+        ]})
+    }}]).to_list(length=1)
+    counts = rows[0] if rows else {}
+    return {field: counts.get(field, 0) for field in
+            ("equipment_total", "equipment_available", "equipment_rented", "equipment_low_stock")}
+
+
+async def compute_dashboard_stats(db, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Build the stats document from scratch"""
+    now = now or datetime.utcnow()
+    next_week = now + timedelta(days=7)
+
+    (
+        customers, customer_users, enquiries, rentals,
+        rental_stats, quotation_stats, invoice_stats, equipment,
+        active_dispatches, expected_returns,
+        recent_rentals, recent_quotations, recent_invoices
+    ) = await asyncio.gather(
+        db.customers.count_documents({}),
+        db.users.count_documents({"role": "customer"}),
+        db.enquiries.count_documents({}),
+        db.rentals.count_documents({}),
+        _count_by_status(db.rentals, {"$ifNull": ["$total_amount", 0]}),
+        _count_by_status(db.quotations),
+        _count_by_status(db.invoices, INVOICE_AMOUNT),
+        _equipment_counts(db),
+        db.equipment_dispatch.count_documents({"status": "active"}),
+        db.rentals.count_documents({
+            "status": {"$in": RETURNING_RENTAL_STATUSES},
+            "end_date": {"$lte": next_week.isoformat()}
+        }),
+        db.rentals.find({}).sort("_id", -1).limit(RECENT_ITEMS).to_list(length=RECENT_ITEMS),
+        db.quotations.find({}).sort("created_at", -1).limit(RECENT_ITEMS).to_list(length=RECENT_ITEMS),
+        db.invoices.find({}).sort("created_at", -1).limit(RECENT_ITEMS).to_list(length=RECENT_ITEMS)
+    )
+
+    stats = empty_stats()
+    stats.update(equipment)
+    stats.update({
+        "customers": customers,
+        "customer_users": customer_users,
+        "enquiries": rentals + enquiries,
+        "rentals": rentals,
+        "rentals_by_status": rental_stats["counts"],
+        "rental_amount_by_status": rental_stats["amounts"],
+        "quotations_by_status": quotation_stats["counts"],
+        "invoices_by_status": invoice_stats["counts"],
+        "invoice_amount_by_status": invoice_stats["amounts"],
+        "active_dispatches": active_dispatches,
+        "expected_returns": expected_returns,
+        # Oldest first, matching the order rentals are appended in
+        "recent_rentals": [rental_summary(rental) for rental in reversed(recent_rentals)],
+        "recent_quotations": [quotation_summary(quotation) for quotation in recent_quotations],
+        "recent_invoices": [invoice_summary(invoice) for invoice in recent_invoices],
+        "reconciled_at": now.isoformat(),
+        "updated_at": now.isoformat()
+    })
+    return stats
+
+
+async def reconcile_dashboard_stats(db) -> Dict[str, Any]:
+    """Recompute the stats document and replace the stored copy.
+
+    The replace is conditional on the stored `version`: if a record_* update landed while the
+    collections were being counted, the result may or may not include it, so the rebuild is
+    discarded and retried. After RECONCILE_ATTEMPTS the incrementally maintained document is
+    kept until the next run.
+    """
+    for _ in range(RECONCILE_ATTEMPTS):
+        current = await db.dashboard_stats.find_one({"_id": STATS_ID}, {"version": 1})
+        stats = await compute_dashboard_stats(db)
+        try:
+            if current is None:
+                stats["version"] = 0
+                await db.dashboard_stats.insert_one(stats)
+                return stats
+            stats["version"] = current.get("version") or 0
+            result = await db.dashboard_stats.replace_one({"_id": STATS_ID, "version": current.get("version")}, stats)
+            if result.matched_count:
+                return stats
+        except DuplicateKeyError:
+            pass  # an incremental update created the document meanwhile
+    logger.info("Dashboard stats changed during every rebuild; keeping the incremental counters")
+    return stats
+
+
+async def get_dashboard_stats(db) -> Dict[str, Any]:
+    """Read the materialized stats, building them first if they have never been reconciled"""
+    try:
+        stats = await db.dashboard_stats.find_one({"_id": STATS_ID})
+        if not stats or not stats.get("reconciled_at"):
+            stats = await reconcile_dashboard_stats(db)
+    except Exception as e:
+        logger.warning("Dashboard stats unavailable: %s", e)
+        return empty_stats()
+    merged = empty_stats()
+    merged.update(stats)
+    return merged
+
+
+async def reconcile_periodically(interval: int = DASHBOARD_RECONCILE_SECONDS):
+    """Background task correcting counter drift every `interval` seconds"""
+    while True:
+        try:
+            await reconcile_dashboard_stats(get_database())
+        except Exception as e:
+            logger.warning("Dashboard stats reconciliation failed: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def run_reconciliation():
+    await connect_to_mongo()
+    stats = await reconcile_dashboard_stats(get_database())
+    print(f"Reconciled dashboard stats at {stats['reconciled_at']}")
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_reconciliation())
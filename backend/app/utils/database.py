@@ -1,13 +1,26 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.database import Database
+from typing import Optional
+import copy
+import logging
 import os
 
+from .memory_db import MemoryDatabase
+
+logger = logging.getLogger(__name__)
+
 MONGODB_URL = os.getenv("MONGODB_URI", os.getenv("MONGODB_URL", "mongodb://localhost:27017/rigit-control-hub"))
 
+# memory:// runs the API on the in-process engine instead of a MongoDB server
+MEMORY_URL_SCHEME = "memory://"
+DATABASE_NAME = "rigit_control_hub"
+
 client: AsyncIOMotorClient = None
 database: Database = None
+# Whether the connected deployment runs multi-document transactions (checked on first use)
+_transactions_supported: Optional[bool] = None
 
-# Mock database for testing when MongoDB is not available
+# Demo documents the in-memory database starts with
 mock_database = {
     "rentals": [
         {
@@ -59,17 +72,6 @@ mock_database = {
             "updated_at": "2025-10-10T00:00:00Z"
         }
     ],
-    "users": [
-        {
-            "_id": "demo-admin",
-            "email": "admin@yourcompany.com",
-            "full_name": "System Administrator",
-            "role": "admin",
-            "hashed_password": "$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj6fEtTT2/D2",  # admin123
-            "created_at": "2025-01-01T00:00:00Z",
-            "updated_at": "2025-01-01T00:00:00Z"
-        }
-    ],
     "payments": [
         {
             "_id": "PAY-2025-001",
@@ -139,131 +141,72 @@ mock_database = {
     ]
 }
 
+def _event_listeners() -> list:
+    """Listeners for the client: query-shape recording, per-request accounting, pool metrics"""
+    from .indexes import event_listeners
+    from .command_accounting import command_accountant
+    from .metrics import connection_pool_stats
+    return event_listeners() + [command_accountant, connection_pool_stats]
+
+def _memory_database() -> MemoryDatabase:
+    return MemoryDatabase(DATABASE_NAME, copy.deepcopy(mock_database), _event_listeners())
+
 async def connect_to_mongo():
     global client, database
+    if database is not None:
+        return
+    if MONGODB_URL.startswith(MEMORY_URL_SCHEME):
+        database = _memory_database()
+        logger.info("Using in-memory database")
+        return
     try:
-        client = AsyncIOMotorClient(MONGODB_URL)
-        database = client.get_database("rigit_control_hub")
+        client = AsyncIOMotorClient(MONGODB_URL, event_listeners=_event_listeners())
+        database = client.get_database(DATABASE_NAME)
         # Test connection
         await client.admin.command('ping')
-        print("Connected to MongoDB")
+        logger.info("Connected to MongoDB")
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        print("Using mock database for testing")
-        # Use mock database
-        database = MockDatabase()
+        logger.warning("Failed to connect to MongoDB, using in-memory database: %s", e)
+        database = _memory_database()
         # Also set client to None to avoid issues
         client = None
 
 async def close_mongo_connection():
-    global client
+    global client, database, _transactions_supported
+    _transactions_supported = None
     if client:
         client.close()
-        print("Disconnected from MongoDB")
+        logger.info("Disconnected from MongoDB")
+    client = None
+    database = None
 
 def get_database() -> Database:
     return database
 
-class MockDatabase:
-    """Mock database for testing when MongoDB is not available"""
-
-    def __init__(self):
-        self.data = mock_database.copy()
-
-    def __getattr__(self, name):
-        if name.startswith('_'):
-            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
-        return MockCollection(self.data.get(name, []))
-
-class MockCollection:
-    def __init__(self, data):
-        self.data = data
-
-    async def find(self, query=None):
-        if query is None:
-            return MockCursor(self.data)
-        # Simple query matching
-        results = []
-        for item in self.data:
-            if self._matches_query(item, query):
-                results.append(item)
-        return MockCursor(results)
-
-    async def find_one(self, query=None):
-        if query is None:
-            return self.data[0] if self.data else None
-        # Simple query matching
-        for item in self.data:
-            if self._matches_query(item, query):
-                return item
-        return None
-
-    async def insert_one(self, document):
-        document["_id"] = f"mock-{len(self.data)}"
-        self.data.append(document)
-        return MockInsertResult(document["_id"])
-
-    async def update_one(self, query, update):
-        for i, item in enumerate(self.data):
-            if self._matches_query(item, query):
-                if "$set" in update:
-                    item.update(update["$set"])
-                if "$push" in update:
-                    for key, value in update["$push"].items():
-                        if key not in item or not isinstance(item[key], list):
-                            item[key] = []
-                        item[key].append(value)
-                return MockUpdateResult(1)
-        return MockUpdateResult(0)
-
-    async def count_documents(self, query=None):
-        if query is None:
-            return len(self.data)
-        results = []
-        for item in self.data:
-            if self._matches_query(item, query):
-                results.append(item)
-        return len(results)
-
-    def _matches_query(self, item, query):
-        for key, value in query.items():
-            if key == "_id":
-                # Handle ObjectId matching
-                if isinstance(value, str) and value.startswith("mock-"):
-                    item_id = item.get("_id", "")
-                    if item_id != value:
-                        return False
-                else:
-                    return False
-            elif key not in item or item[key] != value:
-                return False
-        return True
-
-class MockCursor:
-    def __init__(self, data):
-        self.data = data
-        self.index = 0
-
-    async def to_list(self, length=None):
-        return self.data[:length] if length else self.data
-
-    def __aiter__(self):
-        """Support async iteration"""
-        self.index = 0
-        return self
-
-    async def __anext__(self):
-        """Support async iteration"""
-        if self.index >= len(self.data):
-            raise StopAsyncIteration
-        result = self.data[self.index]
-        self.index += 1
-        return result
-
-class MockInsertResult:
-    def __init__(self, inserted_id):
-        self.inserted_id = inserted_id
-
-class MockUpdateResult:
-    def __init__(self, modified_count):
-        self.modified_count = modified_count
+def get_max_pool_size() -> Optional[int]:
+    """maxPoolSize of the MongoDB client, None on the in-memory database"""
+    return client.options.pool_options.max_pool_size if client is not None else None
+
+async def transactions_supported() -> bool:
+    """True on a replica set or sharded cluster; standalone servers and the in-memory database have none"""
+    global _transactions_supported
+    if client is None:
+        return False
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+        except Exception as e:
+            logger.warning("Could not check transaction support: %s", e)
+            return False
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+async def run_in_transaction(callback):
+    """Await `callback(session)` inside a transaction where supported, else `callback(None)`.
+
+    with_transaction retries the callback on transient transaction errors, so it must be safe to rerun.
+    """
+    if not await transactions_supported():
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
@@ -0,0 +1,184 @@
+"""
+Unified enquiry feed: the `enquiries` collection plus rental orders, read as one listing.
+
+Rentals are enquiries too (admin-created enquiries and customer rental requests are stored
+as rentals), so the sales inbox and the admin enquiry list show both. One aggregation
+merges them: the `enquiries` branch is the source, rentals come in through $unionWith and
+are $project-ed into the enquiry shape by MongoDB. Both branches filter (status,
+salesperson, created date, keyset cursor), sort and limit on their own (created_at, _id)
+indexes before the merge, so a page reads at most `limit + 1` documents per collection
+however many rentals exist.
+
+Entries are ordered by (created_at, _id) and paged with a keyset cursor. Without a limit the
+whole (filtered) feed is returned, as the inbox and admin list, which do not page, expect.
+
+$unionWith needs MongoDB 4.4 or newer.
+"""
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import Query
+from pymongo import ASCENDING, DESCENDING
+
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+# Cursor namespace, so cursors of other listings (or the other order) are rejected
+ENQUIRY_CURSOR_KEY = "enquiries"
+
+
+def _or_default(path: str, default) -> dict:
+    return {"$ifNull": [path, default]}
+
+
+# Rental order -> enquiry shape
+RENTAL_ENQUIRY_PROJECTION = {
+    "_id": 1,
+    "id": {"$toString": "$_id"},
+    "enquiry_id": _or_default("$contract_number", {"$concat": ["ENQ-", {"$substrCP": [{"$toString": "$_id"}, 0, 8]}]}),
+    "customer_id": _or_default("$customer_id", ""),
+    "customer_name": _or_default("$customer_name", "Unknown Customer"),
+    "customer_email": _or_default("$contact_email", _or_default("$customer_email", "")),
+    "equipment_name": {"$trim": {
+        "input": {"$concat": [_or_default("$equipment_category", ""), " - ", _or_default("$equipment_type", "")]},
+        "chars": " -"
+    }},
+    "quantity": _or_default("$quantity", 1),
+    "rental_duration_days": _or_default("$rental_duration_days", 30),
+    "delivery_location": _or_default("$delivery_address", ""),
+    "expected_delivery_date": _or_default("$start_date", ""),
+    "special_instructions": _or_default("$special_requirements", ""),
+    "assigned_salesperson_id": _or_default("$assigned_salesperson_id", None),
+    "assigned_salesperson_name": _or_default("$assigned_salesperson_name", None),
+    "status": _or_default("$status", "submitted_by_customer"),
+    # Left as stored: it is the sort key the cursor continues from
+    "created_at": 1,
+    "enquiry_date": "$created_at",
+    "updated_at": _or_default("$updated_at", "$created_at"),
+    "is_rental_order": {"$literal": True},
+    "contract_number": _or_default("$contract_number", ""),
+    "project_name": _or_default("$project_name", ""),
+    "equipment_type": _or_default("$equipment_type", ""),
+    "start_date": _or_default("$start_date", ""),
+    "end_date": _or_default("$end_date", ""),
+}
+
+# Stored enquiries already have the enquiry shape
+ENQUIRY_DEFAULTS = {
+    "id": {"$toString": "$_id"},
+    "enquiry_id": _or_default("$enquiry_id", {"$toString": "$_id"}),
+}
+
+
+class EnquiryFeedParams:
+    """Query parameters filtering and ordering the enquiry feed"""
+
+    def __init__(
+        self,
+        status: Optional[List[str]] = Query(None, description="Only these statuses (repeatable)"),
+        salesperson_id: Optional[str] = Query(None, description="Only enquiries assigned to this user"),
+        created_from: Optional[date] = Query(None, description="Created on or after (YYYY-MM-DD)"),
+        created_to: Optional[date] = Query(None, description="Created on or before (YYYY-MM-DD)"),
+        order: str = Query("desc", pattern="^(asc|desc)$", description="Creation order")
+    ):
+        self.status = status
+        self.salesperson_id = salesperson_id
+        self.created_from = created_from
+        self.created_to = created_to
+        self.direction = ASCENDING if order == "asc" else DESCENDING
+
+    def query(self, visible_to_salesperson: Optional[str] = None) -> dict:
+        return build_enquiry_filter(
+            self.status, self.salesperson_id, self.created_from, self.created_to, visible_to_salesperson
+        )
+
+
+def build_enquiry_filter(
+    statuses: Optional[List[str]] = None,
+    salesperson_id: Optional[str] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+    visible_to_salesperson: Optional[str] = None
+) -> dict:
+    """Filter on the fields both collections store under the same name.
+
+    `created_to` is inclusive. `visible_to_salesperson` limits the feed to enquiries assigned
+    to that salesperson or to nobody.
+    """
+    clauses: List[dict] = []
+    if statuses:
+        clauses.append({"status": {"$in": statuses}})
+    if salesperson_id:
+        clauses.append({"assigned_salesperson_id": salesperson_id})
+    if created_from or created_to:
+        # created_at is an ISO string, which sorts chronologically
+        window = {}
+        if created_from:
+            window["$gte"] = created_from.isoformat()
+        if created_to:
+            window["$lt"] = (created_to + timedelta(days=1)).isoformat()
+        clauses.append({"created_at": window})
+    if visible_to_salesperson:
+        # null also matches a missing field
+        clauses.append({"assigned_salesperson_id": {"$in": [visible_to_salesperson, None]}})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _limit(limit: Optional[int]) -> List[dict]:
+    return [{"$limit": limit}] if limit is not None else []
+
+
+def _branch(query: dict, direction: int, after: Optional[tuple], limit: Optional[int], shape: dict,
+            stage: str) -> List[dict]:
+    if after:
+        condition = keyset_filter("created_at", direction, *after)
+        query = {"$and": [query, condition]} if query else condition
+    return [
+        {"$match": query},
+        {"$sort": {"created_at": direction, "_id": direction}},
+        *_limit(limit),
+        {stage: shape}
+    ]
+
+
+def build_enquiry_feed_pipeline(query: dict, direction: int, after: Optional[tuple],
+                                limit: Optional[int]) -> List[dict]:
+    """Pipeline run on `enquiries` returning one page of `limit` merged entries (all when None)"""
+    pipeline = _branch(query, direction, after, limit, ENQUIRY_DEFAULTS, "$set")
+    pipeline += [
+        {"$unionWith": {
+            "coll": "rentals",
+            "pipeline": _branch(query, direction, after, limit, RENTAL_ENQUIRY_PROJECTION, "$project")
+        }},
+        {"$sort": {"created_at": direction, "_id": direction}},
+        *_limit(limit)
+    ]
+    return pipeline
+
+
+async def fetch_enquiry_page(
+    db,
+    query: dict,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    direction: int = DESCENDING
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of the merged feed (the rest of it without a limit); returns (enquiries, next cursor or None)"""
+    cursor_key = f"{ENQUIRY_CURSOR_KEY}:{'asc' if direction == ASCENDING else 'desc'}"
+    after = decode_cursor(cursor, cursor_key) if cursor else None
+    pipeline = build_enquiry_feed_pipeline(query, direction, after, limit + 1 if limit is not None else None)
+    rows = await db.enquiries.aggregate(pipeline).to_list(length=None)
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(cursor_key, rows[-1].get("created_at"), rows[-1]["_id"])
+
+    for row in rows:
+        row.pop("_id")
+        if row.get("is_rental_order"):
+            for field in ("created_at", "enquiry_date", "updated_at"):
+                if row.get(field) is None:
+                    row[field] = ""
+    return rows, next_cursor
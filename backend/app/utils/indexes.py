@@ -0,0 +1,318 @@
+"""
+Declarative MongoDB index registry and query-shape recorder.
+
+INDEXES lists every index the application relies on. ensure_indexes() applies the registry
+idempotently: existing indexes are left alone, and a conflicting or failing index is logged
+without blocking the others. It runs in the background on startup.
+
+When RECORD_QUERY_SHAPES is enabled, a pymongo CommandListener records the shape of every
+query the API sends: collection, filtered fields and sort fields (values are never stored).
+Shapes are flushed to the `query_shapes` collection every QUERY_SHAPE_FLUSH_SECONDS.
+
+Commands, run from the backend directory:
+    python -m app.utils.indexes ensure   # apply the registry now
+    python -m app.utils.indexes report   # list recorded query shapes no index can serve
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne, monitoring
+
+from .database import get_database, connect_to_mongo, close_mongo_connection
+
+logger = logging.getLogger(__name__)
+
+RECORD_QUERY_SHAPES = os.getenv("RECORD_QUERY_SHAPES", "true").lower() in ("1", "true", "yes")
+QUERY_SHAPE_FLUSH_SECONDS = int(os.getenv("QUERY_SHAPE_FLUSH_SECONDS", "60"))
+
+QUERY_SHAPES_COLLECTION = "query_shapes"
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: List[Tuple[str, int]]
+    name: str
+    options: Dict = {}
+
+    def model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, **self.options)
+
+
+CUSTOMER_ID_INDEX = IndexSpec(
+    "customers", [("customer_id", ASCENDING)], "customer_id_unique",
+    # Created by `python -m app.utils.migrations` once legacy duplicates are normalized
+    {"unique": True, "partialFilterExpression": {"customer_id": {"$type": "string"}}}
+)
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", [("email", ASCENDING)], "email"),
+    IndexSpec("users", [("role", ASCENDING)], "role"),
+    CUSTOMER_ID_INDEX,
+    IndexSpec("customers", [("email", ASCENDING)], "email"),
+    IndexSpec("leads", [("lead_id", ASCENDING)], "lead_id"),
+    IndexSpec("leads", [("enquiry_id", ASCENDING)], "enquiry_id"),
+    IndexSpec("leads", [("createdAt", DESCENDING), ("_id", DESCENDING)], "createdAt_id"),
+    IndexSpec("leads", [("assigned_salesperson_id", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+              "assigned_salesperson_id_createdAt_id"),
+    IndexSpec("lead_emails", [("lead_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+              "lead_id_timestamp_id"),
+    IndexSpec("lead_calls", [("lead_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+              "lead_id_timestamp_id"),
+    IndexSpec("lead_tasks", [("lead_id", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+              "lead_id_createdAt_id"),
+    IndexSpec("lead_notes", [("lead_id", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+              "lead_id_createdAt_id"),
+    IndexSpec("lead_activity_buckets", [("lead_id", ASCENDING), ("bucket", DESCENDING)], "lead_id_bucket",
+              {"unique": True}),
+    IndexSpec("enquiries", [("enquiry_id", ASCENDING)], "enquiry_id"),
+    IndexSpec("enquiries", [("customer_id", ASCENDING)], "customer_id"),
+    IndexSpec("enquiries", [("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+    IndexSpec("enquiries", [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "status_created_at_id"),
+    IndexSpec("enquiries", [("assigned_salesperson_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "assigned_salesperson_id_created_at_id"),
+    IndexSpec("rentals", [("customer_id", ASCENDING), ("_id", ASCENDING)], "customer_id_id"),
+    IndexSpec("rentals", [("status", ASCENDING), ("end_date", ASCENDING)], "status_end_date"),
+    IndexSpec("rentals", [("contract_number", ASCENDING)], "contract_number"),
+    IndexSpec("rentals", [("updated_at", DESCENDING)], "updated_at"),
+    IndexSpec("rentals", [("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+    IndexSpec("rentals", [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "status_created_at_id"),
+    IndexSpec("rentals", [("assigned_salesperson_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "assigned_salesperson_id_created_at_id"),
+    IndexSpec("quotations", [("quotation_id", ASCENDING)], "quotation_id"),
+    IndexSpec("quotations", [("enquiry_id", ASCENDING)], "enquiry_id"),
+    IndexSpec("quotations", [("status", ASCENDING)], "status"),
+    IndexSpec("quotations", [("created_at", DESCENDING)], "created_at"),
+    IndexSpec("contracts", [("contract_id", ASCENDING)], "contract_id"),
+    IndexSpec("contracts", [("customer_id", ASCENDING), ("status", ASCENDING)], "customer_id_status"),
+    IndexSpec("contracts", [("status", ASCENDING)], "status"),
+    IndexSpec("contracts", [("quotation_id", ASCENDING)], "quotation_id"),
+    IndexSpec("contracts", [("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+    IndexSpec("contracts", [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "status_created_at_id"),
+    IndexSpec("sales_orders", [("sales_order_id", ASCENDING)], "sales_order_id"),
+    IndexSpec("sales_orders", [("status", ASCENDING)], "status"),
+    IndexSpec("invoices", [("customer_id", ASCENDING), ("status", ASCENDING)], "customer_id_status"),
+    IndexSpec("invoices", [("status", ASCENDING)], "status"),
+    IndexSpec("invoices", [("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+    IndexSpec("invoices", [("customer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              "customer_id_created_at_id"),
+    IndexSpec("feedback", [("customer_id", ASCENDING)], "customer_id"),
+    IndexSpec("feedback", [("contract_id", ASCENDING)], "contract_id"),
+    IndexSpec("customer_documents", [("customer_id", ASCENDING)], "customer_id"),
+    IndexSpec("customer_documents", [("customer_id_formatted", ASCENDING)], "customer_id_formatted"),
+    IndexSpec("customer_documents", [("expiryDate", ASCENDING)], "expiryDate"),
+    IndexSpec("equipment", [("item_code", ASCENDING)], "item_code"),
+    IndexSpec("equipment", [("created_at", DESCENDING)], "created_at"),
+    IndexSpec("equipment_dispatch", [("equipment_id", ASCENDING), ("contract_id", ASCENDING), ("status", ASCENDING)],
+              "equipment_id_contract_id_status"),
+    IndexSpec("equipment_dispatch", [("status", ASCENDING)], "status"),
+    IndexSpec("equipment_history", [("equipment_id", ASCENDING), ("timestamp", DESCENDING)], "equipment_id_timestamp"),
+    IndexSpec("pending_adjustments", [("status", ASCENDING)], "status"),
+    IndexSpec("employees", [("employee_id", ASCENDING)], "employee_id"),
+    IndexSpec("employees", [("email", ASCENDING)], "email"),
+    IndexSpec("audit_log", [("timestamp", DESCENDING)], "timestamp"),
+    IndexSpec("events", [("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_id"),
+]
+
+
+async def ensure_index(db, spec: IndexSpec) -> str:
+    """Create one registry index (a no-op when it already exists); returns its name"""
+    names = await getattr(db, spec.collection).create_indexes([spec.model()])
+    return names[0]
+
+
+async def ensure_indexes(db, specs: Optional[List[IndexSpec]] = None) -> Dict[str, List[str]]:
+    """Apply the registry; returns {"ensured": [...], "failed": [...]} as collection.name"""
+    result: Dict[str, List[str]] = {"ensured": [], "failed": []}
+    for spec in specs if specs is not None else INDEXES:
+        # One call per index so a conflict (e.g. duplicates under a unique index) only skips that index
+        try:
+            await ensure_index(db, spec)
+            result["ensured"].append(f"{spec.collection}.{spec.name}")
+        except Exception as e:
+            result["failed"].append(f"{spec.collection}.{spec.name}")
+            logger.warning("Could not create index %s.%s: %s", spec.collection, spec.name, e)
+    return result
+
+
+async def ensure_indexes_in_background():
+    """Startup hook: apply the registry without delaying the first requests"""
+    try:
+        result = await ensure_indexes(get_database())
+        logger.info("Ensured %d indexes (%d failed)", len(result["ensured"]), len(result["failed"]))
+    except Exception as e:
+        logger.warning("Index creation failed: %s", e)
+
+
+def filter_fields(query) -> List[str]:
+    """Field paths a query filters on, including inside $and/$or/$nor (operators and values dropped)"""
+    fields: List[str] = []
+    if not isinstance(query, dict):
+        return fields
+    for key, value in query.items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            for clause in value:
+                fields.extend(filter_fields(clause))
+        elif not key.startswith("$"):
+            fields.append(key)
+    return sorted(set(fields))
+
+
+def command_shape(command_name: str, command: dict) -> Optional[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]:
+    """(collection, filter fields, sort fields) for read/write commands, None for everything else"""
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return None
+
+    query, sort = None, None
+    if command_name == "find":
+        query, sort = command.get("filter"), command.get("sort")
+    elif command_name in ("count", "distinct"):
+        query = command.get("query")
+    elif command_name == "findAndModify":
+        query, sort = command.get("query"), command.get("sort")
+    elif command_name == "update":
+        query = (command.get("updates") or [{}])[0].get("q")
+    elif command_name == "delete":
+        query = (command.get("deletes") or [{}])[0].get("q")
+    elif command_name == "aggregate":
+        # Only the leading $match/$sort stages can use an index
+        for stage in command.get("pipeline") or []:
+            if "$match" in stage and query is None and sort is None:
+                query = stage["$match"]
+            elif "$sort" in stage and sort is None:
+                sort = stage["$sort"]
+            else:
+                break
+    else:
+        return None
+
+    return collection, tuple(filter_fields(query)), tuple(sort.keys()) if isinstance(sort, dict) else ()
+
+
+class QueryShapeRecorder(monitoring.CommandListener):
+    """Counts query shapes in memory; flush() persists and resets the counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # listeners run on the driver's worker threads
+        self._counts: Counter = Counter()
+
+    def started(self, event):
+        shape = command_shape(event.command_name, event.command)
+        if shape is None or shape[0] == QUERY_SHAPES_COLLECTION:
+            return
+        with self._lock:
+            self._counts[shape] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def drain(self) -> Counter:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    async def flush(self, db) -> int:
+        counts = self.drain()
+        if not counts:
+            return 0
+        now = datetime.utcnow()
+        operations = []
+        for (collection, fields, sort), count in counts.items():
+            shape_id = f"{collection}|{','.join(fields)}|{','.join(sort)}"
+            operations.append(UpdateOne(
+                {"_id": shape_id},
+                {
+                    "$setOnInsert": {"collection": collection, "filter_fields": list(fields), "sort_fields": list(sort)},
+                    "$inc": {"count": count},
+                    "$set": {"last_seen": now}
+                },
+                upsert=True
+            ))
+        await getattr(db, QUERY_SHAPES_COLLECTION).bulk_write(operations, ordered=False)
+        return len(operations)
+
+
+query_shape_recorder = QueryShapeRecorder()
+
+
+def event_listeners() -> list:
+    """Listeners to register on the MongoDB client"""
+    return [query_shape_recorder] if RECORD_QUERY_SHAPES else []
+
+
+async def flush_query_shapes_periodically(interval: int = QUERY_SHAPE_FLUSH_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await query_shape_recorder.flush(get_database())
+        except Exception as e:
+            logger.warning("Failed to store query shapes: %s", e)
+
+
+def shape_is_indexed(filter_fields_: List[str], sort_fields: List[str], index_keys: List[List[str]]) -> bool:
+    """True when some index can drive the query: its first key is filtered on, or leads the sort.
+
+    $or queries are treated leniently (any branch field counts).
+    """
+    if not filter_fields_ and not sort_fields:
+        return True  # deliberate full scan, nothing to index
+    if "_id" in filter_fields_:
+        return True
+    for keys in index_keys:
+        if keys[0] in filter_fields_:
+            return True
+        if not filter_fields_ and sort_fields and keys[0] == sort_fields[0]:
+            return True
+    return False
+
+
+async def unindexed_query_shapes(db) -> List[dict]:
+    """Recorded query shapes that no existing index on their collection can serve, most frequent first"""
+    shapes = await getattr(db, QUERY_SHAPES_COLLECTION).find({}).sort("count", DESCENDING).to_list(length=None)
+    index_cache: Dict[str, List[List[str]]] = {}
+    report = []
+    for shape in shapes:
+        collection = shape["collection"]
+        if collection not in index_cache:
+            info = await getattr(db, collection).index_information()
+            index_cache[collection] = [[key for key, _ in index["key"]] for index in info.values()]
+        if not shape_is_indexed(shape.get("filter_fields", []), shape.get("sort_fields", []), index_cache[collection]):
+            report.append(shape)
+    return report
+
+
+async def run_command(command: str):
+    await connect_to_mongo()
+    db = get_database()
+    if command == "ensure":
+        result = await ensure_indexes(db)
+        print(f"Ensured {len(result['ensured'])} indexes")
+        for name in result["failed"]:
+            print(f"  failed: {name}")
+    elif command == "report":
+        shapes = await unindexed_query_shapes(db)
+        if not shapes:
+            print("No unindexed query shapes recorded")
+        for shape in shapes:
+            sort = f" sort by {', '.join(shape['sort_fields'])}" if shape.get("sort_fields") else ""
+            print(f"{shape['count']:>8}  {shape['collection']}: {', '.join(shape['filter_fields']) or '-'}{sort}"
+                  f"  (last seen {shape['last_seen']:%Y-%m-%d %H:%M})")
+    else:
+        print("Usage: python -m app.utils.indexes [ensure|report]")
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_command(sys.argv[1] if len(sys.argv) > 1 else "report"))
@@ -0,0 +1,107 @@
+"""
+Atomic equipment quantity changes for adjustments, dispatches and returns.
+
+Each change is a single find_one_and_update: the quantities move with $inc, and the filter
+carries the guard the change depends on (e.g. `quantity_available >= q` for a dispatch). Two
+scanners dispatching the last units at once therefore cannot both succeed, and no update is
+lost between a read and a write. When the guard fails, nothing is written and the caller
+tells "not found" from "not enough" with a read on that (rare) path only.
+
+The before-image returned by find_one_and_update plus the increments give the after-image, so
+history entries and record_equipment_change get exact values without another read.
+
+Dispatches and returns write several documents. Where transactions are unavailable (standalone
+servers, the in-memory database) those are separate writes, so when a later one fails the
+routers undo the earlier ones with revert_quantity_change and restore_dispatch. Only a crash
+between the writes and their undo can leave a change half-applied there.
+"""
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+class QuantityChange(NamedTuple):
+    # field -> signed multiple of the quantity
+    increments: Dict[str, int]
+    # field that must hold at least the quantity, None when the change cannot overdraw
+    guard: Optional[str]
+
+
+ADJUSTMENTS: Dict[str, QuantityChange] = {
+    "add": QuantityChange({"quantity_total": 1, "quantity_available": 1}, None),
+    "remove": QuantityChange({"quantity_total": -1, "quantity_available": -1}, "quantity_available"),
+    "damage": QuantityChange({"quantity_available": -1, "quantity_damaged": 1}, "quantity_available"),
+    "repair": QuantityChange({"quantity_damaged": -1, "quantity_available": 1}, "quantity_damaged"),
+}
+
+DISPATCH = QuantityChange({"quantity_available": -1, "quantity_rented": 1}, "quantity_available")
+
+RETURNS: Dict[str, QuantityChange] = {
+    "good": QuantityChange({"quantity_available": 1, "quantity_rented": -1}, "quantity_rented"),
+    "damaged": QuantityChange({"quantity_damaged": 1, "quantity_rented": -1}, "quantity_rented"),
+    # Lost equipment is permanently removed
+    "lost": QuantityChange({"quantity_total": -1, "quantity_rented": -1}, "quantity_rented"),
+}
+
+
+def after_change(equipment: dict, change: QuantityChange, quantity: int) -> dict:
+    after = dict(equipment)
+    for field, sign in change.increments.items():
+        after[field] = equipment.get(field, 0) + sign * quantity
+    return after
+
+
+async def apply_quantity_change(db, equipment_id: str, change: QuantityChange, quantity: int,
+                                session=None) -> Optional[Tuple[dict, dict]]:
+    """Apply `change` for `quantity` units if its guard holds; (before, after) or None when nothing matched"""
+    query = {"_id": equipment_id}
+    if change.guard:
+        query[change.guard] = {"$gte": quantity}
+    update: dict = {"$set": {"updated_at": datetime.utcnow()}}
+    if change.increments:
+        update["$inc"] = {field: sign * quantity for field, sign in change.increments.items()}
+    before = await db.equipment.find_one_and_update(
+        query, update, return_document=ReturnDocument.BEFORE, session=session
+    )
+    if before is None:
+        return None
+    return before, {**after_change(before, change, quantity), "updated_at": update["$set"]["updated_at"]}
+
+
+async def revert_quantity_change(db, equipment_id: str, change: QuantityChange, quantity: int):
+    """Undo apply_quantity_change when a later write failed outside a transaction"""
+    await db.equipment.update_one(
+        {"_id": equipment_id},
+        {
+            "$inc": {field: -sign * quantity for field, sign in change.increments.items()},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+    )
+
+
+async def take_from_dispatch(db, equipment_id: str, contract_id: str, quantity: int,
+                             session=None) -> Optional[dict]:
+    """Deduct returned units from the active dispatch; the dispatch after the change, None when none can cover them"""
+    dispatch = await db.equipment_dispatch.find_one_and_update(
+        {"equipment_id": equipment_id, "contract_id": contract_id, "status": "active", "quantity": {"$gte": quantity}},
+        {"$inc": {"quantity": -quantity}},
+        return_document=ReturnDocument.AFTER, session=session
+    )
+    if dispatch is not None and dispatch["quantity"] <= 0:
+        dispatch["status"] = "completed"
+        dispatch["return_date"] = datetime.utcnow()
+        await db.equipment_dispatch.update_one(
+            {"_id": dispatch["_id"], "quantity": {"$lte": 0}},
+            {"$set": {"status": "completed", "return_date": dispatch["return_date"]}},
+            session=session
+        )
+    return dispatch
+
+
+async def restore_dispatch(db, dispatch: dict, quantity: int):
+    """Undo take_from_dispatch when the rest of a return failed outside a transaction"""
+    await db.equipment_dispatch.update_one(
+        {"_id": dispatch["_id"]},
+        {"$inc": {"quantity": quantity}, "$set": {"status": "active"}, "$unset": {"return_date": ""}}
+    )
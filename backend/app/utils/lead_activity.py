@@ -0,0 +1,188 @@
+"""
+Lead activity timelines stored in fixed-size buckets.
+
+Activities used to be $push-ed into an `activities` array on the lead, so busy leads grew
+without bound. They now live in the `lead_activity_buckets` collection:
+
+    {"lead_id": "LEAD-2025-0001", "bucket": 0, "count": 50, "activities": [...], "last_at": ...}
+
+Each activity gets a per-lead sequence number from the lead's `activityCount` counter
+($inc), and activity N goes to bucket (N - 1) // LEAD_ACTIVITY_BUCKET_SIZE, newest first.
+The lead itself only carries `activityCount` and `lastActivityAt`, so reading a lead costs
+the same however long its history is, and a timeline page reads at most a couple of buckets.
+
+Leads created before the buckets existed still hold an embedded `activities` array. They
+are moved by `python -m app.utils.migrations`, or on first access.
+"""
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+LEAD_ACTIVITY_BUCKET_SIZE = int(os.getenv("LEAD_ACTIVITY_BUCKET_SIZE", "50"))
+
+
+def bucket_of(seq: int) -> int:
+    return (seq - 1) // LEAD_ACTIVITY_BUCKET_SIZE
+
+
+def _bucket_updates(lead_id: str, numbered: List[Tuple[int, dict]], newer: bool) -> List[UpdateOne]:
+    """Upserts adding (seq, activity) pairs to their buckets.
+
+    Buckets keep activities newest first: `newer` ones go to the front, older ones
+    (migrated history) to the back. Migrated history may be written again after an
+    interrupted migration, so those updates skip a bucket that already holds their activities;
+    the upsert then fails on the unique (lead_id, bucket) index instead of adding a copy.
+    """
+    by_bucket: Dict[int, List[dict]] = {}
+    for seq, activity in numbered:
+        by_bucket.setdefault(bucket_of(seq), []).append({**activity, "seq": seq})
+
+    operations = []
+    for bucket, activities in by_bucket.items():
+        activities.sort(key=lambda activity: activity["seq"], reverse=True)
+        push = {"$each": activities, "$position": 0} if newer else {"$each": activities}
+        query = {"lead_id": lead_id, "bucket": bucket}
+        if not newer:
+            query["activities.seq"] = {"$ne": activities[0]["seq"]}
+        operations.append(UpdateOne(
+            query,
+            {
+                "$push": {"activities": push},
+                "$inc": {"count": len(activities)},
+                "$max": {"last_at": activities[0].get("timestamp") or ""}
+            },
+            upsert=True
+        ))
+    return operations
+
+
+async def _write_migrated_buckets(db, lead_id: str, numbered: List[Tuple[int, dict]]):
+    try:
+        await db.lead_activity_buckets.bulk_write(_bucket_updates(lead_id, numbered, newer=False), ordered=False)
+    except BulkWriteError as error:
+        # Duplicate keys only mean the bucket was written by an earlier or concurrent attempt
+        if any(write_error.get("code") != 11000 for write_error in error.details.get("writeErrors", [])):
+            raise
+
+
+async def migrate_lead_activities(db, query: Optional[dict] = None) -> int:
+    """Move embedded `activities` arrays of matching leads into buckets; returns leads migrated.
+
+    The buckets are written before the array is removed, so a failure in between leaves the
+    history on the lead for the next attempt rather than losing it.
+    """
+    legacy_query = {"activities": {"$exists": True}, **(query or {})}
+    leads = await db.leads.find(legacy_query, {"lead_id": 1, "activities": 1, "activityCount": 1}).to_list(length=None)
+
+    migrated = 0
+    for lead in leads:
+        stored = lead.get("activities")
+        activities = stored if isinstance(stored, list) else []
+        # Legacy history takes the next numbers (no activity is recorded while the array exists)
+        counted = lead.get("activityCount") or 0
+        if activities:
+            await _write_migrated_buckets(db, lead["lead_id"], list(enumerate(activities, start=counted + 1)))
+
+        update: dict = {"$unset": {"activities": ""}, "$set": {"activityCount": counted + len(activities)}}
+        if activities:
+            update["$max"] = {"lastActivityAt": activities[-1].get("timestamp") or ""}
+        # Skip the lead if its array changed since it was read (another migration got there first)
+        result = await db.leads.update_one({"_id": lead["_id"], "activities": stored}, update)
+        if result.modified_count:
+            migrated += 1
+    return migrated
+
+
+async def record_lead_activity(db, lead_id: str, activity: dict, set_fields: Optional[dict] = None) -> bool:
+    """Append an activity to a lead's timeline, applying `set_fields` to the lead in the same write.
+
+    Returns False when the lead does not exist.
+    """
+    activity = {**activity, "timestamp": activity.get("timestamp") or datetime.now().isoformat()}
+    update = {
+        "$inc": {"activityCount": 1},
+        "$set": {"lastActivityAt": activity["timestamp"], **(set_fields or {})}
+    }
+    lead = await db.leads.find_one_and_update(
+        {"lead_id": lead_id, "activities": {"$exists": False}}, update,
+        projection={"activityCount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not lead:
+        # Either no such lead, or a legacy one: move its embedded history first so it
+        # keeps the lower numbers, then retry
+        if not await migrate_lead_activities(db, {"lead_id": lead_id}):
+            return False
+        return await record_lead_activity(db, lead_id, activity, set_fields)
+
+    await db.lead_activity_buckets.bulk_write(
+        _bucket_updates(lead_id, [(lead["activityCount"], activity)], newer=True)
+    )
+    return True
+
+
+async def insert_leads(db, leads: List[dict], activities: List[dict]) -> int:
+    """Insert new leads, each with its first activity (`activities[i]` belongs to `leads[i]`).
+
+    Two bulk writes for the whole batch instead of one insert plus a counter update per lead.
+    Returns the number of leads inserted.
+    """
+    if not leads:
+        return 0
+    buckets = []
+    for lead, activity in zip(leads, activities):
+        activity = {**activity, "timestamp": activity.get("timestamp") or datetime.now().isoformat(), "seq": 1}
+        lead.update({"activityCount": 1, "lastActivityAt": activity["timestamp"]})
+        buckets.append({
+            "lead_id": lead["lead_id"],
+            "bucket": bucket_of(1),
+            "count": 1,
+            "activities": [activity],
+            "last_at": activity["timestamp"]
+        })
+    result = await db.leads.insert_many(leads, ordered=False)
+    await db.lead_activity_buckets.insert_many(buckets, ordered=False)
+    return len(result.inserted_ids)
+
+
+async def find_lead(db, query: dict) -> Optional[dict]:
+    """Read a lead, first moving a legacy embedded activity log into buckets"""
+    lead = await db.leads.find_one(query, {"activities": 0})
+    # Only leads from before the buckets lack the counter
+    if lead and "activityCount" not in lead:
+        await migrate_lead_activities(db, {"_id": lead["_id"]})
+        lead = await db.leads.find_one({"_id": lead["_id"]}, {"activities": 0})
+    return lead
+
+
+async def fetch_lead_timeline(db, lead: dict, before: Optional[int] = None,
+                              limit: Optional[int] = 20) -> Tuple[List[dict], Optional[int]]:
+    """Newest-first activities of a lead (as read by find_lead) numbered below `before`.
+
+    `limit` None reads all of them. Returns (activities, number to pass as `before` for the next page, or None at the end).
+    """
+    newest = (before - 1) if before else lead.get("activityCount", 0)
+    if newest < 1:
+        return [], None
+    oldest = max(1, newest - limit + 1) if limit is not None else 1
+
+    buckets_cursor = db.lead_activity_buckets.find(
+        {"lead_id": lead["lead_id"], "bucket": {"$gte": bucket_of(oldest), "$lte": bucket_of(newest)}},
+        {"activities": 1}
+    )
+    buckets = await buckets_cursor.to_list(length=None)
+    activities = [
+        activity
+        for bucket in buckets
+        for activity in bucket.get("activities", [])
+        if oldest <= activity.get("seq", 0) <= newest
+    ]
+    activities.sort(key=lambda activity: activity["seq"], reverse=True)
+    return activities, (oldest if oldest > 1 else None)
+
+
+async def delete_lead_activities(db, lead_id: str):
+    await db.lead_activity_buckets.delete_many({"lead_id": lead_id})
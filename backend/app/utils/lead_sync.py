@@ -0,0 +1,298 @@
+"""
+Background creation of CRM leads for rental enquiries that have none.
+
+Each run looks only at rentals changed since the stored watermark. One aggregation derives
+each rental's enquiry id, anti-joins it against `leads.enquiry_id` and keeps one rental per
+missing id. IDs for all new leads are then allocated as one block and the leads are stored
+with a single insert_many.
+
+Progress lives in the `sync_state` document {"_id": "enquiry_leads"}:
+watermark (highest rental updated_at/created_at processed), lease (so only one worker runs
+a sync at a time), last run time and count.
+
+The timestamps are written by the application, not the server, so a rental can be stored
+after a run has already seen a later timestamp. Each run therefore starts LEAD_SYNC_LAG_SECONDS
+before the watermark; rentals already having a lead are dropped by the anti-join, so looking
+at them again is harmless. Only a rental stored more than that long after its own timestamp
+can be missed.
+
+Rentals hold those timestamps as ISO strings or as datetimes, depending on the code path
+that wrote them, and MongoDB only compares values of the same type, so the watermark is kept
+per type: {"string": "2025-10-01T...", "date": datetime(...)}.
+
+Runs every LEAD_SYNC_SECONDS from startup, or once with:
+    python -m app.utils.lead_sync
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import DESCENDING
+
+from .counters import LEAD_ID, next_ids
+from .database import get_database, connect_to_mongo, close_mongo_connection
+from .lead_activity import insert_leads
+
+logger = logging.getLogger(__name__)
+
+LEAD_SYNC_SECONDS = int(os.getenv("LEAD_SYNC_SECONDS", "60"))
+# A crashed run blocks others for at most this long
+LEAD_SYNC_LEASE_SECONDS = int(os.getenv("LEAD_SYNC_LEASE_SECONDS", "300"))
+# How far before the watermark each run starts looking again
+LEAD_SYNC_LAG_SECONDS = int(os.getenv("LEAD_SYNC_LAG_SECONDS", "300"))
+
+SYNC_STATE_ID = "enquiry_leads"
+# BSON types rental timestamps are stored as
+TIMESTAMP_TYPES = ("string", "date")
+
+
+def _string(path: str) -> dict:
+    """The field if it is a non-empty string, else ''"""
+    return {"$cond": [{"$eq": [{"$type": path}, "string"]}, path, ""]}
+
+
+def _zero_pad(expression: Any, width: int) -> dict:
+    return {"$let": {
+        "vars": {"value": expression},
+        "in": {"$concat": [
+            {"$substrCP": ["0" * width, 0, {"$max": [0, {"$subtract": [width, {"$strLenCP": "$$value"}]}]}]},
+            "$$value"
+        ]}
+    }}
+
+
+def enquiry_key_expression(current_year: int) -> dict:
+    """The enquiry id a rental's lead is filed under.
+
+    ENQ- ids are used as is, RC-YYYY-### contract numbers become ENQ-YYYY-0###, anything
+    else falls back to ENQ-<created year>-<first 4 chars of the rental _id>.
+    """
+    created = "$created_at"
+    created_year = {"$switch": {
+        "branches": [
+            {"case": {"$regexMatch": {"input": _string(created), "regex": r"^\d{4}"}},
+             "then": {"$substrCP": [created, 0, 4]}},
+            {"case": {"$eq": [{"$type": created}, "date"]}, "then": {"$toString": {"$year": created}}}
+        ],
+        "default": str(current_year)
+    }}
+    fallback = {"$concat": ["ENQ-", created_year, "-", {"$substrCP": [{"$toString": "$_id"}, 0, 4]}]}
+    return {"$let": {
+        "vars": {"raw": {"$cond": [{"$ne": [_string("$enquiry_id"), ""]}, "$enquiry_id", _string("$contract_number")]}},
+        "in": {"$let": {
+            "vars": {"parts": {"$split": ["$$raw", "-"]}},
+            "in": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": [{"$substrCP": ["$$raw", 0, 4]}, "ENQ-"]}, "then": "$$raw"},
+                    {"case": {"$and": [
+                        {"$eq": [{"$substrCP": ["$$raw", 0, 3]}, "RC-"]},
+                        {"$eq": [{"$size": "$$parts"}, 3]},
+                        {"$regexMatch": {"input": {"$arrayElemAt": ["$$parts", 1]}, "regex": r"^\d+$"}}
+                    ]}, "then": {"$concat": [
+                        "ENQ-", {"$arrayElemAt": ["$$parts", 1]}, "-",
+                        _zero_pad({"$arrayElemAt": ["$$parts", 2]}, 4)
+                    ]}}
+                ],
+                "default": fallback
+            }}
+        }}
+    }}
+
+
+def _changed_between(start: Dict[str, Any], end: Dict[str, Any]) -> dict:
+    """Rentals whose updated_at (or created_at when never updated) lies in [start, end].
+
+    Both are {type: timestamp}; each type gets its own window.
+    """
+    windows = []
+    for timestamp_type, last in end.items():
+        window = {"$lte": last}
+        if start.get(timestamp_type) is not None:
+            window["$gte"] = start[timestamp_type]
+        windows += [
+            {"updated_at": window},
+            {"updated_at": {"$exists": False}, "created_at": window}
+        ]
+    return {"$or": windows}
+
+
+def build_missing_leads_pipeline(start: Dict[str, Any], end: Dict[str, Any], current_year: int) -> List[dict]:
+    """Rentals changed in the window whose enquiry has no lead, one per enquiry id"""
+    return [
+        {"$match": _changed_between(start, end)},
+        {"$set": {
+            "_enquiry_key": enquiry_key_expression(current_year),
+            "_email": {"$cond": [{"$ne": [_string("$contact_email"), ""]}, "$contact_email", _string("$customer_email")]}
+        }},
+        {"$match": {"_email": {"$ne": ""}}},
+        {"$lookup": {
+            "from": "leads",
+            "let": {"key": "$_enquiry_key"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$enquiry_id", "$$key"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "_lead"
+        }},
+        {"$match": {"_lead": {"$size": 0}}},
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": "$_enquiry_key",
+            "rental_id": {"$first": "$_id"},
+            "customer_name": {"$first": "$customer_name"},
+            "email": {"$first": "$_email"},
+            "assigned_salesperson_name": {"$first": "$assigned_salesperson_name"},
+            "created_at": {"$first": "$created_at"}
+        }},
+        {"$sort": {"created_at": 1, "_id": 1}}
+    ]
+
+
+def build_lead(row: dict, lead_id: str, now: str) -> dict:
+    customer_name = row.get("customer_name") or "Unknown"
+    customer_name_parts = customer_name.strip().split(maxsplit=1)
+    first_name = customer_name_parts[0] if customer_name_parts else customer_name
+    last_name = customer_name_parts[1] if len(customer_name_parts) > 1 else ""
+    created_at = row.get("created_at") or now
+    return {
+        "lead_id": lead_id,
+        "salutation": "Mr",
+        "firstName": first_name,
+        "lastName": last_name,
+        "email": row["email"],
+        "mobile": "",
+        "organization": customer_name if len(customer_name_parts) == 1 else "",
+        "website": "",
+        "jobTitle": "",
+        "industry": "",
+        "source": "Enquiry Form",
+        "status": "New",
+        "gender": "Male",
+        "noOfEmployees": "",
+        "annualRevenue": 0,
+        "territory": "",
+        "leadOwner": row.get("assigned_salesperson_name") or "Shariq Ansari",
+        "createdAt": created_at,
+        "createdBy": "system",
+        "updatedAt": created_at,
+        "enquiry_id": row["_id"],
+        "enquiry_reference": str(row["rental_id"])
+    }
+
+
+async def _latest_changes(db) -> Dict[str, Any]:
+    """Highest updated_at/created_at over all rentals, per type (index lookups only)"""
+    latest: Dict[str, Any] = {}
+    for timestamp_type in TIMESTAMP_TYPES:
+        for query, field in (({"updated_at": {"$type": timestamp_type}}, "updated_at"),
+                             ({"updated_at": {"$exists": False}, "created_at": {"$type": timestamp_type}}, "created_at")):
+            docs = await db.rentals.find(query, {field: 1}).sort(field, DESCENDING).limit(1).to_list(length=1)
+            value = docs[0].get(field) if docs else None
+            if value is not None and (timestamp_type not in latest or value > latest[timestamp_type]):
+                latest[timestamp_type] = value
+    return latest
+
+
+def _stored_watermark(state: dict) -> Dict[str, Any]:
+    watermark = state.get("watermark")
+    if watermark is None or isinstance(watermark, dict):
+        return watermark or {}
+    # Written before the watermark was kept per type
+    return {"date" if isinstance(watermark, datetime) else "string": watermark}
+
+
+def _rewind(watermark: Dict[str, Any], seconds: int) -> Dict[str, Any]:
+    """The watermark moved `seconds` back, per type"""
+    rewound: Dict[str, Any] = {}
+    for timestamp_type, value in watermark.items():
+        if isinstance(value, datetime):
+            rewound[timestamp_type] = value - timedelta(seconds=seconds)
+        elif isinstance(value, str):
+            try:
+                rewound[timestamp_type] = (datetime.fromisoformat(value) - timedelta(seconds=seconds)).isoformat()
+            except ValueError:
+                rewound[timestamp_type] = value  # not an ISO timestamp: no lag for this type
+    return rewound
+
+
+async def _acquire_lease(db) -> Optional[dict]:
+    now = datetime.utcnow()
+    await db.sync_state.update_one({"_id": SYNC_STATE_ID}, {"$setOnInsert": {"lease_until": now}}, upsert=True)
+    return await db.sync_state.find_one_and_update(
+        {"_id": SYNC_STATE_ID, "lease_until": {"$lte": now}},
+        {"$set": {"lease_until": now + timedelta(seconds=LEAD_SYNC_LEASE_SECONDS)}}
+    )
+
+
+async def sync_leads_for_enquiries(db) -> int:
+    """Create the missing leads for rentals changed since the last run; returns leads created"""
+    state = await _acquire_lease(db)
+    if state is None:
+        return 0  # another worker is syncing
+
+    created = 0
+    try:
+        watermark = _stored_watermark(state)
+        latest = await _latest_changes(db)
+        if latest:
+            now = datetime.now()
+            pipeline = build_missing_leads_pipeline(_rewind(watermark, LEAD_SYNC_LAG_SECONDS), latest, now.year)
+            rows = await db.rentals.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+            if rows:
+                lead_ids = await next_ids(db, LEAD_ID, len(rows))
+                leads = [build_lead(row, lead_id, now.isoformat()) for row, lead_id in zip(rows, lead_ids)]
+                activities = [{
+                    "type": "created",
+                    "description": f"Lead created from enquiry: {lead['enquiry_id']} (synced)",
+                    "by": "System",
+                    "timestamp": lead["createdAt"]
+                } for lead in leads]
+                created = await insert_leads(db, leads, activities)
+            watermark = {**watermark, **latest}
+        await db.sync_state.update_one({"_id": SYNC_STATE_ID}, {"$set": {
+            "watermark": watermark,
+            "last_run_at": datetime.utcnow(),
+            "last_created": created
+        }})
+    finally:
+        await db.sync_state.update_one({"_id": SYNC_STATE_ID}, {"$set": {"lease_until": datetime.utcnow()}})
+
+    if created:
+        logger.info("Synced %d missing leads for enquiries", created)
+    return created
+
+
+async def mark_rentals_synced(db):
+    """Move the watermark past every stored rental, e.g. after a bulk load that wrote their leads too"""
+    latest = await _latest_changes(db)
+    state = await db.sync_state.find_one({"_id": SYNC_STATE_ID}) or {}
+    await db.sync_state.update_one(
+        {"_id": SYNC_STATE_ID},
+        {"$set": {"watermark": {**_stored_watermark(state), **latest}},
+         "$setOnInsert": {"lease_until": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def sync_leads_periodically(interval: int = LEAD_SYNC_SECONDS):
+    """Background task creating leads for new enquiries every `interval` seconds"""
+    while True:
+        try:
+            await sync_leads_for_enquiries(get_database())
+        except Exception as e:
+            logger.warning("Enquiry lead sync failed: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def run_sync():
+    await connect_to_mongo()
+    created = await sync_leads_for_enquiries(get_database())
+    print(f"Created {created} leads")
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_sync())
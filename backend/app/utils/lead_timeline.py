@@ -0,0 +1,102 @@
+"""
+Unified lead timeline: emails, calls, tasks and notes of a lead in one aggregation.
+
+The first selected collection is the aggregation source and the others are merged in with
+$unionWith. Every branch filters, sorts and limits on its own (lead_id, timestamp, _id)
+index before the merge, so a page never holds more than `limit + 1` entries per type
+however active the lead is. Entries are ordered by a normalized `timestamp` (the
+`timestamp` of emails and calls, the `createdAt` of tasks and notes) and paged with a
+keyset cursor over (timestamp, _id).
+
+$unionWith needs MongoDB 4.4 or newer.
+"""
+from typing import List, Optional, Tuple
+
+from pymongo import DESCENDING
+
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+# entry type -> (collection, timestamp field)
+TIMELINE_SOURCES = {
+    "email": ("lead_emails", "timestamp"),
+    "call": ("lead_calls", "timestamp"),
+    "task": ("lead_tasks", "createdAt"),
+    "note": ("lead_notes", "createdAt"),
+}
+TIMELINE_TYPES = list(TIMELINE_SOURCES)
+
+# Cursor namespace, so cursors of other listings are rejected
+TIMELINE_CURSOR_KEY = "timeline"
+
+
+def _limit(limit: Optional[int]) -> List[dict]:
+    return [{"$limit": limit}] if limit is not None else []
+
+
+def _branch(lead_id: str, entry_type: str, after: Optional[tuple], limit: Optional[int]) -> List[dict]:
+    """Newest `limit` entries of one type (all when None), in the normalized timeline shape"""
+    _, field = TIMELINE_SOURCES[entry_type]
+    match: dict = {"lead_id": lead_id}
+    if after:
+        match = {"$and": [match, keyset_filter(field, DESCENDING, *after)]}
+    return [
+        {"$match": match},
+        {"$sort": {field: -1, "_id": -1}},
+        *_limit(limit),
+        {"$project": {
+            "_id": 1,
+            "type": {"$literal": entry_type},
+            "timestamp": {"$ifNull": [f"${field}", None]},
+            "details": "$$ROOT"
+        }}
+    ]
+
+
+def build_timeline_pipeline(lead_id: str, types: List[str], after: Optional[tuple],
+                            limit: Optional[int]) -> Tuple[str, List[dict]]:
+    """(source collection, pipeline) for one timeline page of `limit` entries"""
+    first, *rest = types
+    pipeline = _branch(lead_id, first, after, limit)
+    for entry_type in rest:
+        pipeline.append({"$unionWith": {
+            "coll": TIMELINE_SOURCES[entry_type][0],
+            "pipeline": _branch(lead_id, entry_type, after, limit)
+        }})
+    pipeline += [
+        {"$sort": {"timestamp": -1, "_id": -1}},
+        *_limit(limit)
+    ]
+    return TIMELINE_SOURCES[first][0], pipeline
+
+
+async def fetch_lead_timeline_page(
+    db,
+    lead_id: str,
+    types: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = 50
+) -> Tuple[List[dict], Optional[str]]:
+    """One newest-first timeline page (the rest of it when limit is None); returns (entries, next cursor or None)"""
+    after = decode_cursor(cursor, TIMELINE_CURSOR_KEY) if cursor else None
+    collection, pipeline = build_timeline_pipeline(
+        lead_id, types or TIMELINE_TYPES, after, limit + 1 if limit is not None else None
+    )
+    rows = await getattr(db, collection).aggregate(pipeline).to_list(length=None)
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(TIMELINE_CURSOR_KEY, rows[-1]["timestamp"], rows[-1]["_id"])
+
+    entries = []
+    for row in rows:
+        details = row["details"]
+        details.pop("_id", None)
+        details.pop("lead_id", None)
+        entries.append({
+            "id": str(row["_id"]),
+            "type": row["type"],
+            "timestamp": row["timestamp"],
+            "details": details
+        })
+    return entries, next_cursor
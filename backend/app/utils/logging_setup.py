@@ -0,0 +1,202 @@
+"""
+Structured, non-blocking logging.
+
+Modules log through the standard library (`logger = logging.getLogger(__name__)`).
+configure_logging(), called once when the app is imported, sends every record through a
+QueueHandler. The logging call, usually on the event loop, only puts the record on an
+in-memory queue. A QueueListener thread formats it and writes it to stdout, so a slow stdout
+consumer never stalls request handling. When the queue is full, records are dropped and
+counted rather than blocking the caller.
+
+Settings:
+    LOG_LEVEL=INFO                                  level of the app.* loggers
+    LOG_LEVELS=app.routers.crm=DEBUG,app.utils.indexes=WARNING
+                                                    per-module levels
+    LOG_FORMAT=json|text                            json by default in production, text otherwise
+    LOG_DEBUG_SAMPLE=1                              keep one in N DEBUG records per call site
+    LOG_QUEUE_SIZE=10000
+
+Every record carries the ID of the request that logged it (`-` outside requests).
+RequestIdMiddleware takes the incoming X-Request-ID, or generates one, and echoes it on the
+response, so one request's lines can be correlated with each other and with the client. Extra
+fields passed as `logger.info(..., extra={...})` become JSON fields.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if os.getenv("ENVIRONMENT", "development") == "production" else "text")
+LOG_DEBUG_SAMPLE = max(1, int(os.getenv("LOG_DEBUG_SAMPLE", "1")))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Accepted from clients as-is; anything else is replaced by a generated ID
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request ID (runs in the caller, before queueing)"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps the first and then every `every`-th DEBUG record of each call site"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counts: Dict[tuple, int] = {}
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        count = self._counts.get(site, 0)
+        self._counts[site] = count + 1
+        record.sample_rate = self.every
+        return count % self.every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of raising"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Merge the arguments and render the traceback now; the record is formatted on the writer thread"""
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id, extra fields, exc"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"a.b=DEBUG,c=WARNING" -> {"a.b": "DEBUG", "c": "WARNING"}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, log_format: str = LOG_FORMAT,
+                      debug_sample: int = LOG_DEBUG_SAMPLE, queue_size: int = LOG_QUEUE_SIZE):
+    """Route the `app` loggers through the queue; safe to call more than once"""
+    global queue_handler, _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample))
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+    app_logger = logging.getLogger("app")
+    app_logger.handlers = [queue_handler]
+    app_logger.propagate = False
+    app_logger.setLevel(level)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return queue_handler.dropped if queue_handler is not None else 0
+
+
+def new_request_id(incoming: bytes) -> str:
+    value = incoming.decode("latin-1")
+    return value if REQUEST_ID_PATTERN.match(value) else uuid.uuid4().hex
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request ID to everything logged while serving the request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = new_request_id(dict(scope["headers"]).get(REQUEST_ID_HEADER, b""))
+        token = request_id.set(value)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,89 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+monitor_loop_lag() runs in the background: it sleeps LOOP_LAG_INTERVAL seconds and measures how
+late it wakes up. The overshoot is time the loop spent in other callbacks that did not yield
+(synchronous file I/O, CPU-bound work, writes to a slow stdout), during which no other request made
+progress. Samples go to the event_loop_lag_seconds histogram on /metrics, and the latest one to
+event_loop_lag_last_seconds.
+
+With LOOP_BLOCK_DEBUG=true a watchdog thread also pings the loop. When a ping is not answered
+within LOOP_BLOCK_THRESHOLD_MS, the loop is held by a single callback, and the watchdog logs
+the loop thread's stack at that moment, i.e. the code that is blocking, followed by the total
+block time once the loop answers. One stack is logged per block. The watchdog wakes every
+threshold, so it is meant for debugging sessions rather than left on.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_BLOCK_DEBUG = os.getenv("LOOP_BLOCK_DEBUG", "false").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+loop_lag = Histogram(
+    "event_loop_lag_seconds", "Delay of the event loop in running a due callback",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+last_lag = 0.0
+
+
+class LoopWatchdog(threading.Thread):
+    """Logs the loop thread's stack when the loop does not answer a ping within `threshold` seconds"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float):
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.loop = loop
+        self.threshold = threshold
+        self.loop_thread_id = threading.get_ident()  # created from the loop's own thread
+        self.blocks = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return  # loop closed
+            if not answered.wait(self.threshold):
+                self.blocks += 1
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else "(no stack)\n"
+                logger.warning("Event loop blocked for more than %.0fms in:\n%s", self.threshold * 1000, stack.rstrip())
+                while not answered.wait(1):
+                    if self._stopped.is_set():
+                        return
+                logger.warning("Event loop was blocked for %.0fms", (time.monotonic() - sent) * 1000)
+            self._stopped.wait(self.threshold)
+
+    def stop(self):
+        self._stopped.set()
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL, block_debug: bool = LOOP_BLOCK_DEBUG,
+                           block_threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+    global last_lag
+    watchdog: Optional[LoopWatchdog] = None
+    if block_debug:
+        watchdog = LoopWatchdog(asyncio.get_running_loop(), block_threshold_ms / 1000)
+        watchdog.start()
+    try:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            last_lag = max(0.0, time.perf_counter() - started - interval)
+            loop_lag.observe((), last_lag)
+    finally:
+        if watchdog is not None:
+            watchdog.stop()
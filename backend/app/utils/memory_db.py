@@ -0,0 +1,2991 @@
+"""
+In-memory MongoDB stand-in with Motor's async API.
+
+MemoryDatabase keeps each collection as documents keyed by _id plus sorted secondary
+indexes, so the whole API can run, be tested and be load-tested in-process without a
+MongoDB server. It is used when MONGODB_URL is memory:// and as the fallback when MongoDB
+cannot be reached.
+
+- Queries: comparisons, $in/$nin, $exists, $type, $regex, $not, $size, $all, $elemMatch,
+  $mod, $and/$or/$nor and $expr, with MongoDB's array and null matching rules.
+- Indexes: create_index(es) builds sorted compound, multikey, unique, sparse and partial
+  indexes. The planner answers equality, $in, range and prefix-regex conditions (also
+  `$expr` equality, as used by $lookup pipelines) from the best index, and walks an index in
+  order when it matches the requested sort so sort + limit stops early. Candidates are always
+  re-checked against the full filter, and, as in MongoDB, an index is only used when it
+  holds every document the query can match: sparse and partial indexes only when the query
+  implies their coverage, and a range on a multikey index only bounds one side. The planner
+  therefore only affects speed, never results.
+- Updates: $set, $unset, $inc, $mul, $min, $max, $push ($each/$position/$slice/$sort),
+  $addToSet, $pull, $pullAll, $pop, $rename, $setOnInsert, $currentDate, replacements,
+  pipeline updates and upserts.
+- Aggregation: $match, $project, $addFields/$set, $unset, $sort, $skip, $limit, $group,
+  $count, $unwind, $lookup (localField and let/pipeline), $unionWith, $bucket, $facet,
+  $sortByCount and $replaceRoot/$replaceWith, with the expression operators the app uses.
+- Monitoring: each call is published to pymongo command listeners (the globally registered
+  ones plus `event_listeners`, as MongoClient does) as the command the driver would send,
+  so listeners such as the query-shape recorder see the same traffic on both backends.
+
+No operation awaits anything internally, so each one is atomic, as single-document writes
+are in MongoDB. Documents are copied on the way in and out, and values are stored the way
+BSON would store them (tuples as lists, datetimes as naive UTC milliseconds). Unsupported
+operators raise OperationFailure rather than being ignored.
+"""
+import bisect
+import itertools
+import math
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import Decimal128, Int64, ObjectId
+from bson.errors import InvalidDocument
+from bson.regex import Regex
+from pymongo import ASCENDING, IndexModel, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, InvalidOperation, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+
+class _Missing:
+    """Value of a field that does not exist (unlike null)"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+_REGEX_TYPES = (re.Pattern, Regex)
+_SCALARS = (type(None), bool, int, float, str, ObjectId, datetime, Int64, Decimal128, bytes)
+
+# $type names and aliases
+_TYPE_CODES = {
+    1: "double", 2: "string", 3: "object", 4: "array", 5: "binData", 7: "objectId", 8: "bool",
+    9: "date", 10: "null", 11: "regex", 16: "int", 18: "long", 19: "decimal",
+}
+_NUMBER_TYPES = {"double", "int", "long", "decimal"}
+
+
+# ---------------------------------------------------------------------------
+# Values
+# ---------------------------------------------------------------------------
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal128)) and not isinstance(value, bool)
+
+
+def _number(value):
+    return float(value.to_decimal()) if isinstance(value, Decimal128) else value
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bson_type(value) -> str:
+    """$type name of a value ("missing" for absent fields)"""
+    if value is MISSING:
+        return "missing"
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, Int64):
+        return "long"
+    if isinstance(value, int):
+        return "int" if -2 ** 31 <= value < 2 ** 31 else "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, Decimal128):
+        return "decimal"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, _REGEX_TYPES):
+        return "regex"
+    if isinstance(value, bytes):
+        return "binData"
+    return "object"
+
+
+def sort_key(value) -> tuple:
+    """Hashable key ordering values as MongoDB compares BSON (null and missing are equal)"""
+    if value is None or value is MISSING:
+        return (1,)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, tuple((key, sort_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (5, tuple(sort_key(item) for item in value))
+    if isinstance(value, ObjectId):
+        return (7, value.binary)
+    if isinstance(value, datetime):
+        return (9, _naive_utc(value))
+    if isinstance(value, Decimal128):
+        return (2, float(value.to_decimal()))
+    if isinstance(value, bytes):
+        return (6, value)
+    if isinstance(value, _REGEX_TYPES):
+        return (11, value.pattern)
+    return (12, str(value))
+
+
+def _expr_key(value) -> tuple:
+    """Aggregation comparison key: missing sorts before null"""
+    return (0,) if value is MISSING else sort_key(value)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _to_stored(value):
+    """The value as MongoDB would store and return it"""
+    if isinstance(value, dict):
+        stored = {}
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise InvalidDocument(f"documents must have only string keys, key was {key!r}")
+            stored[key] = _to_stored(item)
+        return stored
+    if isinstance(value, (list, tuple)):
+        return [_to_stored(item) for item in value]
+    if isinstance(value, datetime):
+        value = _naive_utc(value)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if value is None or type(value) in _SCALARS or isinstance(value, _REGEX_TYPES):
+        return value
+    # Subclasses (e.g. str/int enums) are stored as their base type
+    if isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str):
+        return str.__str__(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    raise InvalidDocument(f"cannot encode object: {value!r}, of type: {type(value)}")
+
+
+_PARTS: Dict[str, Tuple[str, ...]] = {}
+
+
+def _parts(path: str) -> Tuple[str, ...]:
+    parts = _PARTS.get(path)
+    if parts is None:
+        parts = _PARTS[path] = tuple(path.split("."))
+    return parts
+
+
+def _query_values(value, parts: Tuple[str, ...], start: int = 0) -> List[Any]:
+    """Values a query condition on a dotted path is tested against (arrays are traversed)"""
+    for i in range(start, len(parts)):
+        part = parts[i]
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+            if value is MISSING:
+                return [MISSING]
+        elif isinstance(value, list):
+            found = []
+            if part.isdigit() and int(part) < len(value):
+                found += _query_values(value[int(part)], parts, i + 1)
+            for item in value:
+                if isinstance(item, dict):
+                    found += [v for v in _query_values(item, parts, i) if v is not MISSING]
+            return found or [MISSING]
+        else:
+            return [MISSING]
+    return [value]
+
+
+def _expr_path(value, parts: Tuple[str, ...]):
+    """Value of a field path in an aggregation expression ("$a.b" maps over arrays)"""
+    for i, part in enumerate(parts):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list):
+            rest = parts[i:]
+            mapped = (_expr_path(item, rest) for item in value if isinstance(item, (dict, list)))
+            return [item for item in mapped if item is not MISSING]
+        else:
+            return MISSING
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Query matching
+# ---------------------------------------------------------------------------
+
+def _compile_regex(pattern, options: str = "") -> re.Pattern:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    if isinstance(pattern, Regex):
+        pattern, options = pattern.pattern, options or pattern.flags
+        if isinstance(options, int):
+            return re.compile(pattern, options)
+    flags = 0
+    for option in options or "":
+        flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _equals(target) -> Callable[[Any], bool]:
+    """Test for one value (not traversing arrays) being equal to target"""
+    if isinstance(target, _REGEX_TYPES):
+        regex = _compile_regex(target)
+        return lambda value: isinstance(value, str) and regex.search(value) is not None
+    if isinstance(target, str):
+        return lambda value: value == target and isinstance(value, str)
+    if _is_number(target) and not isinstance(target, Decimal128):
+        return lambda value: _is_number(value) and _number(value) == target
+    key = sort_key(target)
+    if target is None:
+        return lambda value: value is None or value is MISSING
+    return lambda value: value is not MISSING and sort_key(value) == key
+
+
+def _any_element(test: Callable[[Any], bool], include_array: bool = True) -> Callable[[List[Any]], bool]:
+    """Condition true when some value, or some element of an array value, passes `test`"""
+    def check(values: List[Any]) -> bool:
+        for value in values:
+            if isinstance(value, list):
+                if include_array and test(value):
+                    return True
+                if any(test(item) for item in value):
+                    return True
+            elif test(value):
+                return True
+        return False
+    return check
+
+
+_COMPARATORS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _compare_test(op: str, target) -> Callable[[List[Any]], bool]:
+    key = sort_key(target)
+    rank = key[0]
+    compare = _COMPARATORS[op]
+
+    def test(value) -> bool:
+        value_key = sort_key(value)
+        # Comparisons only match values of the same BSON type bracket
+        return value_key[0] == rank and compare(value_key, key)
+    return _any_element(test)
+
+
+def _type_test(spec) -> Callable[[List[Any]], bool]:
+    names = set()
+    for item in spec if isinstance(spec, list) else [spec]:
+        name = _TYPE_CODES.get(item, item) if isinstance(item, int) else item
+        names |= _NUMBER_TYPES if name == "number" else {name}
+
+    def check(values: List[Any]) -> bool:
+        for value in values:
+            if value is MISSING:
+                continue
+            if bson_type(value) in names:
+                return True
+            if isinstance(value, list) and any(bson_type(item) in names for item in value):
+                return True
+        return False
+    return check
+
+
+def _operator_test(op: str, arg, condition: dict, variables: Optional[dict]) -> Callable[[List[Any]], bool]:
+    """Test over the values of a field for one query operator"""
+    if op == "$eq":
+        test = _equals(arg)
+        if arg is None:
+            return lambda values: any(v is None or v is MISSING or (isinstance(v, list) and None in v) for v in values)
+        return _any_element(test)
+    if op == "$ne":
+        eq = _operator_test("$eq", arg, condition, variables)
+        return lambda values: not eq(values)
+    if op in _COMPARATORS:
+        return _compare_test(op, arg)
+    if op == "$in":
+        if not isinstance(arg, list):
+            raise OperationFailure("$in needs an array", 2)
+        tests = [_operator_test("$eq", item, condition, variables) for item in arg]
+        return lambda values: any(test(values) for test in tests)
+    if op == "$nin":
+        inside = _operator_test("$in", arg, condition, variables)
+        return lambda values: not inside(values)
+    if op == "$exists":
+        wanted = bool(arg)
+        return lambda values: any(v is not MISSING for v in values) == wanted
+    if op == "$regex":
+        regex = _compile_regex(arg, condition.get("$options", ""))
+        return _any_element(lambda value: isinstance(value, str) and regex.search(value) is not None, False)
+    if op == "$options":
+        return lambda values: True
+    if op == "$not":
+        if isinstance(arg, dict):
+            inner = [_operator_test(sub, sub_arg, arg, variables) for sub, sub_arg in arg.items()]
+        elif isinstance(arg, _REGEX_TYPES):
+            inner = [_any_element(_equals(arg), False)]
+        else:
+            raise OperationFailure("$not needs a regex or a document", 2)
+        return lambda values: not all(test(values) for test in inner)
+    if op == "$type":
+        return _type_test(arg)
+    if op == "$size":
+        return lambda values: any(isinstance(v, list) and len(v) == arg for v in values)
+    if op == "$all":
+        tests = [_operator_test("$eq", item, condition, variables) for item in arg]
+        return lambda values: bool(tests) and all(test(values) for test in tests)
+    if op == "$elemMatch":
+        if all(key.startswith("$") and key not in ("$and", "$or", "$nor", "$expr") for key in arg):
+            element_tests = [_operator_test(sub, sub_arg, arg, variables) for sub, sub_arg in arg.items()]
+
+            def element_matches(item) -> bool:
+                return all(test([item]) for test in element_tests)
+        else:
+            predicate = compile_query(arg, variables)
+
+            def element_matches(item) -> bool:
+                return isinstance(item, dict) and predicate(item)
+        return lambda values: any(isinstance(v, list) and any(element_matches(item) for item in v) for v in values)
+    if op == "$mod":
+        divisor, remainder = arg
+        return _any_element(lambda value: _is_number(value) and int(_number(value)) % divisor == remainder, False)
+    raise OperationFailure(f"unknown operator: {op}", 2)
+
+
+def _compile_field(path: str, condition, variables: Optional[dict]) -> Callable[[dict], bool]:
+    parts = _parts(path)
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        tests = [_operator_test(op, arg, condition, variables) for op, arg in condition.items()]
+    else:
+        tests = [_operator_test("$eq", condition, {}, variables)]
+    if len(tests) == 1:
+        test = tests[0]
+        return lambda doc: test(_query_values(doc, parts))
+
+    def check(doc: dict) -> bool:
+        values = _query_values(doc, parts)
+        return all(test(values) for test in tests)
+    return check
+
+
+def compile_query(query: Optional[dict], variables: Optional[dict] = None) -> Callable[[dict], bool]:
+    """Predicate for a MongoDB query document"""
+    if not query:
+        return lambda doc: True
+    tests: List[Callable[[dict], bool]] = []
+    for key, value in query.items():
+        if key in ("$and", "$or", "$nor"):
+            if not isinstance(value, list) or not value:
+                raise OperationFailure(f"{key} must be a nonempty array", 2)
+            branches = [compile_query(branch, variables) for branch in value]
+            if key == "$and":
+                tests.append(lambda doc, branches=branches: all(branch(doc) for branch in branches))
+            elif key == "$or":
+                tests.append(lambda doc, branches=branches: any(branch(doc) for branch in branches))
+            else:
+                tests.append(lambda doc, branches=branches: not any(branch(doc) for branch in branches))
+        elif key == "$expr":
+            tests.append(lambda doc, expression=value: _truthy(evaluate(expression, doc, variables)))
+        elif key == "$comment":
+            continue
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}", 2)
+        else:
+            tests.append(_compile_field(key, value, variables))
+    if len(tests) == 1:
+        return tests[0]
+    return lambda doc: all(test(doc) for test in tests)
+
+
+# ---------------------------------------------------------------------------
+# Aggregation expressions
+# ---------------------------------------------------------------------------
+
+def _truthy(value) -> bool:
+    if value is None or value is MISSING or value is False:
+        return False
+    if _is_number(value):
+        return _number(value) != 0
+    return True
+
+
+def _nullish(value) -> bool:
+    return value is None or value is MISSING
+
+
+def evaluate(expression, document: dict, variables: Optional[dict] = None):
+    """Evaluate an aggregation expression against a document"""
+    scope = dict(variables) if variables else {}
+    scope["ROOT"] = document
+    scope["CURRENT"] = document
+    return _eval(expression, scope)
+
+
+def _eval(expression, scope: dict):
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            name, _, rest = expression[2:].partition(".")
+            if name == "REMOVE":
+                return MISSING
+            if name == "NOW":
+                return datetime.utcnow()
+            if name not in scope:
+                raise OperationFailure(f"Use of undefined variable: {name}", 17276)
+            value = scope[name]
+            return _expr_path(value, _parts(rest)) if rest else value
+        if expression.startswith("$"):
+            return _expr_path(scope["CURRENT"], _parts(expression[1:]))
+        return expression
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            op = next(iter(expression))
+            if op.startswith("$"):
+                handler = _OPERATORS.get(op)
+                if handler is None:
+                    raise OperationFailure(f"Unrecognized expression '{op}'", 168)
+                return handler(expression[op], scope)
+        result = {}
+        for key, item in expression.items():
+            value = _eval(item, scope)
+            if value is not MISSING:
+                result[key] = value
+        return result
+    if isinstance(expression, list):
+        return [None if item is MISSING else item for item in (_eval(element, scope) for element in expression)]
+    return expression
+
+
+def _args(arg, scope: dict) -> List[Any]:
+    if isinstance(arg, list):
+        return [_eval(item, scope) for item in arg]
+    return [_eval(arg, scope)]
+
+
+def _fail(op: str, message: str):
+    raise OperationFailure(f"{op} {message}", 16020)
+
+
+def _op_if_null(arg, scope):
+    for item in arg[:-1]:
+        value = _eval(item, scope)
+        if not _nullish(value):
+            return value
+    return _eval(arg[-1], scope)
+
+
+def _op_cond(arg, scope):
+    if isinstance(arg, dict):
+        condition, then, otherwise = arg["if"], arg["then"], arg["else"]
+    else:
+        condition, then, otherwise = arg
+    return _eval(then if _truthy(_eval(condition, scope)) else otherwise, scope)
+
+
+def _op_switch(arg, scope):
+    for branch in arg["branches"]:
+        if _truthy(_eval(branch["case"], scope)):
+            return _eval(branch["then"], scope)
+    if "default" not in arg:
+        raise OperationFailure("$switch could not find a matching branch for an input, and no default was specified.", 40066)
+    return _eval(arg["default"], scope)
+
+
+def _op_and(arg, scope):
+    return all(_truthy(_eval(item, scope)) for item in (arg if isinstance(arg, list) else [arg]))
+
+
+def _op_or(arg, scope):
+    return any(_truthy(_eval(item, scope)) for item in (arg if isinstance(arg, list) else [arg]))
+
+
+def _comparison(compare: Callable[[tuple, tuple], Any]):
+    def handler(arg, scope):
+        left, right = _args(arg, scope)
+        return compare(_expr_key(left), _expr_key(right))
+    return handler
+
+
+def _op_in(arg, scope):
+    value, array = _args(arg, scope)
+    if not isinstance(array, list):
+        _fail("$in", "requires an array as a second argument")
+    key = _expr_key(value)
+    return any(_expr_key(item) == key for item in array)
+
+
+def _op_concat(arg, scope):
+    values = _args(arg, scope)
+    if any(_nullish(value) for value in values):
+        return None
+    if not all(isinstance(value, str) for value in values):
+        _fail("$concat", "only supports strings")
+    return "".join(values)
+
+
+def _op_substr(arg, scope):
+    value, start, length = _args(arg, scope)
+    if _nullish(value):
+        return ""
+    value = value if isinstance(value, str) else _to_string(value)
+    start, length = int(_number(start)), int(_number(length))
+    if start < 0:
+        _fail("$substrCP", "starting index must be non-negative")
+    return value[start:] if length < 0 else value[start:start + length]
+
+
+def _op_str_len(arg, scope):
+    value = _args(arg, scope)[0]
+    if not isinstance(value, str):
+        _fail("$strLenCP", "requires a string argument")
+    return len(value)
+
+
+def _op_split(arg, scope):
+    value, delimiter = _args(arg, scope)
+    if _nullish(value):
+        return None
+    if not isinstance(value, str) or not isinstance(delimiter, str):
+        _fail("$split", "requires string arguments")
+    return value.split(delimiter)
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+def _format_date(value: datetime, fmt: str = "%Y-%m-%dT%H:%M:%S.%LZ") -> str:
+    value = _naive_utc(value)
+    fmt = fmt.replace("%L", f"{value.microsecond // 1000:03d}")
+    return value.strftime(fmt)
+
+
+def _to_string(value):
+    if _nullish(value):
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if _is_number(value):
+        return _format_number(_number(value))
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return _format_date(value)
+    raise OperationFailure(f"Unsupported conversion from {bson_type(value)} to string", 241)
+
+
+def _to_int(value):
+    if _nullish(value):
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if _is_number(value):
+        number = _number(value)
+        if isinstance(number, float) and not math.isfinite(number):
+            raise OperationFailure("Attempt to convert a non-finite number to an integer", 241)
+        return int(number)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            raise OperationFailure(f"Failed to parse number '{value}' in $convert", 241)
+    if isinstance(value, datetime):
+        return int((_naive_utc(value) - datetime(1970, 1, 1)).total_seconds() * 1000)
+    raise OperationFailure(f"Unsupported conversion from {bson_type(value)} to int", 241)
+
+
+def _to_double(value):
+    if _nullish(value):
+        return None
+    if isinstance(value, bool) or _is_number(value):
+        return float(_number(value))
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            raise OperationFailure(f"Failed to parse number '{value}' in $convert", 241)
+    raise OperationFailure(f"Unsupported conversion from {bson_type(value)} to double", 241)
+
+
+def _to_bool(value):
+    if _nullish(value):
+        return None
+    return _truthy(value)
+
+
+def _to_object_id(value):
+    if _nullish(value):
+        return None
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise OperationFailure(f"Failed to parse objectId '{value}' in $convert", 241)
+
+
+def _to_date(value):
+    if _nullish(value):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, ObjectId):
+        return value.generation_time.replace(tzinfo=None)
+    if _is_number(value):
+        return datetime(1970, 1, 1) + timedelta(milliseconds=_number(value))
+    if isinstance(value, str):
+        try:
+            return _naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            raise OperationFailure(f"Error parsing date string '{value}'", 241)
+    raise OperationFailure(f"Unsupported conversion from {bson_type(value)} to date", 241)
+
+
+_CONVERTERS = {
+    "string": _to_string, "int": _to_int, "long": _to_int, "double": _to_double, "decimal": _to_double,
+    "bool": _to_bool, "objectId": _to_object_id, "date": _to_date,
+}
+
+
+def _converter(convert: Callable[[Any], Any]):
+    return lambda arg, scope: convert(_args(arg, scope)[0])
+
+
+def _op_convert(arg, scope):
+    value = _eval(arg["input"], scope)
+    if _nullish(value) and "onNull" in arg:
+        return _eval(arg["onNull"], scope)
+    target = _eval(arg["to"], scope)
+    target = _TYPE_CODES.get(target, target) if isinstance(target, int) else target
+    try:
+        return _CONVERTERS[target](value)
+    except (OperationFailure, KeyError):
+        if "onError" in arg:
+            return _eval(arg["onError"], scope)
+        raise
+
+
+def _op_size(arg, scope):
+    value = _args(arg, scope)[0]
+    if not isinstance(value, list):
+        _fail("$size", f"The argument to $size must be an array. Type of argument: {bson_type(value)}")
+    return len(value)
+
+
+def _op_array_elem_at(arg, scope):
+    array, index = _args(arg, scope)
+    if _nullish(array) or _nullish(index):
+        return None
+    if not isinstance(array, list):
+        _fail("$arrayElemAt", "first argument must be an array")
+    index = int(_number(index))
+    if -len(array) <= index < len(array):
+        return array[index]
+    return MISSING
+
+
+def _op_first(arg, scope):
+    array = _args(arg, scope)[0]
+    if _nullish(array):
+        return None
+    return array[0] if array else MISSING
+
+
+def _op_last(arg, scope):
+    array = _args(arg, scope)[0]
+    if _nullish(array):
+        return None
+    return array[-1] if array else MISSING
+
+
+def _op_concat_arrays(arg, scope):
+    arrays = _args(arg, scope)
+    if any(_nullish(array) for array in arrays):
+        return None
+    return [item for array in arrays for item in array]
+
+
+def _op_slice(arg, scope):
+    values = _args(arg, scope)
+    array = values[0]
+    if _nullish(array):
+        return None
+    if len(values) == 2:
+        count = int(values[1])
+        return array[:count] if count >= 0 else array[count:]
+    position, count = int(values[1]), int(values[2])
+    start = position if position >= 0 else max(0, len(array) + position)
+    return array[start:start + count]
+
+
+def _op_reverse_array(arg, scope):
+    array = _args(arg, scope)[0]
+    return None if _nullish(array) else list(reversed(array))
+
+
+def _op_filter(arg, scope):
+    array = _eval(arg["input"], scope)
+    if _nullish(array):
+        return None
+    name = arg.get("as", "this")
+    limit = _eval(arg["limit"], scope) if "limit" in arg else None
+    result = []
+    for item in array:
+        if _truthy(_eval(arg["cond"], {**scope, name: item})):
+            result.append(item)
+            if limit and len(result) >= limit:
+                break
+    return result
+
+
+def _op_map(arg, scope):
+    array = _eval(arg["input"], scope)
+    if _nullish(array):
+        return None
+    name = arg.get("as", "this")
+    return [_eval(arg["in"], {**scope, name: item}) for item in array]
+
+
+def _op_reduce(arg, scope):
+    array = _eval(arg["input"], scope)
+    if _nullish(array):
+        return None
+    value = _eval(arg["initialValue"], scope)
+    for item in array:
+        value = _eval(arg["in"], {**scope, "value": value, "this": item})
+    return value
+
+
+def _op_let(arg, scope):
+    inner = dict(scope)
+    for name, expression in arg["vars"].items():
+        inner[name] = _eval(expression, scope)
+    return _eval(arg["in"], inner)
+
+
+def _regex_input(op: str, arg, scope):
+    value = _eval(arg["input"], scope)
+    if _nullish(value):
+        return None, None
+    if not isinstance(value, str):
+        _fail(op, "needs 'input' to be of type string")
+    regex = _compile_regex(_eval(arg["regex"], scope), _eval(arg.get("options", ""), scope) or "")
+    return value, regex
+
+
+def _op_regex_match(arg, scope):
+    value, regex = _regex_input("$regexMatch", arg, scope)
+    return value is not None and regex.search(value) is not None
+
+
+def _op_regex_find(arg, scope):
+    value, regex = _regex_input("$regexFind", arg, scope)
+    match = regex.search(value) if value is not None else None
+    if not match:
+        return None
+    return {"match": match.group(0), "idx": match.start(), "captures": list(match.groups())}
+
+
+def _extremum(pick: Callable):
+    def handler(arg, scope):
+        values = _args(arg, scope)
+        if len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        values = [value for value in values if not _nullish(value)]
+        return pick(values, key=_expr_key) if values else None
+    return handler
+
+
+def _numbers(values: Iterable[Any]) -> List[Any]:
+    return [_number(value) for value in values if _is_number(value)]
+
+
+def _op_sum(arg, scope):
+    values = _args(arg, scope)
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    return sum(_numbers(values))
+
+
+def _op_avg(arg, scope):
+    values = _args(arg, scope)
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    numbers = _numbers(values)
+    return sum(numbers) / len(numbers) if numbers else None
+
+
+def _op_add(arg, scope):
+    values = _args(arg, scope)
+    if any(_nullish(value) for value in values):
+        return None
+    dates = [value for value in values if isinstance(value, datetime)]
+    total = sum(_number(value) for value in values if not isinstance(value, datetime))
+    if len(dates) > 1:
+        _fail("$add", "only one date allowed")
+    return dates[0] + timedelta(milliseconds=total) if dates else total
+
+
+def _op_subtract(arg, scope):
+    left, right = _args(arg, scope)
+    if _nullish(left) or _nullish(right):
+        return None
+    if isinstance(left, datetime):
+        if isinstance(right, datetime):
+            return int((_naive_utc(left) - _naive_utc(right)).total_seconds() * 1000)
+        return left - timedelta(milliseconds=_number(right))
+    return _number(left) - _number(right)
+
+
+def _op_multiply(arg, scope):
+    values = _args(arg, scope)
+    if any(_nullish(value) for value in values):
+        return None
+    product = 1
+    for value in values:
+        product *= _number(value)
+    return product
+
+
+def _op_divide(arg, scope):
+    left, right = _args(arg, scope)
+    if _nullish(left) or _nullish(right):
+        return None
+    if _number(right) == 0:
+        _fail("$divide", "can't divide by zero")
+    return _number(left) / _number(right)
+
+
+def _op_mod(arg, scope):
+    left, right = _args(arg, scope)
+    if _nullish(left) or _nullish(right):
+        return None
+    return math.fmod(_number(left), _number(right)) if isinstance(left, float) or isinstance(right, float) \
+        else int(math.fmod(left, right))
+
+
+def _unary_number(function: Callable[[Any], Any]):
+    def handler(arg, scope):
+        value = _args(arg, scope)[0]
+        return None if _nullish(value) else function(_number(value))
+    return handler
+
+
+def _op_round(arg, scope):
+    values = _args(arg, scope)
+    value, places = values[0], int(values[1]) if len(values) > 1 else 0
+    if _nullish(value):
+        return None
+    rounded = round(_number(value), places)
+    return int(rounded) if isinstance(value, int) else rounded
+
+
+def _date_argument(arg, scope) -> Optional[datetime]:
+    if isinstance(arg, dict) and "date" in arg:
+        arg = arg["date"]
+    value = _args(arg, scope)[0]
+    if _nullish(value):
+        return None
+    if isinstance(value, ObjectId):
+        return value.generation_time.replace(tzinfo=None)
+    if not isinstance(value, datetime):
+        _fail("date operator", f"can't convert from BSON type {bson_type(value)} to Date")
+    return _naive_utc(value)
+
+
+def _date_part(extract: Callable[[datetime], int]):
+    def handler(arg, scope):
+        value = _date_argument(arg, scope)
+        return None if value is None else extract(value)
+    return handler
+
+
+def _op_date_to_string(arg, scope):
+    value = _eval(arg["date"], scope)
+    if _nullish(value):
+        return _eval(arg["onNull"], scope) if "onNull" in arg else None
+    if not isinstance(value, datetime):
+        _fail("$dateToString", f"can't convert from BSON type {bson_type(value)} to Date")
+    return _format_date(value, arg.get("format", "%Y-%m-%dT%H:%M:%S.%LZ"))
+
+
+def _op_date_from_string(arg, scope):
+    value = _eval(arg["dateString"], scope)
+    if _nullish(value):
+        return _eval(arg["onNull"], scope) if "onNull" in arg else None
+    try:
+        return _to_date(value)
+    except OperationFailure:
+        if "onError" in arg:
+            return _eval(arg["onError"], scope)
+        raise
+
+
+def _trim(strip: Callable[[str, Optional[str]], str]):
+    def handler(arg, scope):
+        value = _eval(arg["input"], scope)
+        if _nullish(value):
+            return None
+        chars = _eval(arg["chars"], scope) if "chars" in arg else None
+        return strip(value, chars)
+    return handler
+
+
+def _case(convert: Callable[[str], str]):
+    def handler(arg, scope):
+        value = _args(arg, scope)[0]
+        return "" if _nullish(value) else convert(value if isinstance(value, str) else _to_string(value))
+    return handler
+
+
+def _op_index_of_cp(arg, scope):
+    values = _args(arg, scope)
+    value, search = values[0], values[1]
+    if _nullish(value):
+        return None
+    start = int(values[2]) if len(values) > 2 else 0
+    end = int(values[3]) if len(values) > 3 else len(value)
+    return value.find(search, start, end)
+
+
+def _op_merge_objects(arg, scope):
+    values = _args(arg, scope)
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    merged: dict = {}
+    for value in values:
+        if isinstance(value, dict):
+            merged.update(value)
+    return merged
+
+
+def _op_object_to_array(arg, scope):
+    value = _args(arg, scope)[0]
+    return None if _nullish(value) else [{"k": key, "v": item} for key, item in value.items()]
+
+
+def _op_array_to_object(arg, scope):
+    value = _args(arg, scope)[0]
+    if _nullish(value):
+        return None
+    result = {}
+    for item in value:
+        key, item_value = (item["k"], item["v"]) if isinstance(item, dict) else item
+        result[key] = item_value
+    return result
+
+
+def _op_set_union(arg, scope):
+    seen, result = set(), []
+    for array in _args(arg, scope):
+        if _nullish(array):
+            return None
+        for item in array:
+            key = sort_key(item)
+            if key not in seen:
+                seen.add(key)
+                result.append(item)
+    return result
+
+
+_OPERATORS: Dict[str, Callable[[Any, dict], Any]] = {
+    "$literal": lambda arg, scope: arg,
+    "$ifNull": _op_if_null,
+    "$cond": _op_cond,
+    "$switch": _op_switch,
+    "$and": _op_and,
+    "$or": _op_or,
+    "$not": lambda arg, scope: not _truthy(_args(arg, scope)[0]),
+    "$eq": _comparison(lambda a, b: a == b),
+    "$ne": _comparison(lambda a, b: a != b),
+    "$gt": _comparison(lambda a, b: a > b),
+    "$gte": _comparison(lambda a, b: a >= b),
+    "$lt": _comparison(lambda a, b: a < b),
+    "$lte": _comparison(lambda a, b: a <= b),
+    "$cmp": _comparison(lambda a, b: (a > b) - (a < b)),
+    "$in": _op_in,
+    "$concat": _op_concat,
+    "$substrCP": _op_substr,
+    "$substr": _op_substr,
+    "$substrBytes": _op_substr,
+    "$strLenCP": _op_str_len,
+    "$strLenBytes": lambda arg, scope: len(_args(arg, scope)[0].encode()),
+    "$split": _op_split,
+    "$indexOfCP": _op_index_of_cp,
+    "$toString": _converter(_to_string),
+    "$toInt": _converter(_to_int),
+    "$toLong": _converter(_to_int),
+    "$toDouble": _converter(_to_double),
+    "$toDecimal": _converter(_to_double),
+    "$toBool": _converter(_to_bool),
+    "$toObjectId": _converter(_to_object_id),
+    "$toDate": _converter(_to_date),
+    "$convert": _op_convert,
+    "$type": lambda arg, scope: bson_type(_args(arg, scope)[0]),
+    "$isNumber": lambda arg, scope: _is_number(_args(arg, scope)[0]),
+    "$isArray": lambda arg, scope: isinstance(_args(arg, scope)[0], list),
+    "$size": _op_size,
+    "$arrayElemAt": _op_array_elem_at,
+    "$first": _op_first,
+    "$last": _op_last,
+    "$concatArrays": _op_concat_arrays,
+    "$slice": _op_slice,
+    "$reverseArray": _op_reverse_array,
+    "$filter": _op_filter,
+    "$map": _op_map,
+    "$reduce": _op_reduce,
+    "$let": _op_let,
+    "$regexMatch": _op_regex_match,
+    "$regexFind": _op_regex_find,
+    "$max": _extremum(max),
+    "$min": _extremum(min),
+    "$sum": _op_sum,
+    "$avg": _op_avg,
+    "$add": _op_add,
+    "$subtract": _op_subtract,
+    "$multiply": _op_multiply,
+    "$divide": _op_divide,
+    "$mod": _op_mod,
+    "$abs": _unary_number(abs),
+    "$floor": _unary_number(math.floor),
+    "$ceil": _unary_number(math.ceil),
+    "$trunc": _unary_number(math.trunc),
+    "$round": _op_round,
+    "$year": _date_part(lambda value: value.year),
+    "$month": _date_part(lambda value: value.month),
+    "$dayOfMonth": _date_part(lambda value: value.day),
+    "$dayOfWeek": _date_part(lambda value: value.isoweekday() % 7 + 1),
+    "$dayOfYear": _date_part(lambda value: value.timetuple().tm_yday),
+    "$hour": _date_part(lambda value: value.hour),
+    "$minute": _date_part(lambda value: value.minute),
+    "$second": _date_part(lambda value: value.second),
+    "$dateToString": _op_date_to_string,
+    "$dateFromString": _op_date_from_string,
+    "$trim": _trim(lambda value, chars: value.strip(chars)),
+    "$ltrim": _trim(lambda value, chars: value.lstrip(chars)),
+    "$rtrim": _trim(lambda value, chars: value.rstrip(chars)),
+    "$toLower": _case(str.lower),
+    "$toUpper": _case(str.upper),
+    "$mergeObjects": _op_merge_objects,
+    "$objectToArray": _op_object_to_array,
+    "$arrayToObject": _op_array_to_object,
+    "$setUnion": _op_set_union,
+}
+
+
+# ---------------------------------------------------------------------------
+# Projection
+# ---------------------------------------------------------------------------
+
+class _Computed:
+    __slots__ = ("expression",)
+
+    def __init__(self, expression):
+        self.expression = expression
+
+
+class _Slice:
+    __slots__ = ("spec",)
+
+    def __init__(self, spec):
+        self.spec = spec
+
+
+def _is_expression(value) -> bool:
+    if isinstance(value, str):
+        return True
+    if isinstance(value, dict):
+        return len(value) == 1 and next(iter(value)).startswith("$")
+    return not isinstance(value, (bool, int, float))
+
+
+def _projection_tree(projection: dict, aggregation: bool) -> Tuple[dict, Optional[bool]]:
+    """Nested spec {field: True | _Computed | _Slice | subtree} and whether it includes fields"""
+    tree: dict = {}
+    inclusive: Optional[bool] = None
+    for path, value in projection.items():
+        parts = _parts(path)
+        node = tree
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if isinstance(value, dict) and not aggregation and "$slice" in value:
+            node[parts[-1]] = _Slice(value["$slice"])
+            continue
+        if isinstance(value, dict) and value and not next(iter(value)).startswith("$"):
+            subtree, sub_inclusive = _projection_tree(value, aggregation)
+            node[parts[-1]] = subtree
+            if path != "_id" and sub_inclusive is not None:
+                inclusive = sub_inclusive if inclusive is None else inclusive
+            continue
+        if _is_expression(value):
+            node[parts[-1]] = _Computed(value)
+            include = True
+        else:
+            include = bool(value)
+            node[parts[-1]] = include
+        if path == "_id":
+            continue
+        if inclusive is None:
+            inclusive = include
+        elif inclusive != include:
+            raise OperationFailure("Cannot do exclusion on a field in an inclusion projection", 31254)
+    return tree, inclusive
+
+
+def _include(doc: dict, tree: dict, root: dict, variables: Optional[dict]) -> dict:
+    result = {}
+    for key, value in doc.items():
+        spec = tree.get(key)
+        if spec is True:
+            result[key] = _copy(value)
+        elif isinstance(spec, _Slice):
+            result[key] = _slice_value(value, spec.spec)
+        elif isinstance(spec, dict):
+            if isinstance(value, dict):
+                result[key] = _include(value, spec, root, variables)
+            elif isinstance(value, list):
+                result[key] = [_include(item, spec, root, variables) for item in value if isinstance(item, dict)]
+    for key, spec in tree.items():
+        if isinstance(spec, _Computed):
+            value = evaluate(spec.expression, root, variables)
+            if value is not MISSING:
+                result[key] = value
+        elif isinstance(spec, dict) and key not in doc and _has_computed(spec):
+            result[key] = _include({}, spec, root, variables)
+    return result
+
+
+def _has_computed(tree: dict) -> bool:
+    return any(isinstance(spec, _Computed) or (isinstance(spec, dict) and _has_computed(spec)) for spec in tree.values())
+
+
+def _exclude(doc: dict, tree: dict) -> dict:
+    result = {}
+    for key, value in doc.items():
+        spec = tree.get(key)
+        if spec is False:
+            continue
+        if isinstance(spec, _Slice):
+            result[key] = _slice_value(value, spec.spec)
+        elif isinstance(spec, dict) and isinstance(value, dict):
+            result[key] = _exclude(value, spec)
+        elif isinstance(spec, dict) and isinstance(value, list):
+            result[key] = [_exclude(item, spec) if isinstance(item, dict) else _copy(item) for item in value]
+        else:
+            result[key] = _copy(value)
+    return result
+
+
+def _slice_value(value, spec):
+    if not isinstance(value, list):
+        return _copy(value)
+    if isinstance(spec, list):
+        skip, count = spec
+        start = skip if skip >= 0 else max(0, len(value) + skip)
+        return _copy(value[start:start + count])
+    return _copy(value[:spec] if spec >= 0 else value[spec:])
+
+
+def compile_projection(projection, variables: Optional[dict] = None, aggregation: bool = False) -> Callable[[dict], dict]:
+    """Function returning a projected copy of a document"""
+    if not projection:
+        if aggregation:
+            raise OperationFailure("$project requires at least one output field", 40177)
+        return _copy
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    tree, inclusive = _projection_tree(projection, aggregation)
+    id_spec = tree.get("_id", True if inclusive else None)
+    if inclusive:
+        if id_spec is None or id_spec is True:
+            tree["_id"] = True
+        elif id_spec is False:
+            del tree["_id"]
+        return lambda doc: _include(doc, tree, doc, variables)
+    computed_id = isinstance(id_spec, _Computed)
+    if computed_id:
+        # {"_id": <expression>} alone: everything else stays
+        del tree["_id"]
+
+    def project(doc: dict) -> dict:
+        result = _exclude(doc, tree)
+        if computed_id:
+            result["_id"] = evaluate(id_spec.expression, doc, variables)
+        return result
+    return project
+
+
+# ---------------------------------------------------------------------------
+# Updates
+# ---------------------------------------------------------------------------
+
+def _container(doc: dict, parts: Tuple[str, ...], create: bool):
+    """(parent, last key) for a dotted path; (None, None) when absent and not created"""
+    node = doc
+    for part in parts[:-1]:
+        if isinstance(node, dict):
+            child = node.get(part, MISSING)
+            if child is MISSING:
+                if not create:
+                    return None, None
+                child = node[part] = {}
+        elif isinstance(node, list) and part.isdigit():
+            index = int(part)
+            if index >= len(node):
+                if not create:
+                    return None, None
+                node.extend([None] * (index + 1 - len(node)))
+                node[index] = {}
+            child = node[index]
+        else:
+            if not create:
+                return None, None
+            raise OperationFailure(f"Cannot create field '{part}' in element {{{parts[0]}: {node!r}}}", 28)
+        if child is None and create:
+            raise OperationFailure(f"Cannot create field in element {{{part}: null}}", 28)
+        node = child
+    if isinstance(node, list) and not parts[-1].isdigit():
+        if create:
+            raise OperationFailure(f"Cannot create field '{parts[-1]}' in an array", 28)
+        return None, None
+    if not isinstance(node, (dict, list)):
+        if create:
+            raise OperationFailure(f"Cannot create field '{parts[-1]}' in element {node!r}", 28)
+        return None, None
+    return node, parts[-1]
+
+
+def _get(node, key):
+    if isinstance(node, dict):
+        return node.get(key, MISSING)
+    index = int(key)
+    return node[index] if index < len(node) else MISSING
+
+
+def _put(node, key, value):
+    if isinstance(node, dict):
+        node[key] = value
+    else:
+        index = int(key)
+        if index >= len(node):
+            node.extend([None] * (index + 1 - len(node)))
+        node[index] = value
+
+
+def _set_path(doc: dict, path: str, value) -> bool:
+    node, key = _container(doc, _parts(path), True)
+    old = _get(node, key)
+    _put(node, key, value)
+    return old is MISSING or sort_key(old) != sort_key(value) or bson_type(old) != bson_type(value)
+
+
+def _unset_path(doc: dict, path: str) -> bool:
+    node, key = _container(doc, _parts(path), False)
+    if node is None:
+        return False
+    if isinstance(node, dict):
+        return node.pop(key, MISSING) is not MISSING
+    index = int(key)
+    if index < len(node):
+        node[index] = None
+        return True
+    return False
+
+
+def _numeric_field(op: str, path: str, value):
+    if value is not MISSING and not _is_number(value):
+        raise OperationFailure(f"Cannot apply {op} to a value of non-numeric type. {{_id: ...}} has the field '{path}' of non-numeric type {bson_type(value)}", 14)
+    return value
+
+
+def _sort_array(items: list, spec) -> list:
+    if isinstance(spec, dict):
+        return sorted(items, key=_sort_function(list(spec.items())))
+    return sorted(items, key=sort_key, reverse=spec < 0)
+
+
+def _array_field(op: str, doc: dict, path: str) -> Tuple[Any, Any, list]:
+    node, key = _container(doc, _parts(path), True)
+    current = _get(node, key)
+    if current is MISSING:
+        current = []
+        _put(node, key, current)
+    elif not isinstance(current, list):
+        raise OperationFailure(f"The field '{path}' must be an array but is of type {bson_type(current)}", 2)
+    return node, key, current
+
+
+def _element_matcher(condition) -> Callable[[Any], bool]:
+    if isinstance(condition, dict) and condition:
+        if all(key.startswith("$") for key in condition):
+            tests = [_operator_test(op, arg, condition, None) for op, arg in condition.items()]
+            return lambda item: all(test([item]) for test in tests)
+        predicate = compile_query(condition)
+        return lambda item: isinstance(item, dict) and predicate(item)
+    equals = _equals(condition)
+    return equals
+
+
+def apply_update(doc: dict, update, inserting: bool = False) -> bool:
+    """Apply update operators (or an update pipeline) to `doc` in place; returns whether it changed"""
+    if isinstance(update, list):
+        original_id = doc.get("_id", MISSING)
+        before = sort_key(doc)
+        result = _apply_stages(None, [doc], update, None)[0]
+        if original_id is not MISSING:
+            result["_id"] = original_id
+        doc.clear()
+        doc.update(result)
+        return sort_key(doc) != before
+
+    original_id = doc.get("_id", MISSING)
+    changed = False
+    for op, fields in update.items():
+        if not isinstance(fields, dict):
+            raise OperationFailure(f"Modifiers operate on fields but we found type {bson_type(fields)} instead", 9)
+        for path, value in fields.items():
+            if op == "$set":
+                changed |= _set_path(doc, path, _to_stored(value))
+            elif op == "$setOnInsert":
+                if inserting:
+                    changed |= _set_path(doc, path, _to_stored(value))
+            elif op == "$unset":
+                changed |= _unset_path(doc, path)
+            elif op in ("$inc", "$mul"):
+                if not _is_number(value):
+                    raise OperationFailure(f"Cannot {op[1:]} with non-numeric argument: {{{path}: {value!r}}}", 14)
+                node, key = _container(doc, _parts(path), True)
+                current = _numeric_field(op, path, _get(node, key))
+                if op == "$inc":
+                    new = value if current is MISSING else current + value
+                else:
+                    new = 0 * value if current is MISSING else current * value
+                _put(node, key, new)
+                changed |= current is MISSING or new != current
+            elif op in ("$min", "$max"):
+                node, key = _container(doc, _parts(path), True)
+                current = _get(node, key)
+                value = _to_stored(value)
+                replace = current is MISSING or (
+                    sort_key(value) < sort_key(current) if op == "$min" else sort_key(value) > sort_key(current)
+                )
+                if replace:
+                    _put(node, key, value)
+                    changed = True
+            elif op == "$push":
+                node, key, current = _array_field(op, doc, path)
+                if isinstance(value, dict) and "$each" in value:
+                    items = _to_stored(value["$each"])
+                    position = value.get("$position")
+                    if position is None:
+                        current.extend(items)
+                    else:
+                        if position < 0:
+                            position = max(0, len(current) + position)
+                        current[position:position] = items
+                    if "$sort" in value:
+                        current[:] = _sort_array(current, value["$sort"])
+                    if "$slice" in value:
+                        size = value["$slice"]
+                        current[:] = current[:size] if size >= 0 else current[size:]
+                else:
+                    current.append(_to_stored(value))
+                changed = True
+            elif op == "$addToSet":
+                node, key, current = _array_field(op, doc, path)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                present = {sort_key(item) for item in current}
+                for item in _to_stored(items):
+                    item_key = sort_key(item)
+                    if item_key not in present:
+                        present.add(item_key)
+                        current.append(item)
+                        changed = True
+            elif op in ("$pull", "$pullAll"):
+                node, key = _container(doc, _parts(path), False)
+                current = _get(node, key) if node is not None else MISSING
+                if not isinstance(current, list):
+                    continue
+                if op == "$pullAll":
+                    keys = {sort_key(item) for item in value}
+                    kept = [item for item in current if sort_key(item) not in keys]
+                else:
+                    matches = _element_matcher(value)
+                    kept = [item for item in current if not matches(item)]
+                if len(kept) != len(current):
+                    current[:] = kept
+                    changed = True
+            elif op == "$pop":
+                node, key = _container(doc, _parts(path), False)
+                current = _get(node, key) if node is not None else MISSING
+                if isinstance(current, list) and current:
+                    current.pop(0 if value < 0 else -1)
+                    changed = True
+            elif op == "$rename":
+                node, key = _container(doc, _parts(path), False)
+                current = _get(node, key) if node is not None else MISSING
+                if current is not MISSING:
+                    _unset_path(doc, path)
+                    _set_path(doc, value, current)
+                    changed = True
+            elif op == "$currentDate":
+                changed |= _set_path(doc, path, _to_stored(datetime.utcnow()))
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}", 9)
+    if original_id is not MISSING and sort_key(doc.get("_id", MISSING)) != sort_key(original_id):
+        raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+    return changed
+
+
+def _validate_update(update):
+    if isinstance(update, list):
+        return
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+
+
+def _validate_replacement(replacement):
+    if replacement and next(iter(replacement)).startswith("$"):
+        raise ValueError("replacement can not include $ operators")
+
+
+def _upsert_seed(query: dict) -> dict:
+    """Fields an upsert copies from the equality conditions of its filter"""
+    seed: dict = {}
+    for key, value in (query or {}).items():
+        if key == "$and":
+            for branch in value:
+                for path, item in _flatten(_upsert_seed(branch)):
+                    _set_path(seed, path, item)
+        elif key.startswith("$"):
+            continue
+        elif isinstance(value, dict) and value and next(iter(value)).startswith("$"):
+            if "$eq" in value:
+                _set_path(seed, key, _to_stored(value["$eq"]))
+            elif "$in" in value and len(value["$in"]) == 1:
+                _set_path(seed, key, _to_stored(value["$in"][0]))
+        elif not isinstance(value, _REGEX_TYPES):
+            _set_path(seed, key, _to_stored(value))
+    return seed
+
+
+def _flatten(doc: dict, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+    for key, value in doc.items():
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+# ---------------------------------------------------------------------------
+# Indexes
+# ---------------------------------------------------------------------------
+
+class _Desc:
+    """Index key component of a descending field: orders the wrapped key in reverse"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return isinstance(other, _Desc) and self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key if isinstance(other, _Desc) else NotImplemented
+
+    def __le__(self, other):
+        return other.key <= self.key if isinstance(other, _Desc) else NotImplemented
+
+    def __gt__(self, other):
+        return other.key > self.key if isinstance(other, _Desc) else NotImplemented
+
+    def __ge__(self, other):
+        return other.key >= self.key if isinstance(other, _Desc) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class _Bound:
+    """Sentinel above (or below) every index key component"""
+    __slots__ = ("top",)
+
+    def __init__(self, top: bool):
+        self.top = top
+
+    def __eq__(self, other):
+        return other is self
+
+    def __lt__(self, other):
+        return not self.top and other is not self
+
+    def __le__(self, other):
+        return not self.top or other is self
+
+    def __gt__(self, other):
+        return self.top and other is not self
+
+    def __ge__(self, other):
+        return self.top or other is self
+
+    def __hash__(self):
+        return id(self)
+
+
+_TOP = _Bound(True)
+
+
+def _encode(key: tuple, direction: int):
+    return _Desc(key) if direction < 0 else key
+
+
+class MemoryIndex:
+    """Sorted index: (key tuple, _id key) entries in index order"""
+
+    def __init__(self, name: str, keys: List[Tuple[str, int]], unique: bool = False, sparse: bool = False,
+                 partial_filter: Optional[dict] = None):
+        self.name = name
+        self.keys = [(field, -1 if direction == -1 else 1) for field, direction in keys]
+        self.unique = unique
+        self.sparse = sparse
+        self.partial_filter = partial_filter
+        self._partial = compile_query(partial_filter) if partial_filter else None
+        self.entries: List[tuple] = []
+        self.doc_keys: Dict[tuple, List[tuple]] = {}
+        # Set once a document has several keys (array values); like MongoDB, never cleared
+        self.multikey = False
+        # Order in which entries with equal keys are stored
+        self.walk_keys = self.keys + ([] if any(field == "_id" for field, _ in self.keys) else [("_id", 1)])
+
+    def keys_for(self, doc: dict) -> List[tuple]:
+        if self._partial and not self._partial(doc):
+            return []
+        per_field = []
+        present = False
+        for field, direction in self.keys:
+            values = []
+            for value in _query_values(doc, _parts(field)):
+                if isinstance(value, list):
+                    values.extend(value if value else [None])
+                else:
+                    values.append(value)
+                present |= value is not MISSING
+            per_field.append([_encode(key, direction) for key in dict.fromkeys(sort_key(value) for value in values)])
+        if self.sparse and not present:
+            return []
+        return [tuple(combination) for combination in itertools.product(*per_field)]
+
+    def _duplicate(self, collection: str) -> DuplicateKeyError:
+        fields = ", ".join(field for field, _ in self.keys)
+        message = f"E11000 duplicate key error collection: {collection} index: {self.name} dup key: {{ {fields} }}"
+        return DuplicateKeyError(message, 11000, {"code": 11000, "errmsg": message, "keyPattern": dict(self.keys)})
+
+    def check(self, keys: List[tuple], id_key: tuple, collection: str):
+        if not self.unique:
+            return
+        for key in keys:
+            i = bisect.bisect_left(self.entries, (key,))
+            while i < len(self.entries) and self.entries[i][0] == key:
+                if self.entries[i][1] != id_key:
+                    raise self._duplicate(collection)
+                i += 1
+
+    def add(self, keys: List[tuple], id_key: tuple):
+        for key in keys:
+            bisect.insort(self.entries, (key, id_key))
+        self.doc_keys[id_key] = keys
+        self.multikey |= len(keys) > 1
+
+    def build(self, docs: Dict[tuple, dict], collection: str):
+        """Index existing documents with one sort (an insort per entry is quadratic on large collections)"""
+        entries = []
+        for id_key, doc in docs.items():
+            keys = self.keys_for(doc)
+            self.doc_keys[id_key] = keys
+            self.multikey |= len(keys) > 1
+            entries.extend((key, id_key) for key in keys)
+        entries.sort()
+        if self.unique:
+            for previous, entry in zip(entries, entries[1:]):
+                if previous[0] == entry[0] and previous[1] != entry[1]:
+                    raise self._duplicate(collection)
+        self.entries = entries
+
+    def remove(self, id_key: tuple):
+        for key in self.doc_keys.pop(id_key, []):
+            i = bisect.bisect_left(self.entries, (key, id_key))
+            if i < len(self.entries) and self.entries[i] == (key, id_key):
+                del self.entries[i]
+
+    def span(self, prefix: tuple, low=None, high=None) -> Tuple[int, int]:
+        """Entry positions whose key starts with `prefix`, then lies in `low`/`high` on the next field.
+
+        `low` and `high` are (encoded key, inclusive) pairs or None.
+        """
+        if low is None:
+            start = bisect.bisect_left(self.entries, (prefix,))
+        else:
+            probe = prefix + ((low[0],) if low[1] else (low[0], _TOP))
+            start = bisect.bisect_left(self.entries, (probe,))
+        if high is None:
+            end = bisect.bisect_left(self.entries, (prefix + (_TOP,),))
+        else:
+            probe = prefix + ((high[0], _TOP) if high[1] else (high[0],))
+            end = bisect.bisect_left(self.entries, (probe,))
+        return start, max(start, end)
+
+    def info(self) -> dict:
+        info: dict = {"v": 2, "key": list(self.keys)}
+        if self.unique:
+            info["unique"] = True
+        if self.sparse:
+            info["sparse"] = True
+        if self.partial_filter:
+            info["partialFilterExpression"] = self.partial_filter
+        return info
+
+
+def _indexable(value) -> bool:
+    return value is None or value is MISSING or (isinstance(value, _SCALARS) and not isinstance(value, bytes))
+
+
+def _regex_prefix(pattern, options: str = "") -> Optional[str]:
+    """Literal prefix of an anchored, case-sensitive regex"""
+    if isinstance(pattern, re.Pattern):
+        if pattern.flags & re.IGNORECASE:
+            return None
+        pattern = pattern.pattern
+    elif isinstance(pattern, Regex):
+        pattern = pattern.pattern
+    if "i" in (options or "") or not isinstance(pattern, str) or not pattern.startswith("^"):
+        return None
+    prefix = []
+    for char in pattern[1:]:
+        if char in ".^$*+?{}[]\\|()":
+            break
+        prefix.append(char)
+    return "".join(prefix) or None
+
+
+def _prefix_range(prefix: str) -> tuple:
+    low, high = ((3, prefix), True), ((3, prefix[:-1] + chr(ord(prefix[-1]) + 1)), False)
+    return ("range", low, high, (low, high))
+
+
+def _field_bound(condition):
+    """("in", keys) or ("range", low, high, one_sided) for an indexable field condition, else None.
+
+    `one_sided` is the range bounded by only one of the comparisons. On a multikey index each
+    comparison may be met by a different array element, so only one side can bound the scan.
+    """
+    if isinstance(condition, _REGEX_TYPES):
+        prefix = _regex_prefix(condition)
+        return _prefix_range(prefix) if prefix else None
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return ("in", [sort_key(condition)]) if _indexable(condition) else None
+    if "$eq" in condition:
+        return ("in", [sort_key(condition["$eq"])]) if _indexable(condition["$eq"]) else None
+    if "$in" in condition:
+        values = condition["$in"]
+        if isinstance(values, list) and all(_indexable(value) for value in values):
+            return ("in", [sort_key(value) for value in values])
+        return None
+    if "$regex" in condition:
+        prefix = _regex_prefix(condition["$regex"], condition.get("$options", ""))
+        if prefix:
+            return _prefix_range(prefix)
+    low = high = None
+    for op in ("$gt", "$gte", "$lt", "$lte"):
+        if op not in condition:
+            continue
+        value = condition[op]
+        if not _indexable(value):
+            return None
+        key = sort_key(value)
+        if key == (1,):
+            return ("in", [key]) if op in ("$gte", "$lte") else ("in", [])
+        if op in ("$gt", "$gte"):
+            low = (key, op == "$gte")
+        else:
+            high = (key, op == "$lte")
+    # Comparisons only match values of their own type, so an open side ends at the type's edge
+    if low is None and high is None:
+        return None
+    if low is None:
+        low = ((high[0][0],), True)
+        return ("range", low, high, (low, high))
+    type_end = ((low[0][0] + 1,), False)
+    return ("range", low, high or type_end, (low, type_end))
+
+
+def _expr_constant(expression, variables: Optional[dict]):
+    """Value of an $expr operand that does not depend on the document, else MISSING"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name = expression[2:].split(".", 1)[0]
+        if name in ("ROOT", "CURRENT", "REMOVE", "NOW") or not variables or name not in variables:
+            return MISSING
+        value = _eval(expression, dict(variables))
+        return None if value is MISSING else value
+    if isinstance(expression, str) and expression.startswith("$"):
+        return MISSING
+    if isinstance(expression, dict):
+        return expression["$literal"] if list(expression) == ["$literal"] else MISSING
+    if isinstance(expression, list):
+        return MISSING
+    return expression
+
+
+def _collect_expr_bounds(expression, variables: Optional[dict], bounds: Dict[str, list]):
+    if not isinstance(expression, dict) or len(expression) != 1:
+        return
+    op, arg = next(iter(expression.items()))
+    if op == "$and" and isinstance(arg, list):
+        for item in arg:
+            _collect_expr_bounds(item, variables, bounds)
+    elif op == "$eq" and isinstance(arg, list) and len(arg) == 2:
+        for field, other in (arg, arg[::-1]):
+            if isinstance(field, str) and field.startswith("$") and not field.startswith("$$"):
+                value = _expr_constant(other, variables)
+                if value is not MISSING and _indexable(value):
+                    bounds.setdefault(field[1:], []).append(("in", [sort_key(value)]))
+                return
+
+
+def _collect_bounds(query: dict, variables: Optional[dict], bounds: Dict[str, list]):
+    for key, value in query.items():
+        if key == "$and":
+            for branch in value:
+                _collect_bounds(branch, variables, bounds)
+        elif key == "$expr":
+            _collect_expr_bounds(value, variables, bounds)
+        elif not key.startswith("$"):
+            bound = _field_bound(value)
+            if bound:
+                bounds.setdefault(key, []).append(bound)
+
+
+def _excludes_null(bound) -> bool:
+    """True when a bound cannot match null or a missing field"""
+    return bound[0] == "range" or (1,) not in bound[1]
+
+
+def _query_conditions(query: dict, conditions: Dict[str, list]):
+    """Field conditions the query ANDs together (top level and $and branches)"""
+    for key, value in query.items():
+        if key == "$and" and isinstance(value, list):
+            for branch in value:
+                if isinstance(branch, dict):
+                    _query_conditions(branch, conditions)
+        elif not key.startswith("$"):
+            conditions.setdefault(key, []).append(value)
+
+
+# Operators matching an array when one of its elements matches
+_ELEMENT_OPERATORS = {"$eq", "$in", "$gt", "$gte", "$lt", "$lte", "$type", "$exists"}
+
+
+def _equality_values(condition) -> Optional[list]:
+    """Values one of which the field must equal (an element of, for arrays), or None"""
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        values = [condition]
+    elif "$eq" in condition:
+        values = [condition["$eq"]]
+    elif isinstance(condition.get("$in"), list):
+        values = condition["$in"]
+    else:
+        return None
+    # null also matches missing fields, which a partial filter may not cover
+    if all(value is not None and value is not MISSING and _indexable(value) for value in values):
+        return values
+    return None
+
+
+def _condition_implies(field: str, condition, required) -> bool:
+    """Whether every document matching `condition` on `field` also matches `required`"""
+    if condition == required:
+        return True
+    if isinstance(required, dict) and set(required) == {"$exists"}:
+        if not required["$exists"]:
+            return False
+        bound = _field_bound(condition)
+        return bound is not None and _excludes_null(bound)
+    if isinstance(required, dict) and required and all(key.startswith("$") for key in required):
+        if not set(required) <= _ELEMENT_OPERATORS or required.get("$exists", True) is not True:
+            return False
+    values = _equality_values(condition)
+    if values is None:
+        return False
+    # The matched value (or array element) itself satisfies `required`
+    check = compile_query({field: required})
+    for value in values:
+        doc: Any = value
+        for part in reversed(_parts(field)):
+            doc = {part: doc}
+        if not check(doc):
+            return False
+    return True
+
+
+def _implies(query: dict, required: dict) -> bool:
+    """Whether the query provably only matches documents matching `required` (a partial filter)"""
+    conditions: Dict[str, list] = {}
+    _query_conditions(query, conditions)
+    for field, condition in required.items():
+        if field == "$and" and isinstance(condition, list):
+            if not all(isinstance(branch, dict) and _implies(query, branch) for branch in condition):
+                return False
+        elif field.startswith("$"):
+            return False
+        elif not any(_condition_implies(field, given, condition) for given in conditions.get(field, [])):
+            return False
+    return True
+
+
+def _covers(index: "MemoryIndex", query: dict, bounds: Dict[str, list]) -> bool:
+    """Whether `index` holds every document `query` can match"""
+    if index.sparse:
+        # Some indexed field must be present: a condition on it that null cannot meet
+        if not any(_excludes_null(bound) for field, _ in index.keys for bound in bounds.get(field, [])):
+            return False
+    if index.partial_filter:
+        return _implies(query, index.partial_filter)
+    return True
+
+
+class _IndexPlan:
+    """Index scan: `points` equality prefixes, optionally a range on the next field"""
+    __slots__ = ("index", "points", "low", "high", "reverse", "ordered", "equalities")
+
+    def __init__(self, index: MemoryIndex, points: List[tuple], low, high, equalities: int):
+        self.index = index
+        self.points = points
+        self.low = low
+        self.high = high
+        self.equalities = equalities
+        self.reverse = False
+        self.ordered = False
+
+    def size(self) -> int:
+        return sum(end - start for start, end in (self.index.span(point, self.low, self.high) for point in self.points))
+
+    def ids(self) -> Iterator[tuple]:
+        seen = set()
+        for point in (reversed(self.points) if self.reverse else self.points):
+            start, end = self.index.span(point, self.low, self.high)
+            positions = range(end - 1, start - 1, -1) if self.reverse else range(start, end)
+            for position in positions:
+                id_key = self.index.entries[position][1]
+                if id_key not in seen:
+                    seen.add(id_key)
+                    yield id_key
+
+
+def _index_plan(index: MemoryIndex, bounds: Dict[str, list]) -> Optional[_IndexPlan]:
+    points: List[tuple] = [()]
+    equalities = 0
+    for field, direction in index.keys:
+        equality = next((bound for bound in bounds.get(field, []) if bound[0] == "in"), None)
+        if equality is None:
+            break
+        keys = sorted(set(equality[1]))
+        if direction < 0:
+            keys.reverse()
+        points = [point + (_encode(key, direction),) for point in points for key in keys]
+        equalities += 1
+    low = high = None
+    if equalities < len(index.keys):
+        field, direction = index.keys[equalities]
+        value_range = next((bound for bound in bounds.get(field, []) if bound[0] == "range"), None)
+        if value_range:
+            _, low, high, one_sided = value_range
+            if index.multikey:
+                low, high = one_sided
+            if direction < 0:
+                low, high = high, low
+            low = (_encode(low[0], direction), low[1]) if low else None
+            high = (_encode(high[0], direction), high[1]) if high else None
+    if not equalities and low is None and high is None:
+        return None
+    return _IndexPlan(index, points, low, high, equalities)
+
+
+def _sorted_plan(index: MemoryIndex, bounds: Dict[str, list], sort: List[Tuple[str, int]]) -> Optional[_IndexPlan]:
+    """Plan returning documents in `sort` order from `index`, if it can.
+
+    Not on multikey indexes: an array sorts by its smallest (or largest) element, which the
+    scan's bounds may have skipped.
+    """
+    if index.multikey:
+        return None
+    plan = _index_plan(index, bounds) or _IndexPlan(index, [()], None, None, 0)
+    if len(plan.points) != 1:
+        return None
+    walk = index.walk_keys[plan.equalities:plan.equalities + len(sort)]
+    if [field for field, _ in walk] != [field for field, _ in sort]:
+        return None
+    if all(direction == wanted for (_, direction), (_, wanted) in zip(walk, sort)):
+        plan.reverse = False
+    elif all(direction == -wanted for (_, direction), (_, wanted) in zip(walk, sort)):
+        plan.reverse = True
+    else:
+        return None
+    plan.ordered = True
+    return plan
+
+
+def _sort_function(sort: List[Tuple[str, int]]) -> Callable[[dict], tuple]:
+    def key(doc: dict) -> tuple:
+        parts = []
+        for field, direction in sort:
+            values = []
+            for value in _query_values(doc, _parts(field)):
+                if isinstance(value, list):
+                    values.extend(value if value else [None])
+                else:
+                    values.append(value)
+            # Arrays sort by their smallest element ascending, largest descending
+            keys = [sort_key(value) for value in values]
+            parts.append(min(keys) if direction > 0 else _Desc(max(keys)))
+        return tuple(parts)
+    return key
+
+
+def _sort_spec(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else ASCENDING)]
+    if isinstance(key_or_list, dict):
+        items = list(key_or_list.items())
+    else:
+        items = [(item, ASCENDING) if isinstance(item, str) else tuple(item) for item in key_or_list]
+    spec = []
+    for field, value in items:
+        if isinstance(value, dict):
+            raise OperationFailure(f"unsupported sort specification for {field}: {value}", 2)
+        spec.append((field, -1 if value in (-1, "-1", "desc", "descending") else 1))
+    return spec
+
+
+# ---------------------------------------------------------------------------
+# Aggregation stages
+# ---------------------------------------------------------------------------
+
+def _accumulator(op: str, arg, variables: Optional[dict]):
+    """(initial state factory, step(state, doc) -> state, finish(state) -> value)"""
+    def value_of(doc):
+        return evaluate(arg, doc, variables)
+
+    if op == "$sum":
+        def step(state, doc):
+            value = value_of(doc)
+            return state + _number(value) if _is_number(value) else state
+        return lambda: 0, step, lambda state: state
+    if op == "$count":
+        return lambda: 0, lambda state, doc: state + 1, lambda state: state
+    if op == "$avg":
+        def step(state, doc):
+            value = value_of(doc)
+            if _is_number(value):
+                state[0] += _number(value)
+                state[1] += 1
+            return state
+        return lambda: [0, 0], step, lambda state: state[0] / state[1] if state[1] else None
+    if op in ("$first", "$last"):
+        def step(state, doc):
+            if op == "$last" or state is MISSING:
+                value = value_of(doc)
+                return None if value is MISSING else value
+            return state
+        return lambda: MISSING, step, lambda state: None if state is MISSING else state
+    if op in ("$max", "$min"):
+        def step(state, doc):
+            value = value_of(doc)
+            if _nullish(value):
+                return state
+            if state is MISSING:
+                return value
+            if op == "$max":
+                return value if _expr_key(value) > _expr_key(state) else state
+            return value if _expr_key(value) < _expr_key(state) else state
+        return lambda: MISSING, step, lambda state: None if state is MISSING else state
+    if op == "$push":
+        def step(state, doc):
+            value = value_of(doc)
+            if value is not MISSING:
+                state.append(value)
+            return state
+        return list, step, lambda state: state
+    if op == "$addToSet":
+        def step(state, doc):
+            value = value_of(doc)
+            if value is not MISSING:
+                state.setdefault(sort_key(value), value)
+            return state
+        return dict, step, lambda state: list(state.values())
+    if op == "$mergeObjects":
+        def step(state, doc):
+            value = value_of(doc)
+            if isinstance(value, dict):
+                state.update(value)
+            return state
+        return dict, step, lambda state: state
+    raise OperationFailure(f"unknown group operator '{op}'", 15952)
+
+
+def _accumulate(groups: Dict[tuple, Tuple[Any, List[dict]]], output: dict, variables: Optional[dict]) -> List[dict]:
+    accumulators = []
+    for field, spec in output.items():
+        if not isinstance(spec, dict) or len(spec) != 1:
+            raise OperationFailure(f"The field '{field}' must be an accumulator object", 40234)
+        op, arg = next(iter(spec.items()))
+        accumulators.append((field,) + _accumulator(op, arg, variables))
+    results = []
+    for group_id, docs in groups.values():
+        row = {"_id": group_id}
+        for field, initial, step, finish in accumulators:
+            state = initial()
+            for doc in docs:
+                state = step(state, doc)
+            row[field] = finish(state)
+        results.append(row)
+    return results
+
+
+def _stage_group(database, docs, spec, variables):
+    key_expression = spec["_id"]
+    groups: Dict[tuple, Tuple[Any, List[dict]]] = {}
+    for doc in docs:
+        group_id = evaluate(key_expression, doc, variables)
+        group_id = None if group_id is MISSING else group_id
+        groups.setdefault(sort_key(group_id), (group_id, []))[1].append(doc)
+    return _accumulate(groups, {field: value for field, value in spec.items() if field != "_id"}, variables)
+
+
+def _stage_bucket(database, docs, spec, variables):
+    boundaries = spec["boundaries"]
+    keys = [sort_key(boundary) for boundary in boundaries]
+    if keys != sorted(keys) or len(keys) < 2:
+        raise OperationFailure("The $bucket 'boundaries' field must be an array of ascending values", 40194)
+    groups: Dict[tuple, Tuple[Any, List[dict]]] = {}
+    for boundary, key in zip(boundaries[:-1], keys[:-1]):
+        groups[key] = (boundary, [])
+    default_docs: List[dict] = []
+    for doc in docs:
+        value_key = sort_key(evaluate(spec["groupBy"], doc, variables))
+        position = bisect.bisect_right(keys, value_key) - 1
+        if 0 <= position < len(keys) - 1 and keys[position][0] == value_key[0]:
+            groups[keys[position]][1].append(doc)
+        elif "default" in spec:
+            default_docs.append(doc)
+        else:
+            raise OperationFailure("$bucket could not find a matching branch for an input, and no default was specified.", 40066)
+    groups = {key: group for key, group in groups.items() if group[1]}
+    if default_docs:
+        groups[("default",)] = (spec["default"], default_docs)
+    return _accumulate(groups, spec.get("output") or {"count": {"$sum": 1}}, variables)
+
+
+def _with_field(doc: dict, path: str, value) -> dict:
+    """Copy of `doc` with a (dotted) field set, or removed when value is MISSING"""
+    result = dict(doc)
+    parts = _parts(path)
+    node = result
+    for part in parts[:-1]:
+        child = node.get(part)
+        child = dict(child) if isinstance(child, dict) else {}
+        node[part] = child
+        node = child
+    if value is MISSING:
+        node.pop(parts[-1], None)
+    else:
+        node[parts[-1]] = value
+    return result
+
+
+def _stage_add_fields(database, docs, spec, variables):
+    results = []
+    for doc in docs:
+        result = doc
+        for path, expression in spec.items():
+            result = _with_field(result, path, evaluate(expression, doc, variables))
+        results.append(result)
+    return results
+
+
+def _stage_unset(database, docs, spec, variables):
+    paths = [spec] if isinstance(spec, str) else spec
+    results = []
+    for doc in docs:
+        for path in paths:
+            doc = _with_field(doc, path, MISSING)
+        results.append(doc)
+    return results
+
+
+def _stage_unwind(database, docs, spec, variables):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    index_field = spec.get("includeArrayIndex")
+    results = []
+    for doc in docs:
+        value = _expr_path(doc, _parts(path))
+        if isinstance(value, list) and value:
+            for index, item in enumerate(value):
+                result = _with_field(doc, path, item)
+                if index_field:
+                    result[index_field] = index
+                results.append(result)
+        elif isinstance(value, list) or _nullish(value):
+            if preserve:
+                result = _with_field(doc, path, MISSING) if isinstance(value, list) else dict(doc)
+                if index_field:
+                    result[index_field] = None
+                results.append(result)
+        else:
+            result = dict(doc)
+            if index_field:
+                result[index_field] = None
+            results.append(result)
+    return results
+
+
+def _stage_lookup(database, docs, spec, variables):
+    foreign = database[spec["from"]]
+    results = []
+    if "localField" in spec:
+        local_parts = _parts(spec["localField"])
+        foreign_field = spec["foreignField"]
+        cache: Dict[tuple, List[dict]] = {}
+        for doc in docs:
+            values = []
+            for value in _query_values(doc, local_parts):
+                values.extend(value if isinstance(value, list) else [value])
+            values = [None if value is MISSING else value for value in values]
+            cache_key = tuple(sort_key(value) for value in values)
+            if cache_key not in cache:
+                cache[cache_key] = foreign._select({foreign_field: {"$in": values}})
+            matched = [_copy(match) for match in cache[cache_key]]
+            if "pipeline" in spec:
+                scope = dict(variables or {})
+                for name, expression in spec.get("let", {}).items():
+                    scope[name] = evaluate(expression, doc, variables)
+                matched = _apply_stages(database, matched, spec["pipeline"], scope)
+            results.append(_with_field(doc, spec["as"], matched))
+        return results
+    for doc in docs:
+        scope = dict(variables or {})
+        for name, expression in spec.get("let", {}).items():
+            scope[name] = evaluate(expression, doc, variables)
+        results.append(_with_field(doc, spec["as"], foreign._run_pipeline(spec.get("pipeline", []), scope)))
+    return results
+
+
+def _stage_union_with(database, docs, spec, variables):
+    if isinstance(spec, str):
+        spec = {"coll": spec}
+    return docs + database[spec["coll"]]._run_pipeline(spec.get("pipeline", []))
+
+
+def _stage_replace_root(database, docs, spec, variables):
+    results = []
+    for doc in docs:
+        root = evaluate(spec["newRoot"], doc, variables)
+        if not isinstance(root, dict):
+            raise OperationFailure(f"'newRoot' expression must evaluate to an object, but resulting value was: {root!r}", 40228)
+        results.append(root)
+    return results
+
+
+def _stage_sort(database, docs, spec, variables):
+    return sorted(docs, key=_sort_function(_sort_spec(spec)))
+
+
+def _stage_count(database, docs, spec, variables):
+    return [{spec: len(docs)}] if docs else []
+
+
+def _stage_facet(database, docs, spec, variables):
+    return [{name: _apply_stages(database, [_copy(doc) for doc in docs], pipeline, variables)
+             for name, pipeline in spec.items()}]
+
+
+def _stage_sort_by_count(database, docs, spec, variables):
+    grouped = _stage_group(database, docs, {"_id": spec, "count": {"$sum": 1}}, variables)
+    return sorted(grouped, key=lambda row: -row["count"])
+
+
+_STAGES: Dict[str, Callable[[Any, List[dict], Any, Optional[dict]], List[dict]]] = {
+    "$match": lambda database, docs, spec, variables: list(filter(compile_query(spec, variables), docs)),
+    "$project": lambda database, docs, spec, variables: list(map(compile_projection(spec, variables, True), docs)),
+    "$addFields": _stage_add_fields,
+    "$set": _stage_add_fields,
+    "$unset": _stage_unset,
+    "$sort": _stage_sort,
+    "$skip": lambda database, docs, spec, variables: docs[spec:],
+    "$limit": lambda database, docs, spec, variables: docs[:spec],
+    "$count": _stage_count,
+    "$group": _stage_group,
+    "$bucket": _stage_bucket,
+    "$unwind": _stage_unwind,
+    "$lookup": _stage_lookup,
+    "$unionWith": _stage_union_with,
+    "$replaceRoot": _stage_replace_root,
+    "$replaceWith": lambda database, docs, spec, variables: _stage_replace_root(database, docs, {"newRoot": spec}, variables),
+    "$facet": _stage_facet,
+    "$sortByCount": _stage_sort_by_count,
+}
+
+
+def _apply_stages(database, docs: List[dict], stages: List[dict], variables: Optional[dict]) -> List[dict]:
+    for stage in stages:
+        if len(stage) != 1:
+            raise OperationFailure("A pipeline stage specification object must contain exactly one field.", 40323)
+        name, spec = next(iter(stage.items()))
+        handler = _STAGES.get(name)
+        if handler is None:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", 40324)
+        docs = handler(database, docs, spec, variables)
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Cursors
+# ---------------------------------------------------------------------------
+
+class _BufferedCursor:
+    """Async cursor over results computed on first read"""
+
+    def __init__(self):
+        self._buffer: Optional[List[dict]] = None
+        self._position = 0
+
+    def _compute(self) -> List[dict]:
+        raise NotImplementedError
+
+    def _results(self) -> List[dict]:
+        if self._buffer is None:
+            self._buffer = self._compute()
+        return self._buffer
+
+    @property
+    def alive(self) -> bool:
+        return self._buffer is None or self._position < len(self._buffer)
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        results = self._results()
+        end = len(results) if not length else min(len(results), self._position + length)
+        batch = results[self._position:end]
+        self._position = end
+        return batch
+
+    async def next(self) -> dict:
+        results = self._results()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.next()
+
+    async def close(self):
+        self._buffer = []
+        self._position = 0
+
+    def batch_size(self, batch_size: int):
+        return self
+
+
+class MemoryCursor(_BufferedCursor):
+    """find() cursor; sort/skip/limit apply when the first document is read"""
+
+    def __init__(self, collection: "MemoryCollection", filter: Optional[dict] = None, projection=None,
+                 skip: int = 0, limit: int = 0, sort=None, **kwargs):
+        super().__init__()
+        self.collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._skip = skip
+        self._limit = limit
+        self._sort = _sort_spec(sort) if sort else None
+
+    def _check_unused(self):
+        if self._buffer is not None:
+            raise InvalidOperation("cannot set options after executing query")
+
+    def sort(self, key_or_list, direction=None):
+        self._check_unused()
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int):
+        self._check_unused()
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int):
+        self._check_unused()
+        self._limit = abs(limit)
+        return self
+
+    def hint(self, index):
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        return self
+
+    def collation(self, collation):
+        return self
+
+    def allow_disk_use(self, allow_disk_use: bool):
+        return self
+
+    def clone(self) -> "MemoryCursor":
+        return MemoryCursor(self.collection, self._filter, self._projection, self._skip, self._limit, self._sort)
+
+    def rewind(self):
+        self._buffer = None
+        self._position = 0
+        return self
+
+    def _compute(self) -> List[dict]:
+        command: Dict[str, Any] = {"find": self.collection.name, "filter": self._filter}
+        for field, value in (("sort", dict(self._sort or [])), ("projection", self._projection),
+                             ("skip", self._skip), ("limit", self._limit)):
+            if value:
+                command[field] = value
+        project = compile_projection(self._projection)
+        return self.collection._command(command, lambda: [
+            project(doc) for doc in self.collection._select(self._filter, self._sort, self._skip, self._limit)
+        ], self.collection._cursor_reply)
+
+
+class MemoryCommandCursor(_BufferedCursor):
+    """aggregate() cursor"""
+
+    def __init__(self, compute: Callable[[], List[dict]]):
+        super().__init__()
+        self._compute_results = compute
+
+    def _compute(self) -> List[dict]:
+        return self._compute_results()
+
+
+# ---------------------------------------------------------------------------
+# Collections and databases
+# ---------------------------------------------------------------------------
+
+def _index_name(keys: List[Tuple[str, Any]]) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _write_kind(request) -> str:
+    if isinstance(request, InsertOne):
+        return "insert"
+    if isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+        return "update"
+    if isinstance(request, (DeleteOne, DeleteMany)):
+        return "delete"
+    raise TypeError(f"{request!r} is not a valid request")
+
+
+def _write_command(collection: str, kind: str, requests: List[Any], ordered: bool) -> dict:
+    """The insert/update/delete command the driver sends for a run of bulk_write requests"""
+    if kind == "insert":
+        return {"insert": collection, "ordered": ordered, "documents": [request._doc for request in requests]}
+    if kind == "update":
+        return {"update": collection, "ordered": ordered, "updates": [{
+            "q": request._filter, "u": request._doc, "multi": isinstance(request, UpdateMany),
+            "upsert": bool(request._upsert)
+        } for request in requests]}
+    return {"delete": collection, "ordered": ordered, "deletes": [
+        {"q": request._filter, "limit": 0 if isinstance(request, DeleteMany) else 1} for request in requests
+    ]}
+
+
+class MemoryCollection:
+    """A collection with Motor's AsyncIOMotorCollection API"""
+
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._docs: Dict[tuple, dict] = {}
+        self._indexes: Dict[str, MemoryIndex] = {"_id_": MemoryIndex("_id_", [("_id", ASCENDING)], unique=True)}
+
+    def __repr__(self):
+        return f"MemoryCollection({self.full_name!r})"
+
+    def _command(self, command: dict, operation: Callable[[], Any], reply: Optional[Callable[[Any], dict]] = None):
+        return self.database._execute(command, operation, reply)
+
+    def _cursor_reply(self, docs: List[dict]) -> dict:
+        return {"cursor": {"firstBatch": docs, "id": 0, "ns": self.full_name}, "ok": 1.0}
+
+    # -- reads --------------------------------------------------------------
+
+    def _plan(self, query: dict, sort: Optional[List[Tuple[str, int]]], wanted: int,
+              variables: Optional[dict]) -> Optional[_IndexPlan]:
+        bounds: Dict[str, list] = {}
+        _collect_bounds(query, variables, bounds)
+        indexes = [index for index in self._indexes.values() if _covers(index, query, bounds)]
+        best: Optional[_IndexPlan] = None
+        best_size = len(self._docs) + 1
+        for index in indexes:
+            plan = _index_plan(index, bounds)
+            if plan is None:
+                continue
+            size = plan.size()
+            if size < best_size:
+                best, best_size = plan, size
+        if sort:
+            # An index already in sort order lets sort + limit stop after `wanted` matches; prefer it
+            # unless the best filtering index leaves only a few times that many candidates
+            for index in indexes:
+                ordered = _sorted_plan(index, bounds, sort)
+                if ordered is None:
+                    continue
+                if best is None or ordered.equalities >= best.equalities and ordered.size() <= best_size \
+                        or (wanted and best_size > 10 * wanted):
+                    return ordered
+        if best is None and "$or" in query:
+            return None
+        return best
+
+    def _or_candidates(self, query: dict, variables: Optional[dict]) -> Optional[List[tuple]]:
+        """Union of index candidates of every $or branch, if each branch can use an index"""
+        branches = query.get("$or")
+        if not isinstance(branches, list):
+            return None
+        ids: Dict[tuple, None] = {}
+        for branch in branches:
+            plan = self._plan(branch, None, 0, variables)
+            if plan is None:
+                return None
+            ids.update(dict.fromkeys(plan.ids()))
+        return list(ids)
+
+    def _select(self, query: Optional[dict], sort: Optional[List[Tuple[str, int]]] = None, skip: int = 0,
+                limit: int = 0, variables: Optional[dict] = None) -> List[dict]:
+        """Stored documents matching `query` (not copies)"""
+        query = query or {}
+        predicate = compile_query(query, variables)
+        wanted = skip + limit if limit else 0
+        plan = self._plan(query, sort, wanted, variables)
+        if plan is not None and plan.ordered:
+            matched = []
+            for id_key in plan.ids():
+                doc = self._docs[id_key]
+                if predicate(doc):
+                    matched.append(doc)
+                    if wanted and len(matched) >= wanted:
+                        break
+            return matched[skip:]
+        if plan is not None:
+            candidates: Iterable[dict] = (self._docs[id_key] for id_key in plan.ids())
+        else:
+            or_ids = self._or_candidates(query, variables) if "$or" in query else None
+            candidates = (self._docs[id_key] for id_key in or_ids) if or_ids is not None else self._docs.values()
+        matched = [doc for doc in candidates if predicate(doc)]
+        if sort:
+            matched.sort(key=_sort_function(sort))
+        return matched[skip:skip + limit] if limit else matched[skip:]
+
+    def find(self, filter: Optional[dict] = None, projection=None, *args, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection, *args, **kwargs)
+
+    async def find_one(self, filter=None, projection=None, *args, sort=None, **kwargs) -> Optional[dict]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        cursor = MemoryCursor(self, filter, projection, kwargs.get("skip", 0), 1, sort)
+        docs = await cursor.to_list(length=1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0, **kwargs) -> int:
+        pipeline = [{"$match": filter}] + ([{"$skip": skip}] if skip else []) + ([{"$limit": limit}] if limit else [])
+        command = {"aggregate": self.name, "pipeline": pipeline + [{"$group": {"_id": 1, "n": {"$sum": 1}}}], "cursor": {}}
+        return self._command(command, lambda: len(self._select(filter, None, skip, limit)))
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return self._command({"count": self.name}, lambda: len(self._docs))
+
+    async def distinct(self, key: str, filter: Optional[dict] = None, **kwargs) -> list:
+        def run() -> list:
+            values: Dict[tuple, Any] = {}
+            for doc in self._select(filter):
+                for value in _query_values(doc, _parts(key)):
+                    for item in value if isinstance(value, list) else [value]:
+                        if item is not MISSING:
+                            values.setdefault(sort_key(item), _copy(item))
+            return list(values.values())
+        return self._command({"distinct": self.name, "key": key, "query": filter or {}}, run)
+
+    def aggregate(self, pipeline: List[dict], *args, **kwargs) -> MemoryCommandCursor:
+        pipeline = list(pipeline)
+        command = {"aggregate": self.name, "pipeline": pipeline, "cursor": {}}
+        return MemoryCommandCursor(lambda: self._command(command, lambda: self._run_pipeline(pipeline), self._cursor_reply))
+
+    def _run_pipeline(self, pipeline: List[dict], variables: Optional[dict] = None) -> List[dict]:
+        # Leading $match / $sort / $skip / $limit run as one indexed read
+        query: dict = {}
+        sort = None
+        skip = limit = 0
+        position = 0
+        if position < len(pipeline) and "$match" in pipeline[position]:
+            query = pipeline[position]["$match"]
+            position += 1
+        if position < len(pipeline) and "$sort" in pipeline[position]:
+            sort = _sort_spec(pipeline[position]["$sort"])
+            position += 1
+        while position < len(pipeline):
+            stage = pipeline[position]
+            if "$skip" in stage and not limit:
+                skip += stage["$skip"]
+            elif "$limit" in stage and not limit:
+                limit = stage["$limit"]
+            else:
+                break
+            position += 1
+        docs = [_copy(doc) for doc in self._select(query, sort, skip, limit, variables)]
+        return _apply_stages(self.database, docs, pipeline[position:], variables)
+
+    # -- writes -------------------------------------------------------------
+
+    def _index_keys(self, doc: dict, id_key: tuple) -> Dict[str, List[tuple]]:
+        keys = {}
+        for name, index in self._indexes.items():
+            keys[name] = index.keys_for(doc)
+            index.check(keys[name], id_key, self.full_name)
+        return keys
+
+    def _insert(self, document: dict) -> Any:
+        if not isinstance(document, dict):
+            raise TypeError("document must be an instance of dict")
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        stored = _to_stored(document)
+        id_key = sort_key(stored["_id"])
+        if id_key in self._docs:
+            raise self._indexes["_id_"]._duplicate(self.full_name)
+        keys = self._index_keys(stored, id_key)
+        for name, index in self._indexes.items():
+            index.add(keys[name], id_key)
+        self._docs[id_key] = stored
+        return stored["_id"]
+
+    def _store(self, old: dict, new: dict):
+        """Replace a stored document, keeping indexes in step"""
+        id_key = sort_key(old["_id"])
+        previous = {name: index.doc_keys.get(id_key, []) for name, index in self._indexes.items()}
+        for index in self._indexes.values():
+            index.remove(id_key)
+        try:
+            keys = self._index_keys(new, id_key)
+        except DuplicateKeyError:
+            for name, index in self._indexes.items():
+                index.add(previous[name], id_key)
+            raise
+        for name, index in self._indexes.items():
+            index.add(keys[name], id_key)
+        self._docs[id_key] = new
+
+    def _delete(self, doc: dict):
+        id_key = sort_key(doc["_id"])
+        for index in self._indexes.values():
+            index.remove(id_key)
+        del self._docs[id_key]
+
+    def _upsert(self, query: dict, update, replacement: bool = False) -> dict:
+        doc = _upsert_seed(query)
+        if replacement:
+            doc = {**({"_id": doc["_id"]} if "_id" in doc else {}), **_to_stored(update)}
+        else:
+            apply_update(doc, update, inserting=True)
+        self._insert(doc)
+        return doc
+
+    def _update(self, filter: dict, update, upsert: bool = False, multi: bool = False, sort=None) -> dict:
+        _validate_update(update)
+        docs = self._select(filter, _sort_spec(sort) if sort else None, 0, 0 if multi else 1)
+        modified = 0
+        for doc in docs:
+            new = _copy(doc)
+            if apply_update(new, update):
+                self._store(doc, new)
+                modified += 1
+        raw: Dict[str, Any] = {"n": len(docs), "nModified": modified}
+        if not docs and upsert:
+            raw["upserted"] = self._upsert(filter, update)["_id"]
+            raw["n"] = 1
+        return raw
+
+    def _replace(self, filter: dict, replacement: dict, upsert: bool = False) -> dict:
+        _validate_replacement(replacement)
+        docs = self._select(filter, None, 0, 1)
+        if docs:
+            new = _to_stored(replacement)
+            if "_id" in new and sort_key(new["_id"]) != sort_key(docs[0]["_id"]):
+                raise OperationFailure("The _id field cannot be changed", 66)
+            new = {"_id": docs[0]["_id"], **{key: value for key, value in new.items() if key != "_id"}}
+            changed = sort_key(new) != sort_key(docs[0])
+            self._store(docs[0], new)
+            return {"n": 1, "nModified": int(changed)}
+        if upsert:
+            return {"n": 1, "nModified": 0, "upserted": self._upsert(filter, replacement, replacement=True)["_id"]}
+        return {"n": 0, "nModified": 0}
+
+    def _remove(self, filter: dict, multi: bool) -> int:
+        docs = self._select(filter, None, 0, 0 if multi else 1)
+        for doc in docs:
+            self._delete(doc)
+        return len(docs)
+
+    async def insert_one(self, document: dict, *args, **kwargs) -> InsertOneResult:
+        command = {"insert": self.name, "ordered": True, "documents": [document]}
+        return InsertOneResult(self._command(command, lambda: self._insert(document), lambda _: _written(1)), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, *args, **kwargs) -> InsertManyResult:
+        documents = list(documents)
+        if not documents:
+            raise TypeError("documents must be a non-empty list")
+
+        def run() -> list:
+            inserted, errors = [], []
+            for position, document in enumerate(documents):
+                try:
+                    inserted.append(self._insert(document))
+                except DuplicateKeyError as error:
+                    errors.append({"index": position, "code": 11000, "errmsg": str(error), "op": document})
+                    if ordered:
+                        break
+            if errors:
+                raise BulkWriteError({
+                    "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                    "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+                })
+            return inserted
+
+        command = {"insert": self.name, "ordered": ordered, "documents": documents}
+        return InsertManyResult(self._command(command, run, lambda inserted: _written(len(inserted))), True)
+
+    def _update_command(self, filter: dict, update, upsert: bool, multi: bool) -> dict:
+        return {"update": self.name, "ordered": True, "updates": [{"q": filter, "u": update, "multi": multi, "upsert": upsert}]}
+
+    async def update_one(self, filter: dict, update, upsert: bool = False, *args, sort=None, **kwargs) -> UpdateResult:
+        command = self._update_command(filter, update, upsert, False)
+        return UpdateResult(self._command(command, lambda: self._update(filter, update, upsert, False, sort), _raw_reply), True)
+
+    async def update_many(self, filter: dict, update, upsert: bool = False, *args, **kwargs) -> UpdateResult:
+        command = self._update_command(filter, update, upsert, True)
+        return UpdateResult(self._command(command, lambda: self._update(filter, update, upsert, True), _raw_reply), True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, *args, **kwargs) -> UpdateResult:
+        command = self._update_command(filter, replacement, upsert, False)
+        return UpdateResult(self._command(command, lambda: self._replace(filter, replacement, upsert), _raw_reply), True)
+
+    def _delete_command(self, filter: dict, multi: bool) -> dict:
+        return {"delete": self.name, "ordered": True, "deletes": [{"q": filter, "limit": 0 if multi else 1}]}
+
+    async def delete_one(self, filter: dict, *args, **kwargs) -> DeleteResult:
+        removed = self._command(self._delete_command(filter, False), lambda: self._remove(filter, False), _written)
+        return DeleteResult({"n": removed}, True)
+
+    async def delete_many(self, filter: dict, *args, **kwargs) -> DeleteResult:
+        removed = self._command(self._delete_command(filter, True), lambda: self._remove(filter, True), _written)
+        return DeleteResult({"n": removed}, True)
+
+    def _find_and_modify(self, filter: dict, change: dict, projection, sort, operation: Callable[[], Any]):
+        command: Dict[str, Any] = {"findAndModify": self.name, "query": filter, **change}
+        if sort:
+            command["sort"] = dict(_sort_spec(sort))
+        if projection:
+            command["fields"] = projection
+        return self._command(command, operation, lambda doc: {"value": doc, "ok": 1.0})
+
+    async def find_one_and_update(self, filter: dict, update, projection=None, sort=None, upsert: bool = False,
+                                  return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[dict]:
+        _validate_update(update)
+
+        def run() -> Optional[dict]:
+            docs = self._select(filter, _sort_spec(sort) if sort else None, 0, 1)
+            project = compile_projection(projection)
+            if docs:
+                new = _copy(docs[0])
+                apply_update(new, update)
+                self._store(docs[0], new)
+                return project(new if return_document == ReturnDocument.AFTER else docs[0])
+            if upsert:
+                doc = self._upsert(filter, update)
+                return project(self._docs[sort_key(doc["_id"])]) if return_document == ReturnDocument.AFTER else None
+            return None
+
+        change = {"update": update, "new": return_document == ReturnDocument.AFTER, "upsert": upsert}
+        return self._find_and_modify(filter, change, projection, sort, run)
+
+    async def find_one_and_replace(self, filter: dict, replacement: dict, projection=None, sort=None,
+                                   upsert: bool = False, return_document: bool = ReturnDocument.BEFORE,
+                                   **kwargs) -> Optional[dict]:
+        def run() -> Optional[dict]:
+            docs = self._select(filter, _sort_spec(sort) if sort else None, 0, 1)
+            before = docs[0] if docs else None
+            raw = self._replace({"_id": before["_id"]} if before else filter, replacement, upsert)
+            project = compile_projection(projection)
+            if return_document == ReturnDocument.AFTER:
+                id_value = before["_id"] if before else raw.get("upserted", MISSING)
+                after = self._docs.get(sort_key(id_value)) if id_value is not MISSING else None
+                return project(after) if after else None
+            return project(before) if before else None
+
+        change = {"update": replacement, "new": return_document == ReturnDocument.AFTER, "upsert": upsert}
+        return self._find_and_modify(filter, change, projection, sort, run)
+
+    async def find_one_and_delete(self, filter: dict, projection=None, sort=None, **kwargs) -> Optional[dict]:
+        def run() -> Optional[dict]:
+            docs = self._select(filter, _sort_spec(sort) if sort else None, 0, 1)
+            if not docs:
+                return None
+            self._delete(docs[0])
+            return compile_projection(projection)(docs[0])
+
+        return self._find_and_modify(filter, {"remove": True}, projection, sort, run)
+
+    def _bulk_run(self, run: List[Tuple[int, Any]], ordered: bool, result: Dict[str, Any]) -> bool:
+        """Apply one run of same-kind requests into `result`; True when an ordered write stopped on an error"""
+        for position, request in run:
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                    continue
+                if isinstance(request, (UpdateOne, UpdateMany)):
+                    raw = self._update(request._filter, request._doc, bool(request._upsert), isinstance(request, UpdateMany))
+                elif isinstance(request, ReplaceOne):
+                    raw = self._replace(request._filter, request._doc, bool(request._upsert))
+                else:
+                    result["nRemoved"] += self._remove(request._filter, isinstance(request, DeleteMany))
+                    continue
+                if "upserted" in raw:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": position, "_id": raw["upserted"]})
+                else:
+                    result["nMatched"] += raw["n"]
+                    result["nModified"] += raw["nModified"]
+            except OperationFailure as error:
+                result["writeErrors"].append({"index": position, "code": error.code, "errmsg": str(error), "op": request})
+                if ordered:
+                    return True
+        return False
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, *args, **kwargs) -> BulkWriteResult:
+        requests = list(requests)
+        if not requests:
+            raise InvalidOperation("No operations to execute")
+        result: Dict[str, Any] = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+        }
+        # Like the driver: one command per run of consecutive inserts, updates or deletes
+        for kind, group in itertools.groupby(enumerate(requests), key=lambda item: _write_kind(item[1])):
+            run = list(group)
+            command = _write_command(self.name, kind, [request for _, request in run], ordered)
+            if self._command(command, lambda: self._bulk_run(run, ordered, result)):
+                break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # -- indexes ------------------------------------------------------------
+
+    def _create_index(self, spec: dict) -> str:
+        keys = [(field, direction if direction in (1, -1) else 1) for field, direction in spec["key"].items()]
+        name = spec.get("name") or _index_name(list(spec["key"].items()))
+        unique = bool(spec.get("unique", False))
+        existing = self._indexes.get(name)
+        if existing is not None:
+            if existing.keys == keys and existing.unique == unique:
+                return name
+            raise OperationFailure(f"An existing index has the same name as the requested index: {name}", 86)
+        for other in self._indexes.values():
+            if other.keys == keys:
+                raise OperationFailure(f"Index already exists with a different name: {other.name}", 85)
+        index = MemoryIndex(name, keys, unique, bool(spec.get("sparse", False)), spec.get("partialFilterExpression"))
+        index.build(self._docs, self.full_name)
+        self._indexes[name] = index
+        return name
+
+    async def create_index(self, keys, **kwargs) -> str:
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def create_indexes(self, indexes: List[IndexModel], **kwargs) -> List[str]:
+        specs = [model.document for model in indexes]
+        return self._command({"createIndexes": self.name, "indexes": specs},
+                             lambda: [self._create_index(spec) for spec in specs])
+
+    async def index_information(self, **kwargs) -> Dict[str, dict]:
+        return self._command({"listIndexes": self.name, "cursor": {}}, lambda: {
+            name: index.info() for name, index in self._indexes.items()
+        })
+
+    def list_indexes(self, **kwargs) -> MemoryCommandCursor:
+        command = {"listIndexes": self.name, "cursor": {}}
+        return MemoryCommandCursor(lambda: self._command(command, lambda: [
+            {**index.info(), "key": dict(index.keys), "name": name} for name, index in self._indexes.items()
+        ], self._cursor_reply))
+
+    async def drop_index(self, index_or_name, **kwargs):
+        name = index_or_name if isinstance(index_or_name, str) else _index_name(_sort_spec(index_or_name))
+
+        def run():
+            if name == "_id_":
+                raise OperationFailure("cannot drop _id index", 72)
+            if self._indexes.pop(name, None) is None:
+                raise OperationFailure(f"index not found with name [{name}]", 27)
+
+        self._command({"dropIndexes": self.name, "index": name}, run)
+
+    async def drop_indexes(self, **kwargs):
+        def run():
+            self._indexes = {"_id_": self._indexes["_id_"]}
+
+        self._command({"dropIndexes": self.name, "index": "*"}, run)
+
+    async def drop(self, **kwargs):
+        await self.database.drop_collection(self.name)
+
+
+def _written(count: int) -> dict:
+    return {"n": count, "ok": 1.0}
+
+
+def _raw_reply(raw: dict) -> dict:
+    return {**raw, "ok": 1.0}
+
+
+# Server address reported in command events
+MEMORY_ADDRESS = ("memory", 0)
+
+
+class MemoryDatabase:
+    """In-memory database; like MongoDB, collections exist once they are used"""
+
+    def __init__(self, name: str = "test", documents: Optional[Dict[str, List[dict]]] = None,
+                 event_listeners: Optional[list] = None):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        # Like MongoClient: the globally registered command listeners plus the ones passed in
+        self._listeners = list(monitoring._LISTENERS.command_listeners) + [
+            listener for listener in event_listeners or [] if isinstance(listener, monitoring.CommandListener)
+        ]
+        self._request_ids = itertools.count(1)
+        for collection, docs in (documents or {}).items():
+            for doc in docs:
+                self[collection]._insert(_copy(doc))
+
+    def __repr__(self):
+        return f"MemoryDatabase({self.name!r})"
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    def _publish(self, method: str, event):
+        for listener in self._listeners:
+            try:
+                getattr(listener, method)(event)
+            except Exception:
+                pass  # as in the driver, a failing listener does not fail the command
+
+    def _execute(self, command: dict, operation: Callable[[], Any], reply: Optional[Callable[[Any], dict]] = None):
+        """Run `operation` as `command`, publishing the command events the driver would"""
+        if not self._listeners:
+            return operation()
+        name = next(iter(command))
+        request_id = next(self._request_ids)
+        self._publish("started", monitoring.CommandStartedEvent(command, self.name, request_id, MEMORY_ADDRESS, request_id))
+        started = time.perf_counter()
+        try:
+            result = operation()
+        except Exception as error:
+            failure = {"ok": 0.0, "errmsg": str(error), "code": getattr(error, "code", None)}
+            self._publish("failed", monitoring.CommandFailedEvent(
+                timedelta(seconds=time.perf_counter() - started), failure, name, request_id, MEMORY_ADDRESS, request_id,
+                database_name=self.name
+            ))
+            raise
+        self._publish("succeeded", monitoring.CommandSucceededEvent(
+            timedelta(seconds=time.perf_counter() - started), reply(result) if reply else {"ok": 1.0}, name,
+            request_id, MEMORY_ADDRESS, request_id, database_name=self.name
+        ))
+        return result
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return self._execute({"listCollections": 1, "nameOnly": True}, lambda: [
+            name for name, collection in self._collections.items() if collection._docs or len(collection._indexes) > 1
+        ])
+
+    async def drop_collection(self, name: str, **kwargs):
+        name = name if isinstance(name, str) else name.name
+        self._execute({"drop": name}, lambda: self._collections.pop(name, None))
+
+    async def command(self, command, *args, **kwargs) -> dict:
+        name = command if isinstance(command, str) else next(iter(command))
+
+        def run() -> dict:
+            if name == "ping":
+                return {"ok": 1.0}
+            raise OperationFailure(f"no such command: '{name}'", 59)
+
+        return self._execute({name: 1} if isinstance(command, str) else dict(command), run, lambda reply: reply)
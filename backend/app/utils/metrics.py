@@ -0,0 +1,299 @@
+"""
+Request metrics in the Prometheus text exposition format, served on GET /metrics.
+
+MetricsMiddleware records every HTTP request, labelled by the router prefix it falls under (the
+prefixes registered in main.py), the method and the matched route template:
+    http_requests_total                 counter, also labelled by status class (2xx, 4xx, 5xx)
+    http_request_duration_seconds       histogram
+    http_response_size_bytes            histogram
+    http_requests_in_flight             gauge, by router only (the route is not known yet)
+Error rates are the 4xx/5xx share of http_requests_total.
+
+render_metrics() adds point-in-time values collected when scraped: MongoDB connection pool
+(ConnectionPoolStats, registered on the Motor client), per-route MongoDB commands (see
+command_accounting.py), event-loop lag (loop_monitor.py), the principal and response caches,
+the password hashing pool and dropped log records.
+
+The format is written directly, so no client library is needed. Counters live in the worker
+process: with several uvicorn workers, scrape each one or aggregate across them. When
+METRICS_TOKEN is set, /metrics requires `Authorization: Bearer <METRICS_TOKEN>`.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+Labels = Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def lines(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self) -> List[str]:
+        return [f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, labels: Labels, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def lines(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+ROUTE_LABELS = ("router", "method", "route")
+
+requests_total = Counter("http_requests_total", "HTTP requests served", ROUTE_LABELS + ("status",))
+request_duration = Histogram("http_request_duration_seconds", "Time to serve HTTP requests", ROUTE_LABELS)
+response_size = Histogram("http_response_size_bytes", "HTTP response body size", ROUTE_LABELS, SIZE_BUCKETS)
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served", ("router",))
+
+REQUEST_METRICS: List[Metric] = [requests_total, request_duration, response_size, requests_in_flight]
+
+
+def router_prefix(path: str, prefixes: Iterable[str]) -> str:
+    """Longest registered router prefix of `path`, or "other" """
+    matches = [prefix for prefix in prefixes if path == prefix or path.startswith(prefix + "/")]
+    return max(matches, key=len) if matches else "other"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count, latency, response size and in-flight requests"""
+
+    def __init__(self, app, router_prefixes: Sequence[str] = ()):
+        self.app = app
+        self.router_prefixes = tuple(router_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        router = router_prefix(scope["path"], self.router_prefixes)
+        status_code = 500
+        body_size = 0
+
+        async def measured_send(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc((router,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.inc((router,), -1)
+            route = scope.get("route")
+            labels = (router, scope["method"], route.path if route is not None else "unmatched")
+            requests_total.inc(labels + (f"{status_code // 100}xx",))
+            request_duration.observe(labels, elapsed)
+            response_size.observe(labels, body_size)
+
+
+class ConnectionPoolStats(monitoring.ConnectionPoolListener):
+    """Open and checked-out MongoDB connections (events arrive on the driver's threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.created = 0
+        self.check_out_failures = 0
+        self.clears = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.check_out_failures += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.clears += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+connection_pool_stats = ConnectionPoolStats()
+
+
+def snapshot_metric(metric: Metric, samples: Iterable[Tuple[Labels, float]]) -> Metric:
+    for labels, value in samples:
+        metric.inc(labels, value)
+    return metric
+
+
+def collected_metrics(max_pool_size: Optional[int] = None) -> List[Metric]:
+    """Point-in-time metrics read from the pool, caches and command accounting when scraped"""
+    from . import loop_monitor
+    from .command_accounting import route_command_stats
+    from .logging_setup import dropped_records
+    from .password_pool import password_pool
+    from .principal_cache import principal_cache
+    from .response_cache import response_cache_stats
+
+    pool = connection_pool_stats
+    metrics = [
+        snapshot_metric(Gauge("mongodb_pool_connections", "Open MongoDB connections"), [((), pool.open)]),
+        snapshot_metric(Gauge("mongodb_pool_checked_out", "MongoDB connections in use"), [((), pool.checked_out)]),
+        snapshot_metric(Counter("mongodb_pool_connections_created_total", "MongoDB connections opened"),
+                        [((), pool.created)]),
+        snapshot_metric(Counter("mongodb_pool_check_out_failures_total", "Failed connection check-outs"),
+                        [((), pool.check_out_failures)]),
+        snapshot_metric(Counter("mongodb_pool_clears_total", "Connection pool clears"), [((), pool.clears)]),
+    ]
+    if max_pool_size is not None:
+        metrics.append(snapshot_metric(Gauge("mongodb_pool_max_size", "maxPoolSize of the client"),
+                                       [((), max_pool_size)]))
+
+    routes = route_command_stats.snapshot()
+    metrics += [
+        snapshot_metric(Counter("mongodb_commands_total", "MongoDB commands issued by requests", ("route",)),
+                        [((route,), stats["commands"]) for route, stats in routes.items()]),
+        snapshot_metric(Counter("mongodb_command_seconds_total", "MongoDB time spent by requests", ("route",)),
+                        [((route,), stats["db_time_ms"] / 1000) for route, stats in routes.items()]),
+        snapshot_metric(Counter("mongodb_flagged_requests_total",
+                                "Requests over the query budget or repeating a query shape", ("route",)),
+                        [((route,), stats["flagged"]) for route, stats in routes.items()]),
+    ]
+
+    metrics += [
+        loop_monitor.loop_lag,
+        snapshot_metric(Gauge("event_loop_lag_last_seconds", "Latest event-loop lag sample"),
+                        [((), loop_monitor.last_lag)]),
+    ]
+
+    users = principal_cache.stats()
+    responses = response_cache_stats()
+    passwords = password_pool.stats()
+    metrics += [
+        snapshot_metric(Counter("cache_lookups_total", "Cache lookups", ("cache", "result")), [
+            (("principal", "hit"), users["hits"]), (("principal", "miss"), users["misses"]),
+            (("response", "hit"), responses["hits"]), (("response", "miss"), responses["misses"]),
+        ]),
+        snapshot_metric(Gauge("cache_entries", "Entries held in the per-process cache", ("cache",)),
+                        [(("principal",), users["size"])]),
+        snapshot_metric(Counter("cache_evictions_total", "Entries evicted for space", ("cache",)),
+                        [(("principal",), users["evictions"])]),
+        snapshot_metric(Gauge("password_pool_pending", "Password hashing jobs running or queued"),
+                        [((), passwords["pending"])]),
+        snapshot_metric(Counter("password_pool_rejected_total", "Password hashing jobs rejected as busy"),
+                        [((), passwords["rejected"])]),
+        snapshot_metric(Counter("log_records_dropped_total", "Log records dropped because the log queue was full"),
+                        [((), dropped_records())]),
+    ]
+    return metrics
+
+
+def render_metrics(max_pool_size: Optional[int] = None) -> str:
+    lines = []
+    for metric in REQUEST_METRICS + collected_metrics(max_pool_size):
+        lines += metric.header() + metric.lines()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,189 @@
+"""
+Maintenance commands for one-off data fixes.
+
+Run from the backend directory:
+    python -m app.utils.migrations
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from pymongo import ASCENDING, UpdateOne
+
+from .counters import LEAD_ID, next_ids
+from .database import get_database, connect_to_mongo, close_mongo_connection
+from .indexes import CUSTOMER_ID_INDEX, ensure_index
+from .lead_activity import migrate_lead_activities
+
+
+def parse_customer_number(customer_id) -> Optional[int]:
+    """Return the sequence number of a CUST-#### or CUST-YYYY-#### id, or None"""
+    if not isinstance(customer_id, str) or not customer_id.startswith("CUST-"):
+        return None
+    parts = customer_id.split("-")
+    if len(parts) == 2 and parts[1].isdigit():
+        return int(parts[1])
+    if len(parts) == 3 and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+def normalized_customer_id(customer_id) -> Optional[str]:
+    """The CUST-#### form of an id (CUST-2025-0001 -> CUST-0001), None when it has none"""
+    if not isinstance(customer_id, str) or not customer_id.startswith("CUST-") or len(customer_id) > 15:
+        return None
+    parts = customer_id.split("-")
+    if len(parts) == 3 and parts[2].isdigit():
+        return f"CUST-{parts[2]}"
+    return customer_id
+
+
+def plan_customer_id_updates(customers: List[dict]) -> Dict[object, str]:
+    """Work out which customers need a new CUST-#### id.
+
+    Ids already in final form are reserved for their first holder before anything else is
+    assigned, so a legacy id normalizing to the same value never takes it over. Year-format
+    ids (CUST-2025-0001) are then shortened to CUST-0001 when that is free, and missing,
+    malformed or clashing ids get the next free number.
+    Returns a map of MongoDB _id -> new customer_id.
+    """
+    max_customer_num = 0
+    for customer in customers:
+        num = parse_customer_number(customer.get("customer_id"))
+        if num is not None:
+            max_customer_num = max(max_customer_num, num)
+
+    taken: Set[str] = set()
+    keepers: Set[object] = set()
+    for customer in customers:
+        current_id = customer.get("customer_id")
+        if current_id is not None and normalized_customer_id(current_id) == current_id and current_id not in taken:
+            taken.add(current_id)
+            keepers.add(customer["_id"])
+
+    updates: Dict[object, str] = {}
+    for customer in customers:
+        if customer["_id"] in keepers:
+            continue
+        current_id = customer.get("customer_id")
+        normalized_id = normalized_customer_id(current_id)
+
+        if normalized_id is None or normalized_id in taken:
+            max_customer_num += 1
+            normalized_id = f"CUST-{str(max_customer_num).zfill(4)}"
+
+        taken.add(normalized_id)
+        if normalized_id != current_id:
+            updates[customer["_id"]] = normalized_id
+
+    return updates
+
+
+async def normalize_customer_ids(db) -> int:
+    """Rewrite non-conforming customer ids with a single bulk write"""
+    customers_cursor = db.customers.find({}, {"customer_id": 1}).sort("_id", ASCENDING)
+    customers = await customers_cursor.to_list(length=None)
+
+    updates = plan_customer_id_updates(customers)
+    if not updates:
+        return 0
+
+    # Clear the ids being replaced first so the unique index never sees a transient duplicate
+    operations = [
+        UpdateOne({"_id": mongo_id}, {"$unset": {"customer_id": ""}})
+        for mongo_id in updates
+    ]
+    operations += [
+        UpdateOne({"_id": mongo_id}, {"$set": {"customer_id": customer_id}})
+        for mongo_id, customer_id in updates.items()
+    ]
+    await db.customers.bulk_write(operations, ordered=True)
+    return len(updates)
+
+
+def is_lead_id(lead_id) -> bool:
+    """True for ids in the LEAD-YYYY-#### format"""
+    return isinstance(lead_id, str) and lead_id.startswith("LEAD-") and len(lead_id) <= 15
+
+
+def lead_year(lead: dict) -> int:
+    """Year a lead was created in (current year when unknown)"""
+    created_at = lead.get("createdAt") or lead.get("created_at") or ""
+    try:
+        if isinstance(created_at, str) and len(created_at) >= 4:
+            return int(created_at[:4])
+        if hasattr(created_at, "year"):
+            return created_at.year
+    except ValueError:
+        pass
+    return datetime.now().year
+
+
+async def assign_lead_ids(db, leads: List[dict]) -> Dict[object, str]:
+    """Give leads without a LEAD-YYYY-#### id the next free one of their creation year.
+
+    The new ids are stored and also written into the given lead dicts.
+    Returns a map of MongoDB _id -> new lead_id.
+    """
+    by_year: Dict[int, List[dict]] = defaultdict(list)
+    for lead in leads:
+        if not is_lead_id(lead.get("lead_id")):
+            by_year[lead_year(lead)].append(lead)
+
+    updates: Dict[object, str] = {}
+    operations = []
+    for year, year_leads in sorted(by_year.items()):
+        lead_ids = await next_ids(db, LEAD_ID, len(year_leads), year)
+        for lead, lead_id in zip(year_leads, lead_ids):
+            # Only fill the id if nobody else did in the meantime
+            operations.append(UpdateOne({"_id": lead["_id"], "lead_id": lead.get("lead_id")},
+                                        {"$set": {"lead_id": lead_id}}))
+            lead["lead_id"] = lead_id
+            updates[lead["_id"]] = lead_id
+
+    if operations:
+        await db.leads.bulk_write(operations, ordered=False)
+    return updates
+
+
+async def normalize_lead_ids(db) -> int:
+    """Assign LEAD-YYYY-#### ids to every lead that lacks one"""
+    leads_cursor = db.leads.find(
+        {"$or": [
+            {"lead_id": {"$not": {"$regex": "^LEAD-"}}},  # also matches missing ids
+            {"lead_id": {"$regex": "^LEAD-.{11,}"}}
+        ]},
+        {"lead_id": 1, "createdAt": 1, "created_at": 1}
+    ).sort("_id", ASCENDING)
+    leads = await leads_cursor.to_list(length=None)
+    return len(await assign_lead_ids(db, leads))
+
+
+async def ensure_customer_id_index(db) -> str:
+    """Create the unique index on customers.customer_id (ignores documents without an id)"""
+    return await ensure_index(db, CUSTOMER_ID_INDEX)
+
+
+async def run_migrations():
+    """Normalize customer and lead ids, bucket lead activities and enforce customer id uniqueness"""
+    await connect_to_mongo()
+    db = get_database()
+
+    updated = await normalize_customer_ids(db)
+    print(f"Normalized {updated} customer IDs")
+
+    updated = await normalize_lead_ids(db)
+    print(f"Assigned {updated} lead IDs")
+
+    migrated = await migrate_lead_activities(db)
+    print(f"Moved activities of {migrated} leads to lead_activity_buckets")
+
+    index_name = await ensure_customer_id_index(db)
+    print(f"Ensured index {index_name} on customers.customer_id")
+
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())
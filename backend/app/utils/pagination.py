@@ -0,0 +1,136 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are read in a fixed (sort key, _id) order and each page starts right after the last
+document of the previous one, so fetching page 1000 costs the same as page 1 when an index
+on (sort key, _id) exists. skip() by contrast walks every document it skips.
+
+Endpoints take a `page: PageParams = Depends()` parameter (query parameters `cursor` and
+`limit`) and call fetch_page(). The response body stays a plain list; when more documents
+remain, the opaque cursor for the next page is returned in the X-Next-Cursor header.
+Without a limit, PAGE_SIZE_DEFAULT documents are returned; PAGE_SIZE_MAX caps the limit.
+Clients that need a whole listing follow X-Next-Cursor until it is absent (see
+src/services/pagination.ts), so no request reads more than one page.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Optional
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Query, Response
+from pymongo import ASCENDING
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# BSON comparison order of the types a sort key may hold. $lt/$gt only match values of
+# the same type, so the keyset filter adds the types that sort before/after explicitly.
+_TYPE_ORDER = ["null", "number", "string", "objectId", "bool", "date"]
+
+
+class PageParams:
+    """Query parameters of a paginated list endpoint"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Page size")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_cursor(sort_key: str, value: Any, _id: Any) -> str:
+    payload = json_util.dumps({"k": sort_key, "v": value, "id": _id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str):
+    """Return the (sort value, _id) a cursor points at; 400 for malformed or foreign cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if payload["k"] != sort_key:
+            raise ValueError("cursor belongs to a different listing")
+        return payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError, binascii.Error, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _type_rank(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 4
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, ObjectId):
+        return 3
+    if isinstance(value, datetime):
+        return 5
+    raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _type_filter(sort_key: str, rank: int) -> dict:
+    if _TYPE_ORDER[rank] == "null":
+        # Matches both null and missing fields
+        return {sort_key: None}
+    return {sort_key: {"$type": _TYPE_ORDER[rank]}}
+
+
+def keyset_filter(sort_key: str, direction: int, value: Any, _id: Any) -> dict:
+    """Filter for the documents after (value, _id) in (sort_key, _id) order"""
+    after = "$gt" if direction == ASCENDING else "$lt"
+    if sort_key == "_id":
+        return {"_id": {after: _id}}
+
+    rank = _type_rank(value)
+    clauses = [{sort_key: value, "_id": {after: _id}}]
+    if value is not None:
+        clauses.insert(0, {sort_key: {after: value}})
+    later_ranks = range(rank + 1, len(_TYPE_ORDER)) if direction == ASCENDING else range(rank)
+    clauses += [_type_filter(sort_key, later) for later in later_ranks]
+    return {"$or": clauses}
+
+
+def _sort_value(document: dict, sort_key: str) -> Any:
+    value = document
+    for part in sort_key.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    page: PageParams,
+    response: Response,
+    sort_key: str = "_id",
+    direction: int = ASCENDING,
+    projection: Optional[dict] = None
+) -> List[dict]:
+    """Read one page of `collection` matching `query`, ordered by (sort_key, _id).
+
+    Sets the X-Next-Cursor header on `response` when more documents remain.
+    """
+    if page.cursor:
+        value, last_id = decode_cursor(page.cursor, sort_key)
+        condition = keyset_filter(sort_key, direction, value, last_id)
+        query = {"$and": [query, condition]} if query else condition
+
+    sort = [("_id", direction)] if sort_key == "_id" else [(sort_key, direction), ("_id", direction)]
+    # One extra document tells whether another page exists
+    documents = await collection.find(query, projection).sort(sort).limit(page.limit + 1).to_list(length=None)
+    if len(documents) > page.limit:
+        documents = documents[:page.limit]
+        last = documents[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort_key, _sort_value(last, sort_key), last["_id"])
+    return documents
+
@@ -0,0 +1,77 @@
+"""
+Bounded worker pool for bcrypt hashing and verification.
+
+A bcrypt round takes a few hundred milliseconds of CPU; running it inline in an async handler
+stalls every other request on the event loop. Password work is submitted here instead, and at
+most PASSWORD_HASH_WORKERS hashes run at once. The bcrypt extension releases the GIL, so
+threads (the default) run in parallel. Set PASSWORD_HASH_EXECUTOR=process to use a process
+pool instead.
+
+At most PASSWORD_HASH_MAX_QUEUE further jobs may wait; beyond that, submissions fail
+immediately with PasswordPoolBusy. A login burst therefore gets fast 503s instead of an
+ever-growing backlog.
+"""
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+                 kind: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self.pending = 0  # running + waiting jobs
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the module never starts threads or processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run `func(*args)` in the pool; `func` must be a module-level function for process pools"""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolBusy("Password hashing queue is full")
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+            self.completed += 1
+            return result
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "maxQueue": self.max_queue,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool()
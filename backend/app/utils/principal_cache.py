@@ -0,0 +1,78 @@
+"""
+Short-lived cache of authenticated user principals, keyed by the token subject (email).
+
+get_current_user runs on every request; caching the principal saves a users lookup per
+call. Entries expire after USER_CACHE_TTL seconds and the user update/delete endpoints
+invalidate them explicitly. The cache is per process, so with several workers a change made
+through another worker is picked up once the TTL expires.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+
+
+class PrincipalCache:
+    """Bounded LRU cache with per-entry expiry and hit/miss counters"""
+
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES, ttl: float = USER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # Bumped on every invalidation so a lookup that raced with an update is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is not None and item[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        if item is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, principal: dict, generation: int):
+        """Store a principal loaded while `generation` was current"""
+        if generation != self.generation or self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Optional[str]):
+        self.generation += 1
+        self.invalidations += 1
+        for key in keys:
+            if key:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,227 @@
+"""
+On-demand sampling profiler for single requests.
+
+A request sent with the `X-Profile: 1` header by an admin or super admin (the bearer token is
+checked like get_current_user does, then require_admin_or_super_admin) runs under a sampler
+thread. Every PROFILE_SAMPLE_INTERVAL_MS the thread looks at the request's task:
+    on-loop   the task is running; the loop thread's stack from this middleware down
+              (Python work: serialization, sorting, blocking calls)
+    awaiting  the task is suspended; its chain of awaited coroutines (waiting for MongoDB,
+              the password pool, ...)
+Samples taken while the loop runs other requests are not attributed to this one. Handlers
+and dependencies that FastAPI runs in its threadpool (plain `def`) show up as awaiting.
+
+Finished profiles are kept in a ring of the last PROFILE_RING_SIZE. The response carries
+X-Profile-Id; GET /api/admin/profiles lists the ring and /api/admin/profiles/{id} returns a
+call tree (format=tree) or folded stacks (format=folded) for flamegraph.pl or speedscope.
+Sampling stops after PROFILE_MAX_SECONDS, and only one request is profiled at a time.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))
+
+Stack = Tuple[str, ...]
+
+
+def frame_label(code) -> str:
+    """function (dir/file.py:line), specific enough to tell same-named functions apart"""
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def running_stack(frame, root_code) -> Stack:
+    """Frames from the one running `root_code` down to `frame`"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        if frame.f_code is root_code:
+            break
+        frame = frame.f_back
+    return tuple(frame_label(code) for code in reversed(codes))
+
+
+def awaiting_stack(coro, root_code) -> Stack:
+    """Chain of coroutines a suspended task is awaiting, from the one running `root_code` down"""
+    codes = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        if frame.f_code is root_code:
+            codes.clear()
+        codes.append(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return tuple(frame_label(code) for code in codes)
+
+
+class TaskSampler(threading.Thread):
+    """Samples one asyncio task from a separate thread until stopped.
+
+    Stacks start at the frame running `root_code` (the profiling middleware), leaving out the
+    server frames above it.
+    """
+
+    def __init__(self, task: asyncio.Task, root_code, interval: float, max_seconds: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.task = task
+        self.root_code = root_code
+        self.loop = task.get_loop()
+        self.loop_thread_id = threading.get_ident()  # created from the loop's own thread
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        coro = self.task.get_coro()
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            try:
+                if asyncio.current_task(self.loop) is self.task:
+                    frame = sys._current_frames().get(self.loop_thread_id)
+                    self.samples[("on-loop",) + running_stack(frame, self.root_code)] += 1
+                else:
+                    self.samples[("awaiting",) + awaiting_stack(coro, self.root_code)] += 1
+            except Exception:
+                pass  # frames changed under us; skip the sample
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def render_folded(samples: Dict[Stack, int]) -> str:
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(samples.items()))
+
+
+def render_tree(samples: Dict[Stack, int], min_percent: float = 0.5) -> str:
+    """Indented call tree with each node's share of the samples"""
+    total = sum(samples.values())
+    if not total:
+        return "No samples\n"
+    tree: dict = {}
+    for stack, count in samples.items():
+        node = tree
+        for label in stack:
+            child = node.setdefault(label, {"count": 0, "children": {}})
+            child["count"] += count
+            node = child["children"]
+
+    lines = []
+
+    def walk(nodes: dict, depth: int):
+        for label, child in sorted(nodes.items(), key=lambda item: -item[1]["count"]):
+            percent = 100 * child["count"] / total
+            if percent < min_percent:
+                continue
+            lines.append(f"{percent:6.1f}% {child['count']:>6}  {'  ' * depth}{label}")
+            walk(child["children"], depth + 1)
+
+    walk(tree, 0)
+    return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """Ring of the most recent profiles"""
+
+    def __init__(self, size: int = PROFILE_RING_SIZE):
+        self._profiles: Deque[dict] = deque(maxlen=size)
+
+    def add(self, profile: dict):
+        self._profiles.append(profile)
+
+    def list(self) -> List[dict]:
+        return [{key: value for key, value in profile.items() if key != "samples"}
+                for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+
+profile_store = ProfileStore()
+_profiling = threading.Lock()
+
+
+async def profiling_user(headers: Dict[bytes, bytes]) -> Optional[dict]:
+    """The admin requesting a profile, None when the header is absent or the user may not profile"""
+    from .auth import get_current_user, require_admin_or_super_admin
+
+    if headers.get(PROFILE_HEADER, b"").lower() not in (b"1", b"true", b"yes"):
+        return None
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        user = await get_current_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=token))
+        require_admin_or_super_admin(user)
+    except HTTPException:
+        return None
+    return user
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that carry the admin profiling header"""
+
+    def __init__(self, app, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.app = app
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or PROFILE_HEADER not in dict(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        user = await profiling_user(dict(scope["headers"]))
+        if user is None or not _profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        sampler = TaskSampler(asyncio.current_task(), ProfilingMiddleware.__call__.__code__, self.interval,
+                              self.max_seconds)
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            samples = sampler.stop()
+            _profiling.release()
+            route = scope.get("route")
+            profile_store.add({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": route.path if route is not None else None,
+                "user": user["email"],
+                "started_at": started_at.isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "sample_interval_ms": self.interval * 1000,
+                "sample_count": sum(samples.values()),
+                "on_loop_samples": sum(count for stack, count in samples.items() if stack[0] == "on-loop"),
+                "samples": dict(samples),
+            })
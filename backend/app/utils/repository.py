@@ -0,0 +1,80 @@
+"""
+Projection-aware reads for list endpoints.
+
+A list endpoint declares a View: the stored fields it returns plus computed fields, which
+are aggregation expressions MongoDB evaluates before sending the document (e.g. the size
+of an embedded array instead of the array itself). Only those fields cross the network
+and get allocated in Python, so large or unused fields cost nothing.
+
+Computed fields in find() projections need MongoDB 4.4 or newer.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+from pymongo import ASCENDING
+
+from .pagination import PageParams, fetch_page
+
+
+class View(NamedTuple):
+    """Fields an endpoint reads: stored fields plus computed ones (name -> expression)"""
+    fields: Tuple[str, ...]
+    computed: Dict[str, Any] = {}
+
+    def projection(self) -> dict:
+        # _id is always returned by MongoDB unless excluded
+        projection: Dict[str, Any] = {field: 1 for field in self.fields}
+        projection.update(self.computed)
+        return projection
+
+    def stage(self) -> dict:
+        """The view as a $project stage for aggregation pipelines"""
+        return {"$project": self.projection()}
+
+
+def model_fields(model: Type[BaseModel], *extra: str) -> Tuple[str, ...]:
+    """Field names of a request model plus extra stored fields, e.g. ids and timestamps"""
+    return tuple(model.model_fields) + extra
+
+
+def array_size(field: str) -> dict:
+    """Computed field: length of an array field (0 when missing)"""
+    return {"$size": {"$ifNull": [f"${field}", []]}}
+
+
+async def find_view(
+    collection,
+    query: dict,
+    view: View,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    limit: int = 0
+) -> List[dict]:
+    cursor = collection.find(query, view.projection())
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list(length=None)
+
+
+async def find_one_view(collection, query: dict, view: View) -> Optional[dict]:
+    return await collection.find_one(query, view.projection())
+
+
+async def find_page_view(
+    collection,
+    query: dict,
+    view: View,
+    page: PageParams,
+    response: Response,
+    sort_key: str = "_id",
+    direction: int = ASCENDING
+) -> List[dict]:
+    """One page of a keyset-paginated listing (see pagination.fetch_page), projected to `view`.
+
+    The sort key is read from the documents to build the next cursor, so it is always projected.
+    """
+    if sort_key not in view.fields and sort_key != "_id":
+        view = view._replace(fields=view.fields + (sort_key,))
+    return await fetch_page(collection, query, page, response, sort_key, direction, view.projection())
@@ -0,0 +1,244 @@
+"""
+Response cache for read-heavy endpoints (master data: UOM, rates, currencies, VAT).
+
+Responses are cached as serialized JSON together with an ETag, so repeat requests skip the
+database and browsers sending If-None-Match get a 304. Entries expire after a TTL and a
+whole namespace is dropped whenever one of its records is created, updated or deleted.
+
+Every namespace has a generation that invalidation bumps. A response is stored with the
+generation read before its loader ran, and an entry of an older generation is never served,
+so a load that overlapped an invalidation cannot put its stale result back for a whole TTL.
+
+The storage is pluggable. The default in-process backend is per worker, so with several
+uvicorn workers another worker may serve a stale entry until its TTL runs out. Set
+RESPONSE_CACHE_BACKEND=mongo to share entries and invalidations across workers, or install
+any other CacheBackend with set_cache_backend().
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from .database import get_database
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Browsers may store the response but must revalidate it with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+CacheEntry = Dict[str, Any]  # {"body": bytes, "etag": str}
+
+# Lookups served by cached_response in this process, whatever the backend
+_lookups = {"hits": 0, "misses": 0, "notModified": 0}
+
+
+class CacheBackend:
+    """Storage for cached responses, grouped in namespaces that are invalidated together"""
+
+    async def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    async def get_generation(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    async def set(self, namespace: str, key: str, entry: CacheEntry, ttl: int, generation: int):
+        """Store an entry loaded while `generation` was current (stale generations must not be served)"""
+        raise NotImplementedError
+
+    async def invalidate(self, namespace: str):
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process LRU cache with expiry"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, CacheEntry]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        item = self._entries.get((namespace, key))
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            del self._entries[(namespace, key)]
+            return None
+        self._entries.move_to_end((namespace, key))
+        return entry
+
+    async def get_generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    async def set(self, namespace: str, key: str, entry: CacheEntry, ttl: int, generation: int):
+        if generation != self._generations.get(namespace, 0):
+            return  # invalidated while the entry was being loaded
+        self._entries[(namespace, key)] = (time.monotonic() + ttl, entry)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, namespace: str):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == namespace]:
+            del self._entries[cache_key]
+
+
+class MongoCacheBackend(CacheBackend):
+    """Entries stored in the `response_cache` collection, shared by all workers.
+
+    Each namespace's generation is a `generation:<namespace>` document in the same collection.
+    Entries carry the generation they were loaded under and are ignored once it is outdated,
+    whichever worker invalidated the namespace.
+    """
+
+    def __init__(self, collection_name: str = "response_cache"):
+        self.collection_name = collection_name
+        self._indexed = False
+
+    def _collection(self):
+        return getattr(get_database(), self.collection_name)
+
+    @staticmethod
+    def _generation_id(namespace: str) -> str:
+        return f"generation:{namespace}"
+
+    async def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        # The entry and its namespace's generation in one round trip
+        docs = await self._collection().find({"$or": [
+            {"_id": f"{namespace}:{key}", "expires_at": {"$gt": datetime.utcnow()}},
+            {"_id": self._generation_id(namespace)}
+        ]}).to_list(length=None)
+        by_id = {doc["_id"]: doc for doc in docs}
+        doc = by_id.get(f"{namespace}:{key}")
+        generation = by_id.get(self._generation_id(namespace), {}).get("generation", 0)
+        if not doc or doc.get("generation", 0) != generation:
+            return None
+        return {"body": bytes(doc["body"]), "etag": doc["etag"]}
+
+    async def get_generation(self, namespace: str) -> int:
+        doc = await self._collection().find_one({"_id": self._generation_id(namespace)})
+        return doc.get("generation", 0) if doc else 0
+
+    async def set(self, namespace: str, key: str, entry: CacheEntry, ttl: int, generation: int):
+        collection = self._collection()
+        if not self._indexed:
+            # MongoDB removes expired entries in the background
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        await collection.replace_one(
+            {"_id": f"{namespace}:{key}"},
+            {
+                "namespace": namespace,
+                "body": entry["body"],
+                "etag": entry["etag"],
+                "generation": generation,
+                "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+            },
+            upsert=True
+        )
+
+    async def invalidate(self, namespace: str):
+        # Bump the generation first: entries written from now on by older loads are never served
+        await self._collection().update_one(
+            {"_id": self._generation_id(namespace)}, {"$inc": {"generation": 1}}, upsert=True
+        )
+        await self._collection().delete_many({"namespace": namespace})
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        _backend = MongoCacheBackend() if RESPONSE_CACHE_BACKEND == "mongo" else MemoryCacheBackend()
+    return _backend
+
+
+def set_cache_backend(backend: CacheBackend):
+    """Replace the cache storage (e.g. with a Redis-backed implementation)"""
+    global _backend
+    _backend = backend
+
+
+def request_cache_key(request: Request) -> str:
+    """Path plus sorted query string, so parameter order does not matter"""
+    query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def build_entry(data: Any) -> CacheEntry:
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode()
+    return {"body": body, "etag": f'"{hashlib.sha1(body).hexdigest()}"'}
+
+
+async def cached_response(
+    request: Request,
+    namespace: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int = RESPONSE_CACHE_TTL
+) -> Response:
+    """Serve `loader()`'s result from the cache, answering 304 when the client's ETag still matches.
+
+    Exceptions raised by the loader (e.g. a 404) propagate and are not cached.
+    """
+    backend = get_cache_backend()
+    key = request_cache_key(request)
+    try:
+        entry = await backend.get(namespace, key)
+    except Exception as e:
+        logger.warning("Response cache read failed: %s", e)
+        entry = None
+
+    _lookups["hits" if entry is not None else "misses"] += 1
+    if entry is None:
+        # Read before loading, so an invalidation during the load discards the result
+        try:
+            generation = await backend.get_generation(namespace)
+        except Exception as e:
+            logger.warning("Response cache read failed: %s", e)
+            generation = None
+        entry = build_entry(await loader())
+        if generation is not None:
+            try:
+                await backend.set(namespace, key, entry, ttl, generation)
+            except Exception as e:
+                logger.warning("Response cache write failed: %s", e)
+
+    headers = {"ETag": entry["etag"], "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        _lookups["notModified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+def response_cache_stats() -> Dict[str, int]:
+    return dict(_lookups)
+
+
+async def invalidate_cache(namespace: str):
+    """Drop every cached response in a namespace after its data changed"""
+    try:
+        await get_cache_backend().invalidate(namespace)
+    except Exception as e:
+        logger.warning("Response cache invalidation failed: %s", e)
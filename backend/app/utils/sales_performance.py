@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# Length of one reporting period; monthly periods are rolling 30-day windows
+PERIOD_LENGTHS = {
+    "monthly": timedelta(days=30),
+    "weekly": timedelta(days=7),
+}
+
+PERIOD_LABELS = {
+    "monthly": "%b %Y",
+    "weekly": "%d %b %Y",
+}
+
+# created_at is stored both as ISO strings and as BSON dates; compare everything as ISO strings
+CREATED_AT_STRING = {"$cond": [
+    {"$eq": [{"$type": "$created_at"}, "date"]},
+    {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%S.%L", "date": "$created_at"}},
+    "$created_at"
+]}
+
+
+def created_in(start: str, end: str) -> dict:
+    """Filter on the stored created_at, so each collection's created_at index serves it.
+
+    Matches ISO strings and BSON dates in [start, end]; the $project below rewrites the field,
+    so this has to run first.
+    """
+    return {"$or": [
+        {"created_at": {"$gte": start, "$lte": end}},
+        {"created_at": {"$gte": datetime.fromisoformat(start), "$lte": datetime.fromisoformat(end)}},
+    ]}
+
+
+def _tagged(kind: str, window: dict, amount: Optional[str] = None) -> List[dict]:
+    return [{"$match": window}, {"$project": {
+        "_id": 0,
+        "kind": {"$literal": kind},
+        "created_at": CREATED_AT_STRING,
+        "amount": {"$ifNull": [amount, 0]} if amount else {"$literal": 0}
+    }}]
+
+
+def build_performance_pipeline(boundaries: List[str]) -> List[dict]:
+    """One pass over the enquiries, quotations and contracts created in the window, bucketed by created_at"""
+    def count(kind: str) -> dict:
+        return {"$sum": {"$cond": [{"$eq": ["$kind", kind]}, 1, 0]}}
+
+    window = created_in(boundaries[0], boundaries[-1])
+    return [
+        *_tagged("enquiry", window),
+        {"$unionWith": {"coll": "quotations", "pipeline": _tagged("quotation", window)}},
+        {"$unionWith": {"coll": "contracts", "pipeline": _tagged("contract", window, "$totalAmount")}},
+        # Dates rendered with millisecond precision can land just outside the string window
+        {"$match": {"created_at": {"$gte": boundaries[0], "$lte": boundaries[-1]}}},
+        {"$bucket": {
+            "groupBy": "$created_at",
+            "boundaries": boundaries,
+            "default": "out_of_range",
+            "output": {
+                "enquiries": count("enquiry"),
+                "quotations": count("quotation"),
+                "contracts": count("contract"),
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$kind", "contract"]}, "$amount", 0]}}
+            }
+        }}
+    ]
+
+
+async def fetch_sales_performance(db, periods: int = 6, granularity: str = "monthly", now: Optional[datetime] = None) -> List[dict]:
+    """Enquiry/quotation/contract counts and revenue for the last `periods` periods, oldest first"""
+    now = now or datetime.now()
+    length = PERIOD_LENGTHS[granularity]
+    period_ends = [now - length * i for i in range(periods - 1, -1, -1)]
+    boundaries = [(period_ends[0] - length).isoformat()] + [end.isoformat() for end in period_ends]
+
+    buckets = await db.enquiries.aggregate(build_performance_pipeline(boundaries)).to_list(length=None)
+    by_start = {bucket["_id"]: bucket for bucket in buckets}
+
+    performance_data = []
+    for start, end in zip(boundaries, period_ends):
+        bucket = by_start.get(start, {})
+        enquiries_count = bucket.get("enquiries", 0)
+        contracts_count = bucket.get("contracts", 0)
+        conversion_rate = (contracts_count / enquiries_count * 100) if enquiries_count > 0 else 0
+        performance_data.append({
+            "month": end.strftime(PERIOD_LABELS[granularity]),
+            "enquiries": enquiries_count,
+            "quotations": bucket.get("quotations", 0),
+            "contracts": contracts_count,
+            "revenue": bucket.get("revenue", 0),
+            "conversionRate": round(conversion_rate, 1)
+        })
+    return performance_data
@@ -0,0 +1,127 @@
+from typing import List, Optional, Tuple
+
+from .pagination import decode_cursor, encode_cursor
+
+PIPELINE_STAGES = ["enquiry", "quotation", "contract", "feedback"]
+
+
+def _lookup_one(collection: str, key: str, foreign_field: str, fields: List[str], as_field: str) -> List[dict]:
+    """Join the first document of `collection` whose `foreign_field` equals `key` (skipped when key is null)"""
+    return [
+        {"$lookup": {
+            "from": collection,
+            "let": {"key": {"$ifNull": [key, None]}},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$ne": ["$$key", None]},
+                    {"$eq": [f"${foreign_field}", "$$key"]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {field: 1 for field in fields}}
+            ],
+            "as": as_field
+        }},
+        {"$set": {as_field: {"$arrayElemAt": [f"${as_field}", 0]}}}
+    ]
+
+
+def _nullable(path: str) -> dict:
+    return {"$ifNull": [path, None]}
+
+
+def _present(path: str) -> dict:
+    return {"$ne": [{"$type": path}, "missing"]}
+
+
+def build_sales_pipeline(
+    stages: Optional[List[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    after=None,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """Aggregation joining enquiry -> quotation -> contract -> feedback with the stage computed in MongoDB"""
+    match: dict = {}
+    if date_from or date_to:
+        match["created_at"] = {}
+        if date_from:
+            match["created_at"]["$gte"] = date_from
+        if date_to:
+            match["created_at"]["$lte"] = date_to
+    if after is not None:
+        match["_id"] = {"$gt": after}
+
+    pipeline: List[dict] = []
+    if match:
+        pipeline.append({"$match": match})
+    pipeline.append({"$sort": {"_id": 1}})
+    if limit and not stages:
+        pipeline.append({"$limit": limit})
+
+    pipeline.append({"$set": {"_enquiry_key": {"$ifNull": ["$enquiry_id", "$id"]}}})
+    pipeline += _lookup_one("customers", "$customer_id", "_id", ["name"], "customer")
+    pipeline += _lookup_one("quotations", "$_enquiry_key", "enquiry_id",
+                            ["quotation_id", "id", "created_at", "totalAmount", "status"], "quotation")
+    pipeline.append({"$set": {"_quotation_key": {"$ifNull": ["$quotation.quotation_id", "$quotation.id"]}}})
+    pipeline += _lookup_one("contracts", "$_quotation_key", "quotation_id",
+                            ["contract_id", "id", "created_at", "totalAmount", "status"], "contract")
+    pipeline.append({"$set": {"_contract_key": {"$ifNull": ["$contract.contract_id", "$contract.id"]}}})
+    pipeline += _lookup_one("feedback", "$_contract_key", "contract_id", ["score", "created_at"], "feedback")
+
+    pipeline.append({"$set": {"stage": {"$switch": {
+        "branches": [
+            {"case": _present("$feedback"), "then": "feedback"},
+            {"case": _present("$contract"), "then": "contract"},
+            {"case": _present("$quotation"), "then": "quotation"}
+        ],
+        "default": "enquiry"
+    }}}})
+    if stages:
+        pipeline.append({"$match": {"stage": {"$in": stages}}})
+        if limit:
+            pipeline.append({"$limit": limit})
+
+    id_str = {"$toString": "$_id"}
+    pipeline.append({"$project": {
+        "_id": 1,
+        "id": {"$concat": ["PIPE-", {"$substrCP": [
+            id_str, {"$max": [0, {"$subtract": [{"$strLenCP": id_str}, 6]}]}, 6
+        ]}]},
+        "customerId": _nullable("$customer_id"),
+        "customerName": {"$ifNull": ["$customer.name", "Unknown"]},
+        "enquiryId": _nullable("$_enquiry_key"),
+        "enquiryDate": _nullable("$created_at"),
+        "enquiryStatus": _nullable("$status"),
+        "quotationId": _nullable("$quotation.quotation_id"),
+        "quotationDate": _nullable("$quotation.created_at"),
+        "quotationValue": _nullable("$quotation.totalAmount"),
+        "quotationStatus": _nullable("$quotation.status"),
+        "contractId": _nullable("$contract.contract_id"),
+        "contractDate": _nullable("$contract.created_at"),
+        "contractValue": _nullable("$contract.totalAmount"),
+        "contractStatus": _nullable("$contract.status"),
+        "feedbackScore": _nullable("$feedback.score"),
+        "feedbackDate": _nullable("$feedback.created_at"),
+        "stage": 1,
+        "notes": {"$ifNull": ["$notes", ""]}
+    }})
+    return pipeline
+
+
+async def fetch_sales_pipeline(
+    db,
+    stages: Optional[List[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Run the pipeline view; returns (items, next cursor or None)"""
+    after = decode_cursor(cursor, "_id")[1] if cursor else None
+    pipeline = build_sales_pipeline(stages, date_from, date_to, after, limit)
+    rows = await db.enquiries.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+    next_cursor = encode_cursor("_id", None, rows[-1]["_id"]) if limit and len(rows) == limit else None
+    for row in rows:
+        row.pop("_id", None)
+    return rows, next_cursor
@@ -0,0 +1,709 @@
+"""
+Synthetic production-sized dataset for performance work.
+
+seed_demo_data() only creates the demo users; this loads a full, referentially consistent
+business history on top of them, so router changes can be measured against realistic volumes:
+
+    customers           CUST-####, with customer_documents
+    leads               LEAD-YYYY-####, each from one enquiry ENQ-YYYY-####, activities in
+                        lead_activity_buckets; part of the enquiries are also stored in `enquiries`
+    quotations          for stored enquiries, some accepted into contracts (+ feedback)
+    rentals             RC-YYYY-###, each for the enquiry (and customer) of an existing lead
+    contracts           RC-YYYY-###, from accepted quotations or directly for a customer
+    invoices            INV-YYYY-###, billing a contract's customer
+    equipment           with equipment_history
+    users               salespeople enquiries and leads are assigned to
+
+Every document derives from one seeded random.Random: the same seed, volumes and end date give
+the same dataset. IDs are allocated from the application counters (in creation order, per
+year), so the app keeps issuing fresh IDs afterwards and loading into a database that already
+holds data never reuses one. Documents go in with insert_many, BATCH_SIZE per batch and up to
+CONCURRENCY batches in flight.
+
+Once loaded, the index registry is applied, the dashboard counters are recomputed and the lead
+sync watermark is moved past the generated rentals (their leads are part of the dataset).
+
+Run from the backend directory:
+    python -m app.utils.scale_data                              # full volumes, seed 42
+    python -m app.utils.scale_data --scale 0.01 --seed 7        # every volume x 0.01
+    python -m app.utils.scale_data --customers 5000 --rentals 0
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import struct
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from bson import ObjectId
+
+from .auth import get_password_hash_async
+from .counters import CUSTOMER_ID, ENQUIRY_ID, INVOICE_ID, LEAD_ID, RENTAL_CONTRACT_NUMBER, IdSequence, next_ids
+from .dashboard_stats import reconcile_dashboard_stats
+from .database import get_database, connect_to_mongo, close_mongo_connection
+from .indexes import ensure_indexes
+from .lead_activity import bucket_of
+from .lead_sync import mark_rentals_synced
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("SCALE_DATA_BATCH_SIZE", "1000"))
+CONCURRENCY = int(os.getenv("SCALE_DATA_CONCURRENCY", "8"))
+
+# Password of the generated salespeople
+SCALE_USER_PASSWORD = "scale123"
+
+MAX_LEAD_ACTIVITIES = 500
+EPOCH = datetime(1970, 1, 1)
+
+FIRST_NAMES = [
+    "Ahmed", "Fatima", "Mohammed", "Aisha", "Omar", "Mariam", "Yousef", "Layla", "Khalid", "Noura",
+    "Rahul", "Priya", "Arjun", "Anjali", "James", "Sarah", "David", "Emma", "Carlos", "Sofia"
+]
+LAST_NAMES = [
+    "Al Mansoori", "Al Hashimi", "Khan", "Rahman", "Haddad", "Nasser", "Menon", "Sharma", "Pillai",
+    "Smith", "Brown", "Wilson", "Fernandes", "Costa", "Ibrahim", "Saleh", "Qureshi", "Joseph"
+]
+COMPANY_WORDS = [
+    "Emirates", "Gulf", "Falcon", "Desert", "Pearl", "Marina", "Summit", "Horizon", "Oasis", "Crescent",
+    "Skyline", "Delta", "Atlas", "Meridian", "Palm", "Harbour"
+]
+COMPANY_SUFFIXES = ["Contracting LLC", "Construction", "Builders", "Engineering", "Projects", "Developers"]
+CITIES = ["Dubai", "Abu Dhabi", "Sharjah", "Ajman", "Ras Al Khaimah", "Fujairah", "Al Ain"]
+PROJECT_TYPES = ["Tower", "Villa Complex", "Mall Extension", "Warehouse", "Bridge", "School", "Hospital Wing"]
+
+# category -> equipment names (categories and units as in models/equipment.py)
+EQUIPMENT_CATALOGUE = {
+    "scaffolding": ["Cuplock Standard", "Ringlock Ledger", "Tube and Clamp Set", "Base Jack", "Steel Plank"],
+    "formwork": ["Table Formwork", "Wall Panel", "Column Formwork", "Slab Formwork Set"],
+    "shoring": ["Heavy Duty Prop", "Shoring Frame", "Trench Shoring Box"],
+    "safety": ["Safety Netting", "Guard Rail", "Toe Board"],
+    "tools": ["Rebar Cutter", "Concrete Vibrator", "Plate Compactor"],
+    "other": ["Site Container", "Mobile Tower"]
+}
+EQUIPMENT_UNITS = ["piece", "set", "meter", "kg", "ton"]
+
+ENQUIRY_STATUSES = ["submitted_by_customer", "assigned", "quoted", "pending_contract_approval", "converted"]
+LEAD_STATUSES = ["New", "Contacted", "Qualified", "Proposal", "Won", "Lost"]
+ACTIVITY_TYPES = ["email", "call", "note", "task", "status_change"]
+QUOTATION_STATUSES = ["draft", "sent", "accepted", "rejected"]
+RENTAL_STATUSES = ["pending_approval", "approved", "active", "extended", "completed", "cancelled"]
+CONTRACT_STATUSES = ["pending_approval", "active", "completed", "cancelled"]
+DOCUMENT_TYPES = ["trade_license", "vat_certificate", "emirates_id", "passport", "po_document", "insurance"]
+DOCUMENT_STATUSES = ["pending", "verified", "rejected"]
+HISTORY_ACTIONS = ["dispatched", "returned", "adjusted", "maintenance", "damaged"]
+
+
+class ScaleVolumes(NamedTuple):
+    customers: int = 20_000
+    leads: int = 200_000
+    # Stored in `enquiries` (the others only exist through their leads and rentals); at most `leads`
+    enquiries: int = 100_000
+    rentals: int = 500_000
+    contracts: int = 500_000
+    invoices: int = 500_000
+    equipment: int = 5_000
+    documents: int = 100_000
+    salespeople: int = 50
+
+    def scaled(self, factor: float) -> "ScaleVolumes":
+        """Every volume times `factor` (at least 1 where the volume is non-zero)"""
+        return ScaleVolumes(*(max(1, round(volume * factor)) if volume else 0 for volume in self))
+
+
+def _object_id(rng: random.Random, when: datetime) -> ObjectId:
+    """ObjectId carrying the creation time, with the remaining bytes drawn from `rng`"""
+    seconds = int((when - EPOCH).total_seconds())
+    return ObjectId(struct.pack(">I", seconds) + rng.randbytes(8))
+
+
+def _batches(documents: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(documents)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+async def _insert(collection, batch: List[dict]) -> int:
+    result = await collection.insert_many(batch, ordered=False)
+    return len(result.inserted_ids)
+
+
+async def insert_batches(collection, documents: Iterable[dict], batch_size: int = BATCH_SIZE,
+                         concurrency: int = CONCURRENCY) -> int:
+    """insert_many `documents` in batches, at most `concurrency` at a time; returns documents inserted"""
+    pending: set = set()
+    inserted = 0
+    try:
+        for batch in _batches(documents, batch_size):
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                inserted += sum(task.result() for task in done)
+            pending.add(asyncio.ensure_future(_insert(collection, batch)))
+        if pending:
+            done, pending = await asyncio.wait(pending)
+            inserted += sum(task.result() for task in done)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
+    return inserted
+
+
+async def allocate_ids(db, sequence: IdSequence, created: List[datetime]) -> List[str]:
+    """IDs for records created at `created` (ascending), each from its creation year's sequence"""
+    if not sequence.yearly:
+        return await next_ids(db, sequence, len(created)) if created else []
+    ids: List[str] = []
+    for year, group in itertools.groupby(created, key=lambda when: when.year):
+        ids += await next_ids(db, sequence, sum(1 for _ in group), year)
+    return ids
+
+
+class Customer(NamedTuple):
+    object_id: ObjectId
+    customer_id: str
+    name: str
+    email: str
+    company: str
+
+
+class Enquiry(NamedTuple):
+    enquiry_id: str
+    lead_id: str
+    created: datetime
+    customer: Customer
+    salesperson: Optional[dict]
+    equipment_name: str
+    quantity: int
+
+
+class ScaleDataGenerator:
+    """Builds and loads one dataset; run() returns the documents inserted per collection"""
+
+    def __init__(self, db, volumes: ScaleVolumes = ScaleVolumes(), seed: int = 42, until: Optional[date] = None,
+                 years: int = 3, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY):
+        self.db = db
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.end = datetime.combine(until or date.today(), time.min)
+        self.start = self.end - timedelta(days=365 * years)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.counts: Dict[str, int] = {}
+
+    async def _load(self, collection: str, documents: Iterable[dict]):
+        inserted = await insert_batches(getattr(self.db, collection), documents, self.batch_size, self.concurrency)
+        self.counts[collection] = self.counts.get(collection, 0) + inserted
+        if inserted:
+            logger.info("Inserted %d %s", inserted, collection)
+
+    def _timestamps(self, count: int, start: Optional[datetime] = None) -> List[datetime]:
+        """`count` ascending creation times, uniform between `start` and the end date"""
+        start = start or self.start
+        span = int((self.end - start).total_seconds())
+        return sorted(start + timedelta(seconds=self.rng.randrange(span)) for _ in range(count))
+
+    def _after(self, when: datetime, max_days: int) -> datetime:
+        """A moment up to `max_days` after `when`, not past the end date"""
+        later = when + timedelta(seconds=self.rng.randrange(max_days * 86400))
+        return min(later, self.end - timedelta(seconds=1))
+
+    def _amount(self, low: int, high: int) -> float:
+        return round(self.rng.uniform(low, high), 2)
+
+    def _equipment_name(self) -> str:
+        category = self.rng.choice(list(EQUIPMENT_CATALOGUE))
+        return f"{category.title()} - {self.rng.choice(EQUIPMENT_CATALOGUE[category])}"
+
+    def _project(self, company: str) -> str:
+        return f"{self.rng.choice(CITIES)} {self.rng.choice(PROJECT_TYPES)} ({company.split()[0]})"
+
+    async def run(self) -> Dict[str, int]:
+        salespeople = await self._salespeople()
+        customers = await self._customers()
+        enquiries = await self._leads(customers, salespeople)
+        accepted = await self._enquiries_and_quotations(enquiries)
+        await self._rentals(enquiries)
+        contracts = await self._contracts(accepted, customers)
+        await self._invoices(contracts)
+        await self._equipment()
+        await self._documents(customers)
+        return self.counts
+
+    async def _salespeople(self) -> List[dict]:
+        if not self.volumes.salespeople:
+            return []
+        hashed_password = await get_password_hash_async(SCALE_USER_PASSWORD)
+        users = []
+        for number, created in enumerate(self._timestamps(self.volumes.salespeople), start=1):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            users.append({
+                "_id": _object_id(self.rng, created),
+                "email": f"sales{number:04d}.{self.rng.randbytes(3).hex()}@scale-test.local",
+                "full_name": f"{first} {last}",
+                "role": "sales",
+                "hashed_password": hashed_password,
+                "created_at": created,
+                "updated_at": created
+            })
+        await self._load("users", users)
+        return users
+
+    async def _customers(self) -> List[Customer]:
+        created = self._timestamps(self.volumes.customers)
+        customer_ids = await allocate_ids(self.db, CUSTOMER_ID, created)
+        customers, documents = [], []
+        for when, customer_id in zip(created, customer_ids):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            company = f"{self.rng.choice(COMPANY_WORDS)} {self.rng.choice(COMPANY_SUFFIXES)}"
+            customer = Customer(
+                _object_id(self.rng, when), customer_id, f"{first} {last}",
+                f"{first}.{last}.{customer_id}@example.com".lower().replace(" ", ""), company
+            )
+            customers.append(customer)
+            documents.append({
+                "_id": customer.object_id,
+                "customer_id": customer_id,
+                "name": customer.name,
+                "email": customer.email,
+                "phone": f"+9715{self.rng.randrange(10 ** 8):08d}",
+                "company": company,
+                "cr_number": f"CR{self.rng.randrange(10 ** 7):07d}",
+                "vat_number": f"100{self.rng.randrange(10 ** 12):012d}",
+                "credit_limit": float(self.rng.choice([25_000, 50_000, 100_000, 250_000])),
+                "deposit_amount": float(self.rng.choice([0, 5_000, 10_000])),
+                "approval_status": self.rng.choices(["approved", "pending", "rejected"], [85, 12, 3])[0],
+                "created_at": when.isoformat(),
+                "updated_at": when.isoformat()
+            })
+        await self._load("customers", documents)
+        return customers
+
+    def _activities(self, created: datetime, lead_id: str, enquiry_id: str) -> List[dict]:
+        """A lead's activities, oldest first; the heavy tail exercises multi-bucket timelines"""
+        count = min(MAX_LEAD_ACTIVITIES, int(self.rng.paretovariate(1.2)))
+        activities = [{
+            "type": "created",
+            "description": f"Lead created from enquiry: {enquiry_id}",
+            "by": "System",
+            "timestamp": created.isoformat()
+        }]
+        when = created
+        for _ in range(count - 1):
+            when = self._after(when, 7)
+            activity_type = self.rng.choice(ACTIVITY_TYPES)
+            activities.append({
+                "type": activity_type,
+                "description": f"{activity_type.replace('_', ' ').capitalize()} logged for {lead_id}",
+                "by": "Sales Team",
+                "timestamp": when.isoformat()
+            })
+        return activities
+
+    async def _leads(self, customers: List[Customer], salespeople: List[dict]) -> List[Enquiry]:
+        created = self._timestamps(self.volumes.leads)
+        lead_ids = await allocate_ids(self.db, LEAD_ID, created)
+        enquiry_ids = await allocate_ids(self.db, ENQUIRY_ID, created)
+
+        enquiries: List[Enquiry] = []
+        leads, buckets = [], []
+        for when, lead_id, enquiry_id in zip(created, lead_ids, enquiry_ids):
+            customer = self.rng.choice(customers)
+            salesperson = self.rng.choice(salespeople) if salespeople and self.rng.random() < 0.8 else None
+            enquiries.append(Enquiry(
+                enquiry_id, lead_id, when, customer, salesperson, self._equipment_name(), self.rng.randint(1, 200)
+            ))
+
+            activities = self._activities(when, lead_id, enquiry_id)
+            first, _, last = customer.name.partition(" ")
+            leads.append({
+                "_id": _object_id(self.rng, when),
+                "lead_id": lead_id,
+                "salutation": "Mr",
+                "firstName": first,
+                "lastName": last,
+                "email": customer.email,
+                "mobile": "",
+                "organization": customer.company,
+                "industry": enquiries[-1].equipment_name.split(" - ")[0],
+                "source": self.rng.choice(["Website", "Enquiry Form", "Referral", "Walk-in"]),
+                "status": self.rng.choice(LEAD_STATUSES),
+                "leadOwner": salesperson["full_name"] if salesperson else "Sales Team",
+                "assigned_salesperson_id": str(salesperson["_id"]) if salesperson else None,
+                "assigned_salesperson_name": salesperson["full_name"] if salesperson else None,
+                "createdAt": when.isoformat(),
+                "createdBy": "system",
+                "updatedAt": activities[-1]["timestamp"],
+                "enquiry_id": enquiry_id,
+                "activityCount": len(activities),
+                "lastActivityAt": activities[-1]["timestamp"]
+            })
+            by_bucket: Dict[int, List[dict]] = {}
+            for seq, activity in enumerate(activities, start=1):
+                by_bucket.setdefault(bucket_of(seq), []).append({**activity, "seq": seq})
+            for bucket, entries in by_bucket.items():
+                entries.reverse()  # newest first
+                buckets.append({
+                    "lead_id": lead_id,
+                    "bucket": bucket,
+                    "count": len(entries),
+                    "activities": entries,
+                    "last_at": entries[0]["timestamp"]
+                })
+
+        await self._load("leads", leads)
+        await self._load("lead_activity_buckets", buckets)
+        return enquiries
+
+    async def _enquiries_and_quotations(self, enquiries: List[Enquiry]) -> List[dict]:
+        """Store a sample of the enquiries with their quotations; returns the accepted quotations"""
+        stored = sorted(self.rng.sample(enquiries, min(self.volumes.enquiries, len(enquiries))),
+                        key=lambda enquiry: enquiry.created)
+        documents, quotations, accepted = [], [], []
+        quotation_numbers: Dict[int, int] = {}
+        for enquiry in stored:
+            salesperson = enquiry.salesperson
+            status = self.rng.choice(ENQUIRY_STATUSES) if salesperson else "submitted_by_customer"
+            documents.append({
+                "_id": _object_id(self.rng, enquiry.created),
+                "enquiry_id": enquiry.enquiry_id,
+                "customer_id": enquiry.customer.customer_id,
+                "customer_name": enquiry.customer.name,
+                "customer_email": enquiry.customer.email,
+                "equipment_name": enquiry.equipment_name,
+                "quantity": enquiry.quantity,
+                "rental_duration_days": self.rng.choice([7, 14, 30, 60, 90, 180]),
+                "delivery_location": self.rng.choice(CITIES),
+                "expected_delivery_date": self._after(enquiry.created, 30).date().isoformat(),
+                "special_instructions": "",
+                "status": status,
+                "created_at": enquiry.created.isoformat(),
+                "updated_at": enquiry.created.isoformat(),
+                "enquiry_date": enquiry.created.isoformat(),
+                "assigned_salesperson_id": str(salesperson["_id"]) if salesperson else None,
+                "assigned_salesperson_name": salesperson["full_name"] if salesperson else None,
+                "lead_id": enquiry.lead_id
+            })
+            if status in ("submitted_by_customer", "assigned") or self.rng.random() < 0.2:
+                continue
+
+            when = self._after(enquiry.created, 10)
+            quotation_numbers[when.year] = quotation_numbers.get(when.year, 0) + 1
+            quotation_id = f"QT-{when.year}-{quotation_numbers[when.year]:05d}"
+            sqft = self.rng.randint(100, 5000)
+            rate = self._amount(2, 15)
+            total = round(sqft * rate, 2)
+            quotation_status = "accepted" if status in ("pending_contract_approval", "converted") \
+                else self.rng.choice(QUOTATION_STATUSES)
+            quotation = {
+                "_id": _object_id(self.rng, when),
+                "id": quotation_id,
+                "quotation_id": quotation_id,
+                "enquiry_id": enquiry.enquiry_id,
+                "customer_id": enquiry.customer.customer_id,
+                "customerName": enquiry.customer.name,
+                "company": enquiry.customer.company,
+                "project": self._project(enquiry.customer.company),
+                "items": [{
+                    "id": "1",
+                    "equipment": enquiry.equipment_name,
+                    "length": float(sqft),
+                    "breadth": 1.0,
+                    "sqft": float(sqft),
+                    "ratePerSqft": rate,
+                    "subtotal": total,
+                    "wastageCharges": 0,
+                    "cuttingCharges": 0,
+                    "total": total
+                }],
+                "totalAmount": total,
+                "status": quotation_status,
+                "createdDate": when.date().isoformat(),
+                "validUntil": (when + timedelta(days=30)).date().isoformat(),
+                "notes": "",
+                "created_at": when.isoformat(),
+                "updated_at": when.isoformat()
+            }
+            quotations.append(quotation)
+            if quotation_status == "accepted":
+                accepted.append(quotation)
+
+        await self._load("enquiries", documents)
+        await self._load("quotations", quotations)
+        return accepted
+
+    async def _rentals(self, enquiries: List[Enquiry]):
+        """Rental orders, each for an enquiry that has a lead (so the lead sync has nothing to add)"""
+        if not enquiries or not self.volumes.rentals:
+            return
+        orders = sorted(
+            ((self._after(enquiry.created, 30), enquiry)
+             for enquiry in (self.rng.choice(enquiries) for _ in range(self.volumes.rentals))),
+            key=lambda order: order[0]
+        )
+        contract_numbers = await allocate_ids(self.db, RENTAL_CONTRACT_NUMBER, [when for when, _ in orders])
+
+        def documents():
+            for (when, enquiry), contract_number in zip(orders, contract_numbers):
+                category, _, equipment_type = enquiry.equipment_name.partition(" - ")
+                days = self.rng.choice([7, 14, 30, 60, 90, 180])
+                start = self._after(when, 14).date()
+                status = self.rng.choice(RENTAL_STATUSES)
+                yield {
+                    "_id": _object_id(self.rng, when),
+                    "contract_number": contract_number,
+                    "enquiry_id": enquiry.enquiry_id,
+                    "project_name": self._project(enquiry.customer.company),
+                    "project_type": "Rental",
+                    "equipment_category": category,
+                    "equipment_type": equipment_type,
+                    "quantity": enquiry.quantity,
+                    "unit": "unit",
+                    "start_date": start.isoformat(),
+                    "end_date": (start + timedelta(days=days)).isoformat(),
+                    "delivery_address": self.rng.choice(CITIES),
+                    "contact_person": enquiry.customer.name,
+                    "contact_phone": "",
+                    "contact_email": enquiry.customer.email,
+                    "special_requirements": "",
+                    "customer_id": enquiry.customer.customer_id,
+                    "customer_name": enquiry.customer.name,
+                    "customer_email": enquiry.customer.email,
+                    "status": status,
+                    "total_amount": 0 if status == "pending_approval" else self._amount(500, 250_000),
+                    "rental_duration_days": days,
+                    "assigned_salesperson_id": str(enquiry.salesperson["_id"]) if enquiry.salesperson else None,
+                    "assigned_salesperson_name": enquiry.salesperson["full_name"] if enquiry.salesperson else None,
+                    "created_at": when.isoformat(),
+                    "updated_at": when.isoformat()
+                }
+
+        await self._load("rentals", documents())
+
+    async def _contracts(self, accepted: List[dict], customers: List[Customer]) -> List[dict]:
+        """Contracts from accepted quotations, then direct ones; returns {contract_id, customer} refs"""
+        by_customer_id = {customer.customer_id: customer for customer in customers}
+        planned = [
+            (self._after(datetime.fromisoformat(quotation["created_at"]), 14), by_customer_id[quotation["customer_id"]],
+             quotation)
+            for quotation in accepted[:self.volumes.contracts]
+        ]
+        planned += [(when, self.rng.choice(customers), None)
+                    for when in self._timestamps(max(0, self.volumes.contracts - len(planned)))]
+        planned.sort(key=lambda contract: contract[0])
+        contract_ids = await allocate_ids(self.db, RENTAL_CONTRACT_NUMBER, [when for when, _, _ in planned])
+
+        refs, feedback = [], []
+
+        def documents():
+            for (when, customer, quotation), contract_id in zip(planned, contract_ids):
+                amount = quotation["totalAmount"] if quotation else self._amount(1_000, 500_000)
+                status = self.rng.choice(CONTRACT_STATUSES)
+                refs.append({"contract_id": contract_id, "customer": customer, "created": when, "amount": amount})
+                if quotation and status == "completed" and self.rng.random() < 0.5:
+                    given = self._after(when, 60)
+                    feedback.append({
+                        "_id": _object_id(self.rng, given),
+                        "customer_id": customer.customer_id,
+                        "contract_id": contract_id,
+                        "score": self.rng.randint(1, 10),
+                        "comments": "",
+                        "created_at": given.isoformat()
+                    })
+                yield {
+                    "_id": _object_id(self.rng, when),
+                    "contract_id": contract_id,
+                    "quotation_id": quotation["quotation_id"] if quotation else None,
+                    "customer_id": customer.customer_id,
+                    "customer_name": customer.name,
+                    "customer": customer.name,
+                    "company": customer.company,
+                    "project": quotation["project"] if quotation else self._project(customer.company),
+                    "equipment": quotation["items"][0]["equipment"] if quotation else self._equipment_name(),
+                    "total_amount": amount,
+                    "totalAmount": amount,
+                    "amount": amount,
+                    "status": status,
+                    "approval_status": "pending" if status == "pending_approval" else "approved",
+                    "start_date": when.date().isoformat(),
+                    "end_date": (when + timedelta(days=365)).date().isoformat(),
+                    "created_at": when.isoformat(),
+                    "updated_at": when.isoformat()
+                }
+
+        await self._load("contracts", documents())
+        await self._load("feedback", feedback)
+        return refs
+
+    async def _invoices(self, contracts: List[dict]):
+        if not contracts or not self.volumes.invoices:
+            return
+        billed = sorted(
+            ((self._after(contract["created"], 90), contract)
+             for contract in (self.rng.choice(contracts) for _ in range(self.volumes.invoices))),
+            key=lambda invoice: invoice[0]
+        )
+        invoice_ids = await allocate_ids(self.db, INVOICE_ID, [when for when, _ in billed])
+
+        def documents():
+            for (when, contract), invoice_id in zip(billed, invoice_ids):
+                amount = round(contract["amount"] * self.rng.choice([0.25, 0.5, 1.0]), 2)
+                vat = round(amount * 0.05, 2)
+                due = when + timedelta(days=30)
+                status = "paid" if self.rng.random() < 0.6 else ("overdue" if due < self.end else "pending")
+                yield {
+                    "_id": _object_id(self.rng, when),
+                    "invoice_id": invoice_id,
+                    "contract_id": contract["contract_id"],
+                    "customer_id": contract["customer"].customer_id,
+                    "customer_name": contract["customer"].name,
+                    "company": contract["customer"].company,
+                    "amount": amount,
+                    "vat": vat,
+                    "vat_rate": 5,
+                    "total": round(amount + vat, 2),
+                    "currency": "AED",
+                    "status": status,
+                    "due_date": due.isoformat(),
+                    "created_at": when.isoformat()
+                }
+
+        await self._load("invoices", documents())
+
+    async def _equipment(self):
+        items, history = [], []
+        for number, created in enumerate(self._timestamps(self.volumes.equipment), start=1):
+            category = self.rng.choice(list(EQUIPMENT_CATALOGUE))
+            total = self.rng.randint(0, 2000)
+            rented = self.rng.randint(0, total)
+            maintenance = self.rng.randint(0, (total - rented) // 10)
+            damaged = self.rng.randint(0, (total - rented - maintenance) // 20)
+            available = total - rented - maintenance - damaged
+            item = {
+                "_id": _object_id(self.rng, created),
+                "item_code": f"{category[:3].upper()}-{number:05d}-{self.rng.randbytes(2).hex().upper()}",
+                "description": self.rng.choice(EQUIPMENT_CATALOGUE[category]),
+                "category": category,
+                "unit": self.rng.choice(EQUIPMENT_UNITS),
+                "daily_rate": self._amount(1, 500),
+                "quantity_total": total,
+                "quantity_available": available,
+                "quantity_rented": rented,
+                "quantity_maintenance": maintenance,
+                "quantity_damaged": damaged,
+                "location": f"{self.rng.choice(CITIES)} Yard {self.rng.randint(1, 5)}",
+                "status": "available" if available else "rented",
+                "approval_status": "approved",
+                "created_at": created,
+                "updated_at": created
+            }
+            items.append(item)
+
+            quantity, when = total, created
+            history.append({
+                "equipment_id": str(item["_id"]),
+                "action": "created",
+                "quantity_change": total,
+                "previous_quantity": 0,
+                "new_quantity": total,
+                "performed_by": "warehouse@yourcompany.com",
+                "reason": "Initial equipment creation - auto-approved",
+                "timestamp": created
+            })
+            for _ in range(self.rng.randint(0, 40)):
+                when = self._after(when, 30)
+                change = self.rng.randint(-min(quantity, 50), 50)
+                history.append({
+                    "equipment_id": str(item["_id"]),
+                    "action": self.rng.choice(HISTORY_ACTIONS),
+                    "quantity_change": change,
+                    "previous_quantity": quantity,
+                    "new_quantity": quantity + change,
+                    "performed_by": "warehouse@yourcompany.com",
+                    "reason": "",
+                    "timestamp": when
+                })
+                quantity += change
+
+        await self._load("equipment", items)
+        await self._load("equipment_history", history)
+
+    async def _documents(self, customers: List[Customer]):
+        if not customers:
+            return
+
+        def documents():
+            for when in self._timestamps(self.volumes.documents):
+                customer = self.rng.choice(customers)
+                document_type = self.rng.choice(DOCUMENT_TYPES)
+                name = f"{document_type}_{customer.customer_id}_{when:%Y%m%d}.pdf"
+                expiry = (when + timedelta(days=self.rng.randint(30, 1095))).date().isoformat()
+                yield {
+                    "_id": _object_id(self.rng, when),
+                    "customer_id": str(customer.object_id),
+                    "customer_id_formatted": customer.customer_id,
+                    "name": name,
+                    "document_name": name,
+                    "type": document_type,
+                    "document_type": document_type,
+                    "status": self.rng.choice(DOCUMENT_STATUSES),
+                    "uploadDate": when.isoformat(),
+                    "upload_date": when.isoformat(),
+                    "created_at": when.isoformat(),
+                    "expiryDate": expiry,
+                    "expiry_date": expiry,
+                    "file_name": name,
+                    "file_size": self.rng.randint(20_000, 5_000_000)
+                }
+
+        await self._load("customer_documents", documents())
+
+
+async def generate_scale_data(db, volumes: ScaleVolumes = ScaleVolumes(), seed: int = 42, until: Optional[date] = None,
+                              years: int = 3, batch_size: int = BATCH_SIZE,
+                              concurrency: int = CONCURRENCY) -> Dict[str, int]:
+    """Load a synthetic dataset into `db` and bring indexes, dashboard counters and the lead sync up to date"""
+    counts = await ScaleDataGenerator(db, volumes, seed, until, years, batch_size, concurrency).run()
+    await ensure_indexes(db)
+    await reconcile_dashboard_stats(db)
+    await mark_rentals_synced(db)
+    return counts
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.scale_data", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default 42)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every default volume")
+    parser.add_argument("--until", type=date.fromisoformat, default=None, help="last day of history (default today)")
+    parser.add_argument("--years", type=int, default=3, help="years of history (default 3)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="insert_many batches in flight")
+    for field, default in ScaleVolumes._field_defaults.items():
+        parser.add_argument(f"--{field}", type=int, default=None, help=f"volume (default {default})")
+    return parser.parse_args(argv)
+
+
+async def run_generator(args: argparse.Namespace):
+    volumes = ScaleVolumes().scaled(args.scale)._replace(**{
+        field: getattr(args, field) for field in ScaleVolumes._fields if getattr(args, field) is not None
+    })
+    await connect_to_mongo()
+    started = datetime.now()
+    counts = await generate_scale_data(
+        get_database(), volumes, args.seed, args.until, args.years, args.batch_size, args.concurrency
+    )
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Inserted {sum(counts.values())} documents in {elapsed:.1f}s (seed {args.seed})")
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run as `python -m`, so the progress logger is __main__ rather than under app.*
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(run_generator(parse_args()))
@@ -1,6 +1,9 @@
 from .database import get_database, connect_to_mongo
-from .auth import get_password_hash
+from .auth import get_password_hash_async
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def seed_demo_data():
     """Seed the database with demo data"""
@@ -14,14 +17,14 @@ async def seed_demo_data():
             "email": "admin@yourcompany.com",
             "full_name": "System Administrator",
             "role": "admin",
-            "hashed_password": get_password_hash("admin123"),
+            "hashed_password": await get_password_hash_async("admin123"),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
         await db.users.insert_one(admin_data)
-        print("Initial admin user created: admin@yourcompany.com / admin123")
+        logger.info("Initial admin user created: admin@yourcompany.com / admin123")
     else:
-        print("Admin user already exists")
+        logger.info("Admin user already exists")
 
     # Create initial super admin user
     super_admin_exists = await db.users.find_one({"email": "superadmin@yourcompany.com"})
@@ -30,12 +33,12 @@ async def seed_demo_data():
             "email": "superadmin@yourcompany.com",
             "full_name": "Super Administrator",
             "role": "super_admin",
-            "hashed_password": get_password_hash("superadmin123"),
+            "hashed_password": await get_password_hash_async("superadmin123"),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
         await db.users.insert_one(super_admin_data)
-        print("Super admin user created: superadmin@yourcompany.com / superadmin123")
+        logger.info("Super admin user created: superadmin@yourcompany.com / superadmin123")
     else:
         # Update existing user to super_admin role if needed
         if super_admin_exists.get("role") != "super_admin":
@@ -43,9 +46,9 @@ async def seed_demo_data():
                 {"email": "superadmin@yourcompany.com"},
                 {"$set": {"role": "super_admin", "updated_at": datetime.utcnow()}}
             )
-            print("Updated existing user to super_admin role")
+            logger.info("Updated existing user to super_admin role")
         else:
-            print("Super admin user already exists")
+            logger.info("Super admin user already exists")
 
     # Create demo users for testing all roles
     demo_users = [
@@ -82,14 +85,14 @@ async def seed_demo_data():
                 "email": user_data["email"],
                 "full_name": user_data["full_name"],
                 "role": user_data["role"],
-                "hashed_password": get_password_hash(user_data["password"]),
+                "hashed_password": await get_password_hash_async(user_data["password"]),
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
             await db.users.insert_one(user_doc)
-            print(f"Demo user created: {user_data['email']} / {user_data['password']}")
+            logger.info("Demo user created: %s / %s", user_data["email"], user_data["password"])
         else:
-            print(f"User {user_data['email']} already exists")
+            logger.info("User %s already exists", user_data["email"])
 
-    print("Seed data initialization completed")
+    logger.info("Seed data initialization completed")
     return
\ No newline at end of file
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hot API endpoints at several dataset sizes
+
+Runs the app in-process (httpx ASGITransport against app.main.app) on the in-memory database.
+For each size it loads the demo users plus a generated dataset (app.utils.scale_data, every
+default volume times the size factor), then calls each endpoint and reports latency
+p50/p95/p99, throughput and MongoDB commands per request (counted by a pymongo command
+listener, which the in-memory engine feeds the same commands the driver would send).
+Startup background jobs are not run, so nothing but the benchmarked requests touches the data.
+
+    python benchmark_api.py [--sizes 0.001,0.01] [--requests 100] [--concurrency 4]
+    python benchmark_api.py --save-baseline                  # write benchmark_baseline.json
+    python benchmark_api.py --baseline benchmark_baseline.json --max-regression 25
+
+With --baseline, exits non-zero when an endpoint's p95 or its commands per request exceed the
+baseline by more than --max-regression percent (latency must also be --min-slowdown-ms slower,
+so jitter on sub-millisecond endpoints does not fail the run). Baselines are only comparable
+on the same machine.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional
+
+# Must be set before the app reads its settings
+os.environ.pop("MONGODB_URI", None)
+os.environ["MONGODB_URL"] = "memory://"
+os.environ.setdefault("RECORD_QUERY_SHAPES", "false")
+
+import httpx
+from pymongo import monitoring
+
+from app.main import app
+from app.utils.database import get_database, connect_to_mongo, close_mongo_connection
+from app.utils.principal_cache import principal_cache
+from app.utils.scale_data import ScaleVolumes, generate_scale_data
+from app.utils.seed_data import seed_demo_data
+
+# Demo users created by seed_demo_data
+CREDENTIALS = {
+    "admin": ("admin@yourcompany.com", "admin123"),
+    "sales": ("sales@yourcompany.com", "sales123"),
+}
+
+# Fixed end of the generated history, so runs on different days load the same data
+DATASET_UNTIL = date(2025, 10, 1)
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    path: str
+    role: Optional[str]  # user whose token is sent, None for anonymous
+    body: Optional[dict] = None
+    max_requests: Optional[int] = None
+
+
+ENDPOINTS = [
+    Endpoint("login", "POST", "/api/auth/login", None,
+             {"email": CREDENTIALS["sales"][0], "password": CREDENTIALS["sales"][1]},
+             max_requests=20),  # bcrypt-bound by design
+    Endpoint("crm_customers", "GET", "/api/crm/customers?limit=100", "admin"),
+    Endpoint("crm_pipeline", "GET", "/api/crm/pipeline?limit=100", "admin"),
+    Endpoint("admin_dashboard", "GET", "/api/admin/dashboard", "admin"),
+    Endpoint("sales_enquiries", "GET", "/api/sales/enquiries", "sales"),
+    Endpoint("equipment", "GET", "/api/equipment/", "admin"),
+    Endpoint("finance_dashboard", "GET", "/api/finance/dashboard", "admin"),
+]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands (listeners may run on driver threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+command_counter = CommandCounter()
+monitoring.register(command_counter)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def size_label(factor: float) -> str:
+    return f"x{factor:g}"
+
+
+async def load_dataset(factor: float, seed: int):
+    """Fresh in-memory database with the demo users and a generated dataset"""
+    await close_mongo_connection()
+    await connect_to_mongo()
+    principal_cache.clear()
+    await seed_demo_data()
+    volumes = ScaleVolumes().scaled(factor)
+    started = time.perf_counter()
+    counts = await generate_scale_data(get_database(), volumes, seed, until=DATASET_UNTIL)
+    print(f"   loaded {sum(counts.values())} documents in {time.perf_counter() - started:.1f}s")
+
+
+async def login(client: httpx.AsyncClient, role: str) -> Dict[str, str]:
+    email, password = CREDENTIALS[role]
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def measure(client: httpx.AsyncClient, endpoint: Endpoint, headers: Dict[str, str], requests: int,
+                  concurrency: int, warmup: int) -> dict:
+    async def call() -> httpx.Response:
+        return await client.request(endpoint.method, endpoint.path, json=endpoint.body, headers=headers)
+
+    for _ in range(warmup):
+        await call()
+
+    latencies_ms: List[float] = []
+    errors: Dict[int, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await call()
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    commands_before = command_counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "commands_per_request": round((command_counter.count - commands_before) / requests, 2),
+    }
+
+
+def print_result(name: str, result: dict):
+    errors = f" errors={result['errors']}" if result["errors"] else ""
+    print(f"   {name:<18} p50={result['p50_ms']:>8.1f}ms p95={result['p95_ms']:>8.1f}ms "
+          f"p99={result['p99_ms']:>8.1f}ms {result['throughput_rps']:>8.1f} req/s "
+          f"{result['commands_per_request']:>6.1f} cmds/req{errors}")
+
+
+def regressions(results: dict, baseline: dict, max_regression: float, min_slowdown_ms: float) -> List[str]:
+    """Endpoints slower (p95) or issuing more commands than the baseline allows"""
+    allowed = 1 + max_regression / 100
+    found = []
+    for size, endpoints in results.items():
+        for name, result in endpoints.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if result["p95_ms"] > base["p95_ms"] * allowed and result["p95_ms"] - base["p95_ms"] >= min_slowdown_ms:
+                found.append(f"{size} {name}: p95 {result['p95_ms']:.1f}ms vs baseline {base['p95_ms']:.1f}ms")
+            if result["commands_per_request"] > base["commands_per_request"] * allowed \
+                    and result["commands_per_request"] - base["commands_per_request"] >= 1:
+                found.append(f"{size} {name}: {result['commands_per_request']:.1f} commands/request "
+                             f"vs baseline {base['commands_per_request']:.1f}")
+    return found
+
+
+async def run(args) -> dict:
+    factors = [float(value) for value in args.sizes.split(",")]
+    selected = [endpoint for endpoint in ENDPOINTS if not args.endpoints or endpoint.name in args.endpoints.split(",")]
+    results: Dict[str, Dict[str, dict]] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for step, factor in enumerate(factors, start=1):
+            label = size_label(factor)
+            print(f"\n{step}. Dataset {label} (seed {args.seed})...")
+            await load_dataset(factor, args.seed)
+            tokens = {role: await login(client, role) for role in CREDENTIALS}
+            results[label] = {}
+            for endpoint in selected:
+                requests = min(args.requests, endpoint.max_requests or args.requests)
+                headers = tokens[endpoint.role] if endpoint.role else {}
+                result = await measure(client, endpoint, headers, requests, args.concurrency, args.warmup)
+                results[label][endpoint.name] = result
+                print_result(endpoint.name, result)
+    await close_mongo_connection()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process endpoint benchmark")
+    parser.add_argument("--sizes", default="0.001,0.01", help="comma-separated dataset size factors")
+    parser.add_argument("--endpoints", default="", help="comma-separated endpoint names (default all)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", nargs="?", const="benchmark_baseline.json", default=None,
+                        help="write this run as a baseline (default benchmark_baseline.json)")
+    parser.add_argument("--max-regression", type=float, default=25, help="allowed regression in percent")
+    parser.add_argument("--min-slowdown-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    failed = [f"{size} {name}: HTTP {result['errors']}"
+              for size, endpoints in results.items() for name, result in endpoints.items() if result["errors"]]
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(),
+                "settings": {key: getattr(args, key) for key in ("sizes", "requests", "concurrency", "seed")},
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    print("\nResult")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed += regressions(results, baseline["results"], args.max_regression, args.min_slowdown_ms)
+    if failed:
+        for line in failed:
+            print(f"   ✗ {line}")
+        return 1
+    print("   ✓ No errors" + (f", no regression beyond {args.max_regression:g}% of {args.baseline}" if args.baseline else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Load test: login burst vs. the rest of the API
+
+Fires a burst of concurrent logins (as at shift start) while continuously probing a cheap
+endpoint, and checks that probe latency stays close to its idle baseline. Password hashing
+runs on a bounded worker pool, so a login burst should only slow down logins (or turn
+excess ones into 503s), not every other request.
+
+Run against a live server with seeded demo users:
+    python loadtest_login.py [--logins 200] [--concurrency 50] [--base-url http://localhost:8000]
+
+Exits non-zero when the probe p95 during the burst exceeds baseline p95 + --max-slowdown-ms.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Demo user created by seed_demo_data
+LOGIN_EMAIL = "sales@yourcompany.com"
+LOGIN_PASSWORD = "sales123"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(label, latencies_ms):
+    print(f"   {label}: n={len(latencies_ms)} "
+          f"p50={percentile(latencies_ms, 50):.1f}ms "
+          f"p95={percentile(latencies_ms, 95):.1f}ms "
+          f"max={max(latencies_ms, default=0):.1f}ms")
+
+
+def probe(url, stop_event, latencies_ms, interval):
+    """Hit `url` repeatedly until stopped, recording latency in ms"""
+    session = requests.Session()
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        session.get(url, timeout=30)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        time.sleep(interval)
+
+
+def measure_probe(url, seconds, interval):
+    latencies_ms = []
+    stop_event = threading.Event()
+    thread = threading.Thread(target=probe, args=(url, stop_event, latencies_ms, interval))
+    thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    thread.join()
+    return latencies_ms
+
+
+def login_once(login_url):
+    started = time.perf_counter()
+    response = requests.post(login_url, json={"email": LOGIN_EMAIL, "password": LOGIN_PASSWORD}, timeout=120)
+    return response.status_code, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login burst load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--baseline-seconds", type=float, default=5)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    parser.add_argument("--max-slowdown-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    probe_url = f"{args.base_url}/health"
+    login_url = f"{args.base_url}/api/auth/login"
+
+    print("\n1. Measuring idle baseline...")
+    baseline = measure_probe(probe_url, args.baseline_seconds, args.probe_interval)
+    summarize("/health (idle)", baseline)
+
+    print(f"\n2. Login burst: {args.logins} logins, {args.concurrency} concurrent...")
+    during = []
+    stop_event = threading.Event()
+    probe_thread = threading.Thread(target=probe, args=(probe_url, stop_event, during, args.probe_interval))
+    probe_thread.start()
+    burst_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda _: login_once(login_url), range(args.logins)))
+    burst_seconds = time.perf_counter() - burst_started
+    stop_event.set()
+    probe_thread.join()
+
+    ok = [ms for code, ms in results if code == 200]
+    busy = [ms for code, ms in results if code == 503]
+    failed = [code for code, _ in results if code not in (200, 503)]
+    summarize("/health (during burst)", during)
+    summarize("login 200", ok)
+    if busy:
+        summarize("login 503 (queue full)", busy)
+    print(f"   throughput: {len(ok) / burst_seconds:.1f} logins/s, unexpected statuses: {failed or 'none'}")
+
+    allowed = percentile(baseline, 95) + args.max_slowdown_ms
+    observed = percentile(during, 95)
+    print("\n3. Result")
+    if observed <= allowed and not failed:
+        print(f"   ✓ Probe p95 {observed:.1f}ms within {allowed:.1f}ms - login load is isolated")
+        return 0
+    print(f"   ✗ Probe p95 {observed:.1f}ms exceeds {allowed:.1f}ms (or unexpected login errors)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+The in-memory engine's planner must only change speed, never results: every query here runs
+on a collection without secondary indexes (full scan) and on one with them, and both must
+return the same documents (in the same order when sorted).
+
+Run with `python -m pytest tests` from the backend directory.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.memory_db import MemoryDatabase
+
+INDEXES = [
+    IndexModel([("x", ASCENDING)], name="x"),
+    IndexModel([("x", DESCENDING), ("s", ASCENDING)], name="x_desc_s"),
+    IndexModel([("p", ASCENDING)], name="p_partial", partialFilterExpression={"p": {"$gt": 1}}),
+    IndexModel([("t", ASCENDING)], name="t_string", partialFilterExpression={"t": {"$type": "string"}}),
+    IndexModel([("y", ASCENDING)], name="y_sparse", sparse=True),
+    IndexModel([("a", ASCENDING)], name="a_multikey"),
+    IndexModel([("s", ASCENDING), ("_id", ASCENDING)], name="s_id"),
+    IndexModel([("d", DESCENDING), ("_id", DESCENDING)], name="d_id"),
+    IndexModel([("n.v", ASCENDING)], name="n_v"),
+]
+
+START = datetime(2025, 1, 1)
+
+
+def _value(rng: random.Random):
+    """A field value of a mixed type, or None (the field is then left out)"""
+    roll = rng.random()
+    if roll < 0.15:
+        return None
+    if roll < 0.25:
+        return "null"
+    if roll < 0.65:
+        return rng.randint(0, 6)
+    if roll < 0.8:
+        return rng.choice(["a", "ab", "b", "ba", "c"])
+    if roll < 0.9:
+        return [rng.randint(0, 6) for _ in range(rng.randint(0, 3))]
+    return rng.random() * 6
+
+
+def make_documents(count: int = 300, seed: int = 7):
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        doc = {"_id": ObjectId(), "i": i}
+        for field in ("x", "p", "t", "y"):
+            value = _value(rng)
+            if value == "null":
+                doc[field] = None
+            elif value is not None:
+                doc[field] = value
+        doc["a"] = [rng.randint(0, 6) for _ in range(rng.randint(0, 3))] if rng.random() < 0.8 else rng.randint(0, 6)
+        if rng.random() < 0.9:
+            doc["s"] = rng.choice(["CUST-0001", "CUST-0002", "CUST-0010", "LEAD-1", "x", ""])
+        if rng.random() < 0.9:
+            when = START + timedelta(hours=rng.randint(0, 500))
+            doc["d"] = when if rng.random() < 0.5 else when.isoformat()
+        if rng.random() < 0.7:
+            doc["n"] = {"v": rng.randint(0, 3)} if rng.random() < 0.7 else [{"v": rng.randint(0, 3)}, {"v": 9}]
+        documents.append(doc)
+    return documents
+
+
+QUERIES = [
+    ({}, None),
+    ({}, [("x", 1)]),
+    ({}, [("x", -1)]),
+    ({}, [("p", 1)]),
+    ({}, [("y", 1)]),
+    ({}, [("s", 1), ("_id", 1)]),
+    ({}, [("d", -1), ("_id", -1)]),
+    ({"x": 2}, None),
+    ({"x": None}, None),
+    ({"x": {"$in": [1, 3, "ab", None]}}, None),
+    ({"x": {"$gt": 2}}, None),
+    ({"x": {"$gte": 2, "$lt": 5}}, [("x", 1)]),
+    ({"x": {"$lt": "b"}}, None),
+    ({"x": {"$gt": 2}, "s": "x"}, None),
+    ({"x": 3}, [("s", 1)]),
+    ({"p": 2}, None),
+    ({"p": 1}, None),
+    ({"p": {"$gt": 3}}, None),
+    ({"p": {"$gte": 0}}, [("p", 1)]),
+    ({"p": {"$in": [2, 5]}}, [("p", 1)]),
+    ({"p": None}, None),
+    ({"t": "ab"}, None),
+    ({"t": {"$type": "string"}}, None),
+    ({"t": {"$regex": "^a"}}, None),
+    ({"t": {"$gte": 2}}, None),
+    ({"y": 2}, None),
+    ({"y": None}, None),
+    ({"y": {"$exists": False}}, None),
+    ({"y": {"$in": [2, None]}}, None),
+    ({"y": {"$gt": 1}}, [("y", 1)]),
+    ({"a": 3}, None),
+    ({"a": {"$gt": 2, "$lt": 4}}, None),
+    ({"a": {"$gte": 1, "$lte": 1}}, None),
+    ({"a": {"$gt": 2}}, [("a", 1)]),
+    ({"a": {"$lt": 3}}, [("a", -1)]),
+    ({}, [("a", 1)]),
+    ({"a": None}, None),
+    ({"s": {"$regex": "^CUST-"}}, [("s", 1), ("_id", 1)]),
+    ({"s": {"$gt": "CUST-0001"}}, [("s", 1), ("_id", 1)]),
+    ({"d": {"$gte": START + timedelta(hours=100), "$lt": START + timedelta(hours=300)}}, None),
+    ({"$or": [{"d": {"$gte": "2025-01-05"}}, {"d": {"$gte": START + timedelta(hours=400)}}]}, None),
+    ({"n.v": 2}, None),
+    ({"n.v": {"$gt": 1, "$lt": 9}}, None),
+    ({"$and": [{"x": {"$gt": 1}}, {"x": {"$lt": 4}}]}, None),
+    ({"$or": [{"x": 2}, {"p": 3}, {"y": None}]}, None),
+    ({"$or": [{"a": {"$gt": 2, "$lt": 4}}, {"p": 2}]}, None),
+]
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(scope="module")
+def collections():
+    documents = make_documents()
+    scanned = MemoryDatabase("scan", {"docs": documents}).docs
+    indexed = MemoryDatabase("indexed", {"docs": documents}).docs
+    _run(indexed.create_indexes(INDEXES))
+    return scanned, indexed
+
+
+async def _find(collection, query, sort, limit):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort + ([] if sort[-1][0] == "_id" else [("_id", ASCENDING)]))
+    if limit:
+        cursor = cursor.limit(limit)
+    return [doc["i"] for doc in await cursor.to_list(length=None)]
+
+
+@pytest.mark.parametrize("query, sort", QUERIES)
+@pytest.mark.parametrize("limit", [0, 5])
+def test_index_and_scan_agree(collections, query, sort, limit):
+    scanned, indexed = collections
+    expected = _run(_find(scanned, query, sort, limit))
+    found = _run(_find(indexed, query, sort, limit))
+    if sort is None:
+        # Without a sort, order (and so which documents a limit keeps) is unspecified
+        matching = set(_run(_find(scanned, query, None, 0)))
+        assert len(found) == len(expected) and set(found) <= matching
+    else:
+        assert found == expected
+
+
+@pytest.mark.parametrize("query, sort", [item for item in QUERIES if not item[1]])
+def test_aggregate_match_agrees(collections, query, sort):
+    scanned, indexed = collections
+    pipeline = [{"$match": query}, {"$sort": {"i": 1}}, {"$project": {"i": 1}}]
+    expected = _run(scanned.aggregate(pipeline).to_list(length=None))
+    assert _run(indexed.aggregate(pipeline).to_list(length=None)) == expected
+
+
+def test_reported_planner_regressions():
+    docs = MemoryDatabase("regressions").docs
+    _run(docs.create_index([("x", ASCENDING)], partialFilterExpression={"x": {"$gt": 5}}))
+    _run(docs.create_index([("y", ASCENDING)], sparse=True))
+    _run(docs.create_index([("a", ASCENDING)]))
+    _run(docs.insert_many([{"_id": 1, "x": 2, "a": [1, 5]}, {"_id": 2, "x": 9, "y": 1, "a": 3}]))
+
+    async def ids(query, sort=None):
+        cursor = docs.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return [doc["_id"] for doc in await cursor.to_list(length=None)]
+
+    assert _run(ids({"x": 2})) == [1]
+    assert _run(ids({}, [("x", 1)])) == [1, 2]
+    assert _run(ids({}, [("y", 1)])) == [1, 2]
+    assert _run(ids({"y": None})) == [1]
+    assert _run(ids({"a": {"$gt": 2, "$lt": 4}}, [("_id", 1)])) == [1, 2]
+
+
+def test_duplicate_id_is_rejected():
+    docs = MemoryDatabase("duplicates").docs
+    _run(docs.insert_one({"_id": 1, "v": 1}))
+    with pytest.raises(DuplicateKeyError):
+        _run(docs.insert_one({"_id": 1, "v": 2}))
+    assert _run(docs.find_one({"_id": 1}))["v"] == 1
@@ -677,16 +677,15 @@ export const CRMModule = () => {
 
   const fetchLeadDetails = async (leadId: string) => {
     try {
-      const [emails, calls, tasks, notes] = await Promise.all([
-        crmService.getLeadEmails(leadId),
-        crmService.getLeadCalls(leadId),
-        crmService.getLeadTasks(leadId),
-        crmService.getLeadNotes(leadId),
-      ]);
-      setLeadEmails(emails);
-      setLeadCalls(calls);
-      setLeadTasks(tasks);
-      setLeadNotes(notes);
+      const timeline = await crmService.getLeadTimeline(leadId);
+      const entriesOfType = (type: string) =>
+        timeline
+          .filter((entry: any) => entry.type === type)
+          .map((entry: any) => ({ ...entry.details, id: entry.id }));
+      setLeadEmails(entriesOfType('email'));
+      setLeadCalls(entriesOfType('call'));
+      setLeadTasks(entriesOfType('task'));
+      setLeadNotes(entriesOfType('note'));
     } catch (error) {
       console.error('Error fetching lead details:', error);
     }
@@ -1500,9 +1499,17 @@ export const CRMModule = () => {
     }
   };
 
-  const handleViewLeadDetails = (lead: any) => {
+  const handleViewLeadDetails = async (lead: any) => {
     setSelectedLead(lead);
     setLeadDetailsDialogOpen(true);
+
+    // List items only carry activitiesCount; load the full lead for its activity log
+    try {
+      const fullLead = await crmService.getLead(lead.lead_id);
+      setSelectedLead((current: any) => (current?.lead_id === lead.lead_id ? fullLead : current));
+    } catch (error) {
+      console.error('Error fetching lead:', error);
+    }
   };
 
   const handleUpdateLeadStatus = async (leadId: string, newStatus: string) => {
@@ -10,6 +10,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { useToast } from '@/hooks/use-toast';
 import { useAuth } from '@/contexts/AuthContext';
 import { Plus, Edit, Trash2, FileText, CheckCircle, XCircle, Calendar, AlertTriangle, Loader2, Truck } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Contract {
     id: string;
@@ -60,7 +61,7 @@ export const ContractsModule = () => {
    // Fetch contracts from MongoDB
    const fetchContracts = async () => {
      try {
-       const response = await fetch('http://localhost:8000/api/sales/contracts', {
+       const response = await fetchAllPages('http://localhost:8000/api/sales/contracts', {
          headers: {
            'Authorization': `Bearer ${localStorage.getItem('auth_token')}`
          }
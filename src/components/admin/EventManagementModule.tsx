@@ -10,6 +10,7 @@ import { Badge } from '@/components/ui/badge';
 import { Textarea } from '@/components/ui/textarea';
 import { useToast } from '@/hooks/use-toast';
 import { Loader2, Plus, Edit, Trash2, Calendar, Bell, AlertTriangle } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Event {
   id: string;
@@ -43,7 +44,7 @@ export const EventManagementModule = () => {
   const fetchEvents = async () => {
     try {
       const token = localStorage.getItem('auth_token');
-      const response = await fetch('http://localhost:8000/api/events/', {
+      const response = await fetchAllPages('http://localhost:8000/api/events/', {
         headers: {
           'Authorization': `Bearer ${token}`
         }
@@ -9,6 +9,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Badge } from '@/components/ui/badge';
 import { useToast } from '@/hooks/use-toast';
 import { Users, FileText, ClipboardList, Calendar, Wallet, Briefcase, Plus, Loader2 } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 type Employee = {
   id: string;
@@ -443,7 +444,7 @@ export const HRModule = () => {
     try {
       setLoading(true);
       const token = localStorage.getItem('auth_token');
-      const res = await fetch('http://localhost:8000/api/hr/employees', {
+      const res = await fetchAllPages('http://localhost:8000/api/hr/employees', {
         headers: { 'Authorization': `Bearer ${token}` },
       });
       if (res.ok) {
@@ -7,6 +7,7 @@ import { useToast } from '@/hooks/use-toast';
 import { Package, Truck, AlertCircle, FileText, BarChart3 } from 'lucide-react';
 import { WarehouseOrdersModule } from '@/components/admin/WarehouseOrdersModule';
 import { AddRemoveEquipmentDialog } from '@/components/forms/AddRemoveEquipmentDialog';
+import { fetchAllPages } from '@/services/pagination';
 
 export const InventoryModule = () => {
   const [activeTab, setActiveTab] = useState('overview');
@@ -56,7 +57,7 @@ export const InventoryModule = () => {
 
     const fetchDispatchData = async () => {
       try {
-        const response = await fetch('http://localhost:8000/api/warehouse/dispatch', {
+        const response = await fetchAllPages('http://localhost:8000/api/warehouse/dispatch', {
           headers: {
             'Authorization': `Bearer ${localStorage.getItem('auth_token')}`
           }
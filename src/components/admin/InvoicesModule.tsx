@@ -8,6 +8,7 @@ import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { useToast } from '@/hooks/use-toast';
 import { Plus, Edit, Trash2, Download, FileText, Send, CreditCard, Loader2, RefreshCw } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Invoice {
   id: string;
@@ -51,7 +52,7 @@ export const InvoicesModule = () => {
         return;
       }
 
-      const response = await fetch('http://localhost:8000/api/invoices/', {
+      const response = await fetchAllPages('http://localhost:8000/api/invoices/', {
         headers: { 'Authorization': `Bearer ${token}` },
       });
 
@@ -6,6 +6,7 @@ import { Button } from '@/components/ui/button';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { Download, FileText, Receipt } from 'lucide-react';
 import { toast } from 'sonner';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Invoice {
   id: string;
@@ -33,7 +34,7 @@ export const InvoicesModule = () => {
     try {
       setLoading(true);
       const token = localStorage.getItem('auth_token');
-      const response = await fetch('http://localhost:8000/api/invoices/', {
+      const response = await fetchAllPages('http://localhost:8000/api/invoices/', {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
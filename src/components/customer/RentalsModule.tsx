@@ -13,6 +13,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Checkbox } from '@/components/ui/checkbox';
 import { Calendar, FileText, Package, Plus, MapPin, Phone, User, Building, Loader2 } from 'lucide-react';
 import { toast } from 'sonner';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Rental {
   id: string;
@@ -143,7 +144,7 @@ export const RentalsModule = () => {
         return;
       }
 
-      const response = await fetch('http://localhost:8000/api/rentals/', {
+      const response = await fetchAllPages('http://localhost:8000/api/rentals/', {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
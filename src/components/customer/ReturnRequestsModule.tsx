@@ -4,6 +4,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Badge } from '@/components/ui/badge';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { CheckCircle } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Rental {
   id: string;
@@ -41,7 +42,7 @@ export const RentalsModule = () => {
     try {
       setLoading(true);
       const token = localStorage.getItem('auth_token');
-      const response = await fetch('http://localhost:8000/api/rentals/', {
+      const response = await fetchAllPages('http://localhost:8000/api/rentals/', {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
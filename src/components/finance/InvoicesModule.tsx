@@ -4,6 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { useToast } from '@/hooks/use-toast';
 import { Download, Send, CreditCard, RefreshCw, Loader2 } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Invoice {
   id: string;
@@ -41,7 +42,7 @@ export const InvoicesModule = () => {
         return;
       }
 
-      const response = await fetch('http://localhost:8000/api/finance/invoices', {
+      const response = await fetchAllPages('http://localhost:8000/api/finance/invoices', {
         headers: { 'Authorization': `Bearer ${token}` },
       });
 
@@ -10,6 +10,7 @@ import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
 import { Calendar, FileText, Package, Plus, Loader2 } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
+import { fetchAllPages } from '@/services/pagination';
 
 interface Rental {
     id: string;
@@ -99,7 +100,7 @@ const EnquiryManagementModule = () => {
       if (!token) return;
 
       console.log('Fetching sales enquiries from /api/sales/enquiries');
-      const response = await fetch('http://localhost:8000/api/sales/enquiries', {
+      const response = await fetchAllPages('http://localhost:8000/api/sales/enquiries', {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
@@ -10,6 +10,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Plus, FileText, Download, Send, Edit, Calculator } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
+import { fetchAllPages } from '@/services/pagination';
 
 interface QuotationItem {
   id: string;
@@ -79,7 +80,7 @@ const QuotationManagementModule = () => {
       }
 
       console.log('Fetching quotations from backend...');
-      const response = await fetch('http://localhost:8000/api/sales/quotations', {
+      const response = await fetchAllPages('http://localhost:8000/api/sales/quotations', {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
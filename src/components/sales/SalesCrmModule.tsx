@@ -22,6 +22,7 @@ import {
   UserCheck,
   BadgeCheck,
 } from 'lucide-react';
+import { fetchAllPages } from '@/services/pagination';
 
 type LeadRecord = {
   id?: string;
@@ -101,7 +102,7 @@ const SalesCrmModule = () => {
       }
 
       console.log('Fetching CRM leads from /api/crm/leads/assigned');
-      const response = await fetch('http://localhost:8000/api/crm/leads/assigned', {
+      const response = await fetchAllPages('http://localhost:8000/api/crm/leads/assigned', {
         headers: {
           Authorization: `Bearer ${token}`,
         },
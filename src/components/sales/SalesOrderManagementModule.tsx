@@ -5,6 +5,7 @@ import { Badge } from '@/components/ui/badge';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { ShoppingCart, CheckCircle, AlertTriangle, Package } from 'lucide-react';
 import { toast as sonnerToast } from 'sonner';
+import { fetchAllPages } from '@/services/pagination';
 
 interface SalesOrder {
   id: string;
@@ -49,7 +50,7 @@ const SalesOrderManagementModule = () => {
       }
 
       console.log('Fetching sales orders...');
-      const response = await fetch('http://localhost:8000/api/sales/orders', {
+      const response = await fetchAllPages('http://localhost:8000/api/sales/orders', {
         headers: { 'Authorization': `Bearer ${token}` },
       });
 
@@ -11,6 +11,7 @@ import { DispatchEquipmentDialog } from '@/components/forms/DispatchEquipmentDia
 import { AddRemoveEquipmentDialog } from '@/components/forms/AddRemoveEquipmentDialog';
 import { WarehouseOrdersModule } from '@/components/admin/WarehouseOrdersModule';
 import { useToast } from '@/hooks/use-toast';
+import { fetchAllPages } from '@/services/pagination';
 
 const WarehouseDashboard = () => {
   const { user, role, loading } = useAuth();
@@ -86,7 +87,7 @@ const WarehouseDashboard = () => {
 
     const fetchDispatchData = async () => {
       try {
-        const response = await fetch('http://localhost:8000/api/warehouse/dispatch', {
+        const response = await fetchAllPages('http://localhost:8000/api/warehouse/dispatch', {
           headers: {
             'Authorization': `Bearer ${localStorage.getItem('auth_token')}`
           }
@@ -1,5 +1,6 @@
 // CRM API Service
 import API_CONFIG from '@/config/api';
+import { fetchAllPages } from '@/services/pagination';
 const API_BASE_URL = API_CONFIG.CRM.BASE;
 
 const getAuthHeaders = () => ({
@@ -8,8 +9,9 @@ const getAuthHeaders = () => ({
 });
 
 // Leads
+// All leads, newest first; the list is served in pages, followed through the X-Next-Cursor header
 export const getLeads = async () => {
-  const response = await fetch(`${API_BASE_URL}/leads`, {
+  const response = await fetchAllPages(`${API_BASE_URL}/leads`, {
     headers: getAuthHeaders(),
   });
   if (!response.ok) throw new Error('Failed to fetch leads');
@@ -62,6 +64,17 @@ export const deleteLead = async (leadId: string) => {
   return response.json();
 };
 
+// Timeline
+// Emails, calls, tasks and notes of a lead, newest first. Pages of `pageSize` entries are
+// requested until the X-Next-Cursor header is absent, so long timelines are loaded in full.
+export const getLeadTimeline = async (leadId: string, pageSize = 200) => {
+  const response = await fetchAllPages(`${API_BASE_URL}/leads/${leadId}/timeline`, {
+    headers: getAuthHeaders(),
+  }, pageSize);
+  if (!response.ok) throw new Error('Failed to fetch lead timeline');
+  return response.json();
+};
+
 // Emails
 export const getLeadEmails = async (leadId: string) => {
   const response = await fetch(`${API_BASE_URL}/leads/${leadId}/emails`, {
@@ -160,10 +173,11 @@ export const convertToDeal = async (convertData: any) => {
 };
 
 // Customers
-export const getCustomers = async () => {
-  const response = await fetch(`${API_BASE_URL}/customers`, {
+// All customers; the list is served in pages, followed through the X-Next-Cursor header
+export const getCustomers = async (pageSize = 100) => {
+  const response = await fetchAllPages(`${API_BASE_URL}/customers`, {
     headers: getAuthHeaders(),
-  });
+  }, pageSize);
   if (!response.ok) throw new Error('Failed to fetch customers');
   return response.json();
 };
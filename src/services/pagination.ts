@@ -0,0 +1,24 @@
+// List endpoints return one page per request; while more entries remain, the cursor for the
+// next page comes back in the X-Next-Cursor header. fetchAllPages requests pages of `pageSize`
+// until the header is absent and resolves to a Response whose JSON body holds the entries of
+// every page in order, so it can stand in for fetch() on list calls. A failed page is
+// returned as is.
+export const NEXT_CURSOR_HEADER = 'X-Next-Cursor';
+
+export const fetchAllPages = async (url: string, init: RequestInit = {}, pageSize = 100): Promise<Response> => {
+  const entries: any[] = [];
+  let cursor: string | null = null;
+  do {
+    const pageUrl = new URL(url, window.location.origin);
+    pageUrl.searchParams.set('limit', String(pageSize));
+    if (cursor) pageUrl.searchParams.set('cursor', cursor);
+    const response = await fetch(pageUrl.toString(), init);
+    if (!response.ok) return response;
+    entries.push(...(await response.json()));
+    cursor = response.headers.get(NEXT_CURSOR_HEADER);
+  } while (cursor);
+  return new Response(JSON.stringify(entries), {
+    status: 200,
+    headers: { 'Content-Type': 'application/json' },
+  });
+};